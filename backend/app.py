@@ -3,7 +3,6 @@ CraftRMN Pro - Aplicación Principal
 """
 import os
 import sys
-import json
 import logging
 from pathlib import Path
 from flask import Flask
@@ -11,7 +10,6 @@ from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from apscheduler.schedulers.background import BackgroundScheduler
-import numpy as np
 
 from extensions import limiter
 
@@ -22,9 +20,16 @@ import config
 from database import get_db
 from config_manager import get_config_manager
 from auth import auth_manager
+from json_utils import NumpyJSONEncoder, NumpyJSONProvider, ORJSON_AVAILABLE
 from security import add_security_headers, log_request, check_csrf_token
+from audit_logger import setup_logging
+from audit_store import get_audit_store
 from middleware.error_handlers import register_error_handlers
+from middleware.http_cache import register_http_cache
 from utils.sync_utils import automatic_retry_job
+from utils import process_lock
+from utils.chunked_upload import get_upload_store
+from reanalysis import get_reanalysis_manager
 
 # Importar analizador
 try:
@@ -39,25 +44,17 @@ except ImportError:
 # ============================================================================
 # CONFIGURACIÓN LOGGING
 # ============================================================================
-logging.getLogger().setLevel(logging.DEBUG)
-
-# ============================================================================
-# JSON ENCODER
-# ============================================================================
-class NumpyJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer): return int(obj)
-        elif isinstance(obj, np.floating): return float(obj)
-        elif isinstance(obj, np.ndarray): return obj.tolist()
-        elif isinstance(obj, np.bool_): return bool(obj)
-        return super().default(obj)
+# Cola + hilo escritor, rotación y muestreo (audit_logger.py); nivel: LOG_LEVEL
+setup_logging()
 
 # ============================================================================
 # INICIALIZAR FLASK
 # ============================================================================
 app = Flask(__name__, static_folder="../frontend")
 app.config['SECRET_KEY'] = config.FLASK_SECRET_KEY
-app.json_encoder = NumpyJSONEncoder
+# jsonify() con soporte NumPy (orjson si está instalado)
+app.json = NumpyJSONProvider(app)
+logging.info(f"✅ JSON: {'orjson' if ORJSON_AVAILABLE else 'json estándar'}")
 
 # Componentes globales
 db = get_db()
@@ -80,14 +77,18 @@ def apply_security_headers_middleware(response):
 # Registrar error handlers
 register_error_handlers(app)
 
+# Compresión y ETag/304
+register_http_cache(app)
+
 # ============================================================================
 # CORS
 # ============================================================================
 CORS(app, resources={
     r"/api/*": {
         "origins": config.ALLOWED_ORIGINS,
-        "methods": ["GET", "POST", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Content-Range", "Authorization", "X-Spectrum-Encoding", "X-API-Version"],
+        "expose_headers": ["X-Spectrum-Points", "X-Spectrum-Layout", "X-API-Version", "ETag"],
         "max_age": 3600,
         "supports_credentials": True
     }
@@ -112,6 +113,10 @@ from routes.config_routes import config_bp
 from routes.measurement_routes import measurement_bp
 from routes.export_routes import export_bp
 from routes.sync_routes import sync_bp
+from routes.reanalysis_routes import reanalysis_bp
+from routes.compound_routes import compound_bp
+from routes.dashboard_routes import dashboard_bp
+from routes.audit_routes import audit_bp
 
 app.register_blueprint(frontend_bp)
 app.register_blueprint(auth_bp, url_prefix='/api')
@@ -120,6 +125,14 @@ app.register_blueprint(config_bp, url_prefix='/api')
 app.register_blueprint(measurement_bp, url_prefix='/api')
 app.register_blueprint(export_bp, url_prefix='/api')
 app.register_blueprint(sync_bp, url_prefix='/api')
+app.register_blueprint(reanalysis_bp, url_prefix='/api')
+app.register_blueprint(compound_bp, url_prefix='/api')
+app.register_blueprint(dashboard_bp, url_prefix='/api')
+app.register_blueprint(audit_bp, url_prefix='/api')
+
+# Esquema de respuesta v2 (compacto, sin alias): mismas rutas bajo /api/v2
+app.register_blueprint(analysis_bp, url_prefix='/api/v2', name='analysis_v2')
+app.register_blueprint(measurement_bp, url_prefix='/api/v2', name='measurement_v2')
 
 logging.info("✅ Blueprints registrados")
 
@@ -138,16 +151,31 @@ except Exception as e:
 # SCHEDULER
 # ============================================================================
 def init_scheduler():
-    """Inicializa el scheduler para reintentos automáticos"""
+    """
+    Inicializa el scheduler para reintentos automáticos.
+    Con varios procesos worker solo lo arranca el que obtiene el lock
+    (config.SCHEDULER_LOCK_FILE); en el resto no hace nada.
+    """
+    if not process_lock.try_acquire(config.SCHEDULER_LOCK_FILE):
+        logging.info(f"⏭️ Scheduler activo en otro proceso (PID {os.getpid()} no lo arranca)")
+        return
+
     scheduler = BackgroundScheduler(daemon=True)
     scheduler.add_job(
         lambda: automatic_retry_job(db, config.GOOGLE_SCRIPT_URL, NumpyJSONEncoder),
         'interval',
         hours=6
     )
+    # Retención del almacén de auditoría (AUDIT_RETENTION_DAYS)
+    scheduler.add_job(lambda: get_audit_store().prune(), 'interval', hours=24)
+    # Subidas por partes abandonadas (UPLOAD_SESSION_TTL_HOURS)
+    scheduler.add_job(lambda: get_upload_store().cleanup_expired(), 'interval', hours=1)
     scheduler.start()
     logging.info("✅ Scheduler iniciado (cada 6 horas)")
 
+    # Reanudar re-análisis interrumpidos por un reinicio
+    get_reanalysis_manager().resume_interrupted()
+
 # ============================================================================
 # STARTUP
 # ============================================================================
@@ -173,7 +201,7 @@ if __name__ == "__main__":
         logging.info("🚀 Modo PRODUCCIÓN")
         try:
             from waitress import serve
-            serve(app, host=config.FLASK_HOST, port=config.FLASK_PORT, threads=4)
+            serve(app, host=config.FLASK_HOST, port=config.FLASK_PORT, threads=config.SERVER_THREADS)
         except ImportError:
             logging.warning("⚠️ Waitress no instalado, usando Werkzeug")
             app.run(host=config.FLASK_HOST, port=config.FLASK_PORT, debug=False)
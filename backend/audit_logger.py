@@ -1,13 +1,38 @@
 """
 Sistema de auditoría y logging avanzado
 Registra todas las acciones importantes para compliance y debug
+
+Escritura asíncrona: los hilos de las peticiones solo encolan el registro
+(QueueHandler) con el mensaje ya construido; un único hilo escritor
+(QueueListener) lo formatea y lo escribe en consola, logs/app.log y
+logs/audit.log. Los archivos rotan por
+tamaño o por tiempo y las copias rotadas se comprimen con gzip en ese mismo
+hilo. Los eventos muy frecuentes se pueden muestrear (LOG_SAMPLING /
+AUDIT_SAMPLING).
+
+Los procesos hijos de los pools de análisis (fork) heredan la cola pero no
+el hilo escritor: setup_child_logging() los pasa a escribir directamente en
+stderr, y el handler de la cola nunca encola desde un proceso que no tiene
+su propio hilo escritor.
 """
 
+import atexit
+import copy
+import gzip
 import logging
+import logging.handlers
 import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-import os
+from typing import Dict
+
+from utils.metrics import metrics
 
 # Crear directorio de logs si no existe
 LOG_DIR = Path(__file__).parent / "logs"
@@ -17,28 +42,236 @@ LOG_DIR.mkdir(exist_ok=True)
 # CONFIGURACIÓN DE LOGGING
 # ============================================================================
 
-# Logger principal
-app_logger = logging.getLogger('craftrmn')
-app_logger.setLevel(logging.DEBUG if os.getenv('FLASK_DEBUG') == 'true' else logging.INFO)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if os.getenv('FLASK_DEBUG') == 'true' else 'INFO').upper()
+LOG_CONSOLE_LEVEL = os.getenv('LOG_CONSOLE_LEVEL', 'INFO').upper()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
 
-# Handler para archivo general
-file_handler = logging.FileHandler(LOG_DIR / 'app.log', encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
+# Rotación: 'size' (LOG_MAX_MB por archivo) o 'time' (LOG_ROTATION_WHEN, p. ej. 'midnight')
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'size').lower()
+LOG_MAX_MB = float(os.getenv('LOG_MAX_MB', 20))
+LOG_ROTATION_WHEN = os.getenv('LOG_ROTATION_WHEN', 'midnight')
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 10))
+LOG_COMPRESS = os.getenv('LOG_COMPRESS', 'true').lower() == 'true'
+
+
+def _parse_sampling(spec: str) -> Dict[str, int]:
+    """'[REQUEST]=10,werkzeug=5' → {'[REQUEST]': 10, 'werkzeug': 5} (1 de cada N)"""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, every = item.rpartition('=')
+        try:
+            if key and int(every) > 1:
+                rules[key.strip()] = int(every)
+        except ValueError:
+            pass
+    return rules
+
+
+class EventSampler:
+    """
+    Muestreo determinista: de los eventos de cada clave con regla se conserva
+    1 de cada N. WARNING y superiores nunca se descartan.
+    """
+
+    def __init__(self, rules: Dict[str, int]):
+        self.rules = rules
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def keep(self, key: str, levelno: int = logging.INFO) -> bool:
+        every = self.rules.get(key)
+        if every is None or levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % every == 0:
+            return True
+        metrics.incr('logging.sampled_out')
+        return False
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Aplica EventSampler a los registros de la app. La clave de una regla
+    puede ser el nombre de un logger (incluye sus hijos) o el comienzo del
+    mensaje, p. ej. '[REQUEST]'.
+    """
+
+    def __init__(self, sampler: EventSampler):
+        super().__init__()
+        self.sampler = sampler
+
+    def filter(self, record):
+        if not self.sampler.rules or record.levelno >= logging.WARNING:
+            return True
+        for key in self.sampler.rules:
+            if (record.name == key or record.name.startswith(key + '.')
+                    or (isinstance(record.msg, str) and record.msg.startswith(key))):
+                return self.sampler.keep(key, record.levelno)
+        return True
+
+
+class AuditEvent:
+    """Evento de auditoría; se serializa a JSON al encolarse (no en log_event)"""
+    __slots__ = ('event',)
+
+    def __init__(self, event: Dict):
+        self.event = event
+
+    def __str__(self):
+        return json.dumps(self.event, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Encola una copia del registro con el mensaje ya construido (los
+    argumentos y los AuditEvent se serializan aquí, así que modificarlos
+    después de loggear no cambia lo escrito); el formato final (fecha,
+    nivel...) se aplica en el hilo escritor.
+    Con la cola llena se descartan DEBUG/INFO (contador logging.dropped);
+    los WARNING+ y la auditoría esperan a que haya hueco.
+    En un proceso sin hilo escritor (hijo de un fork) no se encola nada: el
+    registro va directamente a stderr.
+    """
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if os.getpid() != _listener_pid:
+            _direct_handler().handle(record)
+            return
+        if record.levelno >= logging.WARNING or record.name == 'audit':
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.incr('logging.dropped')
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _rotating_file_handler(path: Path) -> logging.Handler:
+    """
+    Handler de archivo con rotación (y compresión de las copias).
+    Con varios procesos (serve.py) cada worker escribe su propio archivo
+    (app.w0.log...): la rotación no es segura entre procesos.
+    """
+    worker_id = os.getenv('SERVER_WORKER_ID')
+    if worker_id is not None:
+        path = path.with_name(f"{path.stem}.w{worker_id}{path.suffix}")
+    if LOG_ROTATION == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATION_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=int(LOG_MAX_MB * 1024 * 1024),
+            backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    if LOG_COMPRESS:
+        handler.namer = lambda name: name + '.gz'
+        handler.rotator = _gzip_rotator
+    return handler
 
-# Handler para consola
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
 
 # Formato
 formatter = logging.Formatter(
     '%(asctime)s | %(levelname)-8s | %(name)s | %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
+
+# Cola y handler compartidos (root + 'audit')
+log_queue: "queue.Queue" = queue.Queue(LOG_QUEUE_SIZE)
+queue_handler = _NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(EventSampler(_parse_sampling(os.getenv('LOG_SAMPLING', '')))))
+
+# Handlers finales (solo los usa el hilo escritor)
+file_handler = _rotating_file_handler(LOG_DIR / 'app.log')
+file_handler.setLevel(logging.DEBUG)
+file_handler.addFilter(lambda record: record.name != 'audit')
+
+console_handler = logging.StreamHandler()
+console_handler.setLevel(LOG_CONSOLE_LEVEL)
+console_handler.addFilter(lambda record: record.name != 'audit')
+
 file_handler.setFormatter(formatter)
 console_handler.setFormatter(formatter)
 
-app_logger.addHandler(file_handler)
-app_logger.addHandler(console_handler)
+log_listener = logging.handlers.QueueListener(
+    log_queue, file_handler, console_handler, respect_handler_level=True
+)
+_setup_lock = threading.Lock()
+_listener_started = False
+# Proceso que ejecuta el hilo escritor (los hijos de un fork heredan la cola, no el hilo)
+_listener_pid = None
+_stderr_handler = None
+
+
+def _direct_handler() -> logging.Handler:
+    """Handler síncrono a stderr para procesos sin hilo escritor"""
+    global _stderr_handler
+    if _stderr_handler is None:
+        _stderr_handler = logging.StreamHandler(sys.stderr)
+        _stderr_handler.setLevel(LOG_CONSOLE_LEVEL)
+        _stderr_handler.setFormatter(formatter)
+    return _stderr_handler
+
+
+def setup_logging():
+    """
+    Dirige todo el logging del proceso a la cola y arranca el hilo escritor.
+    Sustituye los StreamHandler de logging.basicConfig() del root y fija su
+    nivel (LOG_LEVEL). Idempotente.
+    """
+    global _listener_started, _listener_pid
+    with _setup_lock:
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        for handler in list(root.handlers):
+            if type(handler) is logging.StreamHandler:
+                root.removeHandler(handler)
+        if queue_handler not in root.handlers:
+            root.addHandler(queue_handler)
+
+        if not _listener_started:
+            log_listener.start()
+            atexit.register(log_listener.stop)
+            _listener_started = True
+            _listener_pid = os.getpid()
+
+
+def setup_child_logging():
+    """
+    Para procesos hijos (initializer de los pools de análisis): quita el
+    handler de la cola heredado del root y de 'audit' y escribe directamente
+    en stderr, sin hilo escritor.
+    """
+    handler = _direct_handler()
+    for logger in (logging.getLogger(), logging.getLogger('audit')):
+        if queue_handler in logger.handlers:
+            logger.removeHandler(queue_handler)
+            logger.addHandler(handler)
+
+
+# Logger principal (escribe a través del root)
+app_logger = logging.getLogger('craftrmn')
+app_logger.setLevel(logging.DEBUG if os.getenv('FLASK_DEBUG') == 'true' else logging.INFO)
+
+setup_logging()
 
 
 # ============================================================================
@@ -54,21 +287,33 @@ class AuditLogger:
     def __init__(self):
         self.enabled = os.getenv('AUDIT_LOG_ENABLED', 'true').lower() == 'true'
         self.log_file = LOG_DIR / (os.getenv('AUDIT_LOG_FILE', 'audit.log'))
+        # Muestreo por event_type, p. ej. AUDIT_SAMPLING='SYNC=10' (solo eventos INFO)
+        self.sampler = EventSampler(_parse_sampling(os.getenv('AUDIT_SAMPLING', '')))
         
         if self.enabled:
             # Crear logger de auditoría
             self.logger = logging.getLogger('audit')
             self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            self.logger.addHandler(queue_handler)
             
-            # Handler para archivo de auditoría
-            audit_handler = logging.FileHandler(self.log_file, encoding='utf-8')
+            # Handler para archivo de auditoría (lo usa el hilo escritor)
+            audit_handler = _rotating_file_handler(self.log_file)
             audit_handler.setLevel(logging.INFO)
+            audit_handler.addFilter(logging.Filter('audit'))
             
             # Formato JSON
             audit_formatter = logging.Formatter('%(message)s')
             audit_handler.setFormatter(audit_formatter)
             
-            self.logger.addHandler(audit_handler)
+            log_listener.handlers += (audit_handler,)
+            
+            # Copia indexada en SQLite, por lotes (audit_store.py)
+            self.store_handler = None
+            if os.getenv('AUDIT_DB_ENABLED', 'true').lower() == 'true':
+                from audit_store import AuditStoreHandler, get_audit_store
+                self.store_handler = AuditStoreHandler(get_audit_store())
+                log_listener.handlers += (self.store_handler,)
             
             app_logger.info(f"✅ Audit logging enabled: {self.log_file}")
     
@@ -86,6 +331,9 @@ class AuditLogger:
         if not self.enabled:
             return
         
+        if not self.sampler.keep(event_type, getattr(logging, str(level).upper(), logging.INFO)):
+            return
+        
         event = {
             'timestamp': datetime.now().isoformat(),
             'event_type': event_type,
@@ -95,7 +343,8 @@ class AuditLogger:
             'details': details
         }
         
-        log_line = json.dumps(event, ensure_ascii=False)
+        # json.dumps se hace al encolar (queue_handler.prepare)
+        log_line = AuditEvent(event)
         
         if level == 'ERROR':
             self.logger.error(log_line)
@@ -104,6 +353,18 @@ class AuditLogger:
         else:
             self.logger.info(log_line)
     
+    def flush(self, timeout: float = 0.5):
+        """
+        Vuelca al almacén indexado los eventos pendientes: espera (como mucho
+        timeout s) a que el hilo escritor vacíe la cola y guarda el lote
+        """
+        if not self.enabled or self.store_handler is None:
+            return
+        deadline = time.monotonic() + timeout
+        while log_queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.store_handler.flush()
+    
     def log_login(self, company_id, success, ip, reason=None):
         """Registra intento de login"""
         self.log_event(
@@ -0,0 +1,262 @@
+"""
+Almacén indexado de eventos de auditoría (SQLite)
+
+audit.log sigue siendo el registro en texto; además, el hilo escritor del
+logging (audit_logger.py) inserta los eventos por lotes en una BD SQLite
+aparte (logs/audit.db) con índices por fecha, event_type, usuario e IP, de
+modo que consultas como "logins fallidos desde esta IP el último mes" o
+"exportaciones de FAES" no recorren todo el archivo.
+
+- Lotes de AUDIT_DB_BATCH_SIZE eventos o cada AUDIT_DB_FLUSH_SECONDS
+  (temporizador: un lote parcial no espera a que llegue otro evento)
+- Con varios procesos worker (serve.py) cada uno escribe sus propios lotes
+  en la misma BD: una consulta ve lo de los demás workers con hasta
+  AUDIT_DB_FLUSH_SECONDS de retraso
+- Retención: prune() borra los eventos de más de AUDIT_RETENTION_DAYS días
+  (tarea diaria del scheduler)
+- Importar un audit.log existente: python audit_store.py import logs/audit.log
+"""
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = Path(__file__).parent / "logs"
+
+AUDIT_DB_FILE = LOG_DIR / os.getenv('AUDIT_DB_FILE', 'audit.db')
+AUDIT_DB_BATCH_SIZE = int(os.getenv('AUDIT_DB_BATCH_SIZE', 200))
+AUDIT_DB_FLUSH_SECONDS = float(os.getenv('AUDIT_DB_FLUSH_SECONDS', 2))
+AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 365))
+
+EVENT_COLUMNS = ('timestamp', 'event_type', 'user', 'ip', 'level', 'details')
+FILTER_COLUMNS = ('event_type', 'user', 'ip', 'level')
+
+
+class AuditStore:
+    """Eventos de auditoría en SQLite con índices para consultas filtradas"""
+
+    def __init__(self, db_path: Path = AUDIT_DB_FILE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_database()
+
+    def get_connection(self):
+        conn = sqlite3.connect(str(self.db_path))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self.get_connection()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS audit_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    user TEXT,
+                    ip TEXT,
+                    level TEXT,
+                    details TEXT
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_events(timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_type_time ON audit_events(event_type, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_user_time ON audit_events(user, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_ip_time ON audit_events(ip, timestamp)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ==================== ESCRITURA ====================
+
+    def insert_many(self, events: List[Dict]) -> int:
+        """Inserta un lote de eventos (dicts de AuditLogger.log_event)"""
+        if not events:
+            return 0
+        rows = [
+            (
+                event.get('timestamp') or datetime.now().isoformat(),
+                event.get('event_type', 'UNKNOWN'),
+                event.get('user'),
+                event.get('ip'),
+                event.get('level'),
+                json.dumps(event.get('details'), ensure_ascii=False, default=str),
+            )
+            for event in events
+        ]
+        conn = self.get_connection()
+        try:
+            conn.executemany(
+                f"INSERT INTO audit_events ({', '.join(EVENT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return len(rows)
+
+    def prune(self, retention_days: int = AUDIT_RETENTION_DAYS) -> int:
+        """Borra los eventos anteriores a la retención. Devuelve cuántos borró"""
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        conn = self.get_connection()
+        try:
+            deleted = conn.execute("DELETE FROM audit_events WHERE timestamp < ?", (cutoff,)).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        if deleted:
+            logger.info(f"🧹 Auditoría: {deleted} eventos anteriores a {cutoff[:10]} eliminados")
+        return deleted
+
+    def import_log_file(self, path: Path) -> int:
+        """Importa un audit.log existente (una línea JSON por evento)"""
+        imported, batch = 0, []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    batch.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+                if len(batch) >= 5000:
+                    imported += self.insert_many(batch)
+                    batch = []
+        return imported + self.insert_many(batch)
+
+    # ==================== CONSULTA ====================
+
+    def query(self, filters: Optional[Dict] = None, since: Optional[str] = None,
+              until: Optional[str] = None, page: int = 1, page_size: int = 50) -> Dict:
+        """
+        Eventos filtrados (igualdad en event_type/user/ip/level, rango de
+        fechas ISO [since, until)), del más reciente al más antiguo
+        """
+        conditions, params = [], []
+        for column in FILTER_COLUMNS:
+            value = (filters or {}).get(column)
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self.get_connection()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM audit_events {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT id, {', '.join(EVENT_COLUMNS)} FROM audit_events {where} "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                params + [page_size, (page - 1) * page_size]
+            ).fetchall()
+        finally:
+            conn.close()
+
+        events = []
+        for row in rows:
+            event = dict(row)
+            event['details'] = json.loads(event['details']) if event['details'] else None
+            events.append(event)
+
+        return {
+            'events': events,
+            'page': page,
+            'page_size': page_size,
+            'total_items': total,
+            'total_pages': (total + page_size - 1) // page_size
+        }
+
+
+class AuditStoreHandler(logging.Handler):
+    """
+    Handler del hilo escritor que acumula los eventos de 'audit' y los
+    inserta en AuditStore por lotes: al llegar a batch_size eventos o, como
+    mucho, flush_seconds después del primer evento del lote (temporizador),
+    aunque no lleguen más eventos.
+    """
+
+    def __init__(self, store: AuditStore, batch_size: int = AUDIT_DB_BATCH_SIZE,
+                 flush_seconds: float = AUDIT_DB_FLUSH_SECONDS):
+        super().__init__(logging.INFO)
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._buffer: List[Dict] = []
+        self._timer: Optional[threading.Timer] = None
+        self.addFilter(logging.Filter('audit'))
+
+    def emit(self, record):
+        # El mensaje llega serializado (audit_logger: AuditEvent → JSON al encolar)
+        try:
+            event = json.loads(record.getMessage())
+        except ValueError:
+            return
+        if not isinstance(event, dict):
+            return
+        with self.lock:
+            first = not self._buffer
+            self._buffer.append(event)
+            due = len(self._buffer) >= self.batch_size
+        if due:
+            self.flush()
+        elif first:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        timer = threading.Timer(self.flush_seconds, self.flush)
+        timer.daemon = True
+        with self.lock:
+            if self._timer is not None or not self._buffer:
+                return
+            self._timer = timer
+        timer.start()
+
+    def flush(self):
+        """Inserta lo acumulado (también se llama antes de consultar)"""
+        with self.lock:
+            batch, self._buffer = self._buffer, []
+            timer, self._timer = self._timer, None
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        if not batch:
+            return
+        try:
+            self.store.insert_many(batch)
+        except Exception as e:
+            logger.error(f"❌ Error guardando {len(batch)} eventos de auditoría: {e}")
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+# Instancia global
+_store_instance = None
+_store_lock = threading.Lock()
+
+
+def get_audit_store() -> AuditStore:
+    """Obtiene la instancia global del almacén de auditoría"""
+    global _store_instance
+    with _store_lock:
+        if _store_instance is None:
+            _store_instance = AuditStore()
+        return _store_instance
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == 'import':
+        print(f"📥 {get_audit_store().import_log_file(Path(sys.argv[2]))} eventos importados")
+    else:
+        print("Uso: python audit_store.py import logs/audit.log")
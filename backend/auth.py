@@ -5,14 +5,59 @@ Gestiona tokens, login, logout y verificación de sesiones
 
 import jwt
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
+from typing import Optional
+from flask import g, request, jsonify
 import logging
 
+from utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 
+class VerifiedTokenCache:
+    """
+    LRU acotado de tokens ya verificados → payload, válido hasta su 'exp'.
+
+    La clave es el token completo (cabecera.payload.firma), no solo la firma:
+    un token con el payload alterado y la firma de otro no debe acertar.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._entries.get(token)
+            if payload is None:
+                return None
+            if payload.get('exp', 0) <= time.time():
+                # Expirado: que jwt.decode lo rechace con ExpiredSignatureError
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return payload
+
+    def put(self, token: str, payload: dict):
+        if self.max_entries <= 0 or 'exp' not in payload:
+            return
+        with self._lock:
+            self._entries[token] = payload
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
 class AuthManager:
     """Gestor de autenticación JWT"""
     
@@ -25,6 +70,7 @@ class AuthManager:
         self.algorithm = os.getenv('JWT_ALGORITHM', 'HS256')
         self.access_token_expiration = int(os.getenv('JWT_EXPIRATION_HOURS', 24))
         self.refresh_token_expiration = int(os.getenv('REFRESH_TOKEN_DAYS', 7))
+        self.verified_tokens = VerifiedTokenCache(int(os.getenv('JWT_VERIFIED_CACHE_SIZE', 1024)))
         
         logger.info("✅ AuthManager inicializado")
         logger.info(f"   - Algoritmo: {self.algorithm}")
@@ -93,7 +139,9 @@ class AuthManager:
     
     def verify_token(self, token: str) -> dict:
         """
-        Verifica y decodifica un token JWT
+        Verifica y decodifica un token JWT. Los tokens ya verificados se
+        sirven desde self.verified_tokens hasta su expiración (sin repetir
+        la verificación de la firma ni la decodificación)
         
         Args:
             token: Token JWT a verificar
@@ -105,6 +153,12 @@ class AuthManager:
             jwt.ExpiredSignatureError: Token expirado
             jwt.InvalidTokenError: Token inválido
         """
+        cached = self.verified_tokens.get(token)
+        if cached is not None:
+            metrics.incr('jwt_cache.hits')
+            return dict(cached)
+        metrics.incr('jwt_cache.misses')
+
         try:
             payload = jwt.decode(
                 token,
@@ -112,8 +166,9 @@ class AuthManager:
                 algorithms=[self.algorithm]
             )
             
-            logger.debug(f"✅ Token verificado para empresa: {payload.get('company_id')}")
-            return payload
+            logger.debug("✅ Token verificado para empresa: %s", payload.get('company_id'))
+            self.verified_tokens.put(token, payload)
+            return dict(payload)
             
         except jwt.ExpiredSignatureError:
             logger.warning("⚠️ Token expirado")
@@ -148,6 +203,37 @@ class AuthManager:
 auth_manager = AuthManager()
 
 
+def request_token_payload() -> Optional[dict]:
+    """
+    Payload del token de la petición actual, verificado una sola vez por
+    petición (el resultado se guarda en flask.g). None si no hay token.
+
+    Raises:
+        jwt.ExpiredSignatureError / jwt.InvalidTokenError si el token no es
+        válido (en cada llamada de la misma petición)
+    """
+    if 'jwt_auth' not in g:
+        token = auth_manager.extract_token_from_request()
+        try:
+            g.jwt_auth = (auth_manager.verify_token(token) if token else None, None)
+        except jwt.InvalidTokenError as e:
+            g.jwt_auth = (None, e)
+
+    payload, error = g.jwt_auth
+    if error is not None:
+        raise error
+    return payload
+
+
+def request_company_id(default: str = 'anonymous') -> str:
+    """company_id del token verificado de la petición (para logs y rate limiting)"""
+    try:
+        payload = request_token_payload()
+    except jwt.InvalidTokenError:
+        return 'invalid'
+    return payload.get('company_id', 'unknown') if payload else default
+
+
 def token_required(f):
     """
     Decorador para proteger endpoints que requieren autenticación
@@ -163,18 +249,16 @@ def token_required(f):
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = auth_manager.extract_token_from_request()
-        
-        if not token:
-            logger.warning("⚠️ Acceso denegado: No se proporcionó token")
-            return jsonify({
-                'error': 'Token de autenticación requerido',
-                'message': 'Debes iniciar sesión para acceder a este recurso'
-            }), 401
-        
         try:
-            # Verificar token
-            payload = auth_manager.verify_token(token)
+            # Verificar token (una sola vez por petición)
+            payload = request_token_payload()
+            
+            if payload is None:
+                logger.warning("⚠️ Acceso denegado: No se proporcionó token")
+                return jsonify({
+                    'error': 'Token de autenticación requerido',
+                    'message': 'Debes iniciar sesión para acceder a este recurso'
+                }), 401
             
             # Verificar que sea un access token (no refresh)
             if payload.get('type') != 'access':
@@ -188,7 +272,7 @@ def token_required(f):
             request.jwt_payload = payload
             
             # Log de acceso exitoso
-            logger.info(f"✅ Acceso autorizado: {payload['company_id']} -> {request.path}")
+            logger.debug("✅ Acceso autorizado: %s -> %s", payload['company_id'], request.path)
             
             return f(*args, **kwargs)
             
@@ -234,17 +318,14 @@ def optional_token(f):
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = auth_manager.extract_token_from_request()
-        
-        if token:
-            try:
-                payload = auth_manager.verify_token(token)
+        try:
+            payload = request_token_payload()
+            if payload is not None:
                 request.jwt_payload = payload
-                logger.debug(f"✅ Token opcional verificado: {payload['company_id']}")
-            except:
-                # Token inválido pero endpoint es opcional
-                logger.debug("⚠️ Token opcional inválido, continuando sin auth")
-                pass
+                logger.debug("✅ Token opcional verificado: %s", payload['company_id'])
+        except jwt.InvalidTokenError:
+            # Token inválido pero endpoint es opcional
+            logger.debug("⚠️ Token opcional inválido, continuando sin auth")
         
         return f(*args, **kwargs)
     
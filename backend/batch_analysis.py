@@ -0,0 +1,150 @@
+"""
+Análisis por lotes de una subida con varios experimentos
+
+Un ZIP con varios experimentos Bruker numerados (un rack de muestras) o un
+`ser` pseudo-2D se divide en tareas independientes que se analizan en
+paralelo en procesos worker. Cada experimento (o fila del ser) produce su
+propio resultado, y por tanto su propia medición.
+
+El pool de procesos se crea una vez (al primer lote) y se reutiliza: los
+workers ya tienen su SpectrumAnalyzer cargado. Usa el contexto 'spawn'
+para no hacer fork de un servidor con hilos (waitress, hilo escritor del
+logging, scheduler).
+"""
+import atexit
+import logging
+import math
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List
+
+import config as app_config
+from utils.analysis_workers import init_analysis_worker, get_worker_analyzer
+from utils.metrics import metrics
+
+sys.path.append(str(Path(__file__).parent.parent / "worker"))
+from nmr_reader import NMRDataReader
+
+logger = logging.getLogger(__name__)
+
+# Pool compartido entre peticiones (se crea al primer lote)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    """Pool de BATCH_ANALYSIS_WORKERS procesos, creado una sola vez"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, app_config.BATCH_ANALYSIS_WORKERS),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_analysis_worker
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+            logger.info(f"⚙️ Pool de análisis por lotes: {app_config.BATCH_ANALYSIS_WORKERS} workers")
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Descarta un pool roto (un worker murió) para que el siguiente lote cree otro"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def plan_batch_tasks(datasets: List[Dict]) -> List[Dict]:
+    """
+    Convierte los conjuntos de datos preparados en tareas de análisis.
+    Las filas de un ser se reparten en tareas de BATCH_SER_ROWS_PER_TASK
+    filas para que un único ser grande también se paralelice.
+    """
+    reader = NMRDataReader()
+    rows_per_task = max(1, app_config.BATCH_SER_ROWS_PER_TASK)
+    tasks = []
+
+    for dataset in datasets:
+        path = Path(dataset['path'])
+        n_rows = 1
+        if dataset['kind'] == 'bruker' and (path / 'ser').exists():
+            n_rows = reader.count_bruker_rows(path)
+
+        if n_rows <= 1:
+            tasks.append({
+                'name': dataset['name'], 'kind': dataset['kind'], 'path': str(path),
+                'ser': False, 'start': 0, 'stop': 1, 'rows': 1
+            })
+            continue
+
+        for start in range(0, n_rows, rows_per_task):
+            stop = min(start + rows_per_task, n_rows)
+            tasks.append({
+                'name': dataset['name'], 'kind': dataset['kind'], 'path': str(path),
+                'ser': True, 'start': start, 'stop': stop, 'rows': stop - start
+            })
+
+    return tasks
+
+
+def _analyze_task(task: Dict, params: Dict) -> List[Dict]:
+    """Analiza una tarea en un proceso worker (uno o varios espectros)"""
+    analyzer = get_worker_analyzer()
+    analysis_kwargs = {
+        'fluor_range': params.get('fluor_range'),
+        'pifas_range': params.get('pifas_range'),
+        'concentration': params.get('concentration', 1.0)
+    }
+
+    try:
+        if not task['ser']:
+            results = analyzer.analyze_file(Path(task['path']), **analysis_kwargs)
+            return [{'name': task['name'], 'row': None, 'results': results}]
+
+        output = []
+        rows = analyzer.nmr_reader.read_bruker_rows(Path(task['path']), task['start'], task['stop'])
+        for ppm, intensity, metadata in rows:
+            results = analyzer.analyze_spectrum_data(
+                ppm, intensity, f"{task['name']}#{metadata['row'] + 1}", **analysis_kwargs
+            )
+            output.append({'name': task['name'], 'row': metadata['row'], 'results': results})
+        return output
+
+    except Exception as e:
+        if not task['ser']:
+            return [{'name': task['name'], 'row': None, 'error': str(e)}]
+        return [
+            {'name': task['name'], 'row': row, 'error': str(e)}
+            for row in range(task['start'], task['stop'])
+        ]
+
+
+def run_batch(tasks: List[Dict], params: Dict) -> List[Dict]:
+    """
+    Ejecuta las tareas en paralelo y devuelve los resultados en el orden
+    de las tareas: [{'name', 'row', 'results'} | {'name', 'row', 'error'}]
+    """
+    if not tasks:
+        return []
+
+    workers = max(1, min(app_config.BATCH_ANALYSIS_WORKERS, len(tasks)))
+    metrics.gauge_add('analysis.in_flight', 1)
+    metrics.incr('batch.spectra', sum(task['rows'] for task in tasks))
+    pool = get_batch_pool()
+    try:
+        chunksize = max(1, math.ceil(len(tasks) / (workers * 4)))
+        output = []
+        for items in pool.map(_analyze_task, tasks, [params] * len(tasks), chunksize=chunksize):
+            output.extend(items)
+        return output
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        metrics.gauge_add('analysis.in_flight', -1)
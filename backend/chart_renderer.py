@@ -0,0 +1,282 @@
+"""
+Renderizado de gráficos de espectros en el servidor (PNG)
+
+Dibuja el espectro diezmado y los marcadores de picos con Pillow, sin
+navegador ni kaleido. Los PNG se cachean en disco por medición, de modo que
+las exportaciones pueden referenciar el gráfico por `measurement_id` en lugar
+de subir una imagen base64 de varios MB.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import config as app_config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# DIEZMADO
+# ============================================================================
+
+def decimate_minmax(x: np.ndarray, y: np.ndarray, n_buckets: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Diezma una serie conservando la envolvente (mínimo y máximo por bucket).
+    A diferencia de un submuestreo simple, nunca pierde picos estrechos.
+
+    Returns:
+        (x, y) con como máximo 2 * n_buckets puntos
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = min(len(x), len(y))
+    x, y = x[:n], y[:n]
+
+    if n_buckets <= 0 or n <= 2 * n_buckets:
+        return x, y
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    idx_min = np.empty(n_buckets, dtype=np.int64)
+    idx_max = np.empty(n_buckets, dtype=np.int64)
+    for i in range(n_buckets):
+        segment = y[starts[i]:edges[i + 1]]
+        idx_min[i] = starts[i] + int(np.argmin(segment))
+        idx_max[i] = starts[i] + int(np.argmax(segment))
+
+    # Mantener el orden original dentro de cada bucket
+    first = np.minimum(idx_min, idx_max)
+    second = np.maximum(idx_min, idx_max)
+    order = np.empty(2 * n_buckets, dtype=np.int64)
+    order[0::2] = first
+    order[1::2] = second
+    return x[order], y[order]
+
+
+# ============================================================================
+# RENDERER
+# ============================================================================
+
+class SpectrumChartRenderer:
+    """Dibuja un espectro RMN con marcadores de picos en un PNG"""
+
+    BACKGROUND = (255, 255, 255)
+    AXIS_COLOR = (44, 62, 80)
+    GRID_COLOR = (230, 233, 237)
+    LINE_COLOR = (0, 111, 207)
+    PEAK_COLOR = (192, 57, 43)
+    TEXT_COLOR = (44, 62, 80)
+
+    def __init__(self, width: int = 1200, height: int = 700):
+        self.width = width
+        self.height = height
+        self.margin_left = 90
+        self.margin_right = 30
+        self.margin_top = 50
+        self.margin_bottom = 70
+        self.font = self._load_font(14)
+        self.title_font = self._load_font(18)
+
+    @staticmethod
+    def _load_font(size: int):
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:
+            # Pillow < 10.1 no admite tamaño en la fuente por defecto
+            return ImageFont.load_default()
+
+    def _text(self, draw, xy, text, font, anchor, fill=None):
+        """Dibuja texto; las fuentes bitmap antiguas no soportan 'anchor'"""
+        fill = fill or self.TEXT_COLOR
+        try:
+            draw.text(xy, text, fill=fill, font=font, anchor=anchor)
+        except ValueError:
+            draw.text(xy, text, fill=fill, font=font)
+
+    @staticmethod
+    def _nice_ticks(vmin: float, vmax: float, n: int = 6) -> List[float]:
+        """Ticks 'redondos' (1, 2, 5 x 10^k) para un rango"""
+        span = vmax - vmin
+        if span <= 0:
+            return [vmin]
+        raw_step = span / max(n, 1)
+        magnitude = 10 ** np.floor(np.log10(raw_step))
+        for factor in (1, 2, 5, 10):
+            step = factor * magnitude
+            if step >= raw_step:
+                break
+        start = np.ceil(vmin / step) * step
+        return [float(v) for v in np.arange(start, vmax + step * 0.5, step) if vmin <= v <= vmax]
+
+    def render(self, ppm, intensity, peaks: Optional[List[Dict]] = None,
+               title: Optional[str] = None, max_peak_labels: int = 15) -> bytes:
+        """
+        Renderiza el espectro a PNG.
+
+        El eje ppm se dibuja invertido (convención RMN: ppm altos a la izquierda).
+        """
+        ppm = np.asarray(ppm, dtype=np.float64)
+        intensity = np.asarray(intensity, dtype=np.float64)
+        if ppm.size < 2 or intensity.size < 2:
+            raise ValueError("Espectro vacío, no se puede renderizar")
+
+        plot_w = self.width - self.margin_left - self.margin_right
+        plot_h = self.height - self.margin_top - self.margin_bottom
+
+        x, y = decimate_minmax(ppm, intensity, plot_w)
+
+        ppm_hi, ppm_lo = float(np.max(ppm)), float(np.min(ppm))
+        y_min, y_max = float(np.min(y)), float(np.max(y))
+        if y_max == y_min:
+            y_max = y_min + 1.0
+        y_pad = (y_max - y_min) * 0.05
+        y_min, y_max = y_min - y_pad, y_max + y_pad
+
+        def to_px(px_ppm, px_int):
+            px = self.margin_left + (ppm_hi - px_ppm) / (ppm_hi - ppm_lo) * plot_w
+            py = self.margin_top + (y_max - px_int) / (y_max - y_min) * plot_h
+            return px, py
+
+        img = Image.new('RGB', (self.width, self.height), self.BACKGROUND)
+        draw = ImageDraw.Draw(img)
+
+        # Rejilla y ticks
+        for tick in self._nice_ticks(ppm_lo, ppm_hi, 10):
+            px, _ = to_px(tick, y_min)
+            draw.line([(px, self.margin_top), (px, self.margin_top + plot_h)], fill=self.GRID_COLOR)
+            self._text(draw, (px, self.margin_top + plot_h + 8), f"{tick + 0.0:g}", self.font, 'mt')
+        for tick in self._nice_ticks(y_min, y_max, 6):
+            _, py = to_px(ppm_hi, tick)
+            draw.line([(self.margin_left, py), (self.margin_left + plot_w, py)], fill=self.GRID_COLOR)
+            self._text(draw, (self.margin_left - 8, py), f"{tick + 0.0:.3g}", self.font, 'rm')
+
+        # Ejes
+        draw.rectangle(
+            [self.margin_left, self.margin_top, self.margin_left + plot_w, self.margin_top + plot_h],
+            outline=self.AXIS_COLOR
+        )
+        self._text(draw, (self.margin_left + plot_w / 2, self.height - 20), "ppm", self.font, 'ms')
+        if title:
+            self._text(draw, (self.width / 2, self.margin_top / 2), title, self.title_font, 'mm')
+
+        # Espectro
+        points = [to_px(px_ppm, px_int) for px_ppm, px_int in zip(x, y)]
+        draw.line(points, fill=self.LINE_COLOR, width=1)
+
+        # Picos (los más intensos primero)
+        if peaks:
+            ranked = sorted(peaks, key=lambda p: p.get('intensity', 0) or 0, reverse=True)
+            for peak in ranked[:max_peak_labels]:
+                peak_ppm = peak.get('ppm', peak.get('position'))
+                peak_int = peak.get('intensity', peak.get('height'))
+                if peak_ppm is None or peak_int is None:
+                    continue
+                if not (ppm_lo <= peak_ppm <= ppm_hi):
+                    continue
+                px, py = to_px(float(peak_ppm), float(peak_int))
+                draw.polygon([(px, py - 4), (px - 5, py - 13), (px + 5, py - 13)], fill=self.PEAK_COLOR)
+                self._text(draw, (px, py - 16), f"{float(peak_ppm):.2f}", self.font, 'ms',
+                           fill=self.PEAK_COLOR)
+
+        output = io.BytesIO()
+        img.save(output, format='PNG', optimize=True)
+        return output.getvalue()
+
+
+# ============================================================================
+# CACHÉ POR MEDICIÓN
+# ============================================================================
+
+class ChartCache:
+    """Caché en disco de PNG de espectros, uno por medición"""
+
+    def __init__(self, cache_dir: Path, renderer: SpectrumChartRenderer = None):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.renderer = renderer or SpectrumChartRenderer()
+        self._lock = threading.Lock()
+
+    def _path_for(self, header: Dict) -> Path:
+        # La versión cambia si la medición se actualiza (re-análisis)
+        version = hashlib.sha1(
+            f"{header.get('updated_at')}:{self.renderer.width}x{self.renderer.height}".encode()
+        ).hexdigest()[:12]
+        return self.cache_dir / f"{header['id']}_{version}.png"
+
+    def get_chart(self, header: Dict, load_measurement: Callable[[], Optional[Dict]]) -> Optional[bytes]:
+        """
+        Devuelve el PNG del espectro de una medición.
+
+        Args:
+            header: Cabecera de la medición (id, updated_at, filename)
+            load_measurement: Carga la medición completa; solo se llama si
+                el PNG no está en caché
+
+        Returns:
+            Bytes PNG o None si la medición no tiene espectro
+        """
+        path = self._path_for(header)
+        if path.exists():
+            metrics.incr('chart_cache.hits')
+            return path.read_bytes()
+
+        metrics.incr('chart_cache.misses')
+        measurement = load_measurement()
+        if not measurement:
+            return None
+        png = render_results_chart(measurement, title=header.get('filename'))
+        if png is None:
+            return None
+
+        with self._lock:
+            # Eliminar versiones anteriores de esta medición
+            self.invalidate(header['id'])
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                tmp_path.write_bytes(png)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"⚠️ No se pudo cachear gráfico de {header['id']}: {e}")
+                tmp_path.unlink(missing_ok=True)
+        return png
+
+    def invalidate(self, measurement_id: int):
+        for old in self.cache_dir.glob(f"{measurement_id}_*.png"):
+            old.unlink(missing_ok=True)
+
+
+def render_results_chart(results: Dict, title: Optional[str] = None) -> Optional[bytes]:
+    """
+    Renderiza el gráfico a partir de un dict de resultados o de medición
+    (claves 'spectrum' y 'peaks'). Útil también para watcher/lotes.
+    """
+    spectrum = results.get('spectrum') or {}
+    ppm = spectrum.get('ppm')
+    intensity = spectrum.get('intensity')
+    if ppm is None or intensity is None or len(ppm) < 2 or len(intensity) < 2:
+        logger.warning("Medición sin espectro: no se puede renderizar el gráfico")
+        return None
+    try:
+        return get_chart_cache().renderer.render(ppm, intensity, results.get('peaks') or [], title)
+    except Exception as e:
+        logger.error(f"❌ Error renderizando gráfico: {e}", exc_info=True)
+        return None
+
+
+# Instancia global
+_chart_cache = None
+
+
+def get_chart_cache() -> ChartCache:
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = ChartCache(app_config.CHARTS_DIR)
+    return _chart_cache
@@ -15,11 +15,20 @@ SCRIPT_DIR = Path(__file__).parent.resolve()
 OUTPUT_DIR = SCRIPT_DIR / "storage" / "output"
 ANALYSIS_DIR = SCRIPT_DIR / "storage" / "analysis"
 CRAFT_EXPORTS_DIR = SCRIPT_DIR / "storage" / "craft_exports"
+REPORT_CACHE_DIR = SCRIPT_DIR / "storage" / "report_cache"
+CHARTS_DIR = SCRIPT_DIR / "storage" / "charts"
+UPLOADS_DIR = SCRIPT_DIR / "storage" / "uploads"
+# Subidas direccionadas por contenido (utils/content_store.py)
+CONTENT_STORE_DIR = SCRIPT_DIR / "storage" / "blobs"
 
 # Crear directorios
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
 CRAFT_EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+REPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CHARTS_DIR.mkdir(parents=True, exist_ok=True)
+UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+CONTENT_STORE_DIR.mkdir(parents=True, exist_ok=True)
 
 # ============================================================================
 # CONFIGURACIÓN
@@ -44,6 +53,47 @@ RATE_LIMIT_PER_HOUR = os.getenv('RATE_LIMIT_PER_HOUR', '50')
 LOGIN_RATE_LIMIT = os.getenv('LOGIN_RATE_LIMIT', '5')
 ANALYSIS_RATE_LIMIT = os.getenv('ANALYSIS_RATE_LIMIT', '20')
 DOWNLOAD_RATE_LIMIT = os.getenv('DOWNLOAD_RATE_LIMIT', '30')
+# Contadores compartidos por todos los procesos worker (utils/limiter_storage.py);
+# memory:// solo es correcto con un único proceso
+RATELIMIT_STORAGE_URI = os.getenv(
+    'RATELIMIT_STORAGE_URI', f"sqlite:///{SCRIPT_DIR / 'storage' / 'ratelimit.db'}"
+)
+
+# Despliegue multi-proceso (serve.py)
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 1))
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))
+SCHEDULER_LOCK_FILE = SCRIPT_DIR / "storage" / "scheduler.lock"
+
+# Caché de reportes renderizados (PDF/DOCX)
+REPORT_CACHE_MAX_MB = int(os.getenv('REPORT_CACHE_MAX_MB', 200))
+
+# Espectros analizados recientemente (ajuste interactivo de parámetros)
+SPECTRUM_CACHE_SIZE = int(os.getenv('SPECTRUM_CACHE_SIZE', 32))
+SPECTRUM_CACHE_TTL_SECONDS = float(os.getenv('SPECTRUM_CACHE_TTL_SECONDS', 1800))
+
+# Re-análisis en segundo plano de mediciones históricas
+REANALYSIS_WORKERS = int(os.getenv('REANALYSIS_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+REANALYSIS_CHUNK_SIZE = int(os.getenv('REANALYSIS_CHUNK_SIZE', 25))
+REANALYSIS_NICE = int(os.getenv('REANALYSIS_NICE', 10))
+REANALYSIS_YIELD_SECONDS = float(os.getenv('REANALYSIS_YIELD_SECONDS', 0.5))
+REANALYZE_ON_PARAMS_CHANGE = os.getenv('REANALYZE_ON_PARAMS_CHANGE', 'false').lower() == 'true'
+
+# Análisis por lotes (varios experimentos / filas de ser en una subida)
+BATCH_ANALYSIS_WORKERS = int(os.getenv('BATCH_ANALYSIS_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+BATCH_MAX_SPECTRA = int(os.getenv('BATCH_MAX_SPECTRA', 200))
+BATCH_SER_ROWS_PER_TASK = int(os.getenv('BATCH_SER_ROWS_PER_TASK', 8))
+
+# Subidas por partes reanudables (utils/chunked_upload.py)
+UPLOAD_CHUNK_MAX_MB = int(os.getenv('UPLOAD_CHUNK_MAX_MB', 16))
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+
+# Compresión HTTP y caché de estáticos
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+STATIC_COMPRESS_CACHE_MB = int(os.getenv('STATIC_COMPRESS_CACHE_MB', 32))
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv('STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 3600))
 
 # JWT
 JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 24))
@@ -4,14 +4,17 @@ Gestiona todas las operaciones de base de datos local del dispositivo
 (VERSIÓN CORREGIDA - Extrae datos completos de raw_data)
 """
 
+import os
 import sqlite3
 import json
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import logging
 import re
 
+import json_utils
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,7 @@ class Database:
         self.db_path = base_path / db_path
         
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.fts_enabled = False
         self.init_database()
         
     def get_connection(self):
@@ -87,10 +91,257 @@ class Database:
             ON measurements(filename)
         ''')
         
+        # Resultados versionados de re-análisis (la medición original no se toca)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                measurement_id INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                job_id INTEGER,
+                params TEXT NOT NULL,
+                fluor_percentage REAL,
+                pifas_percentage REAL,
+                pifas_concentration REAL,
+                quality_score REAL,
+                results_data TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                UNIQUE(measurement_id, version)
+            )
+        ''')
+        
+        # Trabajos de re-análisis (last_id permite reanudar)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reanalysis_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                version INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                company_id TEXT,
+                params TEXT NOT NULL,
+                reason TEXT,
+                total INTEGER DEFAULT 0,
+                processed INTEGER DEFAULT 0,
+                failed INTEGER DEFAULT 0,
+                last_id INTEGER DEFAULT 0,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        
+        # Subidas ya analizadas: contenido (SHA-256) + parámetros → medición.
+        # Una subida idéntica de la misma empresa reutiliza el resultado
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_results (
+                content_sha256 TEXT NOT NULL,
+                params_key TEXT NOT NULL,
+                company_id TEXT NOT NULL,
+                measurement_id INTEGER NOT NULL,
+                result_file TEXT,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (content_sha256, params_key, company_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_upload_results_measurement
+            ON upload_results(measurement_id)
+        ''')
+        
+        # Índices para los filtros por rango de la búsqueda del historial
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_measurements_company_pifas
+            ON measurements(company_id, pifas_percentage)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_measurements_company_quality
+            ON measurements(company_id, quality_score)
+        ''')
+        
+        # Compuestos detectados normalizados (consultas entre muestras sin
+        # decodificar raw_data). company_id/timestamp se copian de la medición
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS measurement_compounds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                measurement_id INTEGER NOT NULL,
+                company_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                compound TEXT NOT NULL COLLATE NOCASE,
+                cas TEXT,
+                confidence REAL,
+                peaks_matched INTEGER,
+                peaks_expected INTEGER,
+                matched_peaks TEXT,
+                UNIQUE(measurement_id, compound)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_compounds_company_compound
+            ON measurement_compounds(company_id, compound, timestamp, confidence)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_compounds_compound
+            ON measurement_compounds(compound, timestamp, confidence)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_compounds_cas
+            ON measurement_compounds(cas, company_id, timestamp, confidence)
+        ''')
+        
+        # Estadísticas del dashboard materializadas por empresa y día. Se
+        # recalcula solo el (empresa, día) afectado al guardar/borrar
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS measurement_stats_daily (
+                company_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                n_fluor INTEGER NOT NULL,
+                sum_fluor REAL,
+                n_pifas INTEGER NOT NULL,
+                sum_pifas REAL,
+                min_pifas REAL,
+                max_pifas REAL,
+                n_concentration INTEGER NOT NULL,
+                sum_concentration REAL,
+                n_quality INTEGER NOT NULL,
+                sum_quality REAL,
+                PRIMARY KEY (company_id, day)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS measurement_stats_hist (
+                company_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                bin INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (company_id, day, metric, bin)
+            )
+        ''')
+        
+        self._init_search_index(cursor)
+        self._backfill_compounds(cursor)
+        
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM measurement_stats_daily)")
+        if not cursor.fetchone()[0]:
+            self._refresh_stats(cursor)
+        
         conn.commit()
         conn.close()
         logger.info("Base de datos inicializada correctamente")
     
+    def _init_search_index(self, cursor):
+        """
+        Índice de texto completo (FTS5) sobre filename y compuestos detectados.
+        rowid = id de la medición. Si SQLite no trae FTS5, la búsqueda
+        vuelve a LIKE sobre filename.
+        """
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS measurements_fts USING fts5(
+                    filename, compounds,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+            ''')
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ FTS5 no disponible, búsqueda por LIKE: {e}")
+            self.fts_enabled = False
+            return
+        
+        # Rellenar mediciones anteriores al índice (o guardadas sin él)
+        cursor.execute('''
+            SELECT id, filename,
+                   json_extract(raw_data, '$.analysis.pfas_detection.detected_pfas') AS detected
+            FROM measurements
+            WHERE id NOT IN (SELECT rowid FROM measurements_fts)
+        ''')
+        # fetchall: no se inserta en el índice mientras se lee de él
+        rows = cursor.fetchall()
+        if rows:
+            cursor.executemany(
+                "INSERT INTO measurements_fts (rowid, filename, compounds) VALUES (?, ?, ?)",
+                [
+                    (row['id'], row['filename'],
+                     self._compound_terms(json.loads(row['detected']) if row['detected'] else []))
+                    for row in rows
+                ]
+            )
+            logger.info(f"Índice de búsqueda: {len(rows)} mediciones indexadas")
+    
+    def _backfill_compounds(self, cursor):
+        """
+        Rellena measurement_compounds con las mediciones guardadas antes de
+        la tabla. 'compounds_indexed_until' evita volver a decodificar el
+        historial en cada arranque; INSERT OR IGNORE lo hace idempotente.
+        """
+        cursor.execute("SELECT value FROM device_config WHERE key = 'compounds_indexed_until'")
+        row = cursor.fetchone()
+        last_id = int(row['value']) if row else 0
+        
+        cursor.execute('''
+            SELECT id, company_id, timestamp,
+                   json_extract(raw_data, '$.analysis.pfas_detection.detected_pfas') AS detected
+            FROM measurements
+            WHERE id > ?
+        ''', (last_id,))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        
+        compound_rows = []
+        for row in rows:
+            detected = json.loads(row['detected']) if row['detected'] else []
+            compound_rows.extend(
+                self._compound_rows(row['id'], row['company_id'], row['timestamp'], detected)
+            )
+        self._insert_compounds(cursor, compound_rows)
+        cursor.execute('''
+            INSERT OR REPLACE INTO device_config (key, value, updated_at)
+            VALUES ('compounds_indexed_until', ?, ?)
+        ''', (str(max(row['id'] for row in rows)), datetime.now().isoformat()))
+        logger.info(f"Compuestos indexados: {len(compound_rows)} de {len(rows)} mediciones")
+    
+    @staticmethod
+    def _compound_rows(measurement_id: int, company_id: str, timestamp: str,
+                       detected_pfas: List[Dict]) -> List[Tuple]:
+        """Filas de measurement_compounds para los compuestos detectados de una medición"""
+        rows = []
+        for compound in detected_pfas or []:
+            if not isinstance(compound, dict) or not compound.get('name'):
+                continue
+            cas = compound.get('cas')
+            rows.append((
+                measurement_id, company_id, timestamp, compound['name'],
+                cas if cas and cas != 'N/A' else None,
+                compound.get('confidence'),
+                compound.get('peaks_matched'),
+                compound.get('peaks_expected'),
+                json.dumps(compound.get('matched_peaks', []))
+            ))
+        return rows
+    
+    @staticmethod
+    def _insert_compounds(cursor, rows: List[Tuple]):
+        if rows:
+            cursor.executemany('''
+                INSERT OR IGNORE INTO measurement_compounds (
+                    measurement_id, company_id, timestamp, compound, cas,
+                    confidence, peaks_matched, peaks_expected, matched_peaks
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    
+    @staticmethod
+    def _compound_terms(detected_pfas: List[Dict]) -> str:
+        """Texto indexable de los compuestos detectados (nombre y CAS)"""
+        terms = []
+        for compound in detected_pfas or []:
+            if not isinstance(compound, dict):
+                continue
+            terms.extend(str(compound[key]) for key in ('name', 'cas')
+                         if compound.get(key) and compound.get(key) != 'N/A')
+        return ' '.join(terms)
+    
     # ==================== MÉTODOS AUXILIARES ====================
     
     def execute_query(self, query: str, params: Tuple = ()) -> List[sqlite3.Row]:
@@ -248,10 +499,11 @@ class Database:
             analysis.get('pifas_concentration') or analysis.get('pfas_concentration'),
             analysis.get('concentration'),
             measurement_data.get('quality_score'),
-            json.dumps(measurement_data),
-            json.dumps(measurement_data.get('spectrum', {})),
-            json.dumps(measurement_data.get('peaks', [])),
-            json.dumps(measurement_data.get('molecule_info')),
+            # Resultados con arrays NumPy (espectro): serialización directa
+            json_utils.dumps(measurement_data),
+            json_utils.dumps(measurement_data.get('spectrum', {})),
+            json_utils.dumps(measurement_data.get('peaks', [])),
+            json_utils.dumps(measurement_data.get('molecule_info')),
             0,
             0,
             None,
@@ -260,6 +512,27 @@ class Database:
         ))
         
         measurement_id = cursor.lastrowid
+        detected_pfas = analysis.get('pfas_detection', {}).get('detected_pfas')
+        self._insert_compounds(cursor, self._compound_rows(
+            measurement_id,
+            measurement_data.get('company_id', 'unknown'),
+            measurement_data.get('timestamp', now),
+            detected_pfas
+        ))
+        self._refresh_stats(
+            cursor,
+            measurement_data.get('company_id', 'unknown'),
+            measurement_data.get('timestamp', now)
+        )
+        if self.fts_enabled:
+            cursor.execute(
+                "INSERT INTO measurements_fts (rowid, filename, compounds) VALUES (?, ?, ?)",
+                (
+                    measurement_id,
+                    measurement_data.get('filename', 'unknown'),
+                    self._compound_terms(detected_pfas)
+                )
+            )
         conn.commit()
         conn.close()
         logger.info(f"Medición guardada con ID: {measurement_id} para {measurement_data.get('company_id')}")
@@ -274,15 +547,65 @@ class Database:
         conn.close()
         return self._row_to_measurement(row) if row else None
     
+    def get_measurement_header(self, measurement_id: int) -> Optional[Dict]:
+        """
+        Obtiene solo los campos ligeros de una medición (sin decodificar JSON).
+        Útil para control de acceso y validación de cachés.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, company_id, filename, timestamp, synced, updated_at FROM measurements WHERE id = ?",
+            (measurement_id,)
+        )
+        row = cursor.fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def get_upload_result(self, content_sha256: str, params_key: str,
+                          company_id: str) -> Optional[Dict]:
+        """Análisis anterior del mismo contenido y parámetros: {measurement_id, result_file}"""
+        rows = self.execute_query(
+            "SELECT measurement_id, result_file FROM upload_results "
+            "WHERE content_sha256 = ? AND params_key = ? AND company_id = ?",
+            (content_sha256, params_key, company_id)
+        )
+        return dict(rows[0]) if rows else None
+
+    def save_upload_result(self, content_sha256: str, params_key: str, company_id: str,
+                           measurement_id: int, result_file: Optional[str] = None):
+        """Registra (o sustituye) la medición de un contenido + parámetros"""
+        conn = self.get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO upload_results "
+            "(content_sha256, params_key, company_id, measurement_id, result_file, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (content_sha256, params_key, company_id, measurement_id, result_file,
+             datetime.now().isoformat())
+        )
+        conn.commit()
+        conn.close()
+
+    def get_measurement_spectrum(self, measurement_id: int) -> Optional[Dict]:
+        """Solo el espectro guardado de una medición (sin decodificar raw_data)"""
+        rows = self.execute_query(
+            "SELECT spectrum_data FROM measurements WHERE id = ?", (measurement_id,)
+        )
+        if not rows or not rows[0]['spectrum_data']:
+            return None
+        return json_utils.loads(rows[0]['spectrum_data'])
+
     def get_measurements(
         self, 
         company_id: Optional[str] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        summary: bool = False
     ) -> Dict:
         """
         Obtiene lista de mediciones.
         Si company_id es 'admin', devuelve todas las mediciones.
+        summary: solo SUMMARY_COLUMNS (sin decodificar raw_data ni el espectro)
         
         Returns:
             Dict con 'measurements' (lista) y 'total' (int)
@@ -290,7 +613,7 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        query = "SELECT * FROM measurements"
+        query = f"SELECT {self._list_columns(summary)} FROM measurements"
         params = []
         
         # Si se especifica un ID y NO es 'admin', filtrar por empresa
@@ -310,14 +633,92 @@ class Database:
         
         conn.close()
         
-        measurements = [self._row_to_measurement(row) for row in rows]
+        measurements = [self._list_row(row, summary) for row in rows]
         
         return {
             'measurements': measurements,
             'total': total,
             'total_pages': total_pages
         }
+
+    def _list_columns(self, summary: bool) -> str:
+        return ', '.join(self.SUMMARY_COLUMNS) if summary else '*'
+
+    def _list_row(self, row: sqlite3.Row, summary: bool) -> Dict:
+        if not summary:
+            return self._row_to_measurement(row)
+        item = dict(row)
+        item['synced'] = bool(item['synced'])
+        return item
     
+    # Columnas resumen (sin blobs JSON) para exportaciones masivas
+    SUMMARY_COLUMNS = (
+        'id', 'device_id', 'company_id', 'timestamp', 'filename',
+        'fluor_percentage', 'pifas_percentage', 'pifas_concentration',
+        'concentration', 'quality_score', 'synced', 'created_at', 'updated_at'
+    )
+
+    def iter_measurements(
+        self,
+        company_id: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        columns: Tuple[str, ...] = SUMMARY_COLUMNS,
+        batch_size: int = 500
+    ) -> Iterator[sqlite3.Row]:
+        """
+        Itera mediciones en orden cronológico leyendo por lotes (fetchmany),
+        con memoria constante independientemente del tamaño del historial.
+
+        Args:
+            company_id: Empresa (None/'ADMIN'/'admin' = todas)
+            date_from: Fecha/hora ISO inicial (inclusive)
+            date_to: Fecha/hora ISO final (inclusive; 'YYYY-MM-DD' cubre el día entero)
+            columns: Columnas a leer (evitar blobs si no se necesitan)
+            batch_size: Filas por lote
+        """
+        invalid = set(columns) - set(self._measurement_columns())
+        if invalid:
+            raise ValueError(f"Columnas no válidas: {sorted(invalid)}")
+
+        query = f"SELECT {', '.join(columns)} FROM measurements WHERE 1=1"
+        params = []
+
+        if company_id and company_id not in ('ADMIN', 'admin'):
+            query += " AND company_id = ?"
+            params.append(company_id)
+        if date_from:
+            query += " AND timestamp >= ?"
+            params.append(date_from)
+        if date_to:
+            if len(date_to) == 10:
+                date_to = f"{date_to}T23:59:59.999999"
+            query += " AND timestamp <= ?"
+            params.append(date_to)
+
+        query += " ORDER BY timestamp ASC, id ASC"
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            conn.close()
+
+    def _measurement_columns(self) -> List[str]:
+        """Columnas reales de la tabla measurements"""
+        conn = self.get_connection()
+        try:
+            return [row['name'] for row in conn.execute("PRAGMA table_info(measurements)")]
+        finally:
+            conn.close()
+
     def count_measurements(self, company_id: Optional[str] = None) -> int:
         """
         Cuenta el total de mediciones para una empresa.
@@ -344,41 +745,86 @@ class Database:
             logger.error(f"Error counting measurements: {e}")
             return 0
     
-    def get_measurements_with_search(self, company_id, search_term, limit=50, offset=0):
+    # Filtros por rango admitidos en la búsqueda: clave → (columna, operador)
+    SEARCH_RANGE_FILTERS = {
+        'pifas_min': ('pifas_percentage', '>='),
+        'pifas_max': ('pifas_percentage', '<='),
+        'quality_min': ('quality_score', '>='),
+        'quality_max': ('quality_score', '<='),
+        'date_from': ('timestamp', '>='),
+        'date_to': ('timestamp', '<='),
+    }
+
+    @staticmethod
+    def _fts_query(search_term: str) -> str:
+        """
+        Convierte el término de búsqueda en una consulta FTS5 segura: cada
+        palabra va entre comillas (sin operadores FTS) y con '*' para buscar
+        por prefijo. Todas las palabras deben aparecer (AND).
+        """
+        words = re.findall(r'[^\W_]+', (search_term or '')[:100])
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def _search_where(self, company_id, search_term, filters=None) -> Tuple[str, List]:
         """
-        Obtiene mediciones de una empresa filtrando por término de búsqueda.
+        Cláusula WHERE de la búsqueda del historial (texto + rangos).
+        El texto se resuelve en el índice FTS5; los rangos usan los índices
+        (company_id, pifas_percentage / quality_score / timestamp).
+        """
+        clauses = []
+        params = []
+
+        if company_id and company_id not in ('ADMIN', 'admin'):
+            clauses.append("company_id = ?")
+            params.append(company_id)
+
+        if search_term:
+            if self.fts_enabled:
+                fts_query = self._fts_query(search_term)
+                if fts_query:
+                    clauses.append(
+                        "id IN (SELECT rowid FROM measurements_fts WHERE measurements_fts MATCH ?)"
+                    )
+                    params.append(fts_query)
+            else:
+                safe_term = self._sanitize_search_term(search_term)
+                if safe_term:
+                    clauses.append("filename LIKE ? ESCAPE '\\'")
+                    params.append(f"%{safe_term}%")
+
+        for key, value in (filters or {}).items():
+            if value is None or key not in self.SEARCH_RANGE_FILTERS:
+                continue
+            column, operator = self.SEARCH_RANGE_FILTERS[key]
+            if key == 'date_to' and len(str(value)) == 10:
+                value = f"{value}T23:59:59.999999"
+            clauses.append(f"{column} {operator} ?")
+            params.append(value)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def get_measurements_with_search(self, company_id, search_term, limit=50, offset=0,
+                                     filters: Optional[Dict] = None, summary: bool = False):
+        """
+        Obtiene mediciones de una empresa filtrando por término de búsqueda
+        y por rangos.
         
         Args:
-            company_id: ID de la empresa
-            search_term: Término de búsqueda (busca en filename)
+            company_id: ID de la empresa ('ADMIN' = todas)
+            search_term: Término de búsqueda (filename y compuestos detectados)
             limit: Número máximo de resultados
             offset: Offset para paginación
+            filters: Rangos opcionales (ver SEARCH_RANGE_FILTERS)
+            summary: solo SUMMARY_COLUMNS
         """
         try:
-            cursor = self.conn.cursor()
-            
-            # Construir query con búsqueda
-            if company_id == 'ADMIN':
-                query = """
-                    SELECT * FROM measurements
-                    WHERE filename LIKE ?
-                    ORDER BY timestamp DESC
-                    LIMIT ? OFFSET ?
-                """
-                params = (f"%{search_term}%", limit, offset)
-            else:
-                query = """
-                    SELECT * FROM measurements
-                    WHERE company_id = ? AND filename LIKE ?
-                    ORDER BY timestamp DESC
-                    LIMIT ? OFFSET ?
-                """
-                params = (company_id, f"%{search_term}%", limit, offset)
+            where, params = self._search_where(company_id, search_term, filters)
+            query = (f"SELECT {self._list_columns(summary)} FROM measurements{where} "
+                     f"ORDER BY timestamp DESC LIMIT ? OFFSET ?")
+            rows = self.execute_query(query, tuple(params) + (limit, offset))
             
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            measurements = [self._row_to_dict(row) for row in rows]
+            measurements = [self._list_row(row, summary) for row in rows]
             
             return {
                 'measurements': measurements,
@@ -386,41 +832,27 @@ class Database:
             }
             
         except Exception as e:
-            logging.error(f"Error en get_measurements_with_search: {e}", exc_info=True)
+            logger.error(f"Error en get_measurements_with_search: {e}", exc_info=True)
             return {'measurements': [], 'total': 0}
 
 
-    def count_measurements_with_search(self, company_id, search_term):
+    def count_measurements_with_search(self, company_id, search_term,
+                                       filters: Optional[Dict] = None):
         """
-        Cuenta mediciones que coinciden con el término de búsqueda.
+        Cuenta mediciones que coinciden con el término de búsqueda y los rangos.
         
         Args:
             company_id: ID de la empresa
             search_term: Término de búsqueda
+            filters: Rangos opcionales (ver SEARCH_RANGE_FILTERS)
         """
         try:
-            cursor = self.conn.cursor()
-            
-            if company_id == 'ADMIN':
-                query = """
-                    SELECT COUNT(*) FROM measurements
-                    WHERE filename LIKE ?
-                """
-                params = (f"%{search_term}%",)
-            else:
-                query = """
-                    SELECT COUNT(*) FROM measurements
-                    WHERE company_id = ? AND filename LIKE ?
-                """
-                params = (company_id, f"%{search_term}%")
-            
-            cursor.execute(query, params)
-            count = cursor.fetchone()[0]
-            
-            return count
+            where, params = self._search_where(company_id, search_term, filters)
+            rows = self.execute_query(f"SELECT COUNT(*) FROM measurements{where}", tuple(params))
+            return rows[0][0] if rows else 0
             
         except Exception as e:
-            logging.error(f"Error en count_measurements_with_search: {e}", exc_info=True)
+            logger.error(f"Error en count_measurements_with_search: {e}", exc_info=True)
             return 0
     
     def delete_measurement(self, measurement_id: int, company_id: Optional[str] = None) -> bool:
@@ -458,8 +890,21 @@ class Database:
                     conn.close()
                     return False
             
+            cursor.execute(
+                "SELECT company_id, timestamp FROM measurements WHERE id = ?",
+                (measurement_id,)
+            )
+            target = cursor.fetchone()
+            
             cursor.execute("DELETE FROM measurements WHERE id = ?", (measurement_id,))
             deleted = cursor.rowcount > 0
+            cursor.execute("DELETE FROM analysis_results WHERE measurement_id = ?", (measurement_id,))
+            cursor.execute("DELETE FROM measurement_compounds WHERE measurement_id = ?", (measurement_id,))
+            cursor.execute("DELETE FROM upload_results WHERE measurement_id = ?", (measurement_id,))
+            if self.fts_enabled:
+                cursor.execute("DELETE FROM measurements_fts WHERE rowid = ?", (measurement_id,))
+            if target:
+                self._refresh_stats(cursor, target['company_id'], target['timestamp'])
             
             conn.commit()
             conn.close()
@@ -483,10 +928,28 @@ class Database:
             
             if company_id == 'admin' or company_id is None:
                 cursor.execute("DELETE FROM measurements")
+                deleted_count = cursor.rowcount
+                cursor.execute("DELETE FROM analysis_results")
+                cursor.execute("DELETE FROM measurement_compounds")
+                cursor.execute("DELETE FROM upload_results")
+                cursor.execute("DELETE FROM measurement_stats_daily")
+                cursor.execute("DELETE FROM measurement_stats_hist")
+                if self.fts_enabled:
+                    cursor.execute("DELETE FROM measurements_fts")
             else:
                 cursor.execute("DELETE FROM measurements WHERE company_id = ?", (company_id,))
-            
-            deleted_count = cursor.rowcount
+                deleted_count = cursor.rowcount
+                cursor.execute(
+                    "DELETE FROM analysis_results WHERE measurement_id NOT IN (SELECT id FROM measurements)"
+                )
+                cursor.execute("DELETE FROM measurement_compounds WHERE company_id = ?", (company_id,))
+                cursor.execute("DELETE FROM upload_results WHERE company_id = ?", (company_id,))
+                cursor.execute("DELETE FROM measurement_stats_daily WHERE company_id = ?", (company_id,))
+                cursor.execute("DELETE FROM measurement_stats_hist WHERE company_id = ?", (company_id,))
+                if self.fts_enabled:
+                    cursor.execute(
+                        "DELETE FROM measurements_fts WHERE rowid NOT IN (SELECT id FROM measurements)"
+                    )
             
             conn.commit()
             conn.close()
@@ -512,12 +975,12 @@ class Database:
         
         try:
             # Parsear los datos JSON
-            spectrum_data = json.loads(row['spectrum_data']) if row['spectrum_data'] else {}
-            peaks_data = json.loads(row['peaks_data']) if row['peaks_data'] else []
-            molecule_info_data = json.loads(row['molecule_info']) if row['molecule_info'] else None
+            spectrum_data = json_utils.loads(row['spectrum_data']) if row['spectrum_data'] else {}
+            peaks_data = json_utils.loads(row['peaks_data']) if row['peaks_data'] else []
+            molecule_info_data = json_utils.loads(row['molecule_info']) if row['molecule_info'] else None
             
             # 🔧 CORRECCIÓN: Extraer el objeto 'analysis' completo desde 'raw_data'
-            raw_data = json.loads(row['raw_data']) if row['raw_data'] else {}
+            raw_data = json_utils.loads(row['raw_data']) if row['raw_data'] else {}
             analysis_full = raw_data.get('analysis', {})
             
             # Si analysis_full está vacío, usar los valores de las columnas como fallback
@@ -626,6 +1089,469 @@ class Database:
         finally:
             conn.close()  # <-- FIX: Cerrar siempre la conexión
 
+    # ==================== RE-ANÁLISIS ====================
+
+    def create_reanalysis_job(self, params: Dict, company_id: Optional[str] = None,
+                              reason: Optional[str] = None) -> Dict:
+        """
+        Crea un trabajo de re-análisis con una nueva versión de resultados.
+        La versión es correlativa (el primer re-análisis es la versión 2;
+        la versión 1 es el análisis original guardado en measurements).
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            now = datetime.now().isoformat()
+            cursor.execute("SELECT COALESCE(MAX(version), 1) FROM reanalysis_jobs")
+            version = cursor.fetchone()[0] + 1
+
+            query = "SELECT COUNT(*) FROM measurements"
+            count_params = []
+            if company_id and company_id not in ('ADMIN', 'admin'):
+                query += " WHERE company_id = ?"
+                count_params.append(company_id)
+            cursor.execute(query, count_params)
+            total = cursor.fetchone()[0]
+
+            cursor.execute("""
+                INSERT INTO reanalysis_jobs (
+                    version, status, company_id, params, reason,
+                    total, created_at, updated_at
+                ) VALUES (?, 'pending', ?, ?, ?, ?, ?, ?)
+            """, (version, company_id, json.dumps(params), reason, total, now, now))
+            job_id = cursor.lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+
+        logger.info(f"🔁 Re-análisis #{job_id} creado (versión {version}, {total} mediciones)")
+        return self.get_reanalysis_job(job_id)
+
+    def get_reanalysis_job(self, job_id: int) -> Optional[Dict]:
+        """Obtiene un trabajo de re-análisis"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM reanalysis_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_job(row) if row else None
+
+    def list_reanalysis_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Lista los trabajos de re-análisis más recientes"""
+        query = "SELECT * FROM reanalysis_jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return [self._row_to_job(row) for row in self.execute_query(query, tuple(params))]
+
+    def update_reanalysis_job(self, job_id: int, **fields):
+        """Actualiza campos de estado de un trabajo (status, error, ...)"""
+        allowed = {'status', 'error', 'total', 'processed', 'failed', 'last_id'}
+        invalid = set(fields) - allowed
+        if invalid:
+            raise ValueError(f"Campos no válidos: {sorted(invalid)}")
+
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        conn = self.get_connection()
+        try:
+            conn.execute(
+                f"UPDATE reanalysis_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                (*fields.values(), datetime.now().isoformat(), job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_spectra_for_reanalysis(self, company_id: Optional[str] = None,
+                                   after_id: int = 0, limit: int = 50) -> List[Tuple[int, str, Optional[float]]]:
+        """
+        Devuelve el siguiente lote de (id, spectrum_data, concentration) con
+        id > after_id.
+        El orden por id hace que last_id sea un cursor estable; cada lote es
+        una consulta corta para no mantener abierta una lectura durante todo
+        el trabajo (bloquearía el checkpoint del WAL).
+        """
+        query = "SELECT id, spectrum_data, concentration FROM measurements WHERE id > ?"
+        params = [after_id]
+        if company_id and company_id not in ('ADMIN', 'admin'):
+            query += " AND company_id = ?"
+            params.append(company_id)
+        query += " ORDER BY id ASC LIMIT ?"
+        params.append(limit)
+        return [
+            (row['id'], row['spectrum_data'], row['concentration'])
+            for row in self.execute_query(query, tuple(params))
+        ]
+
+    def save_reanalysis_chunk(self, job_id: int, version: int, params: Dict,
+                              results: List[Dict], last_id: int):
+        """
+        Guarda los resultados de un lote y avanza el cursor del trabajo
+        en la misma transacción: si el proceso muere, se reanuda desde
+        el último lote confirmado sin duplicar ni perder resultados.
+        """
+        now = datetime.now().isoformat()
+        params_json = json.dumps(params)
+        failed = sum(1 for r in results if r.get('error'))
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO analysis_results (
+                    measurement_id, version, job_id, params,
+                    fluor_percentage, pifas_percentage, pifas_concentration,
+                    quality_score, results_data, error, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    r['measurement_id'], version, job_id, params_json,
+                    r.get('fluor_percentage'), r.get('pifas_percentage'),
+                    r.get('pifas_concentration'), r.get('quality_score'),
+                    json.dumps(r['results']) if r.get('results') is not None else None,
+                    r.get('error'), now
+                )
+                for r in results
+            ])
+            cursor.execute("""
+                UPDATE reanalysis_jobs
+                SET processed = processed + ?, failed = failed + ?, last_id = ?, updated_at = ?
+                WHERE id = ?
+            """, (len(results), failed, last_id, now, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_analysis_versions(self, measurement_id: int) -> List[Dict]:
+        """Resultados de re-análisis de una medición (más reciente primero)"""
+        rows = self.execute_query(
+            "SELECT * FROM analysis_results WHERE measurement_id = ? ORDER BY version DESC",
+            (measurement_id,)
+        )
+        versions = []
+        for row in rows:
+            item = dict(row)
+            item['params'] = json.loads(item['params']) if item['params'] else {}
+            item['results'] = json.loads(item.pop('results_data')) if item['results_data'] else None
+            versions.append(item)
+        return versions
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['progress'] = round(job['processed'] / job['total'] * 100, 1) if job['total'] else 100.0
+        return job
+
+    # ==================== COMPUESTOS DETECTADOS ====================
+
+    # Tamaños de agrupación de las tendencias → expresión sobre una columna
+    # de fecha ISO ('timestamp' o 'day' de las estadísticas diarias)
+    TREND_BUCKETS = {
+        'day': "substr({column}, 1, 10)",
+        'week': "strftime('%Y-W%W', {column})",
+        'month': "substr({column}, 1, 7)",
+        'quarter': "substr({column}, 1, 4) || '-Q' || ((CAST(substr({column}, 6, 2) AS INTEGER) + 2) / 3)",
+        'year': "substr({column}, 1, 4)",
+    }
+
+    CAS_PATTERN = re.compile(r'^\d{2,7}-\d{2}-\d$')
+
+    def _compound_where(self, compound: Optional[str], company_id: Optional[str],
+                        min_confidence: Optional[float] = None,
+                        date_from: Optional[str] = None,
+                        date_to: Optional[str] = None) -> Tuple[str, List]:
+        """
+        Cláusula WHERE sobre measurement_compounds. compound puede ser un
+        nombre (sin distinguir mayúsculas) o un número CAS.
+        """
+        clauses = []
+        params = []
+        if company_id and company_id not in ('ADMIN', 'admin'):
+            clauses.append("company_id = ?")
+            params.append(company_id)
+        if compound:
+            clauses.append("cas = ?" if self.CAS_PATTERN.match(compound) else "compound = ?")
+            params.append(compound)
+        if min_confidence is not None:
+            clauses.append("confidence >= ?")
+            params.append(min_confidence)
+        if date_from:
+            clauses.append("timestamp >= ?")
+            params.append(date_from)
+        if date_to:
+            if len(date_to) == 10:
+                date_to = f"{date_to}T23:59:59.999999"
+            clauses.append("timestamp <= ?")
+            params.append(date_to)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def get_compound_summary(self, company_id: Optional[str] = None,
+                             min_confidence: Optional[float] = None,
+                             date_from: Optional[str] = None,
+                             date_to: Optional[str] = None) -> List[Dict]:
+        """Compuestos detectados con nº de muestras, confianza media/máxima y última detección"""
+        where, params = self._compound_where(None, company_id, min_confidence, date_from, date_to)
+        rows = self.execute_query(f'''
+            SELECT compound, MAX(cas) AS cas,
+                   COUNT(*) AS occurrences,
+                   AVG(confidence) AS avg_confidence,
+                   MAX(confidence) AS max_confidence,
+                   MIN(timestamp) AS first_seen,
+                   MAX(timestamp) AS last_seen
+            FROM measurement_compounds{where}
+            GROUP BY compound
+            ORDER BY occurrences DESC, compound
+        ''', tuple(params))
+        return [dict(row) for row in rows]
+
+    def get_compound_occurrences(self, compound: str, company_id: Optional[str] = None,
+                                 min_confidence: Optional[float] = None,
+                                 date_from: Optional[str] = None,
+                                 date_to: Optional[str] = None,
+                                 limit: int = 50, offset: int = 0) -> Dict:
+        """
+        Mediciones en las que se detectó un compuesto (más recientes primero).
+
+        Returns:
+            Dict con 'occurrences' (lista) y 'total' (int)
+        """
+        where, params = self._compound_where(compound, company_id, min_confidence, date_from, date_to)
+        total = self.execute_query(f"SELECT COUNT(*) FROM measurement_compounds{where}", tuple(params))[0][0]
+        rows = self.execute_query(f'''
+            SELECT c.measurement_id, c.company_id, c.timestamp, c.compound, c.cas,
+                   c.confidence, c.peaks_matched, c.peaks_expected, c.matched_peaks,
+                   m.filename, m.pifas_percentage, m.quality_score
+            FROM (
+                SELECT * FROM measurement_compounds{where}
+                ORDER BY timestamp DESC LIMIT ? OFFSET ?
+            ) AS c
+            JOIN measurements m ON m.id = c.measurement_id
+            ORDER BY c.timestamp DESC
+        ''', tuple(params) + (limit, offset))
+
+        occurrences = []
+        for row in rows:
+            item = dict(row)
+            item['matched_peaks'] = json.loads(item['matched_peaks']) if item['matched_peaks'] else []
+            occurrences.append(item)
+        return {'occurrences': occurrences, 'total': total}
+
+    def get_compound_trend(self, compound: str, company_id: Optional[str] = None,
+                           bucket: str = 'month',
+                           min_confidence: Optional[float] = None,
+                           date_from: Optional[str] = None,
+                           date_to: Optional[str] = None) -> List[Dict]:
+        """
+        Detecciones de un compuesto agrupadas por periodo (day/week/month/
+        quarter/year). 'samples' es el total de mediciones del periodo y
+        'detection_rate' la fracción en la que aparece el compuesto.
+        """
+        if bucket not in self.TREND_BUCKETS:
+            raise ValueError(f"Periodo no válido: {bucket}")
+        period = self.TREND_BUCKETS[bucket].format(column='timestamp')
+
+        where, params = self._compound_where(compound, company_id, min_confidence, date_from, date_to)
+        rows = self.execute_query(f'''
+            SELECT {period} AS period,
+                   COUNT(*) AS occurrences,
+                   AVG(confidence) AS avg_confidence,
+                   MAX(confidence) AS max_confidence
+            FROM measurement_compounds{where}
+            GROUP BY period
+            ORDER BY period
+        ''', tuple(params))
+
+        # Mismos filtros de empresa/fecha sobre measurements (índice company_id, timestamp)
+        where, params = self._compound_where(None, company_id, None, date_from, date_to)
+        samples = {
+            row['period']: row['samples']
+            for row in self.execute_query(
+                f"SELECT {period} AS period, COUNT(*) AS samples FROM measurements{where} GROUP BY period",
+                tuple(params)
+            )
+        }
+
+        trend = []
+        for row in rows:
+            item = dict(row)
+            item['samples'] = samples.get(item['period'], 0)
+            item['detection_rate'] = (
+                round(item['occurrences'] / item['samples'], 4) if item['samples'] else None
+            )
+            trend.append(item)
+        return trend
+
+    # ==================== ESTADÍSTICAS DEL DASHBOARD ====================
+
+    # Histogramas materializados: métrica → (columna, ancho del intervalo, nº de intervalos)
+    STATS_HISTOGRAMS = {
+        'fluor': ('fluor_percentage', 10.0, 10),
+        'pifas': ('pifas_percentage', 10.0, 10),
+        'quality': ('quality_score', 1.0, 10),
+    }
+
+    def _refresh_stats(self, cursor, company_id: Optional[str] = None,
+                       timestamp: Optional[str] = None):
+        """
+        Recalcula las estadísticas materializadas del (empresa, día) de una
+        medición, leyendo solo las mediciones de ese día por el índice
+        (company_id, timestamp). Sin argumentos reconstruye todas.
+        """
+        where, params = "", []
+        if company_id is not None:
+            try:
+                day = date.fromisoformat(str(timestamp)[:10])
+            except ValueError:
+                logger.warning(f"Timestamp no ISO ({timestamp}): reconstruyendo estadísticas")
+                return self._refresh_stats(cursor)
+            where = " WHERE company_id = ? AND timestamp >= ? AND timestamp < ?"
+            params = [company_id, day.isoformat(), (day + timedelta(days=1)).isoformat()]
+            cursor.execute(
+                "DELETE FROM measurement_stats_daily WHERE company_id = ? AND day = ?",
+                (company_id, day.isoformat())
+            )
+            cursor.execute(
+                "DELETE FROM measurement_stats_hist WHERE company_id = ? AND day = ?",
+                (company_id, day.isoformat())
+            )
+        else:
+            cursor.execute("DELETE FROM measurement_stats_daily")
+            cursor.execute("DELETE FROM measurement_stats_hist")
+
+        cursor.execute(f"""
+            INSERT INTO measurement_stats_daily (
+                company_id, day, n, n_fluor, sum_fluor, n_pifas, sum_pifas,
+                min_pifas, max_pifas, n_concentration, sum_concentration,
+                n_quality, sum_quality
+            )
+            SELECT company_id, substr(timestamp, 1, 10) AS day, COUNT(*),
+                   COUNT(fluor_percentage), SUM(fluor_percentage),
+                   COUNT(pifas_percentage), SUM(pifas_percentage),
+                   MIN(pifas_percentage), MAX(pifas_percentage),
+                   COUNT(pifas_concentration), SUM(pifas_concentration),
+                   COUNT(quality_score), SUM(quality_score)
+            FROM measurements{where}
+            GROUP BY company_id, day
+        """, params)
+
+        for metric, (column, width, n_bins) in self.STATS_HISTOGRAMS.items():
+            cursor.execute(f"""
+                INSERT INTO measurement_stats_hist (company_id, day, metric, bin, count)
+                SELECT company_id, substr(timestamp, 1, 10) AS day, ?,
+                       MIN(MAX(CAST({column} / ? AS INTEGER), 0), ?) AS bin, COUNT(*)
+                FROM measurements{where or ' WHERE 1=1'} AND {column} IS NOT NULL
+                GROUP BY company_id, day, bin
+            """, [metric, width, n_bins - 1] + params)
+
+    def _stats_where(self, company_id: Optional[str], date_from: Optional[str],
+                     date_to: Optional[str]) -> Tuple[str, List]:
+        """WHERE sobre las tablas de estadísticas (días 'YYYY-MM-DD' inclusive)"""
+        clauses = []
+        params = []
+        if company_id and company_id not in ('ADMIN', 'admin'):
+            clauses.append("company_id = ?")
+            params.append(company_id)
+        if date_from:
+            clauses.append("day >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            clauses.append("day <= ?")
+            params.append(date_to[:10])
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def get_dashboard_stats(self, company_id: Optional[str] = None,
+                            date_from: Optional[str] = None,
+                            date_to: Optional[str] = None,
+                            bucket: str = 'day', recent: int = 10) -> Dict:
+        """
+        Estadísticas del dashboard a partir de las tablas materializadas:
+        totales y medias, histogramas, distribución de calidad y tendencia
+        por periodo. El coste depende del nº de días, no del de mediciones.
+        """
+        if bucket not in self.TREND_BUCKETS:
+            raise ValueError(f"Periodo no válido: {bucket}")
+        where, params = self._stats_where(company_id, date_from, date_to)
+
+        conn = self.get_connection()
+        try:
+            totals = conn.execute(f"""
+                SELECT COALESCE(SUM(n), 0) AS n,
+                       SUM(sum_fluor) / NULLIF(SUM(n_fluor), 0) AS avg_fluor,
+                       SUM(sum_pifas) / NULLIF(SUM(n_pifas), 0) AS avg_pifas,
+                       MIN(min_pifas) AS min_pifas,
+                       MAX(max_pifas) AS max_pifas,
+                       SUM(sum_concentration) / NULLIF(SUM(n_concentration), 0) AS avg_concentration,
+                       SUM(sum_quality) / NULLIF(SUM(n_quality), 0) AS avg_quality,
+                       MIN(day) AS first_day,
+                       MAX(day) AS last_day
+                FROM measurement_stats_daily{where}
+            """, params).fetchone()
+
+            histograms = {}
+            for metric, (_, width, n_bins) in self.STATS_HISTOGRAMS.items():
+                counts = [0] * n_bins
+                for row in conn.execute(f"""
+                    SELECT bin, SUM(count) AS count FROM measurement_stats_hist
+                    {where + ' AND' if where else ' WHERE'} metric = ?
+                    GROUP BY bin
+                """, params + [metric]):
+                    counts[row['bin']] = row['count']
+                histograms[metric] = [
+                    {'from': i * width, 'to': (i + 1) * width, 'count': count}
+                    for i, count in enumerate(counts)
+                ]
+
+            period = self.TREND_BUCKETS[bucket].format(column='day')
+            trend = [dict(row) for row in conn.execute(f"""
+                SELECT {period} AS period,
+                       SUM(n) AS n,
+                       SUM(sum_fluor) / NULLIF(SUM(n_fluor), 0) AS avg_fluor,
+                       SUM(sum_pifas) / NULLIF(SUM(n_pifas), 0) AS avg_pifas,
+                       MAX(max_pifas) AS max_pifas,
+                       SUM(sum_quality) / NULLIF(SUM(n_quality), 0) AS avg_quality
+                FROM measurement_stats_daily{where}
+                GROUP BY period
+                ORDER BY period
+            """, params)]
+        finally:
+            conn.close()
+
+        # Calidad: mismas categorías que el dashboard (≥8, ≥6, ≥4, resto)
+        quality = [item['count'] for item in histograms['quality']]
+        quality_distribution = {
+            'excellent': sum(quality[8:]),
+            'good': sum(quality[6:8]),
+            'regular': sum(quality[4:6]),
+            'low': sum(quality[:4])
+        }
+
+        return {
+            'totals': dict(totals),
+            'histograms': histograms,
+            'quality_distribution': quality_distribution,
+            'trend': trend,
+            'recent': self._recent_measurements(company_id, date_from, date_to, recent)
+        }
+
+    def _recent_measurements(self, company_id: Optional[str], date_from: Optional[str],
+                             date_to: Optional[str], limit: int) -> List[Dict]:
+        """Últimas mediciones (columnas resumen, sin blobs JSON)"""
+        if limit <= 0:
+            return []
+        where, params = self._compound_where(None, company_id, None, date_from, date_to)
+        rows = self.execute_query(
+            f"SELECT {', '.join(self.SUMMARY_COLUMNS)} FROM measurements{where} "
+            f"ORDER BY timestamp DESC LIMIT ?",
+            tuple(params) + (limit,)
+        )
+        return [dict(row) for row in rows]
+
 # ==================== INSTANCIA GLOBAL ====================
 
 _db_instance = None
@@ -634,5 +1560,5 @@ def get_db() -> Database:
     """Obtiene la instancia global de la base de datos"""
     global _db_instance
     if _db_instance is None:
-        _db_instance = Database()
+        _db_instance = Database(os.getenv('DATABASE_PATH', 'storage/measurements.db'))
     return _db_instance
\ No newline at end of file
@@ -1,13 +1,16 @@
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+import config
+import utils.limiter_storage  # registra el esquema sqlite:// en limits  # noqa: F401
+
 """
 Inicializa extensiones de Flask para evitar importaciones circulares.
 """
 
 limiter = Limiter(
     key_func=get_remote_address,
-    storage_uri="memory://",
+    storage_uri=config.RATELIMIT_STORAGE_URI,
     strategy="fixed-window",
     headers_enabled=True
 )
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Serialización JSON de resultados de análisis y mediciones
+
+- orjson (opcional) serializa arrays y escalares NumPy directamente, sin
+  pasar por listas de floats de Python ni por default() elemento a elemento
+- Sin orjson se usa json estándar con NumpyJSONEncoder (mismo resultado)
+- orjson no respeta el orden de bytes: los arrays deben estar en el orden
+  nativo (el analizador entrega siempre float64 nativo y contiguo)
+- Salida compacta por defecto: es la que viaja en las respuestas y se guarda
+  en la BD; indent=True solo para archivos pensados para leerse a mano
+
+NumpyJSONProvider sustituye al proveedor JSON de Flask (app.json), que es lo
+que usan jsonify() y request.get_json() desde Flask 2.2 (app.json_encoder se
+ignora).
+"""
+import dataclasses
+import decimal
+import json
+import logging
+import os
+import uuid
+from datetime import date
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = os.getenv('JSON_DISABLE_ORJSON', 'false').lower() != 'true'
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    # Fechas y dataclasses como en Flask (http_date / asdict), no en ISO
+    _ORJSON_RESPONSE_OPTIONS = (
+        _ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+
+class NumpyJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer): return int(obj)
+        elif isinstance(obj, np.floating): return float(obj)
+        elif isinstance(obj, np.ndarray): return obj.tolist()
+        elif isinstance(obj, np.bool_): return bool(obj)
+        return super().default(obj)
+
+
+def _numpy_default(obj):
+    """
+    Lo que orjson no serializa por sí mismo: arrays no contiguos o
+    subclases (memmap), dtypes no soportados y escalares NumPy sueltos.
+    """
+    if isinstance(obj, np.ndarray):
+        if type(obj) is not np.ndarray or not obj.flags.c_contiguous:
+            return np.ascontiguousarray(obj)
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _response_default(obj):
+    """_numpy_default + los tipos que acepta el proveedor por defecto de Flask"""
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return _numpy_default(obj)
+    if isinstance(obj, date):
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj, indent: bool = False) -> bytes:
+    """Serializa a JSON UTF-8 (compacto salvo indent=True)"""
+    if ORJSON_AVAILABLE:
+        options = _ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_numpy_default, option=options)
+    return dumps(obj, indent).encode('utf-8')
+
+
+def dumps(obj, indent: bool = False) -> str:
+    """Como dumps_bytes, pero devuelve str (columnas TEXT de SQLite)"""
+    if ORJSON_AVAILABLE:
+        return dumps_bytes(obj, indent).decode('utf-8')
+    if indent:
+        return json.dumps(obj, cls=NumpyJSONEncoder, ensure_ascii=False, indent=2)
+    return json.dumps(obj, cls=NumpyJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(data):
+    """Deserializa str o bytes"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # JSON escrito antes con json estándar (NaN / Infinity)
+            pass
+    return json.loads(data)
+
+
+def write_json(path, obj, indent: bool = False):
+    """Escribe obj como JSON en path"""
+    with open(path, 'wb') as f:
+        f.write(dumps_bytes(obj, indent))
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask con soporte NumPy.
+    Respuestas compactas y sin ordenar claves (las dos cosas cuestan tiempo
+    en resultados grandes y el cliente no depende de ellas).
+    """
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs) -> str:
+        if ORJSON_AVAILABLE and not kwargs:
+            return self._dumps_bytes(obj).decode('utf-8')
+        kwargs.setdefault('cls', NumpyJSONEncoder)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if not kwargs:
+            return loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """jsonify(): el cuerpo se genera directamente en bytes"""
+        obj = self._prepare_response_obj(args, kwargs)
+        if ORJSON_AVAILABLE:
+            body = self._dumps_bytes(obj)
+        else:
+            body = json.dumps(
+                obj, cls=NumpyJSONEncoder, ensure_ascii=self.ensure_ascii,
+                sort_keys=self.sort_keys, separators=(',', ':')
+            )
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def _dumps_bytes(self, obj) -> bytes:
+        options = _ORJSON_RESPONSE_OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=_response_default, option=options)
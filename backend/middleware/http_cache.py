@@ -0,0 +1,289 @@
+"""
+Compresión HTTP y GET condicional (ETag / 304) para la API y el frontend
+
+- Compresión: gzip (stdlib) o brotli si está instalado, según
+  Accept-Encoding, para tipos de texto/JSON/SDF a partir de
+  COMPRESSION_MIN_BYTES. Las respuestas de archivo (send_file) y en streaming
+  no se tocan: los estáticos se sirven con serve_static()
+- Estáticos: si existe una versión precomprimida (archivo.js.br / .gz) más
+  reciente que el original se sirve tal cual; si no, se comprime una vez y
+  se guarda en memoria (STATIC_COMPRESS_CACHE_MB). precompress_static()
+  genera las versiones precomprimidas en el despliegue
+- ETag: las mediciones usan un ETag derivado de updated_at (se comprueba
+  antes de leer la fila completa, ver measurement_etag/not_modified); el
+  resto de GET JSON de la API recibe un ETag débil con el hash del cuerpo
+- Cache-Control: las moléculas (assets/molecules/, generadas una vez por
+  compuesto) son inmutables y se cachean
+  STATIC_IMMUTABLE_MAX_AGE; el resto de estáticos (logos, banderas,
+  imágenes, JS/CSS/HTML) se revalida siempre (no-cache + ETag), porque se
+  pueden sustituir con el mismo nombre; la API es privada y se revalida
+
+Ejecutar `python -m middleware.http_cache [carpeta]` desde backend/ genera
+los .gz/.br del frontend.
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+import config
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# .sdf no siempre está registrado en el sistema
+mimetypes.add_type('chemical/x-mdl-sdfile', '.sdf')
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'chemical/x-mdl-sdfile',
+}
+# Extensión del archivo precomprimido por codificación
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+# Solo rutas cuyo contenido no cambia sin cambiar de nombre
+IMMUTABLE_PREFIXES = ('assets/molecules/',)
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    if not mimetype:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def accepted_encoding() -> Optional[str]:
+    """Mejor codificación aceptada por el cliente ('br', 'gzip' o None)"""
+    accept = request.accept_encodings
+    if BROTLI_AVAILABLE and accept['br'] > 0:
+        return 'br'
+    if accept['gzip'] > 0:
+        return 'gzip'
+    return None
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=config.COMPRESSION_LEVEL, mtime=0)
+
+
+# ============================================================================
+# ETAGS DE MEDICIONES
+# ============================================================================
+
+def measurement_etag(header: Dict, *variant) -> str:
+    """
+    ETag de una medición a partir de su cabecera (get_measurement_header):
+    id, updated_at y synced (mark_as_synced no toca updated_at), más lo que
+    cambie la representación (versión del esquema, codificación, proyecciones...)
+    """
+    parts = [header.get('id'), header.get('updated_at'), header.get('synced'), *variant]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    """Respuesta 304 si el cliente ya tiene esta versión (If-None-Match)"""
+    if request.method not in CACHEABLE_METHODS or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+# ============================================================================
+# AFTER_REQUEST: ETAG + COMPRESIÓN
+# ============================================================================
+
+def _add_api_validators(response: Response) -> Response:
+    """ETag débil con el hash del cuerpo y 304 para los GET JSON de la API"""
+    if (request.method not in CACHEABLE_METHODS or response.status_code != 200
+            or not request.path.startswith('/api/')):
+        return response
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    if response.direct_passthrough or response.is_streamed or response.mimetype != 'application/json':
+        return response
+    if 'ETag' not in response.headers:
+        response.add_etag(weak=True)
+    return response.make_conditional(request)
+
+
+def compress_response(response: Response) -> Response:
+    """Comprime el cuerpo si el cliente lo acepta y merece la pena"""
+    if (not config.COMPRESSION_ENABLED or response.status_code not in (200, 201)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is None or request.method == 'HEAD':
+        return response
+
+    body = response.get_data()
+    if len(body) < config.COMPRESSION_MIN_BYTES:
+        return response
+
+    compressed = compress_bytes(body, encoding)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # El ETag identifica la representación sin comprimir
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def register_http_cache(app):
+    """Registra ETag/304 y compresión para todas las respuestas"""
+
+    @app.after_request
+    def http_cache_middleware(response):  # type: ignore
+        return compress_response(_add_api_validators(response))
+
+    logger.info(
+        f"✅ Compresión HTTP: {'brotli + gzip' if BROTLI_AVAILABLE else 'gzip'} "
+        f"(≥ {config.COMPRESSION_MIN_BYTES} bytes)"
+        if config.COMPRESSION_ENABLED else "⚠️ Compresión HTTP desactivada"
+    )
+
+
+# ============================================================================
+# ESTÁTICOS
+# ============================================================================
+
+class _CompressedStaticCache:
+    """LRU en memoria de estáticos comprimidos, limitado por tamaño total"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, stat: os.stat_result, encoding: str) -> bytes:
+        key = (path, stat.st_mtime_ns, stat.st_size, encoding)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        with open(path, 'rb') as f:
+            data = compress_bytes(f.read(), encoding)
+
+        with self._lock:
+            if key not in self._entries and len(data) <= self.max_bytes:
+                self._entries[key] = data
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return data
+
+
+_static_cache = _CompressedStaticCache(config.STATIC_COMPRESS_CACHE_MB * 1024 * 1024)
+
+
+def _static_cache_control(response: Response, path: str) -> Response:
+    if path.startswith(IMMUTABLE_PREFIXES):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = config.STATIC_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _precompressed_sibling(full_path: str, stat: os.stat_result,
+                           encoding: str) -> Optional[str]:
+    """archivo.br / archivo.gz si existe y no es anterior al original"""
+    candidate = full_path + PRECOMPRESSED_SUFFIXES[encoding]
+    try:
+        return candidate if os.stat(candidate).st_mtime_ns >= stat.st_mtime_ns else None
+    except OSError:
+        return None
+
+
+def serve_static(folder: str, path: str) -> Optional[Response]:
+    """
+    Sirve un archivo del frontend con compresión, ETag y Cache-Control.
+    None si no existe (la ruta decide el 404).
+    """
+    full_path = safe_join(folder, path)
+    if full_path is None or not os.path.isfile(full_path):
+        return None
+
+    stat = os.stat(full_path)
+    mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    encoding = None
+    if (config.COMPRESSION_ENABLED and is_compressible(mimetype)
+            and stat.st_size >= config.COMPRESSION_MIN_BYTES):
+        encoding = accepted_encoding()
+
+    if encoding is None:
+        response = send_file(full_path, mimetype=mimetype, conditional=True, etag=True)
+    else:
+        sibling = _precompressed_sibling(full_path, stat, encoding)
+        if sibling is not None:
+            response = send_file(sibling, mimetype=mimetype, conditional=True, etag=True)
+        else:
+            response = Response(_static_cache.get(full_path, stat, encoding), mimetype=mimetype)
+            response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{encoding}", weak=True)
+            response.last_modified = stat.st_mtime
+            response.make_conditional(request)
+        response.headers['Content-Encoding'] = encoding
+
+    if is_compressible(mimetype):
+        response.vary.add('Accept-Encoding')
+    return _static_cache_control(response, path)
+
+
+def precompress_static(folder, min_bytes: Optional[int] = None) -> int:
+    """
+    Genera archivo.gz (y archivo.br con brotli) junto a cada estático
+    comprimible que haya cambiado. Devuelve cuántos archivos escribió.
+    """
+    min_bytes = config.COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+    encodings = ['gzip'] + (['br'] if BROTLI_AVAILABLE else [])
+    written = 0
+    for source in Path(folder).rglob('*'):
+        if not source.is_file() or source.suffix in PRECOMPRESSED_SUFFIXES.values():
+            continue
+        mimetype = mimetypes.guess_type(source.name)[0]
+        if not is_compressible(mimetype) or source.stat().st_size < min_bytes:
+            continue
+        data = None
+        for encoding in encodings:
+            target = source.with_name(source.name + PRECOMPRESSED_SUFFIXES[encoding])
+            if target.exists() and target.stat().st_mtime_ns >= source.stat().st_mtime_ns:
+                continue
+            data = data if data is not None else source.read_bytes()
+            target.write_bytes(compress_bytes(data, encoding))
+            written += 1
+    return written
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else str(config.SCRIPT_DIR.parent / 'frontend')
+    print(f"📦 {precompress_static(folder)} archivos precomprimidos en {folder}")
@@ -8,6 +8,8 @@ CAMBIOS CIENTÍFICOS APLICADOS:
 3. TODO LO DEMÁS INTACTO - Sin cambios en nombres ni funciones
 """
 
+import hashlib
+import json
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 from pathlib import Path
@@ -68,11 +70,40 @@ class PFASDetectorEnhanced:
         self.base_tolerance_ppm = 0.10  # ppm - Variabilidad experimental real
         # ============================================================
         
+        # ((frecuencia, tolerancia), huella) de database_fingerprint()
+        self._fingerprint = None
+        
         print(f"🔬 Detector PFAS inicializado:")
         print(f"   19F: {self.nucleus_frequency_mhz:.1f} MHz")
         print(f"   ✅ Tolerancia CIENTÍFICA: {self.base_tolerance_ppm:.3f} ppm (Realista)")
         print(f"   (~{ppm_to_hz(self.base_tolerance_ppm, self.nucleus_frequency_mhz):.1f} Hz)")
     
+    def database_fingerprint(self) -> str:
+        """
+        Huella de la base de datos de referencia y de la configuración del
+        detector: si cambia, las detecciones cacheadas dejan de valer.
+        Se calcula una vez (serializar la base de datos en cada análisis
+        sería caro); se recalcula si cambian frecuencia o tolerancia, o tras
+        invalidate_database_fingerprint().
+        """
+        config = (self.nucleus_frequency_mhz, self.base_tolerance_ppm)
+        if self._fingerprint is not None and self._fingerprint[0] == config:
+            return self._fingerprint[1]
+
+        payload = json.dumps({
+            'database': PFAS_DATABASE,
+            'signatures': FUNCTIONAL_GROUP_SIGNATURES,
+            'frequency_mhz': self.nucleus_frequency_mhz,
+            'tolerance_ppm': self.base_tolerance_ppm
+        }, sort_keys=True, default=str)
+        fingerprint = hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+        self._fingerprint = (config, fingerprint)
+        return fingerprint
+
+    def invalidate_database_fingerprint(self):
+        """Llamar tras recargar o modificar la base de datos de referencia"""
+        self._fingerprint = None
+    
     def _is_peak_match(
         self, 
         peak_ppm: float, 
@@ -0,0 +1,304 @@
+"""
+Re-análisis en segundo plano de mediciones históricas
+
+Cuando cambian los parámetros de análisis (fluor_range, pifas_range,
+default_concentration) o la base de datos de PFAS, las mediciones guardadas
+conservan sus resultados antiguos. Este módulo vuelve a ejecutar baseline,
+picos y detección sobre el espectro guardado en la BD y escribe los
+resultados como una nueva versión en `analysis_results` (la medición
+original no se modifica).
+
+- Procesos worker (ProcessPoolExecutor) con prioridad reducida (nice)
+- Lotes con cursor `last_id`: el trabajo se puede pausar y reanudar, y
+  sobrevive a un reinicio del servidor
+- Cede el paso mientras haya análisis en vivo (gauge 'analysis.in_flight').
+  El gauge es del proceso: con serve.py --workers N solo ve los análisis
+  del worker que ejecuta el trabajo, no los de los demás (la prioridad
+  reducida de los procesos del pool sigue aplicando)
+- Contexto 'spawn' para el pool, como el análisis por lotes: no se hace
+  fork de un servidor con hilos (waitress, logging, scheduler) ni de sus
+  conexiones SQLite abiertas
+"""
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import config as app_config
+from database import Database, get_db
+from utils.analysis_workers import init_analysis_worker, get_worker_analyzer
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de análisis que invalidan los resultados guardados
+REANALYSIS_PARAM_KEYS = ('fluor_range', 'pifas_range', 'default_concentration')
+
+
+# ============================================================================
+# LADO WORKER (se ejecuta en los procesos hijos)
+# ============================================================================
+
+def _summarize_results(results: Dict) -> Dict:
+    """Resultados sin el espectro (ya está en la medición) y con el mismo formato que /api/analyze"""
+    summary = {k: v for k, v in results.items() if k != 'spectrum'}
+    for compound in summary.get('pfas_detection', {}).get('detected_pfas', []):
+        if 'confidence' in compound:
+            compound['confidence'] = round(compound['confidence'] * 100, 2)
+    return summary
+
+
+def _analyze_chunk(rows: List[Tuple[int, Optional[str], Optional[float]]], params: Dict) -> List[Dict]:
+    """
+    Re-analiza un lote de (measurement_id, spectrum_data JSON, concentration).
+
+    El espectro guardado ya tiene el baseline corregido: no se vuelve a
+    restar salvo que el trabajo pida baseline_correction explícitamente.
+    Cada medición conserva su concentración salvo que el trabajo fije
+    'concentration'; default_concentration solo se usa si no tiene.
+    """
+    output = []
+    for measurement_id, spectrum_json, stored_concentration in rows:
+        item = {'measurement_id': measurement_id}
+        try:
+            spectrum = json.loads(spectrum_json) if spectrum_json else None
+            if not spectrum or len(spectrum.get('ppm') or []) < 2:
+                item['error'] = "Medición sin espectro guardado"
+                output.append(item)
+                continue
+
+            results = get_worker_analyzer().analyze_spectrum_data(
+                spectrum['ppm'],
+                spectrum['intensity'],
+                f"measurement_{measurement_id}",
+                fluor_range=params.get('fluor_range'),
+                pifas_range=params.get('pifas_range'),
+                concentration=_concentration_for(stored_concentration, params),
+                baseline_correction=params.get('baseline_correction', False)
+            )
+            if results.get('error'):
+                item['error'] = results['error']
+            else:
+                item.update({
+                    'fluor_percentage': results.get('fluor_percentage'),
+                    'pifas_percentage': results.get('pifas_percentage'),
+                    'pifas_concentration': results.get('pifas_concentration'),
+                    'quality_score': results.get('quality_score'),
+                    'results': _summarize_results(results)
+                })
+        except Exception as e:
+            item['error'] = str(e)
+        output.append(item)
+
+    # Serializar aquí evita tipos numpy al volver al proceso principal
+    return json.loads(json.dumps(output, default=_json_default))
+
+
+def _concentration_for(stored_concentration: Optional[float], params: Dict) -> float:
+    """Concentración del trabajo si la fija, si no la de la medición"""
+    if params.get('concentration') is not None:
+        return params['concentration']
+    if stored_concentration is not None:
+        return stored_concentration
+    return params.get('default_concentration', 1.0)
+
+
+def _json_default(obj):
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    return str(obj)
+
+
+# ============================================================================
+# GESTOR (proceso del servidor)
+# ============================================================================
+
+class ReanalysisManager:
+    """Lanza, pausa y reanuda trabajos de re-análisis (uno a la vez)"""
+
+    def __init__(self, db: Database = None):
+        self.db = db or get_db()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._current_job_id: Optional[int] = None
+        self._pause_event = threading.Event()
+
+    # ==================== CONTROL ====================
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _check_not_running(self):
+        """RuntimeError si hay un trabajo en curso en este u otro proceso worker"""
+        if self.is_running():
+            raise RuntimeError(f"Ya hay un re-análisis en curso (#{self._current_job_id})")
+        running = self.db.list_reanalysis_jobs(status='running', limit=1)
+        if running:
+            raise RuntimeError(f"Ya hay un re-análisis en curso (#{running[0]['id']}, otro proceso)")
+
+    def current_job_id(self) -> Optional[int]:
+        return self._current_job_id if self.is_running() else None
+
+    def start(self, params: Dict, company_id: Optional[str] = None,
+              reason: Optional[str] = None) -> Dict:
+        """
+        Crea y lanza un trabajo de re-análisis.
+
+        Raises:
+            RuntimeError: si ya hay un trabajo en curso
+        """
+        with self._lock:
+            self._check_not_running()
+            job = self.db.create_reanalysis_job(params, company_id, reason)
+            self._launch(job['id'])
+        return job
+
+    def resume(self, job_id: int) -> Dict:
+        """Reanuda un trabajo pausado o interrumpido desde su último lote"""
+        with self._lock:
+            job = self.db.get_reanalysis_job(job_id)
+            if not job:
+                raise LookupError(f"Re-análisis #{job_id} no encontrado")
+            if job['status'] == 'completed':
+                raise ValueError(f"Re-análisis #{job_id} ya completado")
+            self._check_not_running()
+            self._launch(job_id)
+        return self.db.get_reanalysis_job(job_id)
+
+    def pause(self, job_id: int) -> Dict:
+        """Pausa el trabajo en curso al terminar el lote actual"""
+        job = self.db.get_reanalysis_job(job_id)
+        if not job:
+            raise LookupError(f"Re-análisis #{job_id} no encontrado")
+        if self.current_job_id() == job_id:
+            self._pause_event.set()
+        elif job['status'] in ('pending', 'running', 'interrupted'):
+            self.db.update_reanalysis_job(job_id, status='paused')
+        return self.db.get_reanalysis_job(job_id)
+
+    def resume_interrupted(self):
+        """
+        Al arrancar el servidor: los trabajos que quedaron 'running' se
+        interrumpieron con el proceso. Se marcan y se reanuda el más reciente.
+        """
+        stale = self.db.list_reanalysis_jobs(status='running')
+        for job in stale:
+            self.db.update_reanalysis_job(job['id'], status='interrupted')
+        if stale:
+            job = stale[0]
+            logger.info(f"🔁 Reanudando re-análisis #{job['id']} desde medición {job['last_id']}")
+            try:
+                self.resume(job['id'])
+            except (RuntimeError, ValueError) as e:
+                logger.warning(f"⚠️ No se pudo reanudar re-análisis #{job['id']}: {e}")
+
+    def _launch(self, job_id: int):
+        self._pause_event.clear()
+        self._current_job_id = job_id
+        self.db.update_reanalysis_job(job_id, status='running', error=None)
+        self._thread = threading.Thread(
+            target=self._run, args=(job_id,), name=f"reanalysis-{job_id}", daemon=True
+        )
+        self._thread.start()
+
+    # ==================== EJECUCIÓN ====================
+
+    def _wait_for_live_traffic(self):
+        """Cede el paso a los análisis en vivo de /api/analyze (de este proceso)"""
+        while metrics.get('analysis.in_flight') > 0 and not self._pause_event.is_set():
+            metrics.incr('reanalysis.throttled')
+            time.sleep(app_config.REANALYSIS_YIELD_SECONDS)
+
+    def _run(self, job_id: int):
+        job = self.db.get_reanalysis_job(job_id)
+        params = job['params']
+        workers = max(1, app_config.REANALYSIS_WORKERS)
+        chunk_size = max(1, app_config.REANALYSIS_CHUNK_SIZE)
+        started = time.time()
+
+        logger.info(
+            f"🔁 Re-análisis #{job_id} (v{job['version']}): {job['total']} mediciones, "
+            f"{workers} workers, lotes de {chunk_size}"
+        )
+        metrics.set_gauge('reanalysis.running', 1)
+
+        try:
+            # spawn en todas las plataformas (app.py protege su arranque con __main__)
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_analysis_worker,
+                initargs=(app_config.REANALYSIS_NICE,)
+            ) as pool:
+                pending = deque()
+                cursor = job['last_id']
+                exhausted = False
+
+                while True:
+                    # Mantener como mucho un lote por worker en vuelo
+                    while not exhausted and len(pending) < workers and not self._pause_event.is_set():
+                        self._wait_for_live_traffic()
+                        if self._pause_event.is_set():
+                            break
+                        rows = self.db.get_spectra_for_reanalysis(
+                            job['company_id'], after_id=cursor, limit=chunk_size
+                        )
+                        if not rows:
+                            exhausted = True
+                            break
+                        cursor = rows[-1][0]
+                        pending.append((cursor, pool.submit(_analyze_chunk, rows, params)))
+
+                    if not pending:
+                        break
+
+                    # Confirmar en orden para que last_id nunca salte un lote
+                    last_id, future = pending.popleft()
+                    results = future.result()
+                    self.db.save_reanalysis_chunk(job_id, job['version'], params, results, last_id)
+                    metrics.incr('reanalysis.measurements', len(results))
+
+                    progress = self.db.get_reanalysis_job(job_id)
+                    metrics.set_gauge('reanalysis.progress', progress['progress'])
+                    if progress['status'] == 'paused':
+                        # Pausado desde otro proceso worker (pause() marca la BD)
+                        self._pause_event.set()
+                    logger.debug(
+                        f"🔁 Re-análisis #{job_id}: {progress['processed']}/{progress['total']} "
+                        f"({progress['progress']}%)"
+                    )
+
+            if self._pause_event.is_set():
+                self.db.update_reanalysis_job(job_id, status='paused')
+                logger.info(f"⏸️ Re-análisis #{job_id} pausado")
+            else:
+                self.db.update_reanalysis_job(job_id, status='completed')
+                logger.info(f"✅ Re-análisis #{job_id} completado en {time.time() - started:.1f}s")
+
+        except Exception as e:
+            logger.error(f"❌ Re-análisis #{job_id} falló: {e}", exc_info=True)
+            self.db.update_reanalysis_job(job_id, status='failed', error=str(e))
+        finally:
+            metrics.set_gauge('reanalysis.running', 0)
+
+
+def params_require_reanalysis(old_params: Dict, new_params: Dict) -> bool:
+    """Indica si un cambio de parámetros afecta a los resultados guardados"""
+    return any(old_params.get(key) != new_params.get(key) for key in REANALYSIS_PARAM_KEYS)
+
+
+# Instancia global
+_reanalysis_manager = None
+
+
+def get_reanalysis_manager() -> ReanalysisManager:
+    global _reanalysis_manager
+    if _reanalysis_manager is None:
+        _reanalysis_manager = ReanalysisManager()
+    return _reanalysis_manager
@@ -1,22 +1,37 @@
 """
-Rutas de análisis (analyze, history)
+Rutas de análisis (analyze, ajuste interactivo, history)
 """
 from flask import Blueprint, jsonify, request, current_app
 from pathlib import Path
 from datetime import datetime
 import json
 import logging
+import re
 import threading
+import numpy as np
 
 from auth import token_required
 from security import FileValidator, InputValidator, sanitize_error_message
 from audit_logger import audit_logger, get_request_ip
 from company_data import COMPANY_PROFILES
 from database import get_db
+from json_utils import dumps_bytes, loads, write_json
 from config_manager import get_config_manager
 from pfas_database import get_molecule_visualization
-from utils.file_utils import extract_and_find_data
+from utils.file_utils import staged_datasets
+from batch_analysis import plan_batch_tasks, run_batch
 from utils.sync_utils import push_to_google_cloud
+from utils.metrics import metrics
+from utils.spectrum_cache import get_spectrum_cache
+from utils.chunked_upload import OffsetMismatch, get_upload_store
+from utils.content_store import get_content_store
+from utils.spectrum_encoding import (
+    SPECTRUM_ENCODING_HEADER, requested_encoding, encode_payload_spectra
+)
+from utils.response_schema import (
+    RESULT_ALIASES, requested_version, requested_projections,
+    compact_result, compact_measurement, mark_version
+)
 import config as app_config
 
 analysis_bp = Blueprint('analysis', __name__)
@@ -24,6 +39,210 @@ logger = logging.getLogger(__name__)
 
 db = get_db()
 config = get_config_manager()
+spectrum_cache = get_spectrum_cache()
+upload_store = get_upload_store()
+content_store = get_content_store()
+
+# Parámetros que se pueden ajustar sin volver a subir el archivo
+INTERACTIVE_PARAM_KEYS = ('fluor_range', 'pifas_range', 'concentration')
+
+# Analizador compartido del ajuste interactivo: su caché de etapas reutiliza
+# lectura, baseline y calidad entre ajustes sucesivos del mismo espectro
+_interactive_analyzer = None
+_interactive_lock = threading.Lock()
+
+
+def _validate_upload(ip):
+    """
+    Valida archivo, company_id y autorización de una subida.
+
+    Returns:
+        (file, company_id, None) o (None, None, respuesta de error)
+    """
+    if "file" not in request.files:
+        return None, None, (jsonify({"error": "No 'file' provided"}), 400)
+
+    file = request.files["file"]
+
+    is_valid, error_msg = FileValidator.validate_file(file)
+    if not is_valid:
+        logger.warning(f"⚠️ File validation failed: {error_msg}")
+        audit_logger.log_security_event(
+            'INVALID_FILE_UPLOAD',
+            {'filename': file.filename, 'reason': error_msg},
+            ip,
+            'WARNING'
+        )
+        return None, None, (jsonify({"error": error_msg}), 400)
+
+    company_id = request.form.get("company_id")
+    error_response = _validate_company(company_id, ip)
+    if error_response:
+        return None, None, error_response
+
+    return file, company_id, None
+
+
+def _validate_company(company_id, ip):
+    """
+    Valida company_id y que el token pueda analizar para esa empresa.
+
+    Returns:
+        None o respuesta de error
+    """
+    if not company_id:
+        return jsonify({"error": "No 'company_id' provided"}), 400
+
+    if not InputValidator.validate_company_id(company_id):
+        logger.warning(f"⚠️ Invalid company_id: {company_id}")
+        audit_logger.log_security_event(
+            'INVALID_COMPANY_ID',
+            {'company_id': company_id},
+            ip,
+            'WARNING'
+        )
+        return jsonify({"error": "Invalid company_id format"}), 400
+
+    if company_id not in COMPANY_PROFILES:
+        logger.warning(f"⚠️ Unknown company_id: {company_id}")
+        return jsonify({"error": f"Invalid company_id: '{company_id}'"}), 400
+
+    # Autorización
+    token_company = request.jwt_payload.get('company_id')
+    if token_company != company_id and token_company != 'ADMIN':
+        logger.warning(f"⚠️ Unauthorized: {token_company} → {company_id}")
+        audit_logger.log_security_event(
+            'UNAUTHORIZED_ANALYSIS',
+            {'token_company': token_company, 'requested_company': company_id},
+            ip,
+            'ERROR'
+        )
+        return jsonify({"error": "No autorizado"}), 403
+
+    return None
+
+
+def _parse_parameters():
+    """
+    Lee y valida 'parameters' del formulario.
+
+    Returns:
+        (dict de parámetros, None) o (None, respuesta de error)
+    """
+    parameters = {}
+    if "parameters" in request.form:
+        try:
+            parameters = json.loads(request.form["parameters"])
+        except json.JSONDecodeError as e:
+            logger.warning(f"⚠️ Invalid parameters: {e}")
+            return None, (jsonify({"error": "Invalid parameters format"}), 400)
+        return _validate_parameters(parameters)
+    return parameters, None
+
+
+def _validate_parameters(parameters):
+    """
+    Valida un dict de parámetros de análisis (concentración y rangos).
+
+    Returns:
+        (dict de parámetros, None) o (None, respuesta de error)
+    """
+    if not isinstance(parameters, dict):
+        return None, (jsonify({"error": "Invalid parameters format"}), 400)
+
+    try:
+        if 'concentration' in parameters:
+            conc = float(parameters['concentration'])
+            if conc <= 0 or conc > 1000:
+                return None, (jsonify({"error": "Invalid concentration"}), 400)
+
+        for key in ('fluor_range', 'pifas_range'):
+            if key in parameters:
+                value = parameters[key]
+                if not isinstance(value, dict) or float(value['min']) >= float(value['max']):
+                    return None, (jsonify({"error": f"Invalid {key}"}), 400)
+
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Invalid parameters: {e}")
+        return None, (jsonify({"error": "Invalid parameters format"}), 400)
+    return parameters, None
+
+
+def _enrich_compounds(results):
+    """Confianza en % y visualización 3D/2D de cada compuesto detectado"""
+    if 'pfas_detection' in results and 'detected_pfas' in results['pfas_detection']:
+        for compound in results['pfas_detection']['detected_pfas']:
+            if 'confidence' in compound:
+                compound['confidence'] = round(compound['confidence'] * 100, 2)
+
+            cas_number = compound.get('cas')
+            molecule_viz = get_molecule_visualization(cas_number)
+
+            compound['file_3d'] = molecule_viz.get('file_3d')
+            compound['image_2d'] = molecule_viz.get('image_2d')
+
+
+def _save_analysis(results, company_id, filename, json_encoder, result_stem=None):
+    """
+    Persiste un resultado de análisis: JSON en disco, medición en la BD y
+    sincronización en segundo plano.
+    result_stem: prefijo del JSON de resultados (por defecto, el del archivo)
+
+    Returns:
+        (measurement_id, result_filename)
+    """
+    # Guardar JSON (compacto y fuera del hilo de la petición). Copia de primer
+    # nivel: la respuesta añade claves a results después de guardar
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    safe_stem = re.sub(r'[^\w\-]+', '_', result_stem or Path(filename).stem)
+    result_filename = f"{safe_stem}_{company_id}_analysis_{timestamp}.json"
+    result_path = app_config.ANALYSIS_DIR / result_filename
+
+    threading.Thread(
+        target=_write_result_json, args=(result_path, dict(results)), daemon=True
+    ).start()
+
+    # Guardar en BD
+    measurement_data = {
+        'device_id': config.get_device_id(),
+        'company_id': company_id,
+        'filename': filename,
+        'timestamp': datetime.now().isoformat(),
+        'analysis': results.copy(),
+        'quality_score': results.get('quality_score'),
+        'fluor_percentage': results.get('fluor_percentage'),
+        'pfas_percentage': results.get('pfas_percentage'),
+        'pifas_percentage': results.get('pifas_percentage'),
+        'spectrum': results.get('spectrum', {}),
+        'peaks': results.get('peaks', []),
+        'quality_metrics': results.get('quality_metrics', {}),
+    }
+
+    measurement_id = db.save_measurement(measurement_data)
+    logger.info(f"📊 Measurement saved: ID {measurement_id}")
+
+    # Sincronización
+    measurement_data['measurement_id_local'] = measurement_id
+
+    try:
+        sync_thread = threading.Thread(
+            target=push_to_google_cloud,
+            args=(app_config.GOOGLE_SCRIPT_URL, measurement_data, json_encoder, measurement_id, db)
+        )
+        sync_thread.start()
+        logger.debug(f"🚀 Cloud sync started for {measurement_id}")
+    except Exception as thread_err:
+        logger.error(f"❌ Failed to start sync: {thread_err}")
+
+    return measurement_id, result_filename
+
+
+def _write_result_json(result_path, results):
+    try:
+        write_json(result_path, results)
+        logger.info(f"💾 Analysis JSON saved: {result_path.name}")
+    except Exception as json_err:
+        logger.error(f"Failed to save JSON: {json_err}")
 
 
 @analysis_bp.route("/analyze", methods=["POST"])
@@ -33,176 +252,644 @@ def analyze_spectrum():
     Analizar espectro con validación exhaustiva
     REQUIERE: 'file' y 'company_id' en multipart/form-data
     """
-    from app import NumpyJSONEncoder, SpectrumAnalyzer
-    
     ip = get_request_ip()
     
     try:
-        # Validar archivo
-        if "file" not in request.files:
-            return jsonify({"error": "No 'file' provided"}), 400
-        
-        file = request.files["file"]
-        
-        is_valid, error_msg = FileValidator.validate_file(file)
-        if not is_valid:
-            logger.warning(f"⚠️ File validation failed: {error_msg}")
-            audit_logger.log_security_event(
-                'INVALID_FILE_UPLOAD',
-                {'filename': file.filename, 'reason': error_msg},
-                ip,
-                'WARNING'
-            )
-            return jsonify({"error": error_msg}), 400
-        
-        # Validar company_id
-        company_id = request.form.get("company_id")
-        if not company_id:
-            return jsonify({"error": "No 'company_id' provided"}), 400
-        
-        if not InputValidator.validate_company_id(company_id):
-            logger.warning(f"⚠️ Invalid company_id: {company_id}")
-            audit_logger.log_security_event(
-                'INVALID_COMPANY_ID',
-                {'company_id': company_id},
-                ip,
-                'WARNING'
-            )
-            return jsonify({"error": "Invalid company_id format"}), 400
+        file, company_id, error_response = _validate_upload(ip)
+        if error_response:
+            return error_response
+
+        # Validar parámetros
+        parameters, error_response = _parse_parameters()
+        if error_response:
+            return error_response
+
+        # Guardar en el almacén por contenido (hash calculado al escribir)
+        content_sha256, file_path, _ = content_store.put_stream(file.stream, file.filename)
+        logger.debug(f"File stored: {file_path}")
+
+        return _analyze_saved_file(file_path, file.filename, company_id, parameters, ip, content_sha256)
+
+    except Exception as e:
+        logger.error(f"❌ Error during analysis: {str(e)}", exc_info=True)
         
-        if company_id not in COMPANY_PROFILES:
-            logger.warning(f"⚠️ Unknown company_id: {company_id}")
-            return jsonify({"error": f"Invalid company_id: '{company_id}'"}), 400
+        audit_logger.log_analysis(
+            request.form.get("company_id", "unknown"),
+            file.filename if 'file' in locals() and file else "unknown",
+            False,
+            ip,
+            str(e)
+        )
         
-        # Autorización
-        token_company = request.jwt_payload.get('company_id')
-        if token_company != company_id and token_company != 'ADMIN':
-            logger.warning(f"⚠️ Unauthorized: {token_company} → {company_id}")
-            audit_logger.log_security_event(
-                'UNAUTHORIZED_ANALYSIS',
-                {'token_company': token_company, 'requested_company': company_id},
-                ip,
-                'ERROR'
-            )
-            return jsonify({"error": "No autorizado"}), 403
+        return jsonify({
+            "error": "Analysis failed",
+            "message": sanitize_error_message(str(e))
+        }), 500
 
-        # Guardar archivo
-        safe_filename = Path(file.filename).name
-        file_path = app_config.OUTPUT_DIR / safe_filename
-        file.save(file_path)
-        logger.debug(f"File saved: {file_path}")
 
-        file_path = extract_and_find_data(file_path)
-        logger.debug(f"Data path: {file_path}")
+def _analyze_saved_file(file_path, filename, company_id, parameters, ip, content_sha256=None):
+    """
+    Analiza un archivo ya guardado en disco (subida directa o por partes),
+    persiste la medición y construye la respuesta de /analyze.
+    Con content_sha256, unos bytes ya analizados con los mismos parámetros
+    para la misma empresa devuelven el resultado anterior sin re-analizar.
+    Las excepciones se propagan al endpoint.
+    """
+    from app import NumpyJSONEncoder, SpectrumAnalyzer
+
+    # Análisis
+    analyzer = SpectrumAnalyzer()
+    analysis_params = config.get_analysis_params()
+    params = {
+        'fluor_range': parameters.get("fluor_range", analysis_params.get('fluor_range')),
+        'pifas_range': parameters.get("pifas_range", analysis_params.get('pifas_range')),
+        'concentration': parameters.get("concentration", analysis_params.get('default_concentration'))
+    }
+
+    # El formato (extensión) y la configuración del lector también cambian el resultado
+    reader = getattr(analyzer, 'nmr_reader', None)
+    params_key = content_store.params_key(dict(
+        params,
+        stored_name=content_store.stored_name(filename),
+        fid_mode=getattr(reader, 'fid_mode', None),
+        phase_mode=getattr(reader, 'phase_mode', None)
+    ))
+    if content_sha256:
+        response = _reused_analysis_response(content_sha256, params_key, filename, company_id, ip)
+        if response is not None:
+            return response
+
+    logger.info(f"📊 Analyzing: {filename} for {company_id}")
+    # El re-análisis en segundo plano cede el paso mientras haya análisis en vivo
+    metrics.gauge_add('analysis.in_flight', 1)
+    try:
+        # Los ZIP se indexan y solo se extrae el conjunto de datos necesario
+        with staged_datasets(file_path) as datasets:
+            logger.debug(f"Data path: {datasets[0]['path']}")
+            results = analyzer.analyze_file(datasets[0]['path'], **params)
+            single_file = datasets[0]['kind'] == 'file'
+    finally:
+        metrics.gauge_add('analysis.in_flight', -1)
+    
+    if not results or not isinstance(results, dict):
+        logger.error("❌ Analyzer returned no results")
+        audit_logger.log_analysis(company_id, filename, False, ip, "Invalid results")
+        return jsonify({"error": "Analyzer returned no results"}), 500
+
+    # En el almacén el archivo se llama por su hash: mostrar el nombre subido
+    if single_file:
+        for key in ('file_name', 'filename'):
+            if key in results:
+                results[key] = Path(filename).name
+
+    _enrich_compounds(results)
+    measurement_id, result_filename = _save_analysis(
+        results, company_id, filename, NumpyJSONEncoder
+    )
+    if content_sha256:
+        db.save_upload_result(content_sha256, params_key, company_id, measurement_id, result_filename)
+    
+    audit_logger.log_analysis(company_id, filename, True, ip)
+
+    # Espectro sin corregir en memoria para el ajuste interactivo
+    session_id = spectrum_cache.put(
+        analyzer.ppm_data, analyzer.intensity_data, company_id, params,
+        _comparable_results(results),
+        metadata=analyzer.file_metadata, measurement_id=measurement_id,
+        filename=results.get('file_name')
+    )
+
+    # Respuesta
+    results['measurement_id'] = measurement_id
+    results['analysis_session_id'] = session_id
+    results['result_file'] = result_filename
+    results['saved_company_id'] = company_id
+    return _analysis_response(results)
+
+
+def _analysis_response(results):
+    """Respuesta de /analyze en la versión y codificación pedidas"""
+    version = requested_version(request)
+    if version == 2:
+        results = compact_result(results)
+
+    response = jsonify(encode_payload_spectra(results, requested_encoding(request)))
+    response.vary.add(SPECTRUM_ENCODING_HEADER)
+    return mark_version(response, version)
+
+
+def _reused_analysis_response(content_sha256, params_key, filename, company_id, ip):
+    """
+    Respuesta con el análisis anterior de los mismos bytes y parámetros
+    (misma empresa), o None si no lo hay o la medición se borró.
+    No crea una medición nueva: measurement_id es la anterior y el historial
+    no cambia; la respuesta lleva el nombre subido ahora (file_name/filename),
+    el de la medición original (original_filename) y "reused": true.
+    """
+    previous = db.get_upload_result(content_sha256, params_key, company_id)
+    if not previous:
+        return None
+    measurement = db.get_measurement(previous['measurement_id'])
+    if not measurement or measurement['company_id'] != company_id or not measurement.get('analysis'):
+        return None
+
+    measurement_id = measurement['id']
+    logger.info(f"♻️ Same content already analysed: {filename} → measurement {measurement_id}")
+    metrics.incr('analysis.reused')
+    audit_logger.log_event(
+        event_type='ANALYSIS',
+        details={
+            'filename': filename,
+            'success': True,
+            'error': None,
+            'reused_measurement_id': measurement_id
+        },
+        user=company_id,
+        ip=ip
+    )
+
+    # Sesión interactiva: la de memoria o una nueva desde el espectro guardado
+    session = spectrum_cache.get_by_measurement(measurement_id)
+    if session is None:
+        session, _ = _session_from_measurement(measurement_id)
+
+    results = dict(measurement['analysis'])
+    # Mismo criterio que un análisis nuevo: en un archivo suelto se muestra
+    # el nombre subido (en un ZIP, el del conjunto de datos)
+    if results.get('file_name') == measurement['filename']:
+        for key in ('file_name', 'filename'):
+            if key in results:
+                results[key] = Path(filename).name
+    results['original_filename'] = measurement['filename']
+    results['measurement_id'] = measurement_id
+    results['analysis_session_id'] = session['session_id'] if session else None
+    results['result_file'] = previous['result_file']
+    results['saved_company_id'] = company_id
+    results['reused'] = True
+    return _analysis_response(results)
+
+
+# ============================================================================
+# SUBIDAS POR PARTES REANUDABLES (init → PUT partes → complete)
+# ============================================================================
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def _load_upload(upload_id):
+    """
+    Sesión de subida del token actual (su empresa o ADMIN).
+
+    Returns:
+        (meta, None) o (None, respuesta de error)
+    """
+    try:
+        meta = upload_store.get(upload_id)
+    except LookupError as e:
+        return None, (jsonify({"error": str(e)}), 404)
+
+    token_company = request.jwt_payload.get('company_id')
+    if token_company != meta['company_id'] and token_company != 'ADMIN':
+        return None, (jsonify({"error": "No autorizado"}), 403)
+    return meta, None
 
-        # Validar parámetros
-        parameters = {}
-        if "parameters" in request.form:
-            try:
-                parameters = json.loads(request.form["parameters"])
-                
-                if 'concentration' in parameters:
-                    conc = float(parameters['concentration'])
-                    if conc <= 0 or conc > 1000:
-                        return jsonify({"error": "Invalid concentration"}), 400
-                
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.warning(f"⚠️ Invalid parameters: {e}")
-                return jsonify({"error": "Invalid parameters format"}), 400
-
-        # Análisis
-        analyzer = SpectrumAnalyzer()
-        analysis_params = config.get_analysis_params()
 
-        logger.info(f"📊 Analyzing: {file.filename} for {company_id}")
-        results = analyzer.analyze_file(
-            file_path,
-            fluor_range=parameters.get("fluor_range", analysis_params.get('fluor_range')),
-            pifas_range=parameters.get("pifas_range", analysis_params.get('pifas_range')),
-            concentration=parameters.get("concentration", analysis_params.get('default_concentration'))
+@analysis_bp.route("/uploads", methods=["POST"])
+@token_required
+def create_upload():
+    """
+    Inicia una subida por partes.
+    Body JSON: {"filename", "size", "company_id"}
+    Devuelve upload_id y el tamaño máximo de cada parte (chunk_size).
+    """
+    ip = get_request_ip()
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    company_id = data.get('company_id')
+
+    error_response = _validate_company(company_id, ip)
+    if error_response:
+        return error_response
+
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid size"}), 400
+
+    try:
+        meta = upload_store.create(filename, size, company_id)
+    except ValueError as e:
+        logger.warning(f"⚠️ File validation failed: {e}")
+        audit_logger.log_security_event(
+            'INVALID_FILE_UPLOAD',
+            {'filename': filename, 'reason': str(e)},
+            ip,
+            'WARNING'
         )
-        
-        if not results or not isinstance(results, dict):
-            logger.error("❌ Analyzer returned no results")
-            audit_logger.log_analysis(company_id, file.filename, False, ip, "Invalid results")
-            return jsonify({"error": "Analyzer returned no results"}), 500
-
-        # Enriquecimiento 3D/2D
-        if 'pfas_detection' in results and 'detected_pfas' in results['pfas_detection']:
-            for compound in results['pfas_detection']['detected_pfas']:
-                if 'confidence' in compound:
-                    compound['confidence'] = round(compound['confidence'] * 100, 2)
-                
-                cas_number = compound.get('cas')
-                molecule_viz = get_molecule_visualization(cas_number)
-                
-                compound['file_3d'] = molecule_viz.get('file_3d')
-                compound['image_2d'] = molecule_viz.get('image_2d')
-
-        # Guardar JSON
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        result_filename = f"{Path(file.filename).stem}_{company_id}_analysis_{timestamp}.json"
-        result_path = app_config.ANALYSIS_DIR / result_filename
-        
-        try:
-            with open(result_path, "w", encoding='utf-8') as f:
-                json.dump(results, f, indent=2, cls=NumpyJSONEncoder, ensure_ascii=False)
-            logger.info(f"💾 Analysis JSON saved: {result_filename}")
-        except Exception as json_err:
-            logger.error(f"Failed to save JSON: {json_err}")
-
-        # Guardar en BD
-        measurement_data = {
-            'device_id': config.get_device_id(),
-            'company_id': company_id,
-            'filename': file.filename,
-            'timestamp': datetime.now().isoformat(),
-            'analysis': results.copy(),
-            'quality_score': results.get('quality_score'),
-            'fluor_percentage': results.get('fluor_percentage'),
-            'pfas_percentage': results.get('pfas_percentage'),
-            'pifas_percentage': results.get('pifas_percentage'),
-            'spectrum': results.get('spectrum', {}),
-            'peaks': results.get('peaks', []),
-            'quality_metrics': results.get('quality_metrics', {}),
+        return jsonify({"error": str(e)}), 400
+
+    info = upload_store.public_info(meta)
+    info['chunk_size'] = upload_store.max_chunk_bytes
+    return jsonify(info), 201
+
+
+@analysis_bp.route("/uploads/<upload_id>", methods=["GET"])
+@token_required
+def get_upload(upload_id):
+    """Estado de una subida: 'received' es el offset desde el que reanudar"""
+    meta, error_response = _load_upload(upload_id)
+    if error_response:
+        return error_response
+    return jsonify(upload_store.public_info(meta))
+
+
+@analysis_bp.route("/uploads/<upload_id>", methods=["PUT"])
+@token_required
+def put_upload_chunk(upload_id):
+    """
+    Recibe una parte en el cuerpo (application/octet-stream).
+    Cabecera: Content-Range: bytes <inicio>-<fin>/<total>
+    La parte debe empezar en 'received'; si no, 409 con el offset correcto.
+    """
+    ip = get_request_ip()
+    meta, error_response = _load_upload(upload_id)
+    if error_response:
+        return error_response
+
+    match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return jsonify({"error": "Content-Range required (bytes start-end/total)"}), 400
+
+    start, end = int(match.group(1)), int(match.group(2))
+    total = None if match.group(3) == '*' else int(match.group(3))
+    length = request.content_length
+    if length is None or end < start or end - start + 1 != length:
+        return jsonify({"error": "Content-Range does not match Content-Length"}), 400
+
+    try:
+        meta = upload_store.write_chunk(upload_id, start, length, request.stream, total)
+    except OffsetMismatch as e:
+        return jsonify({"error": str(e), "received": e.received}), 409
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        logger.warning(f"⚠️ Chunk rejected for upload {upload_id}: {e}")
+        audit_logger.log_security_event(
+            'INVALID_FILE_UPLOAD',
+            {'filename': meta['filename'], 'reason': str(e)},
+            ip,
+            'WARNING'
+        )
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error writing chunk for upload {upload_id}: {str(e)}", exc_info=True)
+        return jsonify({"error": "Chunk upload failed", "message": sanitize_error_message(str(e))}), 500
+
+    return jsonify(upload_store.public_info(meta))
+
+
+@analysis_bp.route("/uploads/<upload_id>", methods=["DELETE"])
+@token_required
+def delete_upload(upload_id):
+    """Cancela una subida y borra lo recibido"""
+    meta, error_response = _load_upload(upload_id)
+    if error_response:
+        return error_response
+    upload_store.discard(upload_id)
+    return jsonify({"success": True, "upload_id": upload_id})
+
+
+@analysis_bp.route("/uploads/<upload_id>/complete", methods=["POST"])
+@token_required
+def complete_upload(upload_id):
+    """
+    Cierra una subida completa y la analiza (misma respuesta que /analyze).
+    Body JSON opcional: {"sha256": "...", "parameters": {...}}
+    Si se envía sha256 y no coincide con el calculado, se descarta la subida.
+    """
+    ip = get_request_ip()
+    meta, error_response = _load_upload(upload_id)
+    if error_response:
+        return error_response
+
+    data = request.get_json(silent=True) or {}
+    parameters, error_response = _validate_parameters(data.get('parameters') or {})
+    if error_response:
+        return error_response
+
+    try:
+        # El hash ya se calculó al recibir las partes: si el contenido está
+        # en el almacén, la subida se descarta sin escribir nada
+        meta, file_path = upload_store.finish(
+            upload_id,
+            lambda data_path, session: content_store.adopt(data_path, session['sha256'], session['filename'])[0],
+            data.get('sha256')
+        )
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return _analyze_saved_file(
+            file_path, meta['filename'], meta['company_id'], parameters, ip, meta['sha256']
+        )
+    except Exception as e:
+        logger.error(f"❌ Error during analysis: {str(e)}", exc_info=True)
+        audit_logger.log_analysis(meta['company_id'], meta['filename'], False, ip, str(e))
+        return jsonify({
+            "error": "Analysis failed",
+            "message": sanitize_error_message(str(e))
+        }), 500
+
+
+@analysis_bp.route("/analyze/batch", methods=["POST"])
+@token_required
+def analyze_batch():
+    """
+    Analiza todos los experimentos de una subida en paralelo.
+    Un ZIP con varios experimentos Bruker numerados (un rack de muestras)
+    o un ser pseudo-2D produce una medición por experimento/fila.
+    REQUIERE: 'file' y 'company_id' en multipart/form-data
+    """
+    from app import NumpyJSONEncoder
+
+    ip = get_request_ip()
+
+    try:
+        file, company_id, error_response = _validate_upload(ip)
+        if error_response:
+            return error_response
+
+        parameters, error_response = _parse_parameters()
+        if error_response:
+            return error_response
+
+        _, file_path, _ = content_store.put_stream(file.stream, file.filename)
+        logger.debug(f"File stored: {file_path}")
+
+        analysis_params = config.get_analysis_params()
+        params = {
+            'fluor_range': parameters.get("fluor_range", analysis_params.get('fluor_range')),
+            'pifas_range': parameters.get("pifas_range", analysis_params.get('pifas_range')),
+            'concentration': parameters.get("concentration", analysis_params.get('default_concentration'))
         }
 
-        measurement_id = db.save_measurement(measurement_data)
-        logger.info(f"📊 Measurement saved: ID {measurement_id}")
-        
-        audit_logger.log_analysis(company_id, file.filename, True, ip)
+        with staged_datasets(file_path, all_datasets=True) as datasets:
+            tasks = plan_batch_tasks(datasets)
+            n_spectra = sum(task['rows'] for task in tasks)
+            if n_spectra > app_config.BATCH_MAX_SPECTRA:
+                return jsonify({
+                    "error": f"Too many spectra in one upload (max {app_config.BATCH_MAX_SPECTRA})"
+                }), 400
 
-        # Sincronización
-        measurement_data['measurement_id_local'] = measurement_id
-        
-        try:
-            sync_thread = threading.Thread(
-                target=push_to_google_cloud,
-                args=(app_config.GOOGLE_SCRIPT_URL, measurement_data, NumpyJSONEncoder, measurement_id, db)
+            logger.info(
+                f"📊 Batch analysis: {file.filename} for {company_id} "
+                f"({len(datasets)} experiments, {n_spectra} spectra)"
+            )
+            batch_results = run_batch(tasks, params)
+
+        measurements = []
+        for item in batch_results:
+            label = f"{file.filename}/{item['name']}"
+            result_stem = f"{Path(file.filename).stem}_{item['name']}"
+            if item.get('row') is not None:
+                label += f"#{item['row'] + 1}"
+                result_stem += f"_{item['row'] + 1}"
+
+            results = item.get('results')
+            if not results or results.get('error'):
+                error = item.get('error') or (results or {}).get('error', 'Analysis failed')
+                measurements.append({"name": label, "error": sanitize_error_message(error)})
+                continue
+
+            _enrich_compounds(results)
+            measurement_id, result_filename = _save_analysis(
+                results, company_id, label, NumpyJSONEncoder, result_stem
             )
-            sync_thread.start()
-            logger.debug(f"🚀 Cloud sync started for {measurement_id}")
-        except Exception as thread_err:
-            logger.error(f"❌ Failed to start sync: {thread_err}")
+            measurements.append({
+                "name": label,
+                "measurement_id": measurement_id,
+                "result_file": result_filename,
+                "fluor_percentage": results.get('fluor_percentage'),
+                "pifas_percentage": results.get('pifas_percentage'),
+                "pifas_concentration": results.get('pifas_concentration'),
+                "quality_score": results.get('quality_score'),
+                "pfas_detected": results.get('pfas_detection', {}).get('total_detected', 0)
+            })
 
-        # Respuesta
-        results['measurement_id'] = measurement_id
-        results['result_file'] = result_filename
-        results['saved_company_id'] = company_id
+        succeeded = sum(1 for m in measurements if 'measurement_id' in m)
+        audit_logger.log_analysis(
+            company_id, file.filename, succeeded > 0, ip,
+            None if succeeded == len(measurements) else f"{len(measurements) - succeeded} failed"
+        )
 
-        return jsonify(results)
+        return jsonify({
+            "company_id": company_id,
+            "filename": file.filename,
+            "total": len(measurements),
+            "succeeded": succeeded,
+            "failed": len(measurements) - succeeded,
+            "measurements": measurements
+        })
 
+    except ValueError as e:
+        logger.warning(f"⚠️ Batch upload rejected: {e}")
+        return jsonify({"error": sanitize_error_message(str(e))}), 400
     except Exception as e:
-        logger.error(f"❌ Error during analysis: {str(e)}", exc_info=True)
-        
+        logger.error(f"❌ Error during batch analysis: {str(e)}", exc_info=True)
+
         audit_logger.log_analysis(
             request.form.get("company_id", "unknown"),
-            file.filename if 'file' in locals() else "unknown",
+            file.filename if 'file' in locals() and file else "unknown",
             False,
             ip,
             str(e)
         )
-        
+
+        return jsonify({
+            "error": "Batch analysis failed",
+            "message": sanitize_error_message(str(e))
+        }), 500
+
+
+def _comparable_results(results):
+    """Resultados sin el espectro y con tipos JSON nativos (base de comparación)"""
+    summary = {k: v for k, v in results.items() if k != 'spectrum'}
+    return loads(dumps_bytes(summary))
+
+
+def _diff_results(previous, current):
+    """Campos de primer nivel nuevos o modificados, y campos eliminados"""
+    changed = {k: v for k, v in current.items() if previous.get(k) != v}
+    removed = [k for k in previous if k not in current]
+    return changed, removed
+
+
+def _stored_range(region, default):
+    """Rango {'min', 'max'} de una región del análisis guardado (ppm_range)"""
+    ppm_range = region.get('ppm_range') if isinstance(region, dict) else None
+    if isinstance(ppm_range, (list, tuple)) and len(ppm_range) == 2:
+        return {'min': float(ppm_range[0]), 'max': float(ppm_range[1])}
+    return default
+
+
+def _session_from_measurement(measurement_id):
+    """
+    Sesión interactiva a partir del espectro guardado en la BD (la caché en
+    memoria caducó o la medición no se analizó en este proceso).
+
+    Returns:
+        (sesión, None) o (None, respuesta de error)
+    """
+    measurement = db.get_measurement(measurement_id)
+    if not measurement:
+        return None, (jsonify({"error": "Measurement not found"}), 404)
+
+    token_company = request.jwt_payload.get('company_id')
+    if token_company != measurement['company_id'] and token_company != 'ADMIN':
+        return None, (jsonify({"error": "No autorizado"}), 403)
+
+    spectrum = measurement.get('spectrum') or {}
+    if len(spectrum.get('ppm') or []) < 2:
+        return None, (jsonify({"error": "Medición sin espectro guardado"}), 422)
+
+    # El espectro guardado ya tiene el baseline corregido (no se vuelve a
+    # restar); rangos, concentración y metadatos del lector se recuperan del
+    # análisis guardado para que sin cambios el resultado sea el mismo
+    analysis = measurement.get('analysis') or {}
+    analysis_params = config.get_analysis_params()
+    params = {
+        'fluor_range': _stored_range(analysis.get('fluor_total'), analysis_params.get('fluor_range')),
+        'pifas_range': _stored_range(analysis.get('pifas'), analysis_params.get('pifas_range')),
+        'concentration': analysis.get('concentration', analysis_params.get('default_concentration')),
+        'baseline_correction': False
+    }
+    metadata = {
+        'resolution': analysis.get('spectrum_resolution'),
+        'phase': analysis.get('phase_correction')
+    }
+    previous = {k: v for k, v in analysis.items() if k != 'spectrum'}
+
+    session_id = spectrum_cache.put(
+        np.asarray(spectrum['ppm'], dtype=np.float64),
+        np.asarray(spectrum['intensity'], dtype=np.float64),
+        measurement['company_id'], params, previous,
+        metadata=metadata, measurement_id=measurement_id,
+        filename=analysis.get('file_name', measurement['filename'])
+    )
+    session = spectrum_cache.get(session_id) if session_id else None
+    if session is None:
+        return None, (jsonify({"error": "Spectrum cache disabled"}), 503)
+    session['source'] = 'database'
+    return session, None
+
+
+def _get_interactive_analyzer():
+    global _interactive_analyzer
+    if _interactive_analyzer is None:
+        from app import SpectrumAnalyzer
+        _interactive_analyzer = SpectrumAnalyzer()
+    return _interactive_analyzer
+
+
+@analysis_bp.route("/analyze/interactive", methods=["POST"])
+@token_required
+def analyze_interactive():
+    """
+    Ajuste interactivo de parámetros: recalcula un análisis a partir del
+    espectro que ya tiene el servidor, sin volver a subir el archivo.
+    Body JSON: session_id (de /analyze) o measurement_id, y parameters
+    (fluor_range, pifas_range, concentration).
+    Devuelve solo los campos de resultados que cambian respecto a la
+    respuesta anterior de la misma sesión. No guarda una medición nueva.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id')
+        measurement_id = data.get('measurement_id')
+
+        parameters, error_response = _validate_parameters(data.get('parameters') or {})
+        if error_response:
+            return error_response
+        unknown = [k for k in parameters if k not in INTERACTIVE_PARAM_KEYS]
+        if unknown:
+            return jsonify({"error": f"Unsupported parameters: {', '.join(unknown)}"}), 400
+
+        if session_id:
+            session = spectrum_cache.get(str(session_id))
+            if session is None:
+                # El cliente puede reintentar con measurement_id
+                return jsonify({"error": "Analysis session expired"}), 404
+        elif measurement_id is not None:
+            try:
+                measurement_id = int(measurement_id)
+            except (TypeError, ValueError):
+                return jsonify({"error": "Invalid measurement_id"}), 400
+            session = spectrum_cache.get_by_measurement(measurement_id)
+            if session is None:
+                session, error_response = _session_from_measurement(measurement_id)
+                if error_response:
+                    return error_response
+        else:
+            return jsonify({"error": "Provide 'session_id' or 'measurement_id'"}), 400
+
+        token_company = request.jwt_payload.get('company_id')
+        if token_company != session['company_id'] and token_company != 'ADMIN':
+            return jsonify({"error": "No autorizado"}), 403
+
+        params = {**session['params'], **parameters}
+        params['concentration'] = float(params['concentration'])
+
+        with session['lock']:
+            with _interactive_lock:
+                analyzer = _get_interactive_analyzer()
+                results = analyzer.analyze_spectrum_data(
+                    session['ppm'], session['intensity'],
+                    session['filename'] or f"measurement_{session['measurement_id']}",
+                    metadata=session['metadata'], **params
+                )
+                reused = list(analyzer.pipeline.last_run['reused'])
+
+            if not results or results.get('error'):
+                return jsonify({
+                    "error": "Analysis failed",
+                    "message": sanitize_error_message((results or {}).get('error', 'No results'))
+                }), 422
+
+            if params.get('baseline_correction') is False:
+                # Espectro de la BD: el baseline se corrigió en el análisis original
+                for key in ('baseline_corrected', 'baseline_value'):
+                    if key in session['results']:
+                        results[key] = session['results'][key]
+
+            _enrich_compounds(results)
+            current = _comparable_results(results)
+            changed, removed = _diff_results(session['results'], current)
+            spectrum_cache.update(session['session_id'], params, current)
+
+        version = requested_version(request)
+        if version == 2:
+            changed = compact_result(changed)
+            removed = [key for key in removed if key not in RESULT_ALIASES]
+
+        metrics.incr('analysis.interactive')
+        return mark_version(jsonify({
+            "session_id": session['session_id'],
+            "measurement_id": session['measurement_id'],
+            "source": session.get('source', 'memory'),
+            "parameters": params,
+            "changed": changed,
+            "removed": removed,
+            "reused_stages": reused
+        }), version)
+
+    except Exception as e:
+        logger.error(f"❌ Error during interactive analysis: {str(e)}", exc_info=True)
         return jsonify({
             "error": "Analysis failed",
             "message": sanitize_error_message(str(e))
@@ -213,13 +900,27 @@ def analyze_spectrum():
 def get_history():
     """
     Obtener historial de mediciones para una empresa
-    Query Parameters: company_id, page, page_size, search
+    Query Parameters: company_id, page, page_size, search,
+    pifas_min, pifas_max, quality_min, quality_max, date_from, date_to,
+    include (v2: analysis, peaks, spectrum, molecule_info)
     """
     try:
+        version = requested_version(request)
+        include = requested_projections(request) if version == 2 else ()
+        summary = version == 2 and not include
         company_id = request.args.get('company_id')
         page = request.args.get('page', 1, type=int)
         page_size = request.args.get('page_size', 50, type=int)
         search_term = request.args.get('search', '').strip()
+        filters = {
+            'pifas_min': request.args.get('pifas_min', type=float),
+            'pifas_max': request.args.get('pifas_max', type=float),
+            'quality_min': request.args.get('quality_min', type=float),
+            'quality_max': request.args.get('quality_max', type=float),
+            'date_from': request.args.get('date_from') or None,
+            'date_to': request.args.get('date_to') or None,
+        }
+        filters = {key: value for key, value in filters.items() if value is not None}
 
         if not company_id:
             return jsonify({
@@ -246,36 +947,42 @@ def get_history():
 
         offset = (page - 1) * page_size
 
-        if search_term:
+        if search_term or filters:
             measurement_data = db.get_measurements_with_search(
                 company_id=company_id,
                 search_term=search_term,
                 limit=page_size,
-                offset=offset
+                offset=offset,
+                filters=filters,
+                summary=summary
             )
             total_count = db.count_measurements_with_search(
                 company_id=company_id,
-                search_term=search_term
+                search_term=search_term,
+                filters=filters
             )
         else:
             measurement_data = db.get_measurements(
                 company_id=company_id,
                 limit=page_size,
-                offset=offset
+                offset=offset,
+                summary=summary
             )
             total_count = db.count_measurements(company_id=company_id)
 
         total_pages = (total_count + page_size - 1) // page_size if total_count > 0 else 0
         measurements = measurement_data.get('measurements', [])
+        if version == 2:
+            measurements = [compact_measurement(m, include) for m in measurements]
 
-        return jsonify({
+        return mark_version(jsonify({
             "measurements": measurements,
             "page": page,
             "page_size": page_size,
             "total_pages": total_pages,
             "total_items": total_count,
             "company_id": company_id
-        }), 200
+        }), version), 200
 
     except Exception as e:
         logger.error(f"❌ Error in get_history: {str(e)}", exc_info=True)
@@ -0,0 +1,69 @@
+"""
+Rutas de consulta del registro de auditoría (solo ADMIN)
+"""
+from datetime import datetime, timedelta
+from flask import Blueprint, jsonify, request
+import logging
+
+from auth import token_required
+from audit_logger import audit_logger
+from audit_store import get_audit_store
+
+audit_bp = Blueprint('audit', __name__)
+logger = logging.getLogger(__name__)
+
+
+def _parse_bound(value, end=False):
+    """
+    'YYYY-MM-DD' o fecha-hora ISO → cota ISO para comparar con timestamp.
+    Un día suelto como date_to incluye el día completo. ValueError si no es válida.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.isoformat()
+
+
+@audit_bp.route("/audit/events", methods=["GET"])
+@token_required
+def get_audit_events():
+    """
+    Eventos de auditoría filtrados y paginados (más recientes primero)
+    Query Parameters: event_type, user, ip, level, date_from, date_to,
+    page, page_size
+    Ej.: logins fallidos desde una IP → event_type=LOGIN&level=WARNING&ip=...
+    Con varios procesos worker el resultado es consistente con retraso: los
+    eventos de otros workers aparecen tras su siguiente volcado.
+    """
+    if request.jwt_payload.get('company_id') != 'ADMIN':
+        return jsonify({"error": "Solo admin puede consultar la auditoría"}), 403
+
+    try:
+        try:
+            since = _parse_bound(request.args.get('date_from'))
+            until = _parse_bound(request.args.get('date_to'), end=True)
+        except ValueError:
+            return jsonify({"error": "Invalid date (expected YYYY-MM-DD or ISO datetime)"}), 400
+
+        page = max(request.args.get('page', 1, type=int), 1)
+        page_size = request.args.get('page_size', 50, type=int)
+        if page_size < 1 or page_size > 500:
+            page_size = 50
+
+        filters = {
+            'event_type': (request.args.get('event_type') or '').upper() or None,
+            'user': request.args.get('user'),
+            'ip': request.args.get('ip'),
+            'level': (request.args.get('level') or '').upper() or None,
+        }
+
+        # Incluir los eventos que aún esperan en el lote de este proceso; los
+        # de otros workers (serve.py) llegan en AUDIT_DB_FLUSH_SECONDS como mucho
+        audit_logger.flush()
+        return jsonify(get_audit_store().query(filters, since, until, page, page_size))
+
+    except Exception as e:
+        logger.error(f"❌ Error in get_audit_events: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
@@ -0,0 +1,131 @@
+"""
+Rutas de consulta de compuestos detectados entre muestras
+(apariciones y tendencias por compuesto)
+"""
+from flask import Blueprint, jsonify, request
+import logging
+
+from auth import token_required
+from company_data import COMPANY_PROFILES
+from database import get_db
+
+compound_bp = Blueprint('compound', __name__)
+logger = logging.getLogger(__name__)
+
+db = get_db()
+
+
+def _authorize_company():
+    """
+    Valida 'company' y que el token pueda consultarla.
+
+    Returns:
+        (company_id, None) o (None, respuesta de error)
+    """
+    company_id = request.args.get('company')
+    if not company_id:
+        return None, (jsonify({"error": "Missing 'company' parameter"}), 400)
+
+    if company_id not in COMPANY_PROFILES:
+        return None, (jsonify({"error": f"Invalid company ID: '{company_id}'"}), 404)
+
+    token_company = request.jwt_payload.get('company_id')
+    if token_company != company_id and token_company != 'ADMIN':
+        logger.warning(f"⚠️ Access denied: {token_company} → {company_id}")
+        return None, (jsonify({"error": "No autorizado"}), 403)
+
+    return company_id, None
+
+
+def _common_filters():
+    """Filtros comunes: min_confidence (%), date_from, date_to"""
+    return {
+        'min_confidence': request.args.get('min_confidence', type=float),
+        'date_from': request.args.get('date_from') or None,
+        'date_to': request.args.get('date_to') or None,
+    }
+
+
+@compound_bp.route("/compounds", methods=["GET"])
+@token_required
+def get_compounds():
+    """
+    Compuestos detectados en las mediciones de una empresa
+    Query Parameters: company, min_confidence, date_from, date_to
+    """
+    company_id, error_response = _authorize_company()
+    if error_response:
+        return error_response
+
+    try:
+        compounds = db.get_compound_summary(company_id, **_common_filters())
+        return jsonify({"company_id": company_id, "compounds": compounds})
+    except Exception as e:
+        logger.error(f"❌ Error in get_compounds: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@compound_bp.route("/compounds/<compound>/occurrences", methods=["GET"])
+@token_required
+def get_compound_occurrences(compound):
+    """
+    Mediciones en las que aparece un compuesto (nombre o CAS)
+    Query Parameters: company, min_confidence, date_from, date_to, page, per_page
+    """
+    company_id, error_response = _authorize_company()
+    if error_response:
+        return error_response
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', 50, type=int)
+    if per_page < 1 or per_page > 500:
+        per_page = 50
+
+    try:
+        data = db.get_compound_occurrences(
+            compound, company_id,
+            limit=per_page, offset=(page - 1) * per_page,
+            **_common_filters()
+        )
+        total = data['total']
+        return jsonify({
+            "compound": compound,
+            "company_id": company_id,
+            "occurrences": data['occurrences'],
+            "page": page,
+            "per_page": per_page,
+            "total_items": total,
+            "total_pages": (total + per_page - 1) // per_page
+        })
+    except Exception as e:
+        logger.error(f"❌ Error in get_compound_occurrences: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@compound_bp.route("/compounds/<compound>/trend", methods=["GET"])
+@token_required
+def get_compound_trend(compound):
+    """
+    Evolución de las detecciones de un compuesto por periodo
+    Query Parameters: company, bucket (day|week|month|quarter|year),
+    min_confidence, date_from, date_to
+    """
+    company_id, error_response = _authorize_company()
+    if error_response:
+        return error_response
+
+    bucket = request.args.get('bucket', 'month')
+    if bucket not in db.TREND_BUCKETS:
+        return jsonify({"error": f"Invalid bucket: '{bucket}'"}), 400
+
+    try:
+        trend = db.get_compound_trend(compound, company_id, bucket=bucket, **_common_filters())
+        return jsonify({
+            "compound": compound,
+            "company_id": company_id,
+            "bucket": bucket,
+            "trend": trend
+        })
+    except Exception as e:
+        logger.error(f"❌ Error in get_compound_trend: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
@@ -6,6 +6,8 @@ import logging
 
 from config_manager import get_config_manager, LicenseValidator
 from company_data import COMPANY_PROFILES
+from reanalysis import get_reanalysis_manager, params_require_reanalysis
+import config as app_config
 
 config_bp = Blueprint('config', __name__)
 logger = logging.getLogger(__name__)
@@ -89,11 +91,24 @@ def update_config():
         response_config = {}
 
         if 'analysis_params' in data and isinstance(data['analysis_params'], dict):
+            old_params = config.get_analysis_params()
             config.update_analysis_params(data['analysis_params'])
             logger.info(f"Analysis parameters updated: {data['analysis_params']}")
             response_config['analysis_params'] = config.get_analysis_params()
             updated_any = True
 
+            # Re-analizar el histórico con los nuevos parámetros (opcional)
+            if app_config.REANALYZE_ON_PARAMS_CHANGE and params_require_reanalysis(
+                old_params, response_config['analysis_params']
+            ):
+                try:
+                    job = get_reanalysis_manager().start(
+                        response_config['analysis_params'], reason='analysis_params'
+                    )
+                    response_config['reanalysis_job'] = job
+                except RuntimeError as e:
+                    logger.warning(f"⚠️ Re-análisis no lanzado: {e}")
+
         if not updated_any:
             return jsonify({"message": "No valid parameters to update"}), 400
 
@@ -0,0 +1,71 @@
+"""
+Rutas del dashboard (estadísticas agregadas en el servidor)
+"""
+from flask import Blueprint, jsonify, request
+from datetime import date
+import logging
+
+from auth import token_required
+from company_data import COMPANY_PROFILES
+from database import get_db
+
+dashboard_bp = Blueprint('dashboard', __name__)
+logger = logging.getLogger(__name__)
+
+db = get_db()
+
+
+def _parse_day(value):
+    """'YYYY-MM-DD' → misma cadena, o ValueError"""
+    return date.fromisoformat(value).isoformat() if value else None
+
+
+@dashboard_bp.route("/dashboard/stats", methods=["GET"])
+@token_required
+def get_dashboard_stats():
+    """
+    Estadísticas del dashboard calculadas en SQL sobre las tablas
+    materializadas por empresa y día (no descarga mediciones).
+    Query Parameters: company, date_from, date_to (YYYY-MM-DD),
+    bucket (day|week|month|quarter|year), recent
+    """
+    try:
+        company_id = request.args.get('company')
+        if not company_id:
+            return jsonify({"error": "Missing 'company' parameter"}), 400
+
+        if company_id not in COMPANY_PROFILES:
+            return jsonify({"error": f"Invalid company ID: '{company_id}'"}), 404
+
+        token_company = request.jwt_payload.get('company_id')
+        if token_company != company_id and token_company != 'ADMIN':
+            logger.warning(f"⚠️ Access denied: {token_company} → {company_id}")
+            return jsonify({"error": "No autorizado"}), 403
+
+        try:
+            date_from = _parse_day(request.args.get('date_from'))
+            date_to = _parse_day(request.args.get('date_to'))
+        except ValueError:
+            return jsonify({"error": "Invalid date (expected YYYY-MM-DD)"}), 400
+
+        bucket = request.args.get('bucket', 'day')
+        if bucket not in db.TREND_BUCKETS:
+            return jsonify({"error": f"Invalid bucket: '{bucket}'"}), 400
+
+        recent = min(max(request.args.get('recent', 10, type=int), 0), 100)
+
+        stats = db.get_dashboard_stats(
+            company_id, date_from=date_from, date_to=date_to,
+            bucket=bucket, recent=recent
+        )
+        stats.update({
+            "company_id": company_id,
+            "date_from": date_from,
+            "date_to": date_to,
+            "bucket": bucket
+        })
+        return jsonify(stats)
+
+    except Exception as e:
+        logger.error(f"❌ Error in get_dashboard_stats: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
@@ -1,18 +1,58 @@
 """
 Rutas de exportación de reportes (PDF, DOCX, CSV, JSON)
 """
-from flask import Blueprint, jsonify, request, send_file, current_app
+from flask import Blueprint, Response, jsonify, request, send_file, current_app, stream_with_context
 from pathlib import Path
 from datetime import datetime
 import logging
 import base64
+import csv
+import io
+import json
 
 from auth import token_required
+from audit_logger import audit_logger, get_request_ip
+from company_data import COMPANY_PROFILES
 from export_utils import ReportExporter
+from chart_renderer import get_chart_cache
+from database import get_db
+from utils.report_cache import ReportCache, get_report_cache
 
 export_bp = Blueprint('export', __name__)
 logger = logging.getLogger(__name__)
 
+db = get_db()
+
+
+def _authorized_chart_header(measurement_id):
+    """
+    Cabecera de la medición cuyo gráfico se renderiza en el servidor, o None
+    si el id no es válido, no existe o el token no tiene acceso a ella.
+    """
+    try:
+        measurement_id = int(measurement_id)
+    except (TypeError, ValueError):
+        logger.warning(f"measurement_id inválido para gráfico: {measurement_id}")
+        return None
+
+    header = db.get_measurement_header(measurement_id)
+    if not header:
+        logger.warning(f"Medición {measurement_id} no encontrada para gráfico")
+        return None
+
+    token_company = request.jwt_payload.get('company_id')
+    if token_company != 'ADMIN' and header['company_id'] != token_company:
+        logger.warning(f"⚠️ Gráfico denegado: {token_company} → {header['company_id']}")
+        return None
+    return header
+
+
+def get_measurement_chart(header):
+    """PNG del espectro de una medición ya autorizada (_authorized_chart_header)"""
+    if header is None:
+        return None
+    return get_chart_cache().get_chart(header, lambda: db.get_measurement(header['id']))
+
 
 @export_bp.route("/export", methods=["POST"])
 @token_required
@@ -20,6 +60,8 @@ def export_report():
     """
     Exportar reporte (single, comparison, dashboard)
     Body: format, type, lang, company_data, results/samples/stats
+    Opcional (single): measurement_id en lugar de chart_image para que el
+    gráfico se renderice en el servidor
     """
     try:
         data = request.get_json()
@@ -74,6 +116,37 @@ def export_report():
 
         output = None
         filename_prefix = f"CraftRMN_{export_type}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        filename = f"{filename_prefix}.{extensions[format_type]}"
+
+        # Gráfico renderizado en el servidor (single sin chart_image): el
+        # acceso a la medición se comprueba antes de consultar la caché
+        chart_header = None
+        if export_type == "single" and not data.get("chart_image") and data.get("measurement_id") is not None:
+            chart_header = _authorized_chart_header(data.get("measurement_id"))
+
+        # Caché de reportes renderizados (PDF/DOCX)
+        report_cache = get_report_cache()
+        cache_key = None
+        if format_type in ReportCache.CACHEABLE_FORMATS:
+            logo_mtime = None
+            if company_logo_server_path:
+                logo_mtime = Path(company_logo_server_path).stat().st_mtime_ns
+            # La clave incluye la versión de la medición autorizada (o None):
+            # sin acceso no se comparte la entrada de quien sí lo tiene
+            chart_version = None
+            if chart_header is not None:
+                chart_version = [chart_header['id'], chart_header.get('updated_at')]
+            cache_key = report_cache.make_key(data, logo_mtime, chart_version)
+
+            cached_report = report_cache.get(cache_key)
+            if cached_report is not None:
+                logger.info(f"♻️ Reporte servido desde caché: {filename}")
+                return send_file(
+                    io.BytesIO(cached_report),
+                    mimetype=mime_types[format_type],
+                    as_attachment=True,
+                    download_name=filename
+                )
 
         # Función helper para convertir imágenes 2D a Base64
         def convert_image_paths_to_base64(results_obj):
@@ -152,6 +225,10 @@ def export_report():
             chart_image_base64 = data.get("chart_image")
             chart_image_bytes = ReportExporter.base64_to_bytes(chart_image_base64) if chart_image_base64 else None
 
+            # Sin imagen del navegador: renderizar en el servidor por measurement_id
+            if chart_image_bytes is None:
+                chart_image_bytes = get_measurement_chart(chart_header)
+
             if format_type == "pdf":
                 output = ReportExporter.export_pdf(results, company_data, chart_image_bytes, lang)
             elif format_type == "docx":
@@ -171,7 +248,10 @@ def export_report():
             logger.error(f"Export generation failed")
             return jsonify({"error": f"Failed to generate export file"}), 500
 
-        filename = f"{filename_prefix}.{extensions[format_type]}"
+        if cache_key:
+            report_cache.put(cache_key, output.getvalue())
+            output.seek(0)
+
         logger.info(f"✅ Sending: {filename}")
 
         return send_file(
@@ -183,4 +263,120 @@ def export_report():
 
     except Exception as e:
         logger.error(f"❌ Error during export: {str(e)}", exc_info=True)
-        return jsonify({"error": f"Export failed: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Export failed: {str(e)}"}), 500
+
+
+# ============================================================================
+# EXPORTACIÓN MASIVA EN STREAMING (historial completo)
+# ============================================================================
+
+HISTORY_EXPORT_FIELDS = (
+    ('id', 'id'),
+    ('timestamp', 'timestamp'),
+    ('company_id', 'company_id'),
+    ('device_id', 'device_id'),
+    ('filename', 'filename'),
+    ('fluor_percentage', 'fluor_percentage'),
+    ('pfas_percentage', 'pifas_percentage'),
+    ('pfas_concentration', 'pifas_concentration'),
+    ('concentration', 'concentration'),
+    ('quality_score', 'quality_score'),
+    ('synced', 'synced'),
+)
+
+# Filas por fragmento enviado al cliente
+STREAM_FLUSH_ROWS = 200
+
+
+def _generate_history_csv(rows):
+    """Genera el CSV por fragmentos (memoria constante)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in HISTORY_EXPORT_FIELDS])
+
+    pending = 0
+    for row in rows:
+        writer.writerow([row[column] for _, column in HISTORY_EXPORT_FIELDS])
+        pending += 1
+        if pending >= STREAM_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield buffer.getvalue()
+
+
+def _generate_history_ndjson(rows):
+    """Genera NDJSON (un objeto JSON por línea) por fragmentos"""
+    lines = []
+    for row in rows:
+        record = {name: row[column] for name, column in HISTORY_EXPORT_FIELDS}
+        record['synced'] = bool(record['synced'])
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= STREAM_FLUSH_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+@export_bp.route("/export/history", methods=["GET"])
+@token_required
+def export_history():
+    """
+    Exporta el historial de mediciones en streaming directamente desde SQLite
+    Query Parameters: company, from, to (ISO), format (csv | ndjson)
+    """
+    try:
+        company_id = request.args.get('company')
+        format_type = request.args.get('format', 'csv').lower()
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+
+        if not company_id:
+            return jsonify({"error": "Missing 'company' parameter"}), 400
+
+        if company_id not in COMPANY_PROFILES:
+            return jsonify({"error": f"Invalid company ID: '{company_id}'"}), 404
+
+        token_company = request.jwt_payload.get('company_id')
+        if token_company != company_id and token_company != 'ADMIN':
+            logger.warning(f"⚠️ History export denied: {token_company} → {company_id}")
+            return jsonify({"error": "No autorizado"}), 403
+
+        for value in (date_from, date_to):
+            if value:
+                try:
+                    datetime.fromisoformat(value)
+                except ValueError:
+                    return jsonify({"error": f"Invalid date: '{value}'"}), 400
+
+        generators = {
+            "csv": (_generate_history_csv, "text/csv", "csv"),
+            "ndjson": (_generate_history_ndjson, "application/x-ndjson", "ndjson"),
+        }
+        if format_type not in generators:
+            return jsonify({"error": f"Unsupported format: '{format_type}'"}), 400
+
+        generate, mimetype, extension = generators[format_type]
+        rows = db.iter_measurements(
+            company_id=company_id,
+            date_from=date_from,
+            date_to=date_to
+        )
+
+        filename = f"CraftRMN_history_{company_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        logger.info(f"📤 History export: {company_id} ({date_from} → {date_to}) as {format_type}")
+        audit_logger.log_export(company_id, 'history', format_type, get_request_ip())
+
+        return Response(
+            stream_with_context(generate(rows)),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Error during history export: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Export failed: {str(e)}"}), 500
@@ -1,40 +1,51 @@
 """
-Rutas del frontend (static files, health check)
+Rutas del frontend (static files, health check, metrics)
 """
-from flask import Blueprint, jsonify, send_from_directory
+from flask import Blueprint, jsonify, request
 from datetime import datetime
 import logging
 
+from auth import token_required
+from middleware.http_cache import serve_static
+from utils.metrics import metrics
+from utils.report_cache import get_report_cache
+
 frontend_bp = Blueprint('frontend', __name__)
 logger = logging.getLogger(__name__)
 
 
+def _serve_frontend_file(path):
+    """Archivo del frontend o 404 JSON si no existe"""
+    from flask import current_app
+
+    response = serve_static(current_app.static_folder, path)
+    if response is None:
+        return jsonify({"error": "File not found"}), 404
+    return response
+
+
 @frontend_bp.route('/')
 def home():
     """Servir index.html (Portal de Login)"""
-    from flask import current_app
-    return send_from_directory(current_app.static_folder, "index.html")
+    return _serve_frontend_file("index.html")
 
 
 @frontend_bp.route('/app.html')
 def main_app():
     """Servir app.html (Aplicación principal)"""
-    from flask import current_app
-    return send_from_directory(current_app.static_folder, "app.html")
+    return _serve_frontend_file("app.html")
 
 
 @frontend_bp.route('/<path:path>')
 def static_proxy(path):
-    """Servir archivos estáticos (JS, CSS, imágenes)"""
-    from flask import current_app
-    
+    """
+    Servir archivos estáticos (JS, CSS, imágenes) comprimidos y con
+    ETag/Cache-Control (middleware/http_cache.py)
+    """
     if path in ["index.html", "app.html"]:
         return home()
     
-    try:
-        return send_from_directory(current_app.static_folder, path)
-    except FileNotFoundError:
-        return jsonify({"error": "File not found"}), 404
+    return _serve_frontend_file(path)
 
 
 @frontend_bp.route("/api/health", methods=["GET"])
@@ -45,4 +56,17 @@ def health_check():
         "message": "CraftRMN Analysis Server Running (Multi-Empresa)",
         "version": "2.0.0",
         "timestamp": datetime.now().isoformat()
-    })
\ No newline at end of file
+    })
+
+
+@frontend_bp.route("/api/metrics", methods=["GET"])
+@token_required
+def get_metrics():
+    """Métricas internas del servidor (admin only)"""
+    if request.jwt_payload.get('company_id') != 'ADMIN':
+        return jsonify({"error": "Solo admin puede ver métricas"}), 403
+
+    snapshot = metrics.snapshot()
+    snapshot['report_cache'] = get_report_cache().stats()
+    snapshot['timestamp'] = datetime.now().isoformat()
+    return jsonify(snapshot)
@@ -1,12 +1,24 @@
 """
 Rutas de gestión de mediciones (CRUD)
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
 import logging
 
 from auth import token_required
+from chart_renderer import get_chart_cache
 from company_data import COMPANY_PROFILES
 from database import get_db
+from utils.spectrum_cache import get_spectrum_cache
+from utils.spectrum_encoding import (
+    SPECTRUM_ENCODING_HEADER, OCTET_MIMETYPE, ARROW_MIMETYPE,
+    requested_encoding, encode_payload_spectra, spectrum_arrays,
+    to_octet_stream, to_arrow_ipc, negotiate_mimetype
+)
+from middleware.http_cache import measurement_etag, not_modified
+from utils.response_schema import (
+    DETAIL_PROJECTIONS, requested_version, requested_projections,
+    compact_measurement, mark_version
+)
 
 measurement_bp = Blueprint('measurement', __name__)
 logger = logging.getLogger(__name__)
@@ -19,9 +31,12 @@ db = get_db()
 def get_measurements():
     """
     Obtener lista de mediciones filtrada por empresa
-    Query Parameters: company, page, per_page
+    Query Parameters: company, page, per_page,
+    include (v2: analysis, peaks, spectrum, molecule_info)
     """
     try:
+        version = requested_version(request)
+        include = requested_projections(request) if version == 2 else ()
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
         company_id = request.args.get('company')
@@ -46,7 +61,8 @@ def get_measurements():
             measurement_data = db.get_measurements(
                 company_id=company_id,
                 limit=per_page,
-                offset=(page - 1) * per_page
+                offset=(page - 1) * per_page,
+                summary=version == 2 and not include
             )
             total_count = db.count_measurements(company_id=company_id)
             total_pages = (total_count + per_page - 1) // per_page
@@ -57,14 +73,18 @@ def get_measurements():
 
         logger.info(f"Returning {len(measurement_data.get('measurements',[]))} measurements")
 
-        return jsonify({
-            "measurements": measurement_data.get('measurements', []),
+        measurements = measurement_data.get('measurements', [])
+        if version == 2:
+            measurements = [compact_measurement(m, include) for m in measurements]
+
+        return mark_version(jsonify({
+            "measurements": measurements,
             "page": page,
             "per_page": per_page,
             "total_items": measurement_data.get('total', 0),
             "total_pages": measurement_data.get('total_pages', 0),
             "company_id_requested": company_id
-        })
+        }), version)
 
     except Exception as e:
         logger.error(f"❌ Error in get_measurements: {str(e)}", exc_info=True)
@@ -94,29 +114,153 @@ def get_measurement(measurement_id):
         logger.debug(f"Fetching measurement {measurement_id} for {requesting_company_id}")
 
         try:
-            measurement = db.get_measurement(measurement_id)
+            header = db.get_measurement_header(measurement_id)
         except Exception as db_err:
             logger.error(f"Database error: {db_err}", exc_info=True)
             return jsonify({"error": "Database query failed"}), 500
 
-        if not measurement:
+        if not header:
             logger.warning(f"Measurement {measurement_id} not found")
             return jsonify({"error": "Measurement not found"}), 404
 
         # Verificar pertenencia
-        actual_company_id = measurement.get('company_id')
+        actual_company_id = header.get('company_id')
         if requesting_company_id != 'ADMIN' and actual_company_id != requesting_company_id:
             logger.warning(f"Access denied: {requesting_company_id} → {actual_company_id}")
             return jsonify({"error": "Access denied"}), 403
 
-        logger.info(f"Returning measurement {measurement_id}")
-        return jsonify(measurement)
+        # ETag desde updated_at: si el cliente ya la tiene no se lee la fila completa
+        version = requested_version(request)
+        encoding = requested_encoding(request)
+        include = requested_projections(request, DETAIL_PROJECTIONS) if version == 2 else ()
+        etag = measurement_etag(header, version, encoding, include)
+        response = not_modified(etag)
+
+        if response is None:
+            try:
+                measurement = db.get_measurement(measurement_id)
+            except Exception as db_err:
+                logger.error(f"Database error: {db_err}", exc_info=True)
+                return jsonify({"error": "Database query failed"}), 500
+
+            if not measurement:
+                logger.warning(f"Measurement {measurement_id} not found")
+                return jsonify({"error": "Measurement not found"}), 404
+
+            logger.info(f"Returning measurement {measurement_id}")
+            if version == 2:
+                measurement = compact_measurement(measurement, include)
+            response = jsonify(encode_payload_spectra(measurement, encoding))
+            response.set_etag(etag, weak=True)
+
+        response.vary.add(SPECTRUM_ENCODING_HEADER)
+        return mark_version(response, version)
 
     except Exception as e:
         logger.error(f"❌ Error in get_measurement: {str(e)}", exc_info=True)
         return jsonify({"error": "An unexpected error occurred"}), 500
 
 
+@measurement_bp.route("/measurements/<int:measurement_id>/chart.png", methods=["GET"])
+@token_required
+def get_measurement_chart(measurement_id):
+    """Gráfico PNG del espectro renderizado en el servidor (cacheado)"""
+    try:
+        header = db.get_measurement_header(measurement_id)
+        if not header:
+            return jsonify({"error": "Measurement not found"}), 404
+
+        token_company = request.jwt_payload.get('company_id')
+        if token_company != 'ADMIN' and header['company_id'] != token_company:
+            logger.warning(f"⚠️ Chart denied: {token_company} → {header['company_id']}")
+            return jsonify({"error": "Access denied"}), 403
+
+        png = get_chart_cache().get_chart(header, lambda: db.get_measurement(measurement_id))
+        if png is None:
+            return jsonify({"error": "Measurement has no spectrum"}), 404
+
+        return Response(png, mimetype='image/png')
+
+    except Exception as e:
+        logger.error(f"❌ Error in get_measurement_chart: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@measurement_bp.route("/measurements/<int:measurement_id>/spectrum", methods=["GET"])
+@token_required
+def get_measurement_spectrum(measurement_id):
+    """
+    Espectro de una medición según Accept: application/octet-stream
+    (float32 LE, ppm[n] + intensity[n]), application/vnd.apache.arrow.stream
+    o application/json
+    """
+    try:
+        header = db.get_measurement_header(measurement_id)
+        if not header:
+            return jsonify({"error": "Measurement not found"}), 404
+
+        token_company = request.jwt_payload.get('company_id')
+        if token_company != 'ADMIN' and header['company_id'] != token_company:
+            logger.warning(f"⚠️ Spectrum denied: {token_company} → {header['company_id']}")
+            return jsonify({"error": "Access denied"}), 403
+
+        mimetype = negotiate_mimetype(request)
+        if mimetype is None:
+            return jsonify({"error": "Not acceptable"}), 406
+
+        etag = measurement_etag(header, 'spectrum', mimetype)
+        cached = not_modified(etag)
+        if cached is not None:
+            cached.vary.add('Accept')
+            return cached
+
+        arrays = spectrum_arrays(db.get_measurement_spectrum(measurement_id))
+        if arrays is None:
+            return jsonify({"error": "Measurement has no spectrum"}), 404
+        ppm, intensity = arrays
+
+        if mimetype == OCTET_MIMETYPE:
+            response = Response(to_octet_stream(ppm, intensity), mimetype=OCTET_MIMETYPE)
+            response.headers['X-Spectrum-Points'] = str(ppm.size)
+            response.headers['X-Spectrum-Layout'] = 'ppm,intensity;float32le'
+        elif mimetype == ARROW_MIMETYPE:
+            response = Response(to_arrow_ipc(ppm, intensity), mimetype=ARROW_MIMETYPE)
+        else:
+            response = jsonify({"measurement_id": measurement_id, "ppm": ppm, "intensity": intensity})
+
+        response.set_etag(etag, weak=True)
+        response.vary.add('Accept')
+        return response
+
+    except Exception as e:
+        logger.error(f"❌ Error in get_measurement_spectrum: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@measurement_bp.route("/measurements/<int:measurement_id>/analyses", methods=["GET"])
+@token_required
+def get_measurement_analyses(measurement_id):
+    """Resultados versionados de re-análisis de una medición"""
+    try:
+        header = db.get_measurement_header(measurement_id)
+        if not header:
+            return jsonify({"error": "Measurement not found"}), 404
+
+        token_company = request.jwt_payload.get('company_id')
+        if token_company != 'ADMIN' and header['company_id'] != token_company:
+            logger.warning(f"⚠️ Analyses denied: {token_company} → {header['company_id']}")
+            return jsonify({"error": "Access denied"}), 403
+
+        return jsonify({
+            "measurement_id": measurement_id,
+            "versions": db.get_analysis_versions(measurement_id)
+        })
+
+    except Exception as e:
+        logger.error(f"❌ Error in get_measurement_analyses: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
 @measurement_bp.route("/measurements/<int:measurement_id>", methods=["DELETE"])
 @token_required
 def delete_measurement(measurement_id):
@@ -142,6 +286,8 @@ def delete_measurement(measurement_id):
         success = db.delete_measurement(measurement_id, requesting_company_id)
         
         if success:
+            get_chart_cache().invalidate(measurement_id)
+            get_spectrum_cache().discard_measurement(measurement_id)
             logger.info(f"Measurement {measurement_id} deleted by {requesting_company_id}")
             return jsonify({
                 "message": f"Measurement {measurement_id} deleted successfully"
@@ -170,6 +316,7 @@ def clear_all_measurements():
         logger.warning(f"Clear all measurements: {company_id}")
         
         deleted_count = db.delete_all_measurements(company_id)
+        get_spectrum_cache().discard_company(company_id)
         
         logger.info(f"Deleted {deleted_count} measurements for {company_id}")
         
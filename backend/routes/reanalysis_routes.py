@@ -0,0 +1,126 @@
+"""
+Rutas de re-análisis de mediciones históricas (solo ADMIN)
+"""
+from flask import Blueprint, jsonify, request
+import logging
+
+from auth import token_required
+from audit_logger import audit_logger, get_request_ip
+from company_data import COMPANY_PROFILES
+from config_manager import get_config_manager
+from database import get_db
+from reanalysis import get_reanalysis_manager, REANALYSIS_PARAM_KEYS
+
+reanalysis_bp = Blueprint('reanalysis', __name__)
+logger = logging.getLogger(__name__)
+
+db = get_db()
+config = get_config_manager()
+
+
+def _require_admin():
+    if request.jwt_payload.get('company_id') != 'ADMIN':
+        return jsonify({"error": "Solo admin puede gestionar re-análisis"}), 403
+    return None
+
+
+@reanalysis_bp.route("/reanalysis", methods=["POST"])
+@token_required
+def start_reanalysis():
+    """
+    Lanza un re-análisis en segundo plano.
+    Body (opcional): company_id, analysis_params (por defecto los actuales), reason
+    analysis_params admite además 'concentration' (aplicada a todas las
+    mediciones en lugar de la suya) y 'baseline_correction'.
+    """
+    denied = _require_admin()
+    if denied:
+        return denied
+
+    try:
+        data = request.get_json(silent=True) or {}
+
+        company_id = data.get('company_id')
+        if company_id and company_id not in COMPANY_PROFILES:
+            return jsonify({"error": f"Invalid company_id: '{company_id}'"}), 400
+
+        overrides = data.get('analysis_params') or {}
+        if not isinstance(overrides, dict):
+            return jsonify({"error": "Invalid analysis_params"}), 400
+
+        params = config.get_analysis_params()
+        params.update({k: v for k, v in overrides.items() if k in REANALYSIS_PARAM_KEYS + ('concentration', 'baseline_correction')})
+
+        job = get_reanalysis_manager().start(params, company_id, data.get('reason', 'manual'))
+        audit_logger.log_event(
+            event_type='REANALYSIS',
+            details={'job_id': job['id'], 'version': job['version'], 'company_id': company_id},
+            user='ADMIN',
+            ip=get_request_ip()
+        )
+        return jsonify(job), 202
+
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        logger.error(f"❌ Error starting reanalysis: {str(e)}", exc_info=True)
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+
+@reanalysis_bp.route("/reanalysis/jobs", methods=["GET"])
+@token_required
+def list_reanalysis_jobs():
+    """Lista los trabajos de re-análisis recientes"""
+    denied = _require_admin()
+    if denied:
+        return denied
+
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify({
+        "jobs": db.list_reanalysis_jobs(status=request.args.get('status'), limit=limit),
+        "current_job_id": get_reanalysis_manager().current_job_id()
+    })
+
+
+@reanalysis_bp.route("/reanalysis/jobs/<int:job_id>", methods=["GET"])
+@token_required
+def get_reanalysis_job(job_id):
+    """Estado y progreso de un trabajo"""
+    denied = _require_admin()
+    if denied:
+        return denied
+
+    job = db.get_reanalysis_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@reanalysis_bp.route("/reanalysis/jobs/<int:job_id>/pause", methods=["POST"])
+@token_required
+def pause_reanalysis_job(job_id):
+    """Pausa un trabajo al terminar el lote en curso"""
+    denied = _require_admin()
+    if denied:
+        return denied
+
+    try:
+        return jsonify(get_reanalysis_manager().pause(job_id))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+
+
+@reanalysis_bp.route("/reanalysis/jobs/<int:job_id>/resume", methods=["POST"])
+@token_required
+def resume_reanalysis_job(job_id):
+    """Reanuda un trabajo pausado, interrumpido o fallido"""
+    denied = _require_admin()
+    if denied:
+        return denied
+
+    try:
+        return jsonify(get_reanalysis_manager().resume(job_id)), 202
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except (RuntimeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 409
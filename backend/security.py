@@ -205,6 +205,9 @@ class FileValidator:
         'chemical/x-jcamp-dx'  # Para archivos JDF
     }
     
+    # Extensiones de texto (no deben contener bytes nulos)
+    TEXT_EXTENSIONS = {'.csv', '.txt', '.jdx'}
+    
     # Tamaño máximo (100 MB)
     MAX_FILE_SIZE = 100 * 1024 * 1024
     
@@ -219,24 +222,10 @@ class FileValidator:
         if not file:
             return False, "No file provided"
         
-        if not file.filename:
-            return False, "Empty filename"
-        
-        # 1. Validar nombre de archivo
-        if not InputValidator.validate_filename(file.filename):
-            return False, "Invalid filename"
-        
-        # 2. Validar extensión
-        file_path = Path(file.filename)
-        extension = file_path.suffix.lower()
-        filename_lower = file.filename.lower()
-        
-        # Permitir archivos sin extensión si son conocidos (fid, ser, etc.)
-        if extension == '' and filename_lower not in ['fid', 'ser', 'acqus', 'procs']:
-            if extension not in cls.ALLOWED_EXTENSIONS:
-                return False, f"File extension not allowed: {extension}"
-        elif extension not in cls.ALLOWED_EXTENSIONS:
-            return False, f"File extension not allowed: {extension}"
+        # 1-2. Validar nombre de archivo y extensión
+        is_valid, error_msg = cls.validate_filename(file.filename)
+        if not is_valid:
+            return False, error_msg
         
         # 3. Validar tipo MIME
         mime_type = file.content_type
@@ -249,12 +238,63 @@ class FileValidator:
         file_size = file.tell()
         file.seek(0)  # Volver al inicio
         
+        return cls.validate_size(file_size)
+
+    @classmethod
+    def validate_filename(cls, filename):
+        """
+        Valida nombre y extensión (también antes de recibir el contenido,
+        p. ej. al iniciar una subida por partes).
+
+        Returns:
+            tuple: (is_valid, error_message)
+        """
+        if not filename:
+            return False, "Empty filename"
+
+        if not InputValidator.validate_filename(filename):
+            return False, "Invalid filename"
+
+        extension = Path(filename).suffix.lower()
+        filename_lower = filename.lower()
+
+        # Permitir archivos sin extensión si son conocidos (fid, ser, etc.)
+        if extension == '' and filename_lower not in ['fid', 'ser', 'acqus', 'procs']:
+            if extension not in cls.ALLOWED_EXTENSIONS:
+                return False, f"File extension not allowed: {extension}"
+        elif extension not in cls.ALLOWED_EXTENSIONS:
+            return False, f"File extension not allowed: {extension}"
+
+        return True, None
+
+    @classmethod
+    def validate_size(cls, file_size):
+        """
+        Returns:
+            tuple: (is_valid, error_message)
+        """
         if file_size > cls.MAX_FILE_SIZE:
             return False, f"File too large: {file_size} bytes (max: {cls.MAX_FILE_SIZE})"
-        
-        if file_size == 0:
+
+        if file_size <= 0:
             return False, "Empty file"
-        
+
+        return True, None
+
+    @classmethod
+    def validate_header(cls, filename, head):
+        """
+        Comprueba que los primeros bytes corresponden al tipo declarado por
+        la extensión: ZIP con firma PK, texto (csv/txt/jdx) sin bytes nulos.
+
+        Returns:
+            tuple: (is_valid, error_message)
+        """
+        extension = Path(filename).suffix.lower()
+        if extension == '.zip' and not head.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+            return False, "File content does not match extension: .zip"
+        if extension in cls.TEXT_EXTENSIONS and b'\x00' in head:
+            return False, f"File content does not match extension: {extension}"
         return True, None
 
 
@@ -323,18 +363,10 @@ def get_user_identifier():
     """
     ip = request.headers.get('X-Forwarded-For', request.remote_addr)
     
-    # Si hay JWT, incluir company_id
-    auth_header = request.headers.get('Authorization', '')
-    if auth_header.startswith('Bearer '):
-        try:
-            # Extraer company_id del token (sin verificarlo completamente)
-            import jwt
-            token = auth_header.split(' ')[1]
-            payload = jwt.decode(token, options={"verify_signature": False})
-            company_id = payload.get('company_id', 'unknown')
-            return f"{ip}:{company_id}"
-        except:
-            pass
+    # Si hay JWT válido, incluir company_id (verificado una vez por petición)
+    if request.headers.get('Authorization', '').startswith('Bearer '):
+        from auth import request_company_id
+        return f"{ip}:{request_company_id()}"
     
     return ip
 
@@ -345,30 +377,25 @@ def get_user_identifier():
 
 def log_request():
     """
-    Log de todas las requests para auditoría.
+    Log de todas las requests para auditoría (nivel DEBUG).
+    Con DEBUG desactivado no se lee ni se verifica el token.
     """
-    # Información básica
-    method = request.method
-    path = request.path
-    ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-    user_agent = request.headers.get('User-Agent', 'Unknown')
-    
-    # Información de autenticación
-    auth_header = request.headers.get('Authorization', '')
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+
+    # Información de autenticación: el token se verifica una sola vez por
+    # petición y token_required reutiliza el resultado
     company_id = 'anonymous'
-    
-    if auth_header.startswith('Bearer '):
-        try:
-            import jwt
-            token = auth_header.split(' ')[1]
-            payload = jwt.decode(token, options={"verify_signature": False})
-            company_id = payload.get('company_id', 'unknown')
-        except:
-            pass
+    if request.headers.get('Authorization', '').startswith('Bearer '):
+        from auth import request_company_id
+        company_id = request_company_id()
     
     # Log en formato estructurado
-    logging.info(
-        f"[REQUEST] {method} {path} | IP: {ip} | User: {company_id} | UA: {user_agent[:50]}"
+    logging.debug(
+        "[REQUEST] %s %s | IP: %s | User: %s | UA: %s",
+        request.method, request.path,
+        request.headers.get('X-Forwarded-For', request.remote_addr),
+        company_id, request.headers.get('User-Agent', 'Unknown')[:50]
     )
 
 
@@ -0,0 +1,119 @@
+"""
+CraftRMN Pro - Servidor multi-proceso (waitress × N procesos)
+
+El análisis es CPU-bound: con un solo proceso el GIL limita el servidor a
+~1 núcleo aunque waitress use varios hilos. Este lanzador abre el socket una
+vez y crea N procesos worker (fork) que lo comparten, cada uno con su
+propio waitress de SERVER_THREADS hilos.
+
+Estado compartido entre procesos:
+- Rate limiting: SQLite (RATELIMIT_STORAGE_URI, utils/limiter_storage.py)
+- Scheduler: solo en el proceso que obtiene storage/scheduler.lock
+- BD de mediciones y auditoría: SQLite (WAL)
+- Logs: un app/audit.log por worker (app.w<N>.log); audit.db es común
+- Por proceso: cachés en memoria (espectros del ajuste interactivo, tokens,
+  estáticos comprimidos) y métricas de /api/metrics
+
+Uso: python serve.py [--workers N] [--threads T] [--host H] [--port P]
+Requiere fork (Linux/macOS); en Windows arranca un único proceso.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | serve | %(message)s')
+logger = logging.getLogger('serve')
+
+
+def _balance_pools(workers: int):
+    """Reparte los núcleos entre procesos (pools de lotes y re-análisis por worker)"""
+    per_worker = max(1, (os.cpu_count() or 2) // workers)
+    os.environ.setdefault('BATCH_ANALYSIS_WORKERS', str(per_worker))
+    os.environ.setdefault('REANALYSIS_WORKERS', str(max(1, per_worker // 2)))
+
+
+def _run_worker(sock, threads: int, worker_id: int):
+    """Proceso worker: importa la app después del fork (sus hilos no sobreviven al fork)"""
+    os.environ['SERVER_WORKER_ID'] = str(worker_id)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from waitress import serve
+    import app as app_module
+
+    app_module.init_scheduler()
+    serve(app_module.app, sockets=[sock], threads=threads, ident='CraftRMN')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CraftRMN - servidor multi-proceso")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVER_WORKERS', 1)))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('SERVER_THREADS', 4)))
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        logger.warning("⚠️ fork no disponible en esta plataforma: se usa un único proceso")
+        workers = 1
+
+    # Antes de importar config: los workers heredan el módulo ya cargado
+    _balance_pools(workers)
+    import config
+    host = args.host or config.FLASK_HOST
+    port = args.port or config.FLASK_PORT
+
+    if workers == 1:
+        from waitress import serve
+        import app as app_module
+        app_module.init_scheduler()
+        serve(app_module.app, host=host, port=port, threads=args.threads, ident='CraftRMN')
+        return
+
+    sock = socket.create_server((host, port), backlog=2048)
+    context = multiprocessing.get_context('fork')
+    children = {}
+    stopping = False
+
+    def spawn(worker_id: int):
+        process = context.Process(
+            target=_run_worker, args=(sock, args.threads, worker_id),
+            name=f"craftrmn-w{worker_id}", daemon=False
+        )
+        process.start()
+        children[worker_id] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info(f"🚀 {workers} procesos × {args.threads} hilos en http://{host}:{port}")
+    for worker_id in range(workers):
+        spawn(worker_id)
+
+    # Supervisar: reiniciar los workers que terminen inesperadamente
+    while not stopping:
+        time.sleep(0.5)
+        for worker_id, process in list(children.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning(f"⚠️ Worker {worker_id} terminó (código {process.exitcode}), reiniciando")
+                spawn(worker_id)
+
+    logger.info("🛑 Deteniendo workers")
+    for process in children.values():
+        process.terminate()
+    for process in children.values():
+        process.join(timeout=10)
+    sock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
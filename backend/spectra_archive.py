@@ -0,0 +1,442 @@
+"""
+Archivo columnar de mediciones para analítica offline (Parquet / Arrow / HDF5)
+
+Exporta las mediciones de la base de datos a un formato columnar:
+- Columnas resumen (id, empresa, fecha, porcentajes, calidad...)
+- Espectros como arrays float32 de tamaño fijo (remuestreados a n_points
+  sobre su propio rango ppm)
+
+Las filas se procesan por lotes, así que la memoria está acotada por
+`chunk_size * n_points` floats independientemente del tamaño del historial.
+Los mismos ficheros se leen de vuelta con `iter_archive()` para recargar o
+re-analizar datos históricos sin parsear JSON fila a fila.
+
+Uso:
+    python spectra_archive.py export archivo.parquet --company FAES --from 2024-01-01
+    python spectra_archive.py export archivo.h5 --format hdf5 --points 8192
+    python spectra_archive.py info archivo.parquet
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from database import Database, get_db
+
+# --- Arrow / Parquet ---
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+    pa = None
+
+# --- HDF5 ---
+try:
+    import h5py
+    HDF5_AVAILABLE = True
+except ImportError:
+    HDF5_AVAILABLE = False
+    h5py = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POINTS = 16384
+DEFAULT_CHUNK_SIZE = 256
+
+FORMAT_BY_SUFFIX = {
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.h5': 'hdf5',
+    '.hdf5': 'hdf5',
+}
+
+# (nombre en el archivo, columna en la BD, dtype)
+SUMMARY_FIELDS = (
+    ('id', 'id', 'int64'),
+    ('company_id', 'company_id', 'str'),
+    ('device_id', 'device_id', 'str'),
+    ('timestamp', 'timestamp', 'str'),
+    ('filename', 'filename', 'str'),
+    ('fluor_percentage', 'fluor_percentage', 'float64'),
+    ('pfas_percentage', 'pifas_percentage', 'float64'),
+    ('pfas_concentration', 'pifas_concentration', 'float64'),
+    ('concentration', 'concentration', 'float64'),
+    ('quality_score', 'quality_score', 'float64'),
+)
+
+# Columnas calculadas a partir del espectro
+SPECTRUM_FIELDS = (
+    ('ppm_start', 'float64'),
+    ('ppm_end', 'float64'),
+    ('n_points_original', 'int32'),
+)
+
+ARCHIVE_COLUMNS = tuple(name for name, _, _ in SUMMARY_FIELDS) + tuple(name for name, _ in SPECTRUM_FIELDS)
+
+
+# ============================================================================
+# REMUESTREO
+# ============================================================================
+
+def resample_spectrum(spectrum: Dict, n_points: int) -> Tuple[np.ndarray, float, float, int]:
+    """
+    Remuestrea un espectro a n_points equiespaciados sobre su rango ppm.
+
+    Returns:
+        (intensity float32, ppm_start, ppm_end, n_points_original).
+        Si no hay espectro devuelve NaN y n_points_original = 0.
+    """
+    ppm = np.asarray(spectrum.get('ppm') if spectrum else [], dtype=np.float64)
+    intensity = np.asarray(spectrum.get('intensity') if spectrum else [], dtype=np.float64)
+    n = min(ppm.size, intensity.size)
+
+    if n < 2:
+        return np.full(n_points, np.nan, dtype=np.float32), np.nan, np.nan, 0
+
+    ppm, intensity = ppm[:n], intensity[:n]
+    ppm_start, ppm_end = float(ppm[0]), float(ppm[-1])
+    axis = np.linspace(ppm_start, ppm_end, n_points)
+
+    # np.interp exige abscisas crecientes (los espectros RMN suelen ir de mayor a menor ppm)
+    if ppm_start > ppm_end:
+        resampled = np.interp(axis[::-1], ppm[::-1], intensity[::-1])[::-1]
+    else:
+        resampled = np.interp(axis, ppm, intensity)
+
+    return resampled.astype(np.float32), ppm_start, ppm_end, n
+
+
+def ppm_axis(ppm_start: float, ppm_end: float, n_points: int) -> np.ndarray:
+    """Reconstruye el eje ppm de una fila del archivo"""
+    return np.linspace(ppm_start, ppm_end, n_points)
+
+
+# ============================================================================
+# LECTURA DE LA BD POR LOTES
+# ============================================================================
+
+def _iter_chunks(db: Database, n_points: int, chunk_size: int,
+                 company_id: Optional[str], date_from: Optional[str],
+                 date_to: Optional[str]) -> Iterator[Tuple[Dict[str, list], np.ndarray]]:
+    """Lee la BD por lotes y devuelve (columnas resumen, matriz de espectros)"""
+    columns = tuple(column for _, column, _ in SUMMARY_FIELDS) + ('spectrum_data',)
+    rows = db.iter_measurements(
+        company_id=company_id,
+        date_from=date_from,
+        date_to=date_to,
+        columns=columns,
+        batch_size=chunk_size
+    )
+
+    def new_chunk():
+        summary = {name: [] for name, _, _ in SUMMARY_FIELDS}
+        summary.update({name: [] for name, _ in SPECTRUM_FIELDS})
+        return summary, np.empty((chunk_size, n_points), dtype=np.float32)
+
+    summary, spectra = new_chunk()
+    count = 0
+
+    for row in rows:
+        for name, column, _ in SUMMARY_FIELDS:
+            summary[name].append(row[column])
+
+        try:
+            spectrum = json.loads(row['spectrum_data']) if row['spectrum_data'] else {}
+        except json.JSONDecodeError:
+            logger.warning(f"Medición {row['id']}: spectrum_data corrupto")
+            spectrum = {}
+
+        spectra[count], ppm_start, ppm_end, n_original = resample_spectrum(spectrum, n_points)
+        summary['ppm_start'].append(ppm_start)
+        summary['ppm_end'].append(ppm_end)
+        summary['n_points_original'].append(n_original)
+        count += 1
+
+        if count == chunk_size:
+            yield summary, spectra
+            summary, spectra = new_chunk()
+            count = 0
+
+    if count:
+        yield summary, spectra[:count]
+
+
+def _summary_arrays(summary: Dict[str, list]) -> Dict[str, np.ndarray]:
+    """Convierte las listas resumen a arrays numpy con su dtype"""
+    dtypes = {name: dtype for name, _, dtype in SUMMARY_FIELDS}
+    dtypes.update(dict(SPECTRUM_FIELDS))
+    arrays = {}
+    for name, values in summary.items():
+        dtype = dtypes[name]
+        if dtype == 'str':
+            arrays[name] = np.array(['' if v is None else str(v) for v in values], dtype=object)
+        elif dtype.startswith('float'):
+            arrays[name] = np.array([np.nan if v is None else v for v in values], dtype=dtype)
+        else:
+            arrays[name] = np.array([0 if v is None else v for v in values], dtype=dtype)
+    return arrays
+
+
+# ============================================================================
+# ESCRITORES
+# ============================================================================
+
+def _arrow_schema(n_points: int):
+    fields = []
+    for name, _, dtype in SUMMARY_FIELDS:
+        fields.append(pa.field(name, pa.string() if dtype == 'str' else pa.from_numpy_dtype(np.dtype(dtype))))
+    for name, dtype in SPECTRUM_FIELDS:
+        fields.append(pa.field(name, pa.from_numpy_dtype(np.dtype(dtype))))
+    fields.append(pa.field('intensity', pa.list_(pa.float32(), n_points)))
+    return pa.schema(fields, metadata={'n_points': str(n_points), 'format': 'craftrmn-spectra-v1'})
+
+
+def _arrow_batch(schema, summary: Dict[str, list], spectra: np.ndarray):
+    arrays = _summary_arrays(summary)
+    columns = []
+    for field in schema:
+        if field.name == 'intensity':
+            flat = pa.array(np.ascontiguousarray(spectra).reshape(-1), type=pa.float32())
+            columns.append(pa.FixedSizeListArray.from_arrays(flat, spectra.shape[1]))
+        else:
+            columns.append(pa.array(arrays[field.name], type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def _write_arrow(path: Path, chunks, n_points: int, fmt: str) -> int:
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow no está instalado. `pip install pyarrow`")
+
+    schema = _arrow_schema(n_points)
+    total = 0
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(str(path), schema, compression='zstd')
+        write = writer.write_batch
+    else:
+        sink = pa.OSFile(str(path), 'wb')
+        writer = pa_ipc.new_file(sink, schema)
+        write = writer.write_batch
+
+    try:
+        for summary, spectra in chunks:
+            write(_arrow_batch(schema, summary, spectra))
+            total += spectra.shape[0]
+    finally:
+        writer.close()
+        if fmt != 'parquet':
+            sink.close()
+    return total
+
+
+def _write_hdf5(path: Path, chunks, n_points: int, chunk_size: int) -> int:
+    if not HDF5_AVAILABLE:
+        raise ImportError("h5py no está instalado. `pip install h5py`")
+
+    total = 0
+    with h5py.File(str(path), 'w') as f:
+        f.attrs['n_points'] = n_points
+        f.attrs['format'] = 'craftrmn-spectra-v1'
+
+        summary_group = f.create_group('summary')
+        datasets = {}
+        for name, _, dtype in SUMMARY_FIELDS:
+            h5_dtype = h5py.string_dtype() if dtype == 'str' else dtype
+            datasets[name] = summary_group.create_dataset(
+                name, shape=(0,), maxshape=(None,), dtype=h5_dtype, chunks=(chunk_size,)
+            )
+        for name, dtype in SPECTRUM_FIELDS:
+            datasets[name] = summary_group.create_dataset(
+                name, shape=(0,), maxshape=(None,), dtype=dtype, chunks=(chunk_size,)
+            )
+        intensity = f.create_dataset(
+            'spectra/intensity', shape=(0, n_points), maxshape=(None, n_points),
+            dtype='float32', chunks=(min(chunk_size, 64), n_points), compression='gzip', shuffle=True
+        )
+
+        for summary, spectra in chunks:
+            arrays = _summary_arrays(summary)
+            n = spectra.shape[0]
+            for name, dataset in datasets.items():
+                dataset.resize((total + n,))
+                dataset[total:total + n] = arrays[name]
+            intensity.resize((total + n, n_points))
+            intensity[total:total + n] = spectra
+            total += n
+
+    return total
+
+
+def export_archive(
+    path: Path,
+    fmt: Optional[str] = None,
+    db: Optional[Database] = None,
+    company_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    n_points: int = DEFAULT_POINTS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    Exporta mediciones a un archivo columnar.
+
+    Args:
+        path: Fichero de salida
+        fmt: 'parquet', 'arrow' o 'hdf5' (por defecto según la extensión)
+        company_id: Empresa (None = todas)
+        date_from / date_to: Rango de fechas ISO
+        n_points: Puntos por espectro tras remuestrear
+        chunk_size: Filas procesadas por lote
+
+    Returns:
+        Número de mediciones exportadas
+    """
+    path = Path(path)
+    fmt = fmt or FORMAT_BY_SUFFIX.get(path.suffix.lower())
+    if fmt not in ('parquet', 'arrow', 'hdf5'):
+        raise ValueError(f"Formato de archivo no soportado: {fmt or path.suffix}")
+
+    db = db or get_db()
+    chunks = _iter_chunks(db, n_points, chunk_size, company_id, date_from, date_to)
+
+    if fmt == 'hdf5':
+        total = _write_hdf5(path, chunks, n_points, chunk_size)
+    else:
+        total = _write_arrow(path, chunks, n_points, fmt)
+
+    logger.info(f"📦 Archivo {fmt} creado: {path} ({total} mediciones, {n_points} puntos)")
+    return total
+
+
+# ============================================================================
+# LECTORES
+# ============================================================================
+
+def iter_archive(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[Dict[str, np.ndarray], np.ndarray]]:
+    """
+    Lee un archivo por lotes.
+
+    Yields:
+        (summary, spectra) donde summary es un dict columna -> array y
+        spectra es una matriz float32 (filas, n_points)
+    """
+    path = Path(path)
+    fmt = FORMAT_BY_SUFFIX.get(path.suffix.lower())
+
+    if fmt == 'hdf5':
+        if not HDF5_AVAILABLE:
+            raise ImportError("h5py no está instalado. `pip install h5py`")
+        with h5py.File(str(path), 'r') as f:
+            intensity = f['spectra/intensity']
+            total = intensity.shape[0]
+            for start in range(0, total, chunk_size):
+                stop = min(start + chunk_size, total)
+                summary = {}
+                for name in ARCHIVE_COLUMNS:
+                    dataset = f['summary'][name]
+                    values = dataset[start:stop]
+                    if dataset.dtype.kind == 'O':
+                        values = np.array([v.decode('utf-8') if isinstance(v, bytes) else v for v in values], dtype=object)
+                    summary[name] = values
+                yield summary, intensity[start:stop]
+        return
+
+    if fmt not in ('parquet', 'arrow'):
+        raise ValueError(f"Formato de archivo no soportado: {path.suffix}")
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow no está instalado. `pip install pyarrow`")
+
+    if fmt == 'parquet':
+        batches = pq.ParquetFile(str(path)).iter_batches(batch_size=chunk_size)
+    else:
+        reader = pa_ipc.open_file(pa.memory_map(str(path), 'r'))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    for batch in batches:
+        summary = {}
+        spectra = None
+        for name, column in zip(batch.schema.names, batch.columns):
+            if name == 'intensity':
+                n_points = column.type.list_size
+                spectra = column.values.to_numpy(zero_copy_only=False).reshape(len(column), n_points)
+            else:
+                summary[name] = column.to_numpy(zero_copy_only=False)
+        yield summary, spectra
+
+
+def iter_archive_spectra(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[Dict, np.ndarray, np.ndarray]]:
+    """
+    Itera fila a fila: (registro resumen, ppm, intensity).
+    Pensado para re-analizar datos históricos con el analizador.
+    """
+    for summary, spectra in iter_archive(path, chunk_size):
+        n_points = spectra.shape[1]
+        for i in range(spectra.shape[0]):
+            record = {name: values[i] for name, values in summary.items()}
+            if not record.get('n_points_original'):
+                continue
+            yield record, ppm_axis(record['ppm_start'], record['ppm_end'], n_points), spectra[i]
+
+
+def archive_info(path: Path) -> Dict:
+    """Resumen de un archivo (filas, puntos por espectro, columnas)"""
+    rows = 0
+    n_points = 0
+    columns: List[str] = []
+    for summary, spectra in iter_archive(path):
+        rows += spectra.shape[0]
+        n_points = spectra.shape[1]
+        columns = list(summary.keys())
+    return {'path': str(path), 'rows': rows, 'n_points': n_points, 'columns': columns}
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archivo columnar de espectros CraftRMN")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Exportar mediciones")
+    export_parser.add_argument('path', type=Path)
+    export_parser.add_argument('--format', choices=['parquet', 'arrow', 'hdf5'])
+    export_parser.add_argument('--company')
+    export_parser.add_argument('--from', dest='date_from')
+    export_parser.add_argument('--to', dest='date_to')
+    export_parser.add_argument('--points', type=int, default=DEFAULT_POINTS)
+    export_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    info_parser = subparsers.add_parser('info', help="Mostrar resumen de un archivo")
+    info_parser.add_argument('path', type=Path)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        total = export_archive(
+            args.path, fmt=args.format, company_id=args.company,
+            date_from=args.date_from, date_to=args.date_to,
+            n_points=args.points, chunk_size=args.chunk_size
+        )
+        print(f"✅ {total} mediciones exportadas a {args.path}")
+    else:
+        info = archive_info(args.path)
+        print(f"📦 {info['path']}")
+        print(f"   Filas: {info['rows']}")
+        print(f"   Puntos por espectro: {info['n_points']}")
+        print(f"   Columnas: {', '.join(info['columns'])}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
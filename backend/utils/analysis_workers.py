@@ -0,0 +1,45 @@
+"""
+Procesos worker de análisis (ProcessPoolExecutor)
+
+Inicialización común para los pools de re-análisis y de análisis por lotes:
+prioridad reducida, stdout silenciado, logging directo a stderr (el hilo
+escritor de audit_logger no existe en un hijo creado con fork) y un
+SpectrumAnalyzer por proceso (se crea una sola vez, no por tarea).
+"""
+import os
+import sys
+from pathlib import Path
+
+_worker_analyzer = None
+
+
+def init_analysis_worker(nice_increment: int = 0):
+    """Initializer de ProcessPoolExecutor"""
+    global _worker_analyzer
+
+    if nice_increment and hasattr(os, 'nice'):
+        try:
+            os.nice(nice_increment)
+        except OSError:
+            pass
+
+    # El analizador imprime su progreso por stdout; en los workers sobra
+    sys.stdout = open(os.devnull, 'w')
+
+    # La cola de logging del padre (fork) o la de app importada de nuevo
+    # (spawn) no la vacía nadie aquí: escribir directamente en stderr
+    if 'audit_logger' in sys.modules:
+        sys.modules['audit_logger'].setup_child_logging()
+
+    worker_dir = str(Path(__file__).parent.parent.parent / "worker")
+    if worker_dir not in sys.path:
+        sys.path.append(worker_dir)
+    from analyzer import SpectrumAnalyzer
+    _worker_analyzer = SpectrumAnalyzer()
+
+
+def get_worker_analyzer():
+    """Analizador del proceso worker actual"""
+    if _worker_analyzer is None:
+        init_analysis_worker()
+    return _worker_analyzer
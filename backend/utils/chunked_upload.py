@@ -0,0 +1,304 @@
+"""
+Subidas por partes reanudables (init → PUT partes → complete)
+
+Una subida de 100 MB en una sola petición multipart se pierde entera si la
+conexión cae. Aquí el cliente abre una sesión, envía el archivo en partes
+consecutivas (Content-Range) y, si se corta, consulta cuántos bytes tiene el
+servidor y continúa desde ahí.
+
+- Cada parte se escribe directamente en disco (storage/uploads/<id>.part)
+  sin cargar el archivo entero en memoria.
+- El SHA-256 se calcula a medida que llegan los bytes. El estado del hash
+  vive en memoria del proceso; si la parte llega a otro worker o tras un
+  reinicio, se recalcula leyendo lo ya recibido.
+- Tamaño y tipo se validan al iniciar (nombre, extensión, tamaño declarado)
+  y al recibir (no exceder el tamaño, firma de los primeros bytes).
+- El estado de la sesión es un JSON junto a los datos, así que cualquier
+  proceso worker puede atender cualquier parte; un lock por sesión evita
+  escrituras simultáneas.
+"""
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import config as app_config
+from security import FileValidator
+from utils import process_lock
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bloques de lectura del cuerpo de la petición
+READ_BLOCK_SIZE = 1024 * 1024
+# Bytes iniciales con los que se comprueba la firma del archivo
+HEADER_BYTES = 4096
+
+
+class OffsetMismatch(ValueError):
+    """La parte no empieza donde termina lo ya recibido"""
+
+    def __init__(self, received: int):
+        super().__init__(f"Offset mismatch: server has {received} bytes")
+        self.received = received
+
+
+class ChunkedUploadStore:
+    """Sesiones de subida por partes en disco"""
+
+    def __init__(self, upload_dir: Path, max_chunk_bytes: int, ttl_seconds: float):
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl_seconds = ttl_seconds
+        # upload_id → (bytes hasheados, hash incremental)
+        self._hashers: Dict[str, Tuple[int, object]] = {}
+        self._hashers_lock = threading.Lock()
+
+    # ==================== RUTAS ====================
+
+    @staticmethod
+    def is_valid_id(upload_id: str) -> bool:
+        return len(upload_id) == 32 and all(c in '0123456789abcdef' for c in upload_id)
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.json"
+
+    def data_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.part"
+
+    def _lock_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f"{upload_id}.lock"
+
+    # ==================== ESTADO ====================
+
+    def _load(self, upload_id: str) -> Dict:
+        if not self.is_valid_id(upload_id):
+            raise LookupError("Upload not found")
+        try:
+            meta = json.loads(self._meta_path(upload_id).read_text(encoding='utf-8'))
+        except (FileNotFoundError, json.JSONDecodeError):
+            raise LookupError("Upload not found")
+        if meta['expires_at'] < time.time():
+            self.discard(upload_id)
+            raise LookupError("Upload expired")
+        return meta
+
+    def _save(self, meta: Dict):
+        """Escritura atómica (otro proceso puede estar leyendo)"""
+        path = self._meta_path(meta['upload_id'])
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_text(json.dumps(meta), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def public_info(meta: Dict) -> Dict:
+        info = {
+            'upload_id': meta['upload_id'],
+            'filename': meta['filename'],
+            'company_id': meta['company_id'],
+            'size': meta['size'],
+            'received': meta['received'],
+            'complete': meta['received'] == meta['size'],
+            'expires_at': meta['expires_at'],
+        }
+        if meta.get('sha256'):
+            info['sha256'] = meta['sha256']
+        return info
+
+    # ==================== HASH INCREMENTAL ====================
+
+    def _hasher_for(self, upload_id: str, received: int):
+        """Hash de los primeros `received` bytes (el de memoria o recalculado)"""
+        with self._hashers_lock:
+            cached = self._hashers.pop(upload_id, None)
+        if cached is not None and cached[0] == received:
+            return cached[1]
+
+        metrics.incr('uploads.rehash')
+        hasher = hashlib.sha256()
+        remaining = received
+        with open(self.data_path(upload_id), 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    # ==================== OPERACIONES ====================
+
+    def create(self, filename: str, size: int, company_id: str) -> Dict:
+        """
+        Abre una sesión tras validar nombre, extensión y tamaño declarado.
+        ValueError si no son válidos.
+        """
+        for is_valid, error_msg in (FileValidator.validate_filename(filename),
+                                    FileValidator.validate_size(size)):
+            if not is_valid:
+                raise ValueError(error_msg)
+
+        upload_id = secrets.token_hex(16)
+        now = time.time()
+        meta = {
+            'upload_id': upload_id,
+            'filename': Path(filename).name,
+            'company_id': company_id,
+            'size': size,
+            'received': 0,
+            'created_at': now,
+            'expires_at': now + self.ttl_seconds,
+        }
+        self.data_path(upload_id).touch()
+        self._save(meta)
+        metrics.incr('uploads.started')
+        logger.info(f"📤 Upload {upload_id} started: {meta['filename']} ({size} bytes) for {company_id}")
+        return meta
+
+    def get(self, upload_id: str) -> Dict:
+        """Estado de la sesión; LookupError si no existe o ha caducado"""
+        return self._load(upload_id)
+
+    def write_chunk(self, upload_id: str, start: int, length: int, stream,
+                    total: Optional[int] = None) -> Dict:
+        """
+        Escribe una parte de `length` bytes leída de `stream` a partir de `start`.
+
+        - OffsetMismatch si start no coincide con lo ya recibido
+        - ValueError si excede el tamaño o la firma no corresponde al tipo
+          (si es la firma, además se descarta la sesión)
+        - RuntimeError si otra petición está escribiendo en la misma sesión
+
+        Si el cuerpo llega incompleto se conserva lo recibido para reanudar.
+        """
+        # 404 antes de crear el archivo de lock
+        self._load(upload_id)
+        with process_lock.exclusive(self._lock_path(upload_id)) as acquired:
+            if not acquired:
+                raise RuntimeError("Upload busy: another chunk is being written")
+
+            meta = self._load(upload_id)
+            received = meta['received']
+            if start != received:
+                raise OffsetMismatch(received)
+            if total is not None and total != meta['size']:
+                raise ValueError(f"Total size mismatch: declared {meta['size']}, got {total}")
+            if length > self.max_chunk_bytes:
+                raise ValueError(f"Chunk too large: {length} bytes (max: {self.max_chunk_bytes})")
+            if start + length > meta['size']:
+                raise ValueError(f"Chunk exceeds declared size ({meta['size']} bytes)")
+
+            hasher = self._hasher_for(upload_id, received)
+            try:
+                with open(self.data_path(upload_id), 'r+b') as f:
+                    # Descartar bytes de una escritura anterior interrumpida
+                    f.seek(received)
+                    f.truncate()
+                    remaining = length
+                    while remaining > 0:
+                        block = stream.read(min(READ_BLOCK_SIZE, remaining))
+                        if not block:
+                            break
+                        f.write(block)
+                        hasher.update(block)
+                        received += len(block)
+                        remaining -= len(block)
+            finally:
+                meta['received'] = received
+                if received == meta['size']:
+                    meta['sha256'] = hasher.hexdigest()
+                self._save(meta)
+                with self._hashers_lock:
+                    self._hashers[upload_id] = (received, hasher)
+
+            if start < HEADER_BYTES and (received >= HEADER_BYTES or received == meta['size']):
+                self._check_header(meta)
+
+        metrics.incr('uploads.bytes', received - start)
+        if received == meta['size']:
+            logger.info(f"✅ Upload {upload_id} complete: {meta['filename']} sha256={meta['sha256'][:12]}")
+        return meta
+
+    def _check_header(self, meta: Dict):
+        with open(self.data_path(meta['upload_id']), 'rb') as f:
+            head = f.read(HEADER_BYTES)
+        is_valid, error_msg = FileValidator.validate_header(meta['filename'], head)
+        if not is_valid:
+            self.discard(meta['upload_id'])
+            raise ValueError(error_msg)
+
+    def finish(self, upload_id: str, place: Callable[[Path, Dict], Path],
+               expected_sha256: Optional[str] = None) -> Tuple[Dict, Path]:
+        """
+        Cierra una subida completa: comprueba el hash (si el cliente lo
+        envía), entrega los datos a place(ruta, meta), que los mueve a su
+        destino y devuelve la ruta final, y borra la sesión.
+        ValueError si falta algo o el hash no coincide; RuntimeError si
+        otra petición está usando la sesión.
+
+        Returns:
+            (meta, ruta final)
+        """
+        self._load(upload_id)
+        with process_lock.exclusive(self._lock_path(upload_id)) as acquired:
+            if not acquired:
+                raise RuntimeError("Upload busy: another request is using it")
+
+            meta = self._load(upload_id)
+            if meta['received'] != meta['size']:
+                raise ValueError(f"Upload incomplete: {meta['received']} of {meta['size']} bytes")
+            if expected_sha256 and expected_sha256.lower() != meta['sha256']:
+                self.discard(upload_id)
+                raise ValueError("SHA-256 mismatch: the upload was corrupted, start again")
+
+            path = place(self.data_path(upload_id), meta)
+            self.discard(upload_id)
+        metrics.incr('uploads.completed')
+        return meta, path
+
+    def discard(self, upload_id: str):
+        """Borra datos, estado y lock de la sesión"""
+        with self._hashers_lock:
+            self._hashers.pop(upload_id, None)
+        for path in (self.data_path(upload_id), self._meta_path(upload_id), self._lock_path(upload_id)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def cleanup_expired(self) -> int:
+        """Borra las sesiones caducadas (abandonadas). Devuelve cuántas."""
+        now = time.time()
+        removed = 0
+        for meta_path in self.upload_dir.glob('*.json'):
+            try:
+                expired = json.loads(meta_path.read_text(encoding='utf-8'))['expires_at'] < now
+            except (OSError, ValueError, KeyError):
+                expired = meta_path.stat().st_mtime + self.ttl_seconds < now
+            if expired:
+                self.discard(meta_path.stem)
+                removed += 1
+        if removed:
+            logger.info(f"🧹 {removed} subidas por partes caducadas eliminadas")
+        return removed
+
+
+# Instancia global
+_upload_store = None
+
+
+def get_upload_store() -> ChunkedUploadStore:
+    global _upload_store
+    if _upload_store is None:
+        _upload_store = ChunkedUploadStore(
+            app_config.UPLOADS_DIR,
+            app_config.UPLOAD_CHUNK_MAX_MB * 1024 * 1024,
+            app_config.UPLOAD_SESSION_TTL_HOURS * 3600
+        )
+    return _upload_store
@@ -0,0 +1,121 @@
+"""
+Almacén de subidas direccionado por contenido
+
+Cada archivo subido se guarda una sola vez bajo su SHA-256
+(storage/blobs/<aa>/<sha256>/<nombre>), en lugar de OUTPUT_DIR/<nombre>:
+dos empresas que suben "muestra.csv" ya no se pisan el archivo, y volver a
+subir los mismos bytes no ocupa más disco.
+
+El hash se calcula mientras se escribe la subida (un solo recorrido) en un
+temporal del propio almacén; si el contenido ya existe, el temporal se
+descarta y se usa el archivo existente. Las subidas por partes llegan con el
+hash ya calculado (utils/chunked_upload.py) y, si se conocen, ni se mueven.
+
+Dentro del directorio del hash el archivo se llama data<extensión> (o fid,
+ser... si no tiene extensión): el lector de RMN elige el formato por el
+nombre, así que la misma secuencia de bytes con otra extensión se guarda
+como otro archivo.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Tuple
+
+import config as app_config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bloques de lectura/escritura
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+class ContentStore:
+    """Archivos subidos, uno por (SHA-256, formato)"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / 'tmp'
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def stored_name(filename: str) -> str:
+        """Nombre dentro del directorio del hash: conserva lo que usa el lector"""
+        name = Path(filename).name
+        suffix = Path(name).suffix.lower()
+        return f"data{suffix}" if suffix else name.lower()
+
+    def path_for(self, sha256: str, filename: str) -> Path:
+        return self.root / sha256[:2] / sha256 / self.stored_name(filename)
+
+    def _commit(self, tmp_path: Path, sha256: str, filename: str) -> Tuple[Path, bool]:
+        """Mueve tmp_path a su sitio o lo descarta si el contenido ya existe"""
+        path = self.path_for(sha256, filename)
+        if path.exists():
+            tmp_path.unlink()
+            metrics.incr('content_store.dedup')
+            logger.debug(f"♻️ Contenido ya almacenado: {sha256[:12]} ({filename})")
+            return path, False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Atómico: con dos subidas simultáneas del mismo contenido gana una
+        # (bytes idénticos) y nadie ve un archivo a medio escribir
+        os.replace(tmp_path, path)
+        metrics.incr('content_store.stored')
+        return path, True
+
+    def put_stream(self, stream: BinaryIO, filename: str) -> Tuple[str, Path, bool]:
+        """
+        Guarda el contenido de stream calculando el hash al escribir.
+
+        Returns:
+            (sha256, ruta en el almacén, True si es contenido nuevo)
+        """
+        digest = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir, suffix='.upload')
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    block = stream.read(COPY_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        sha256 = digest.hexdigest()
+        path, created = self._commit(tmp_path, sha256, filename)
+        return sha256, path, created
+
+    def adopt(self, src_path: Path, sha256: str, filename: str) -> Tuple[Path, bool]:
+        """
+        Incorpora un archivo completo cuyo hash ya se conoce (se mueve, no se
+        copia; si el contenido ya existe, src_path se borra sin escribir nada).
+
+        Returns:
+            (ruta en el almacén, True si es contenido nuevo)
+        """
+        return self._commit(Path(src_path), sha256, filename)
+
+    @staticmethod
+    def params_key(params: Dict) -> str:
+        """Clave estable de los parámetros de análisis (orden de claves indiferente)"""
+        payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Instancia global
+_content_store = None
+
+
+def get_content_store() -> ContentStore:
+    global _content_store
+    if _content_store is None:
+        _content_store = ContentStore(app_config.CONTENT_STORE_DIR)
+    return _content_store
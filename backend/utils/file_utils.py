@@ -1,84 +1,216 @@
 """
 Utilidades para procesamiento de archivos
 """
-import os
 import logging
-import zipfile
+import posixpath
 import shutil
+import tempfile
+import zipfile
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Dict, Iterator, List
 
 logger = logging.getLogger(__name__)
 
+# Archivos sueltos que el lector sabe interpretar
+DATA_EXTENSIONS = {'.csv', '.txt', '.jdf', '.jdx', '.ft', '.ft1', '.ft2'}
+
+# Miembros que se extraen de cada experimento (el resto, p.ej. pdata/, se ignora)
+BRUKER_MEMBERS = {'fid', 'ser', 'acqus', 'acqu2s', 'acqu3s', 'pulseprogram'}
+VARIAN_MEMBERS = {'fid', 'procpar', 'text'}
+
+# Límite de bytes descomprimidos por conjunto de datos (protección zip bomb)
+MAX_DATASET_BYTES = 512 * 1024 * 1024
+
+# Prioridad al elegir un único conjunto de datos (mismo orden que antes)
+KIND_PRIORITY = {'bruker': 0, 'varian': 1, 'file': 2}
+
+
+def _natural_key(path: str):
+    """Ordena '2/fid' antes que '10/fid' (experimentos Bruker numerados)"""
+    return [int(part) if part.isdigit() else part for part in path.split('/')]
+
+
+def index_zip_datasets(zip_ref: zipfile.ZipFile) -> List[Dict]:
+    """
+    Indexa los conjuntos de datos de un ZIP leyendo solo el directorio
+    central (sin descomprimir nada). Una única pasada sobre infolist().
+
+    Returns:
+        Lista de dicts {'kind', 'name', 'root', 'members', 'size'} ordenada
+        por prioridad (Bruker, Varian, archivos) y orden natural de ruta.
+        'root' es el directorio del experimento dentro del ZIP (o la ruta
+        del archivo para kind='file').
+    """
+    directories: Dict[str, Dict[str, zipfile.ZipInfo]] = {}
+    loose_files: List[zipfile.ZipInfo] = []
+
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        name = info.filename.replace('\\', '/')
+        # Ignorar metadatos de macOS
+        if name.startswith('__MACOSX/') or posixpath.basename(name).startswith('._'):
+            continue
+        parent, base = posixpath.split(name)
+        directories.setdefault(parent, {})[base] = info
+        if posixpath.splitext(base)[1].lower() in DATA_EXTENSIONS:
+            loose_files.append(info)
+
+    datasets = []
+    for root, files in directories.items():
+        if 'procpar' in files and 'fid' in files:
+            kind, wanted = 'varian', VARIAN_MEMBERS
+        elif 'fid' in files or 'ser' in files:
+            kind, wanted = 'bruker', BRUKER_MEMBERS
+        else:
+            continue
+        members = [files[base] for base in sorted(wanted & files.keys())]
+        datasets.append({
+            'kind': kind,
+            'name': root or 'root',
+            'root': root,
+            'members': members,
+            'size': sum(m.file_size for m in members)
+        })
+
+    for info in loose_files:
+        datasets.append({
+            'kind': 'file',
+            'name': info.filename,
+            'root': info.filename,
+            'members': [info],
+            'size': info.file_size
+        })
+
+    datasets.sort(key=lambda d: (KIND_PRIORITY[d['kind']], _natural_key(d['root'])))
+    return datasets
+
+
+def extract_dataset(zip_ref: zipfile.ZipFile, dataset: Dict, dest_dir: Path) -> Path:
+    """
+    Extrae en streaming solo los miembros de un conjunto de datos.
+
+    Returns:
+        Path a analizar (directorio del experimento o archivo)
+    """
+    if dataset['size'] > MAX_DATASET_BYTES:
+        raise ValueError(f"Conjunto de datos demasiado grande: {dataset['name']}")
+
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+
+    if dataset['kind'] == 'file':
+        target_dir = dest_dir
+    else:
+        target_dir = dest_dir / (posixpath.basename(dataset['root']) or 'data')
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+    target = target_dir
+    for info in dataset['members']:
+        # Solo el nombre base: nunca se escribe fuera de dest_dir
+        out_path = target_dir / posixpath.basename(info.filename.replace('\\', '/'))
+        with zip_ref.open(info) as src, open(out_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        if dataset['kind'] == 'file':
+            target = out_path
+
+    return target
+
+
+@contextmanager
+def staged_datasets(file_path: Path, all_datasets: bool = False) -> Iterator[List[Dict]]:
+    """
+    Prepara los datos de una subida para analizarlos.
+
+    - Archivo normal: se usa tal cual.
+    - ZIP: se indexa el directorio central y se extraen solo los miembros
+      necesarios a un directorio temporal, que se borra al salir.
+
+    Args:
+        file_path: Archivo subido
+        all_datasets: True = todos los experimentos; False = solo el primero
+
+    Yields:
+        Lista de dicts {'name', 'kind', 'path'}
+    """
+    file_path = Path(file_path)
+    if file_path.suffix.lower() != '.zip':
+        logger.debug(f"Archivo no es ZIP: {file_path.name}")
+        yield [{'name': file_path.name, 'kind': 'file', 'path': file_path}]
+        return
+
+    logger.info(f"📦 Archivo ZIP detectado: {file_path.name}")
+    temp_dir = Path(tempfile.mkdtemp(prefix=f"{file_path.stem}_", dir=file_path.parent))
+
+    try:
+        try:
+            with zipfile.ZipFile(file_path, 'r') as zip_ref:
+                datasets = index_zip_datasets(zip_ref)
+                if not datasets:
+                    raise ValueError("El ZIP no contiene datos RMN reconocibles")
+                if not all_datasets:
+                    datasets = datasets[:1]
+
+                logger.info(f"   🔍 {len(datasets)} conjunto(s) de datos en el ZIP")
+                staged = []
+                for index, dataset in enumerate(datasets):
+                    path = extract_dataset(zip_ref, dataset, temp_dir / str(index))
+                    logger.debug(f"   ✅ {dataset['kind']}: {dataset['name']} → {path}")
+                    staged.append({
+                        'name': dataset['name'],
+                        'kind': dataset['kind'],
+                        'path': path
+                    })
+        except zipfile.BadZipFile:
+            logger.error("   ❌ ZIP corrupto")
+            raise ValueError("ZIP corrupto o inválido")
+
+        yield staged
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
 
 def extract_and_find_data(file_path: Path) -> Path:
     """
     Extrae archivos ZIP y encuentra el directorio/archivo de datos NMR.
-    
+
+    Solo se extraen los miembros del primer conjunto de datos (según el
+    índice del directorio central) a `<stem>_extracted`. Para evitar dejar
+    datos en disco, preferir `staged_datasets()`.
+
     Args:
         file_path: Ruta al archivo subido
-    
+
     Returns:
         Path al archivo/directorio de datos a analizar
     """
     if file_path.suffix.lower() != '.zip':
         logger.debug(f"Archivo no es ZIP: {file_path.name}")
         return file_path
-    
+
     logger.info(f"📦 Archivo ZIP detectado: {file_path.name}")
-    
+
     extract_dir = file_path.parent / f"{file_path.stem}_extracted"
-    
     if extract_dir.exists():
         logger.debug(f"Limpiando directorio previo: {extract_dir}")
         shutil.rmtree(extract_dir)
-    
-    extract_dir.mkdir(parents=True, exist_ok=True)
-    
+
     try:
         with zipfile.ZipFile(file_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        logger.info(f"   ✅ ZIP extraído a: {extract_dir}")
-        
-        # Buscar estructura Bruker
-        for root, dirs, files in os.walk(extract_dir):
-            root_path = Path(root)
-            
-            if 'fid' in files or 'ser' in files:
-                logger.info(f"   🔍 Datos Bruker: {root_path}")
-                return root_path
-            
-            for dir_name in dirs:
-                if dir_name.isdigit():
-                    exp_dir = root_path / dir_name
-                    if (exp_dir / 'fid').exists() or (exp_dir / 'ser').exists():
-                        logger.info(f"   🔍 Experimento Bruker: {exp_dir}")
-                        return exp_dir
-        
-        # Buscar estructura Varian
-        for root, dirs, files in os.walk(extract_dir):
-            root_path = Path(root)
-            if 'procpar' in files and 'fid' in files:
-                logger.info(f"   🔍 Datos Varian: {root_path}")
-                return root_path
-        
-        # Buscar archivos conocidos
-        for root, dirs, files in os.walk(extract_dir):
-            root_path = Path(root)
-            for file in files:
-                file_path_candidate = root_path / file
-                ext = file_path_candidate.suffix.lower()
-                
-                if ext in ['.csv', '.txt', '.jdf', '.jdx', '.ft', '.ft1', '.ft2']:
-                    logger.info(f"   🔍 Archivo encontrado: {file_path_candidate}")
-                    return file_path_candidate
-        
-        logger.warning(f"   ⚠️ Estructura desconocida, usando raíz")
-        return extract_dir
-        
+            datasets = index_zip_datasets(zip_ref)
+            if not datasets:
+                logger.warning("   ⚠️ Estructura desconocida, usando raíz")
+                extract_dir.mkdir(parents=True, exist_ok=True)
+                return extract_dir
+
+            data_path = extract_dataset(zip_ref, datasets[0], extract_dir)
+            logger.info(f"   🔍 Datos {datasets[0]['kind']}: {data_path}")
+            return data_path
+
     except zipfile.BadZipFile:
-        logger.error(f"   ❌ ZIP corrupto")
+        logger.error("   ❌ ZIP corrupto")
         raise ValueError("ZIP corrupto o inválido")
     except Exception as e:
         logger.error(f"   ❌ Error extrayendo ZIP: {e}")
-        raise
\ No newline at end of file
+        raise
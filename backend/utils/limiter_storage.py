@@ -0,0 +1,101 @@
+"""
+Almacenamiento SQLite para Flask-Limiter (compartido entre procesos)
+
+Con `memory://` cada proceso worker lleva sus propios contadores y un límite
+de "5 por minuto" se convierte en 5×N. Este backend guarda los contadores
+en un archivo SQLite local (WAL) que comparten todos los procesos de la
+máquina, sin necesitar Redis ni Memcached.
+
+URI: sqlite:///ruta/relativa.db (relativa a backend/) o sqlite:////ruta/absoluta.db
+Solo implementa lo que usa la estrategia fixed-window (extensions.py).
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from limits.storage import Storage
+
+BASE_DIR = Path(__file__).parent.parent.resolve()
+
+
+class SQLiteStorage(Storage):
+    """Contadores de rate limiting en SQLite: una fila por clave y ventana"""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    # Cada cuántos incr se borran las ventanas ya caducadas
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = Path(uri.split('://', 1)[1][1:])
+        self.db_path = path if path.is_absolute() else BASE_DIR / path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = float(options.get('timeout', 5))
+        self._local = threading.local()
+        self._incr_count = 0
+
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expiry REAL NOT NULL
+            )
+        ''')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        """Una conexión por hilo, en autocommit (cada sentencia es atómica)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._connection()
+        count = conn.execute('''
+            INSERT INTO rate_limits (key, count, expiry) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                count = CASE WHEN expiry <= ? THEN excluded.count ELSE count + excluded.count END,
+                expiry = CASE WHEN expiry <= ? THEN excluded.expiry ELSE expiry END
+            RETURNING count
+        ''', (key, amount, now + expiry, now, now)).fetchone()[0]
+
+        self._incr_count += 1
+        if self._incr_count % self.CLEANUP_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expiry <= ?", (now,))
+        return count
+
+    def get(self, key: str) -> int:
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expiry > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connection().execute(
+            "SELECT expiry FROM rate_limits WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row and row[0] > time.time() else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
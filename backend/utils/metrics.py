@@ -0,0 +1,54 @@
+"""
+Métricas internas del servidor (contadores y gauges en memoria)
+"""
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """
+    Registro thread-safe de métricas de proceso.
+
+    - Contadores: solo crecen (ej. 'report_cache.hits')
+    - Gauges: valor actual (ej. 'analysis.in_flight')
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._gauges = defaultdict(float)
+
+    def incr(self, name: str, amount: int = 1):
+        """Incrementa un contador"""
+        with self._lock:
+            self._counters[name] += amount
+
+    def gauge_add(self, name: str, delta: float):
+        """Suma (o resta) un delta a un gauge"""
+        with self._lock:
+            self._gauges[name] += delta
+
+    def set_gauge(self, name: str, value: float):
+        """Fija el valor de un gauge"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def get(self, name: str, default: float = 0) -> float:
+        """Devuelve el valor de un contador o gauge"""
+        with self._lock:
+            if name in self._counters:
+                return self._counters[name]
+            return self._gauges.get(name, default)
+
+    def snapshot(self) -> Dict:
+        """Copia de todas las métricas para exponerlas en la API"""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges)
+            }
+
+
+# Instancia global
+metrics = Metrics()
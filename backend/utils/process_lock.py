@@ -0,0 +1,78 @@
+"""
+Lock entre procesos basado en archivo
+
+Con varios procesos worker (serve.py, gunicorn...) cada uno importa app.py;
+las tareas periódicas (reintentos de sincronización, limpieza de auditoría,
+reanudar re-análisis) solo deben ejecutarse en uno. El primero que obtiene
+el lock lo mantiene mientras vive; si muere, el sistema operativo lo libera.
+
+exclusive() sirve para secciones cortas (p. ej. escribir una parte de una
+subida) que no deben solaparse entre procesos.
+"""
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Locks obtenidos por este proceso (el archivo debe seguir abierto)
+_held: Dict[str, object] = {}
+
+
+def _lock(handle) -> bool:
+    """Lock exclusivo sin esperar sobre un archivo abierto"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def try_acquire(path: Path) -> bool:
+    """
+    Intenta obtener (sin esperar) el lock exclusivo del archivo path.
+    True si este proceso lo tiene (también si ya lo tenía).
+    """
+    key = str(path)
+    if key in _held:
+        return True
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path, 'a+')
+    if not _lock(handle):
+        handle.close()
+        return False
+
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    _held[key] = handle
+    return True
+
+
+@contextmanager
+def exclusive(path: Path):
+    """
+    Lock exclusivo sin esperar durante el bloque `with`.
+    Produce True si se obtuvo; False si otro proceso o hilo lo tiene.
+    """
+    handle = open(path, 'a+')
+    try:
+        acquired = _lock(handle)
+        yield acquired
+    finally:
+        # Cerrar el archivo libera el lock (flock y msvcrt)
+        handle.close()
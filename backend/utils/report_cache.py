@@ -0,0 +1,171 @@
+"""
+Caché en disco de reportes renderizados (PDF/DOCX)
+
+Los reportes se direccionan por contenido: la clave es un hash SHA-256 de
+(results, company_data, chart_image, lang, format). Una exportación idéntica
+se sirve directamente desde disco sin volver a construir el documento.
+El tamaño total está acotado y se expulsan primero las entradas usadas
+hace más tiempo (LRU por mtime).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+import config as app_config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """Caché LRU en disco de reportes renderizados"""
+
+    CACHEABLE_FORMATS = {'pdf', 'docx'}
+    SUFFIX = '.bin'
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = self._scan_size()
+
+    # ==================== CLAVES ====================
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Calcula la clave de caché a partir de las partes del reporte.
+        Los dicts se serializan de forma canónica (sort_keys) para que el
+        orden de claves enviado por el cliente no afecte al hash.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (bytes, bytearray)):
+                digest.update(b'b:')
+                digest.update(hashlib.sha256(part).digest())
+            else:
+                digest.update(b'j:')
+                digest.update(json.dumps(
+                    part, sort_keys=True, ensure_ascii=False, default=str
+                ).encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    # ==================== LECTURA / ESCRITURA ====================
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Devuelve el reporte cacheado o None (y registra hit/miss)"""
+        path = self._path_for(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            metrics.incr('report_cache.misses')
+            return None
+        except OSError as e:
+            logger.warning(f"⚠️ Error leyendo caché de reportes {path.name}: {e}")
+            metrics.incr('report_cache.misses')
+            return None
+
+        # Marcar como usado recientemente (LRU)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        metrics.incr('report_cache.hits')
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Guarda un reporte y expulsa entradas antiguas si se supera el límite"""
+        if not data or len(data) > self.max_bytes:
+            return
+
+        path = self._path_for(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            # Si la clave ya existe el archivo se sustituye: no suma dos veces
+            replaced_bytes = path.stat().st_size
+        except OSError:
+            replaced_bytes = 0
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudo guardar reporte en caché: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        metrics.incr('report_cache.stores')
+
+        with self._lock:
+            self._total_bytes += len(data) - replaced_bytes
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            for entry in self.cache_dir.glob(f"*{self.SUFFIX}"):
+                entry.unlink(missing_ok=True)
+            self._total_bytes = 0
+
+    # ==================== EXPULSIÓN LRU ====================
+
+    def _scan_size(self) -> int:
+        return sum(
+            entry.stat().st_size
+            for entry in self.cache_dir.glob(f"*{self.SUFFIX}")
+            if entry.is_file()
+        )
+
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta volver bajo el límite"""
+        entries = []
+        for entry in self.cache_dir.glob(f"*{self.SUFFIX}"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        entries.sort(key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+            metrics.incr('report_cache.evictions')
+            logger.debug(f"Reporte expulsado de la caché: {entry.name}")
+
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Instancia global
+_report_cache = None
+
+
+def get_report_cache() -> ReportCache:
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = ReportCache(
+            app_config.REPORT_CACHE_DIR,
+            app_config.REPORT_CACHE_MAX_MB * 1024 * 1024
+        )
+    return _report_cache
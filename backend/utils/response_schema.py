@@ -0,0 +1,98 @@
+"""
+Esquema de respuesta v2 (compacto) para resultados y mediciones
+
+v1 (por defecto, sin cambios) repite cada valor bajo varios alias
+(file_name/filename, snr/signal_to_noise, pifas_*/pfas_*, fluor_total y sus
+copias aplanadas...) y las mediciones vuelven a copiar esos valores en el
+nivel superior junto al 'analysis' completo, que además incluye otra vez el
+espectro y los picos.
+
+v2 (rutas /api/v2/... o cabecera `X-API-Version: 2`):
+- Resultados: cada valor una sola vez, con su nombre canónico (los alias v1
+  y dónde está su valor se listan en RESULT_ALIASES)
+- Mediciones: columnas resumen (Database.SUMMARY_COLUMNS) en el nivel
+  superior y proyecciones explícitas con `?include=analysis,peaks,spectrum`;
+  el listado solo devuelve el resumen salvo que se pidan
+"""
+from typing import Dict, Iterable, Tuple
+
+from database import Database
+
+API_VERSION_HEADER = 'X-API-Version'
+V2_PREFIX = '/api/v2/'
+
+# Alias v1 → valor canónico en v2
+RESULT_ALIASES = {
+    'filename': 'file_name',
+    'sample_concentration': 'concentration',
+    'signal_to_noise': 'quality_metrics.snr',
+    'snr': 'quality_metrics.snr',
+    'fluor_percentage': 'fluor_total.percentage',
+    'fluor_area': 'fluor_total.total_area',
+    'total_integral': 'fluor_total.total_area',
+    'pifas_percentage': 'pifas.percentage',
+    'pfas_percentage': 'pifas.percentage',
+    'pifas_area': 'pifas.total_area',
+    'pfas_area': 'pifas.total_area',
+    'pfas_concentration': 'pifas_concentration',
+    'peaks_count': 'len(peaks)',
+}
+
+# Proyecciones de una medición v2 (además del resumen)
+MEASUREMENT_PROJECTIONS = ('analysis', 'peaks', 'spectrum', 'molecule_info')
+DETAIL_PROJECTIONS = ('analysis', 'peaks', 'spectrum')
+
+
+def requested_version(request) -> int:
+    """2 si la ruta es /api/v2/... o el cliente envía X-API-Version: 2"""
+    if request.path.startswith(V2_PREFIX):
+        return 2
+    return 2 if request.headers.get(API_VERSION_HEADER, '').strip() == '2' else 1
+
+
+def requested_projections(request, default: Iterable[str] = ()) -> Tuple[str, ...]:
+    """
+    Proyecciones pedidas con ?include= (lista separada por comas, 'all' = todas).
+    Sin el parámetro se usa default; con include= vacío, solo el resumen.
+    """
+    include = request.args.get('include')
+    if include is None:
+        return tuple(default)
+    names = {name.strip().lower() for name in include.split(',') if name.strip()}
+    if 'all' in names:
+        return MEASUREMENT_PROJECTIONS
+    return tuple(name for name in MEASUREMENT_PROJECTIONS if name in names)
+
+
+def compact_result(results: Dict) -> Dict:
+    """Resultado de análisis v2: sin los alias v1"""
+    return {key: value for key, value in results.items() if key not in RESULT_ALIASES}
+
+
+def compact_measurement(measurement: Dict, include: Iterable[str] = ()) -> Dict:
+    """
+    Medición v2. Acepta tanto la medición completa (_row_to_measurement)
+    como una fila resumen (SUMMARY_COLUMNS).
+    """
+    include = set(include)
+    compact = {key: measurement.get(key) for key in Database.SUMMARY_COLUMNS}
+    compact['synced'] = bool(compact['synced'])
+
+    if 'analysis' in include:
+        analysis = compact_result(measurement.get('analysis') or {})
+        # Espectro y picos tienen su propia proyección; el resumen ya está arriba
+        compact['analysis'] = {
+            key: value for key, value in analysis.items()
+            if key not in ('spectrum', 'peaks') and key not in compact
+        }
+    for key in ('peaks', 'spectrum', 'molecule_info'):
+        if key in include:
+            compact[key] = measurement.get(key)
+    return compact
+
+
+def mark_version(response, version: int):
+    """Indica en la respuesta la versión del esquema usada"""
+    response.headers[API_VERSION_HEADER] = str(version)
+    response.vary.add(API_VERSION_HEADER)
+    return response
@@ -0,0 +1,151 @@
+"""
+Caché en memoria de espectros analizados recientemente
+
+Guarda el espectro sin corregir (ppm + intensidad + metadatos del lector)
+de cada análisis en vivo, junto con los últimos resultados devueltos. El
+ajuste interactivo de parámetros (/api/analyze/interactive) recalcula a
+partir de aquí en lugar de volver a subir y leer el archivo original.
+
+Las entradas se direccionan por id de sesión de análisis (y por
+measurement_id), caducan tras un TTL corto y se expulsan por LRU.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import config as app_config
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SpectrumCache:
+    """Caché LRU con TTL de sesiones de análisis (espectro + últimos resultados)"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._by_measurement: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def put(self, ppm, intensity, company_id: str, params: Dict, results: Dict,
+            metadata: Optional[Dict] = None, measurement_id: Optional[int] = None,
+            filename: Optional[str] = None) -> Optional[str]:
+        """
+        Registra una sesión y devuelve su id (None si la caché está desactivada).
+        results: resultados tal como se devolvieron al cliente (sin 'spectrum')
+        """
+        if self.max_entries <= 0:
+            return None
+
+        session_id = uuid.uuid4().hex
+        entry = {
+            'session_id': session_id,
+            'measurement_id': measurement_id,
+            'company_id': company_id,
+            'filename': filename,
+            'ppm': ppm,
+            'intensity': intensity,
+            'metadata': metadata or {},
+            'params': dict(params),
+            'results': results,
+            'expires': time.monotonic() + self.ttl_seconds,
+            'lock': threading.Lock()
+        }
+
+        with self._lock:
+            self._entries[session_id] = entry
+            if measurement_id is not None:
+                self._by_measurement[measurement_id] = session_id
+            self._evict()
+
+        metrics.incr('spectrum_cache.stores')
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Devuelve la sesión (y renueva su TTL) o None si no existe o caducó"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry['expires'] < time.monotonic():
+                if entry is not None:
+                    self._remove(session_id)
+                metrics.incr('spectrum_cache.misses')
+                return None
+            entry['expires'] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(session_id)
+
+        metrics.incr('spectrum_cache.hits')
+        return entry
+
+    def get_by_measurement(self, measurement_id: int) -> Optional[Dict]:
+        with self._lock:
+            session_id = self._by_measurement.get(measurement_id)
+        return self.get(session_id) if session_id else None
+
+    def update(self, session_id: str, params: Dict, results: Dict):
+        """Guarda los últimos parámetros/resultados devueltos para la sesión"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                entry['params'] = dict(params)
+                entry['results'] = results
+
+    def discard_measurement(self, measurement_id: int):
+        """Olvida la sesión de una medición (p.ej. al borrarla)"""
+        with self._lock:
+            session_id = self._by_measurement.get(measurement_id)
+            if session_id:
+                self._remove(session_id)
+
+    def discard_company(self, company_id: str):
+        """Olvida todas las sesiones de una empresa (o todas si es ADMIN)"""
+        with self._lock:
+            for session_id in [sid for sid, e in self._entries.items()
+                               if company_id in ('ADMIN', 'admin') or e['company_id'] == company_id]:
+                self._remove(session_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_measurement.clear()
+
+    def _remove(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry and self._by_measurement.get(entry['measurement_id']) == session_id:
+            del self._by_measurement[entry['measurement_id']]
+
+    def _evict(self):
+        """Quita las caducadas y, si sigue llena, las menos usadas"""
+        now = time.monotonic()
+        for session_id in [sid for sid, e in self._entries.items() if e['expires'] < now]:
+            self._remove(session_id)
+        while len(self._entries) > self.max_entries:
+            session_id = next(iter(self._entries))
+            self._remove(session_id)
+            metrics.incr('spectrum_cache.evictions')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds
+            }
+
+
+# Instancia global
+_spectrum_cache = None
+
+
+def get_spectrum_cache() -> SpectrumCache:
+    global _spectrum_cache
+    if _spectrum_cache is None:
+        _spectrum_cache = SpectrumCache(
+            app_config.SPECTRUM_CACHE_SIZE,
+            app_config.SPECTRUM_CACHE_TTL_SECONDS
+        )
+    return _spectrum_cache
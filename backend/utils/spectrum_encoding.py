@@ -0,0 +1,117 @@
+"""
+Representaciones binarias del espectro en la API
+
+En JSON cada punto del espectro ocupa ~18-20 bytes de texto decimal y el
+navegador tiene que parsearlo. El cliente puede pedir en su lugar:
+
+- Dentro del JSON (/api/analyze, /api/measurements/<id>): cabecera
+  `X-Spectrum-Encoding: base64-f32le` (o `?spectrum_encoding=base64-f32le`)
+  → ppm e intensity como base64 de float32 little-endian, que el cliente
+  convierte directamente en Float32Array
+- Endpoint dedicado (/api/measurements/<id>/spectrum), según `Accept`:
+    application/octet-stream            float32 LE: ppm[n] + intensity[n]
+    application/vnd.apache.arrow.stream Arrow IPC (columnas ppm, intensity; requiere pyarrow)
+    application/json                    {"ppm": [...], "intensity": [...]}
+"""
+import base64
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+    pa = None
+
+SPECTRUM_ENCODING_HEADER = 'X-Spectrum-Encoding'
+BASE64_F32 = 'base64-f32le'
+SPECTRUM_ENCODINGS = ('json', BASE64_F32)
+
+OCTET_MIMETYPE = 'application/octet-stream'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+JSON_MIMETYPE = 'application/json'
+
+_F32_LE = np.dtype('<f4')
+
+
+def requested_encoding(request) -> str:
+    """Codificación del espectro pedida por el cliente ('json' por defecto)"""
+    encoding = (request.headers.get(SPECTRUM_ENCODING_HEADER)
+                or request.args.get('spectrum_encoding') or 'json').strip().lower()
+    return encoding if encoding in SPECTRUM_ENCODINGS else 'json'
+
+
+def spectrum_arrays(spectrum: Optional[Dict]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """(ppm, intensity) como float32 LE, o None si no hay espectro utilizable"""
+    if not isinstance(spectrum, dict) or spectrum.get('encoding'):
+        return None
+    ppm, intensity = spectrum.get('ppm'), spectrum.get('intensity')
+    if ppm is None or intensity is None or len(ppm) != len(intensity) or len(ppm) == 0:
+        return None
+    return (np.asarray(ppm, dtype=np.float64).astype(_F32_LE),
+            np.asarray(intensity, dtype=np.float64).astype(_F32_LE))
+
+
+def encode_spectrum(spectrum: Optional[Dict], encoding: str) -> Optional[Dict]:
+    """Copia del espectro con ppm/intensity codificados (el resto de claves se conserva)"""
+    if encoding != BASE64_F32:
+        return spectrum
+    arrays = spectrum_arrays(spectrum)
+    if arrays is None:
+        return spectrum
+    ppm, intensity = arrays
+    encoded = dict(spectrum)
+    encoded.update({
+        'encoding': BASE64_F32,
+        'points': int(ppm.size),
+        'ppm': base64.b64encode(ppm.tobytes()).decode('ascii'),
+        'intensity': base64.b64encode(intensity.tobytes()).decode('ascii'),
+    })
+    return encoded
+
+
+def encode_payload_spectra(payload: Dict, encoding: str) -> Dict:
+    """Codifica 'spectrum' y 'analysis.spectrum' de un resultado o medición (en sitio)"""
+    if encoding == 'json':
+        return payload
+    if 'spectrum' in payload:
+        payload['spectrum'] = encode_spectrum(payload['spectrum'], encoding)
+    analysis = payload.get('analysis')
+    if isinstance(analysis, dict) and 'spectrum' in analysis:
+        payload['analysis'] = dict(analysis, spectrum=encode_spectrum(analysis['spectrum'], encoding))
+    return payload
+
+
+def to_octet_stream(ppm: np.ndarray, intensity: np.ndarray) -> bytes:
+    """float32 LE: los n valores de ppm seguidos de los n de intensidad"""
+    return ppm.astype(_F32_LE).tobytes() + intensity.astype(_F32_LE).tobytes()
+
+
+def to_arrow_ipc(ppm: np.ndarray, intensity: np.ndarray) -> bytes:
+    """Stream Arrow IPC con un único RecordBatch (ppm, intensity: float32)"""
+    if not ARROW_AVAILABLE:
+        raise ImportError("pyarrow no está instalado. `pip install pyarrow`")
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(ppm, type=pa.float32()), pa.array(intensity, type=pa.float32())],
+        names=['ppm', 'intensity']
+    )
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate_mimetype(request) -> Optional[str]:
+    """
+    Mejor representación según Accept (None si ninguna es aceptable).
+    JSON primero: con 'Accept: */*' (fetch por defecto) se mantiene JSON.
+    """
+    offered = [JSON_MIMETYPE, OCTET_MIMETYPE]
+    if ARROW_AVAILABLE:
+        offered.append(ARROW_MIMETYPE)
+    if not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    return request.accept_mimetypes.best_match(offered)
@@ -7,6 +7,7 @@ from datetime import datetime
 # Importar el analizador
 sys.path.append(str(Path(__file__).parent.parent / "worker"))
 from analyzer import SpectrumAnalyzer
+from json_utils import write_json
 
 # ============================================================================
 # CONFIGURACIÓN
@@ -83,9 +84,7 @@ def process_file(file_path: Path, params: dict = None):
         result_filename = f"{file_path.stem}_analysis_{timestamp}.json"
         result_path = ANALYSIS_DIR / result_filename
         
-        import json
-        with open(result_path, "w") as f:
-            json.dump(results, f, indent=2)
+        write_json(result_path, results, indent=True)
         
         print(f"💾 Resultados guardados: {result_filename}")
         
@@ -40,6 +40,52 @@ class APIClient {
         };
     }
 
+    /**
+     * Espectro en binario dentro del JSON: base64 de float32 little-endian
+     * (~4 bytes/punto en lugar de ~20 de texto decimal)
+     */
+    static get SPECTRUM_ENCODING() {
+        return 'base64-f32le';
+    }
+
+    /**
+     * Convierte un espectro codificado ({encoding, ppm, intensity} en base64)
+     * en Float32Array. Los espectros en JSON plano se devuelven tal cual.
+     */
+    static decodeSpectrum(spectrum) {
+        if (!spectrum || spectrum.encoding !== this.SPECTRUM_ENCODING) {
+            return spectrum;
+        }
+        const decoded = { ...spectrum };
+        delete decoded.encoding;
+        decoded.ppm = this.base64ToFloat32(spectrum.ppm);
+        decoded.intensity = this.base64ToFloat32(spectrum.intensity);
+        return decoded;
+    }
+
+    static base64ToFloat32(text) {
+        const binary = atob(text);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        // Todas las plataformas con navegador son little-endian
+        return new Float32Array(bytes.buffer);
+    }
+
+    /**
+     * Decodifica 'spectrum' y 'analysis.spectrum' de un resultado o medición
+     */
+    static decodeSpectra(payload) {
+        if (payload?.spectrum) {
+            payload.spectrum = this.decodeSpectrum(payload.spectrum);
+        }
+        if (payload?.analysis?.spectrum) {
+            payload.analysis.spectrum = this.decodeSpectrum(payload.analysis.spectrum);
+        }
+        return payload;
+    }
+
     /**
      * ✅ NUEVO: Verificar si hay token válido
      */
@@ -106,6 +152,106 @@ class APIClient {
         }
     }
 
+    /**
+     * A partir de este tamaño el archivo se sube por partes (/api/uploads)
+     */
+    static get CHUNKED_UPLOAD_THRESHOLD() {
+        return 8 * 1024 * 1024;
+    }
+
+    static get CHUNK_MAX_RETRIES() {
+        return 5;
+    }
+
+    /**
+     * Sube el archivo por partes y lo analiza al completar. Si la conexión
+     * cae, reintenta desde el offset que tiene el servidor; el upload_id se
+     * guarda en localStorage para reanudar también tras recargar la página.
+     * Devuelve la Response de /complete (o la del primer error).
+     */
+    static async analyzeChunked(file, parameters, headers) {
+        const companyId = CURRENT_COMPANY_PROFILE.company_id;
+        const resumeKey = `upload:${companyId}:${file.name}:${file.size}:${file.lastModified}`;
+        let upload = null;
+
+        const savedId = localStorage.getItem(resumeKey);
+        if (savedId) {
+            const response = await fetch(`${this.baseURL}/api/uploads/${savedId}`, { headers });
+            if (response.ok) {
+                upload = await response.json();
+                window.APP_LOGGER.debug(`Resuming upload ${savedId} at ${upload.received} bytes`);
+            }
+        }
+
+        if (!upload) {
+            const response = await fetch(`${this.baseURL}/api/uploads`, {
+                method: 'POST',
+                headers: { ...headers, 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, size: file.size, company_id: companyId })
+            });
+            if (!response.ok) {
+                return response;
+            }
+            upload = await response.json();
+            localStorage.setItem(resumeKey, upload.upload_id);
+        }
+
+        const uploadURL = `${this.baseURL}/api/uploads/${upload.upload_id}`;
+        const chunkSize = Math.min(upload.chunk_size || this.CHUNKED_UPLOAD_THRESHOLD, this.CHUNKED_UPLOAD_THRESHOLD);
+        let offset = upload.received;
+        let retries = 0;
+
+        while (offset < file.size) {
+            const end = Math.min(offset + chunkSize, file.size);
+            let response;
+            try {
+                response = await fetch(uploadURL, {
+                    method: 'PUT',
+                    headers: {
+                        ...headers,
+                        'Content-Type': 'application/octet-stream',
+                        'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`
+                    },
+                    body: file.slice(offset, end)
+                });
+            } catch (error) {
+                // Conexión caída: esperar y preguntar cuánto ha recibido el servidor
+                if (++retries > this.CHUNK_MAX_RETRIES) {
+                    throw error;
+                }
+                window.APP_LOGGER.warn(`Chunk upload failed (retry ${retries}):`, error);
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                const status = await fetch(uploadURL, { headers }).catch(() => null);
+                if (status?.ok) {
+                    offset = (await status.json()).received;
+                }
+                continue;
+            }
+
+            if (response.status === 409) {
+                const conflict = await response.clone().json();
+                if (typeof conflict.received === 'number') {
+                    offset = conflict.received;
+                    continue;
+                }
+            }
+            if (!response.ok) {
+                localStorage.removeItem(resumeKey);
+                return response;
+            }
+            offset = (await response.json()).received;
+            retries = 0;
+        }
+
+        const response = await fetch(`${uploadURL}/complete`, {
+            method: 'POST',
+            headers: { ...headers, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ parameters: parameters || {} })
+        });
+        localStorage.removeItem(resumeKey);
+        return response;
+    }
+
     /**
      * ✅ MEJORADO: Análisis con JWT y mejor manejo de errores
      */
@@ -135,7 +281,7 @@ class APIClient {
         try {
             // ✅ NUEVO: Incluir token en headers
             const token = localStorage.getItem('access_token');
-            const headers = {};
+            const headers = { 'X-Spectrum-Encoding': this.SPECTRUM_ENCODING };
             
             if (token) {
                 headers['Authorization'] = `Bearer ${token}`;
@@ -144,11 +290,14 @@ class APIClient {
                 window.APP_LOGGER.warn('⚠️ No hay token - La petición puede fallar');
             }
 
-            const response = await fetch(`${this.baseURL}/api/analyze`, {
-                method: 'POST',
-                headers: headers,
-                body: formData
-            });
+            // Archivos grandes: subida por partes reanudable
+            const response = file.size > this.CHUNKED_UPLOAD_THRESHOLD
+                ? await this.analyzeChunked(file, parameters, headers)
+                : await fetch(`${this.baseURL}/api/analyze`, {
+                    method: 'POST',
+                    headers: headers,
+                    body: formData
+                });
 
             let result;
             const contentType = response.headers.get('content-type');
@@ -186,7 +335,7 @@ class APIClient {
                 pfas_detected: result.pfas_detection?.total_detected || 0
             });
             
-            return result;
+            return this.decodeSpectra(result);
 
         } catch (error) {
             window.APP_LOGGER.error('Analysis request failed:', error);
@@ -206,6 +355,8 @@ class APIClient {
 
     /**
      * ✅ MEJORADO: Obtiene el historial con JWT
+     * Esquema v2: solo las columnas resumen de cada medición (sin análisis
+     * completo ni espectro), que es lo que muestran historial y comparación
      */
     static async getHistory(page = 1, pageSize = 50, searchTerm = '') {
         try {
@@ -221,9 +372,9 @@ class APIClient {
                 params.append('search', searchTerm);
             }
 
-            window.APP_LOGGER.debug(`Fetching history: ${this.baseURL}/api/history?${params}`);
+            window.APP_LOGGER.debug(`Fetching history: ${this.baseURL}/api/v2/history?${params}`);
 
-            const response = await fetch(`${this.baseURL}/api/history?${params}`, {
+            const response = await fetch(`${this.baseURL}/api/v2/history?${params}`, {
                 method: 'GET',
                 headers: this.getAuthHeaders(this.getHeaders())
             });
@@ -246,6 +397,38 @@ class APIClient {
         }
     }
 
+    /**
+     * Estadísticas agregadas del dashboard (calculadas en el servidor)
+     */
+    static async getDashboardStats({ dateFrom = null, dateTo = null, bucket = 'day' } = {}) {
+        try {
+            const params = new URLSearchParams({
+                company: this.getCompanyId(),
+                bucket: bucket
+            });
+
+            if (dateFrom) params.append('date_from', dateFrom);
+            if (dateTo) params.append('date_to', dateTo);
+
+            const response = await fetch(`${this.baseURL}/api/dashboard/stats?${params}`, {
+                method: 'GET',
+                headers: this.getAuthHeaders(this.getHeaders())
+            });
+
+            const data = await response.json();
+
+            if (!response.ok) {
+                throw new Error(data.error || `HTTP ${response.status}`);
+            }
+
+            return data;
+
+        } catch (error) {
+            window.APP_LOGGER.error('Failed to load dashboard stats:', error);
+            throw error;
+        }
+    }
+
     /**
      * ✅ MEJORADO: Exporta datos con JWT
      */
@@ -273,7 +456,9 @@ class APIClient {
             const response = await fetch(`${this.baseURL}/api/export`, {
                 method: 'POST',
                 headers: this.getAuthHeaders({ 'Content-Type': 'application/json' }),
-                body: JSON.stringify(requestBody)
+                // Los espectros decodificados son Float32Array: se envían como listas
+                body: JSON.stringify(requestBody, (key, value) =>
+                    ArrayBuffer.isView(value) ? Array.from(value) : value)
             });
 
             if (!response.ok) {
@@ -432,7 +617,7 @@ class APIClient {
             APP_LOGGER.debug(`Fetching measurement: ${url}`);
             
             const response = await fetch(url, {
-                headers: this.getAuthHeaders()
+                headers: this.getAuthHeaders({ 'X-Spectrum-Encoding': this.SPECTRUM_ENCODING })
             });
             
             if (!response.ok) {
@@ -443,13 +628,42 @@ class APIClient {
             const data = await response.json();
             APP_LOGGER.info(`Measurement ${measurementId} loaded`);
             
-            return data;
+            return this.decodeSpectra(data);
             
         } catch (error) {
             APP_LOGGER.error('Error fetching measurement:', error);
             throw error;
         }
     }
+
+    /**
+     * Solo el espectro de una medición, en binario (float32 LE: ppm + intensity)
+     * @returns {Promise<{ppm: Float32Array, intensity: Float32Array}>}
+     */
+    static async getSpectrum(measurementId) {
+        try {
+            const url = `${this.baseURL}/api/measurements/${measurementId}/spectrum`;
+            const response = await fetch(url, {
+                headers: this.getAuthHeaders({ 'Accept': 'application/octet-stream' })
+            });
+            
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({}));
+                throw new Error(errorData.error || `HTTP ${response.status}`);
+            }
+            
+            const buffer = await response.arrayBuffer();
+            const points = parseInt(response.headers.get('X-Spectrum-Points'), 10);
+            return {
+                ppm: new Float32Array(buffer, 0, points),
+                intensity: new Float32Array(buffer, points * 4, points)
+            };
+            
+        } catch (error) {
+            APP_LOGGER.error('Error fetching spectrum:', error);
+            throw error;
+        }
+    }
     
     /**
      * ✅ Obtiene la configuración del servidor
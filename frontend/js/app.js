@@ -467,9 +467,13 @@ async function exportReport(format = null) {
 
         const companyProfile = window.CURRENT_COMPANY_PROFILE || {};
 
+        // Si la medición está guardada, el servidor renderiza el gráfico
+        // (evita subir la imagen base64 del navegador)
+        const measurementId = currentAnalysisData.measurement_id || currentAnalysisData.id || null;
+
         // Capturar imagen del gráfico
         let chartImage = null;
-        if (window.ChartManager && typeof ChartManager.getChartAsBase64 === 'function') {
+        if (!measurementId && window.ChartManager && typeof ChartManager.getChartAsBase64 === 'function') {
             try {
                 chartImage = await ChartManager.getChartAsBase64();
             } catch (chartError) {
@@ -560,8 +564,9 @@ async function exportReport(format = null) {
                 }))
             },
             
-            // ✅ Imagen del gráfico
+            // ✅ Imagen del gráfico (o referencia a la medición)
             chart_image: chartImage,
+            measurement_id: measurementId,
             
             // ✅ DATOS DE LA EMPRESA para el branding
             company_data: {
@@ -293,7 +293,7 @@ class ComparisonManager {
         const rows = [
             { label: (window.LanguageManager?.t('results.fluor') || 'Flúor') + ' (%)', values: this.selectedSamples.map(s => (Number(s.fluor_percentage || 0)).toFixed(2)) },
             { label: (window.LanguageManager?.t('results.pfas') || 'PFAS') + ' (%)', values: this.selectedSamples.map(s => (Number(s.pfas_percentage ?? s.pifas_percentage ?? 0)).toFixed(2)) },
-            { label: (window.LanguageManager?.t('results.concentration') || 'Concentración') + ' (mM)', values: this.selectedSamples.map(s => (Number(s.analysis?.pifas_concentration ?? s.concentration ?? 0)).toFixed(4)) },
+            { label: (window.LanguageManager?.t('results.concentration') || 'Concentración') + ' (mM)', values: this.selectedSamples.map(s => (Number(s.analysis?.pifas_concentration ?? s.pifas_concentration ?? s.concentration ?? 0)).toFixed(4)) },
             { label: (window.LanguageManager?.t('results.quality') || 'Calidad') + ' (/10)', values: this.selectedSamples.map(s => (Number(s.quality_score ?? 0)).toFixed(1)) },
             { label: (window.LanguageManager?.t('comparison.date') || 'Fecha'), values: this.selectedSamples.map(s => new Date(s.timestamp || s.created_at || Date.now()).toLocaleDateString()) }
         ];
@@ -395,7 +395,7 @@ class ComparisonManager {
                 filename: s.filename || s.sample_name,
                 fluor: Number(s.fluor_percentage || 0),
                 pfas: Number(s.pfas_percentage ?? s.pifas_percentage ?? 0),
-                concentration: Number(s.analysis?.pifas_concentration ?? s.concentration ?? 0),
+                concentration: Number(s.analysis?.pifas_concentration ?? s.pifas_concentration ?? s.concentration ?? 0),
                 quality: Number(s.quality_score ?? 0),
                 date: new Date(s.timestamp || s.created_at || Date.now()).toISOString()
             }));
@@ -4,8 +4,9 @@
 
 class DashboardManager {
     constructor() {
-        this.measurements = [];
-        this.filteredMeasurements = [];
+        // Estadísticas agregadas por el servidor (/api/dashboard/stats)
+        this.stats = null;
+        this.dateRange = { dateFrom: null, dateTo: null };
         this.charts = {
             trend: null,
             distribution: null
@@ -93,9 +94,9 @@ class DashboardManager {
             // Mostrar indicador de carga
             this.showLoading(true);
             
-            // Cargar todas las mediciones (sin paginación para el dashboard)
-            console.log('[Dashboard] 🔍 Llamando a APIClient.getHistory...');
-            const response = await APIClient.getHistory(1, 1000);
+            // Estadísticas calculadas en el servidor (no se descargan mediciones)
+            console.log('[Dashboard] 🔍 Llamando a APIClient.getDashboardStats...', this.dateRange);
+            const response = await APIClient.getDashboardStats(this.dateRange);
             
             console.log('[Dashboard] ✅ Respuesta recibida:', response);
             
@@ -103,13 +104,12 @@ class DashboardManager {
                 throw new Error('No se recibió respuesta del servidor');
             }
             
-            this.measurements = response.measurements || [];
-            this.filteredMeasurements = [...this.measurements];
+            this.stats = response;
             
-            console.log(`[Dashboard] ✅ ${this.measurements.length} mediciones cargadas correctamente`);
+            console.log(`[Dashboard] ✅ Estadísticas de ${this.stats.totals.n} mediciones cargadas correctamente`);
             
             // Verificar si hay datos
-            if (this.measurements.length === 0) {
+            if (this.stats.totals.n === 0) {
                 console.log('[Dashboard] ⚠️ No hay datos para mostrar');
                 this.showEmptyState();
             } else {
@@ -213,21 +213,15 @@ class DashboardManager {
                 break;
             case 'all':
             default:
-                this.filteredMeasurements = [...this.measurements];
-                this.updateStatistics();
-                this.updateCharts();
+                this.dateRange = { dateFrom: null, dateTo: null };
+                this.loadData();
                 return;
         }
 
-        this.filteredMeasurements = this.measurements.filter(m => {
-            const measurementDate = new Date(m.timestamp || m.created_at);
-            return measurementDate >= startDate;
-        });
-
-        console.log(`[Dashboard] Filtro aplicado: ${this.filteredMeasurements.length} mediciones`);
+        this.dateRange = { dateFrom: this.toISODate(startDate), dateTo: null };
+        console.log('[Dashboard] Filtro aplicado:', this.dateRange);
         
-        this.updateStatistics();
-        this.updateCharts();
+        this.loadData();
     }
 
     /**
@@ -242,19 +236,19 @@ class DashboardManager {
             return;
         }
 
-        const startDate = new Date(dateFrom);
-        const endDate = new Date(dateTo);
-        endDate.setHours(23, 59, 59, 999);
-
-        this.filteredMeasurements = this.measurements.filter(m => {
-            const measurementDate = new Date(m.timestamp || m.created_at);
-            return measurementDate >= startDate && measurementDate <= endDate;
-        });
-
-        console.log(`[Dashboard] Filtro personalizado: ${this.filteredMeasurements.length} mediciones`);
+        // Los inputs de tipo date ya dan 'YYYY-MM-DD' (fin de rango inclusive)
+        this.dateRange = { dateFrom: dateFrom, dateTo: dateTo };
+        console.log('[Dashboard] Filtro personalizado:', this.dateRange);
         
-        this.updateStatistics();
-        this.updateCharts();
+        this.loadData();
+    }
+
+    /**
+     * Fecha local en formato 'YYYY-MM-DD'
+     */
+    toISODate(value) {
+        const pad = n => String(n).padStart(2, '0');
+        return `${value.getFullYear()}-${pad(value.getMonth() + 1)}-${pad(value.getDate())}`;
     }
 
     /**
@@ -271,20 +265,19 @@ class DashboardManager {
         if (quickFilter) quickFilter.value = 'all';
         if (customDateRange) customDateRange.style.display = 'none';
         
-        this.filteredMeasurements = [...this.measurements];
-        this.updateStatistics();
-        this.updateCharts();
+        this.dateRange = { dateFrom: null, dateTo: null };
+        this.loadData();
     }
 
     /**
      * Actualiza las estadísticas
      */
     updateStatistics() {
-        const measurements = this.filteredMeasurements;
+        const totals = this.stats?.totals || { n: 0 };
         
-        console.log('[Dashboard] Actualizando estadísticas con', measurements.length, 'mediciones');
+        console.log('[Dashboard] Actualizando estadísticas con', totals.n, 'mediciones');
         
-        if (measurements.length === 0) {
+        if (totals.n === 0) {
             document.getElementById('dashTotalAnalyses').textContent = '0';
             document.getElementById('dashAvgFluor').textContent = '0%';
             document.getElementById('dashAvgPfas').textContent = '0%';
@@ -292,18 +285,18 @@ class DashboardManager {
         }
 
         // Total de análisis
-        document.getElementById('dashTotalAnalyses').textContent = measurements.length;
+        document.getElementById('dashTotalAnalyses').textContent = totals.n;
 
         // Promedio de flúor
-        const avgFluor = measurements.reduce((sum, m) => sum + (m.fluor_percentage || 0), 0) / measurements.length;
+        const avgFluor = totals.avg_fluor || 0;
         document.getElementById('dashAvgFluor').textContent = `${avgFluor.toFixed(2)}%`;
 
         // Promedio de PFAS
-        const avgPfas = measurements.reduce((sum, m) => sum + (m.pfas_percentage || m.pifas_percentage || 0), 0) / measurements.length;
+        const avgPfas = totals.avg_pifas || 0;
         document.getElementById('dashAvgPfas').textContent = `${avgPfas.toFixed(2)}%`;
         
         console.log('[Dashboard] Estadísticas actualizadas:', {
-            total: measurements.length,
+            total: totals.n,
             avgFluor: avgFluor.toFixed(2),
             avgPfas: avgPfas.toFixed(2)
         });
@@ -322,9 +315,9 @@ class DashboardManager {
      * Actualiza el gráfico de tendencia
      */
     updateTrendChart() {
-        const measurements = this.filteredMeasurements.slice().reverse(); // Más antiguos primero
+        const trend = this.stats?.trend || []; // Ordenada por periodo (más antiguos primero)
 
-        if (measurements.length === 0) {
+        if (trend.length === 0) {
             const chartDiv = document.getElementById('trendChart');
             if (chartDiv) {
                 chartDiv.innerHTML = '<div style="text-align:center;color:#9ca3af;padding:40px;">No hay datos para mostrar</div>';
@@ -334,16 +327,16 @@ class DashboardManager {
 
         const traces = [
             {
-                x: measurements.map(m => new Date(m.timestamp || m.created_at)),
-                y: measurements.map(m => m.fluor_percentage || 0),
+                x: trend.map(t => t.period),
+                y: trend.map(t => t.avg_fluor || 0),
                 name: 'Flúor (%)',
                 type: 'scatter',
                 mode: 'lines+markers',
                 line: { color: '#10b981' }
             },
             {
-                x: measurements.map(m => new Date(m.timestamp || m.created_at)),
-                y: measurements.map(m => m.pfas_percentage || m.pifas_percentage || 0),
+                x: trend.map(t => t.period),
+                y: trend.map(t => t.avg_pifas || 0),
                 name: 'PFAS (%)',
                 type: 'scatter',
                 mode: 'lines+markers',
@@ -377,9 +370,9 @@ class DashboardManager {
      * Actualiza el gráfico de distribución
      */
     updateDistributionChart() {
-        const measurements = this.filteredMeasurements;
+        const categories = this.stats?.quality_distribution;
 
-        if (measurements.length === 0) {
+        if (!categories || this.stats.totals.n === 0) {
             const chartDiv = document.getElementById('distributionChart');
             if (chartDiv) {
                 chartDiv.innerHTML = '<div style="text-align:center;color:#9ca3af;padding:40px;">No hay datos para mostrar</div>';
@@ -387,21 +380,6 @@ class DashboardManager {
             return;
         }
 
-        const categories = {
-            excellent: 0,
-            good: 0,
-            regular: 0,
-            low: 0
-        };
-
-        measurements.forEach(m => {
-            const quality = m.quality_score || 0;
-            if (quality >= 8) categories.excellent++;
-            else if (quality >= 6) categories.good++;
-            else if (quality >= 4) categories.regular++;
-            else categories.low++;
-        });
-
         const data = [{
             values: [categories.excellent, categories.good, categories.regular, categories.low],
             labels: ['Excelente', 'Buena', 'Regular', 'Baja'],
@@ -433,7 +411,7 @@ class DashboardManager {
             return;
         }
 
-        const recent = this.measurements.slice(0, 10); // Últimos 10
+        const recent = this.stats?.recent || []; // Últimos 10
 
         if (recent.length === 0) {
             tbody.innerHTML = `
@@ -451,7 +429,7 @@ class DashboardManager {
                 <td>${this.escapeHtml(m.filename || m.sample_name || 'N/A')}</td>
                 <td>${new Date(m.timestamp || m.created_at).toLocaleString()}</td>
                 <td>${(m.fluor_percentage || 0).toFixed(2)}%</td>
-                <td>${(m.pfas_percentage || m.pifas_percentage || 0).toFixed(2)}%</td>
+                <td>${(m.pifas_percentage || 0).toFixed(2)}%</td>
                 <td>${(m.quality_score || 0).toFixed(1)}/10</td>
             </tr>
         `).join('');
@@ -490,15 +468,16 @@ class DashboardManager {
                 UIManager.showLoading('Exportando dashboard...');
             }
 
-            // Recopilar estadísticas
+            // Recopilar estadísticas (ya agregadas por el servidor)
+            const totals = this.stats?.totals || { n: 0 };
             const stats = {
-                totalAnalyses: this.filteredMeasurements.length,
-                avgFluor: this.filteredMeasurements.reduce((sum, m) => sum + (m.fluor_percentage || 0), 0) / this.filteredMeasurements.length,
-                avgPfas: this.filteredMeasurements.reduce((sum, m) => sum + (m.pfas_percentage || m.pifas_percentage || 0), 0) / this.filteredMeasurements.length,
-                avgConcentration: this.filteredMeasurements.reduce((sum, m) => sum + (m.analysis?.pifas_concentration || m.concentration || 0), 0) / this.filteredMeasurements.length,
-                avgQuality: this.filteredMeasurements.reduce((sum, m) => sum + (m.quality_score || 0), 0) / this.filteredMeasurements.length,
-                avgSNR: this.filteredMeasurements.reduce((sum, m) => sum + (m.snr || m.signal_to_noise || 0), 0) / this.filteredMeasurements.length,
-                highQualitySamples: this.filteredMeasurements.filter(m => (m.quality_score || 0) >= 8).length
+                totalAnalyses: totals.n,
+                avgFluor: totals.avg_fluor || 0,
+                avgPfas: totals.avg_pifas || 0,
+                avgConcentration: totals.avg_concentration || 0,
+                avgQuality: totals.avg_quality || 0,
+                avgSNR: null,
+                highQualitySamples: this.stats?.quality_distribution?.excellent || 0
             };
 
             // Capturar gráficos como imágenes
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark del procesado de FID Bruker
+======================================
+Compara el camino nmrglue (NMRDataReader por defecto) con el camino
+mapeado en memoria + in situ (NMR_FID_MODE=mmap) sobre FID sintéticos
+de 32k/64k/128k puntos complejos.
+
+Mide por tamaño:
+- Tiempo medio de lectura + procesado
+- Pico de memoria (tracemalloc; las páginas del memmap no cuentan porque
+  las respalda el archivo). El lector ya ha procesado un FID, así que es el
+  pico en régimen de lote (workspace y ventana ya en caché)
+- Tamaño de FFT y resolución digital (Hz/punto)
+
+Segunda tabla: zero filling exacto 2× (sin workspace ni caché) frente a
+tamaño 5-smooth + workspace reutilizado, con TD que no son potencia de 2.
+
+Tercera tabla: autophase (NMR_PHASE_MODE=auto) por espectro, sobre el mismo
+FID con un error de fase conocido (p0, p1) → fase recuperada y tiempo.
+
+Ejecutar: python tests/bench_fid_processing.py [repeticiones]
+"""
+
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+# --- Configuración de Rutas ---
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+WORKER_DIR = ROOT_DIR / "worker"
+sys.path.insert(0, str(WORKER_DIR))
+
+import fid_processing
+from nmr_reader import NMRDataReader, NMRGLUE_AVAILABLE
+
+SIZES = (32768, 65536, 131072)
+# Puntos complejos "incómodos" (2× no es un tamaño de FFT rápido)
+ODD_SIZES = (32771, 65551, 131101)
+# Error de fase aplicado al FID sintético en la tabla de autophase (grados)
+PHASE_ERRORS = ((40.0, -60.0), (-120.0, 150.0))
+SW_HZ = 100_000.0
+SFO1 = 470.4
+
+ACQUS_TEMPLATE = """##TITLE= Parameter file
+##JCAMPDX= 5.0
+##$AQ_mod= 3
+##$BYTORDA= 0
+##$DTYPA= 0
+##$TD= {td}
+##$SW= {sw_ppm}
+##$SW_h= {sw_hz}
+##$SFO1= {sfo1}
+##$O1= {o1}
+##$NUC1= <19F>
+##$NS= 16
+##END=
+"""
+
+
+def make_bruker_fid(directory: Path, n_complex: int):
+    """FID DQD int32 con tres señales PFAS amortiguadas y ruido"""
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(n_complex)
+    t = np.arange(n_complex) / SW_HZ
+    fid = np.zeros(n_complex, dtype=np.complex128)
+    for offset_hz, amplitude in ((-8000.0, 1.0), (1500.0, 0.6), (12000.0, 0.3)):
+        fid += amplitude * np.exp(2j * np.pi * offset_hz * t - t * 5.0)
+    fid += (rng.normal(size=n_complex) + 1j * rng.normal(size=n_complex)) * 0.01
+
+    interleaved = np.empty(n_complex * 2, dtype='<i4')
+    interleaved[0::2] = np.round(fid.real * 2e7)
+    interleaved[1::2] = np.round(fid.imag * 2e7)
+    interleaved.tofile(directory / 'fid')
+
+    (directory / 'acqus').write_text(ACQUS_TEMPLATE.format(
+        td=n_complex * 2, sw_ppm=SW_HZ / SFO1, sw_hz=SW_HZ, sfo1=SFO1, o1=-100 * SFO1
+    ))
+
+
+def measure(reader: NMRDataReader, path: Path, repeats: int):
+    _, _, metadata = reader.read_data(path)  # calentamiento (imports, cachés del SO)
+
+    tracemalloc.start()
+    reader.read_data(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        reader.read_data(path)
+    elapsed = (time.perf_counter() - started) / repeats
+    return elapsed, peak, metadata.get('resolution', {})
+
+
+def time_zero_fill(raw_data, repeats: int, fast: bool) -> float:
+    """ms por FID: exacto 2× con buffers nuevos, o 5-smooth con workspace"""
+    size = fid_processing.zero_fill_size(raw_data.n_complex, fast=fast)
+    workspace = fid_processing.FIDWorkspace() if fast else None
+    fid_processing.process_fid_inplace(raw_data.row(0), True, raw_data.sw_hz,
+                                       size=size, workspace=workspace)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        if not fast:
+            fid_processing._cached_window.cache_clear()
+        fid_processing.process_fid_inplace(raw_data.row(0), True, raw_data.sw_hz,
+                                           size=size, workspace=workspace)
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def time_autophase(raw_data, repeats: int, p0: float, p1: float):
+    """Desfasa el FID (orden 0 y 1) y mide cuánto tarda autophase en recuperarlo"""
+    fid = np.asarray(raw_data.row(0), dtype=np.float64)
+    spectrum = np.fft.fftshift(np.fft.fft(fid[0::2] + 1j * fid[1::2],
+                                          fid_processing.zero_fill_size(raw_data.n_complex)))
+    fid_processing.apply_phase(spectrum, -p0, -p1)
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        found = fid_processing.autophase(spectrum)
+    return (time.perf_counter() - started) / repeats * 1000, found
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', module='nmrglue')
+
+    modes = ['mmap']
+    if NMRGLUE_AVAILABLE:
+        modes.insert(0, 'nmrglue')
+
+    print("=" * 72)
+    print("⏱️  BENCHMARK: procesado de FID Bruker")
+    print("=" * 72)
+    print(f"{'puntos':>8} {'modo':>8} {'tiempo (ms)':>12} {'pico (MB)':>10} {'FID (MB)':>9} "
+          f"{'FFT':>7} {'Hz/pt':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_complex in SIZES:
+            path = Path(tmp) / str(n_complex)
+            make_bruker_fid(path, n_complex)
+            fid_mb = (path / 'fid').stat().st_size / 1e6
+            for mode in modes:
+                elapsed, peak, resolution = measure(NMRDataReader(fid_mode=mode), path, repeats)
+                print(f"{n_complex:>8} {mode:>8} {elapsed * 1000:>12.1f} {peak / 1e6:>10.1f} {fid_mb:>9.2f} "
+                      f"{resolution.get('fft_size', 0):>7} {resolution.get('hz_per_point', 0):>7.3f}")
+
+        print()
+        print(f"{'puntos':>8} {'FFT 2×':>8} {'ms':>8} {'FFT rápida':>11} {'ms':>8}")
+        for n_complex in ODD_SIZES:
+            path = Path(tmp) / str(n_complex)
+            make_bruker_fid(path, n_complex)
+            raw_data = fid_processing.open_bruker_raw(path)
+            exact_ms = time_zero_fill(raw_data, repeats, fast=False)
+            fast_ms = time_zero_fill(raw_data, repeats, fast=True)
+            print(f"{n_complex:>8} {n_complex * 2:>8} {exact_ms:>8.1f} "
+                  f"{fid_processing.zero_fill_size(n_complex):>11} {fast_ms:>8.1f}")
+
+        print()
+        print(f"{'puntos':>8} {'error (p0, p1)':>16} {'recuperada':>18} {'ms/espectro':>12}")
+        for n_complex in SIZES:
+            raw_data = fid_processing.open_bruker_raw(Path(tmp) / str(n_complex))
+            for p0, p1 in PHASE_ERRORS:
+                elapsed, (found_p0, found_p1) = time_autophase(raw_data, repeats, p0, p1)
+                print(f"{n_complex:>8} {f'({p0:.0f}, {p1:.0f})':>16} "
+                      f"{f'({found_p0:.1f}, {found_p1:.1f})':>18} {elapsed:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la búsqueda del historial
+=======================================
+Crea una BD temporal con N mediciones sintéticas (filename + compuestos
+detectados en raw_data) y compara:
+
+- LIKE '%término%' sobre filename (búsqueda anterior: recorre la tabla)
+- Índice FTS5 (filename + compuestos) vía Database.get_measurements_with_search
+- FTS5 + filtros por rango (pifas_percentage, quality_score, fecha)
+
+Segunda tabla: consultas por compuesto sobre measurement_compounds
+(apariciones y tendencia) frente a decodificar raw_data de cada fila.
+
+También mide el relleno inicial del índice FTS5 y de measurement_compounds
+al abrir una BD existente.
+
+Ejecutar: python tests/bench_history_search.py [n_mediciones]
+"""
+
+import json
+import logging
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# --- Configuración de Rutas ---
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from database import Database
+
+COMPANIES = ('FAES', 'AUGAS_GALICIA', 'LABORATORIO_X')
+COMPOUNDS = (
+    ('PFOA (Perfluorooctanoic acid)', '335-67-1'),
+    ('PFOS (Perfluorooctanesulfonic acid)', '1763-23-1'),
+    ('PFHxS (Perfluorohexanesulfonic acid)', '355-46-4'),
+    ('GenX (HFPO-DA)', '13252-13-6'),
+    ('6:2 FTS (Fluorotelomer sulfonate)', '27619-97-2'),
+)
+QUERIES = (
+    ('012345', {}),
+    ('pozo_01234', {}),
+    ('muestra_rio', {}),
+    ('PFOS', {}),
+    ('genx', {'pifas_min': 20.0}),
+    ('pfoa', {'quality_min': 7.0, 'date_from': '2025-06-01'}),
+)
+# (compuesto, min_confidence, date_from) para la tabla de compuestos
+COMPOUND_QUERIES = (
+    ('PFOS', 70.0, '2025-07-01'),
+    ('335-67-1', None, None),
+)
+REPEATS = 5
+
+
+def populate(db_path: Path, n: int):
+    """Inserta n mediciones directamente (sin índice FTS: lo rellena Database)"""
+    rng = random.Random(n)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("""
+        CREATE TABLE measurements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT NOT NULL,
+            company_id TEXT NOT NULL, timestamp TEXT NOT NULL, filename TEXT NOT NULL,
+            fluor_percentage REAL, pifas_percentage REAL, pifas_concentration REAL,
+            concentration REAL, quality_score REAL, raw_data TEXT NOT NULL,
+            spectrum_data TEXT, peaks_data TEXT, molecule_info TEXT,
+            synced INTEGER DEFAULT 0, sync_attempts INTEGER DEFAULT 0,
+            last_sync_attempt TEXT, created_at TEXT NOT NULL, updated_at TEXT NOT NULL
+        )
+    """)
+    rows = []
+    for i in range(n):
+        timestamp = (start + timedelta(minutes=7 * i)).isoformat()
+        place = rng.choice(('muestra_rio', 'pozo', 'efluente', 'control', 'lote'))
+        detected = [
+            {'name': name.split(' ')[0], 'cas': cas, 'confidence': round(rng.uniform(60, 100), 2)}
+            for name, cas in rng.sample(COMPOUNDS, rng.randint(0, 2))
+        ]
+        raw = {'analysis': {'pfas_detection': {'detected_pfas': detected}}}
+        rows.append((
+            'bench', rng.choice(COMPANIES), timestamp, f"{place}_{i:06d}.zip",
+            rng.uniform(0, 100), rng.uniform(0, 60), rng.uniform(0, 5), 1.0,
+            rng.uniform(0, 10), json.dumps(raw), timestamp, timestamp
+        ))
+    conn.executemany("""
+        INSERT INTO measurements (
+            device_id, company_id, timestamp, filename, fluor_percentage,
+            pifas_percentage, pifas_concentration, concentration, quality_score,
+            raw_data, created_at, updated_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    conn.close()
+
+
+def time_like(db: Database, term: str) -> float:
+    """ms por búsqueda con el LIKE anterior (página + total)"""
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        db.execute_query(
+            "SELECT * FROM measurements WHERE company_id = ? AND filename LIKE ? "
+            "ORDER BY timestamp DESC LIMIT 50 OFFSET 0", ('FAES', f"%{term}%")
+        )
+        db.execute_query(
+            "SELECT COUNT(*) FROM measurements WHERE company_id = ? AND filename LIKE ?",
+            ('FAES', f"%{term}%")
+        )
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def time_search(db: Database, term: str, filters: dict):
+    """ms por búsqueda con el índice (página + total) y número de resultados"""
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        db.get_measurements_with_search('FAES', term, limit=50, offset=0, filters=filters)
+        total = db.count_measurements_with_search('FAES', term, filters=filters)
+    return (time.perf_counter() - started) / REPEATS * 1000, total
+
+
+def time_json_scan(db: Database, compound: str, min_confidence, date_from) -> float:
+    """ms por consulta decodificando raw_data de todas las filas (sin la tabla)"""
+    started = time.perf_counter()
+    conn = db.get_connection()
+    matches = 0
+    for row in conn.execute("SELECT raw_data, timestamp FROM measurements WHERE company_id = ?", ('FAES',)):
+        if date_from and row['timestamp'] < date_from:
+            continue
+        analysis = json.loads(row['raw_data']).get('analysis', {})
+        for item in analysis.get('pfas_detection', {}).get('detected_pfas', []):
+            if compound in (item.get('name'), item.get('cas')) and \
+                    (min_confidence is None or item.get('confidence', 0) >= min_confidence):
+                matches += 1
+    conn.close()
+    return (time.perf_counter() - started) * 1000
+
+
+def time_compound(db: Database, compound: str, min_confidence, date_from):
+    """ms por consulta de apariciones (página + total) y de tendencia mensual"""
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        data = db.get_compound_occurrences(compound, 'FAES', min_confidence=min_confidence,
+                                           date_from=date_from)
+    occurrences_ms = (time.perf_counter() - started) / REPEATS * 1000
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        db.get_compound_trend(compound, 'FAES', bucket='month', min_confidence=min_confidence,
+                              date_from=date_from)
+    trend_ms = (time.perf_counter() - started) / REPEATS * 1000
+    return occurrences_ms, trend_ms, data['total']
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    logging.disable(logging.CRITICAL)
+
+    print("=" * 72)
+    print(f"⏱️  BENCHMARK: búsqueda del historial ({n} mediciones)")
+    print("=" * 72)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'measurements.db'
+        populate(db_path, n)
+
+        started = time.perf_counter()
+        db = Database(str(db_path))
+        print(f"Relleno de FTS5 y measurement_compounds: {time.perf_counter() - started:.1f} s "
+              f"(FTS5 {'activo' if db.fts_enabled else 'NO disponible'})")
+        print()
+        print(f"{'término':>12} {'filtros':>36} {'LIKE (ms)':>10} {'índice (ms)':>12} {'total':>7}")
+
+        for term, filters in QUERIES:
+            like_ms = time_like(db, term) if not filters else float('nan')
+            search_ms, total = time_search(db, term, filters)
+            print(f"{term:>12} {json.dumps(filters):>36} {like_ms:>10.1f} {search_ms:>12.1f} {total:>7}")
+
+        print()
+        print(f"{'compuesto':>10} {'conf. mín':>9} {'desde':>11} {'JSON (ms)':>10} "
+              f"{'apariciones (ms)':>17} {'tendencia (ms)':>15} {'total':>7}")
+        for compound, min_confidence, date_from in COMPOUND_QUERIES:
+            scan_ms = time_json_scan(db, compound, min_confidence, date_from)
+            occurrences_ms, trend_ms, total = time_compound(db, compound, min_confidence, date_from)
+            print(f"{compound:>10} {str(min_confidence):>9} {str(date_from):>11} {scan_ms:>10.1f} "
+                  f"{occurrences_ms:>17.1f} {trend_ms:>15.1f} {total:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la serialización JSON de resultados de análisis
+=============================================================
+Construye resultados con la forma de los de SpectrumAnalyzer (espectro
+ppm/intensidad de N puntos, picos, métricas de calidad y PFAS detectados,
+con escalares NumPy) y compara por tamaño de espectro:
+
+- Antes: espectro convertido con .tolist() + json estándar con
+  NumpyJSONEncoder (respuesta) y json.dump(indent=2) (archivo en ANALYSIS_DIR)
+- json_utils con json estándar (sin orjson, arrays vía NumpyJSONEncoder)
+- json_utils con orjson (arrays NumPy serializados directamente)
+
+Mide tiempo medio (incluida la conversión .tolist() en el camino anterior)
+y bytes generados. Comprueba además que todos los caminos producen el
+mismo JSON una vez decodificado.
+
+Ejecutar: python tests/bench_json_serialization.py [repeticiones]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# --- Configuración de Rutas ---
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+import json_utils
+from json_utils import NumpyJSONEncoder
+
+SIZES = (16_384, 65_536, 262_144)
+N_PEAKS = 40
+
+
+def make_results(n_points: int) -> dict:
+    """Resultados sintéticos con la estructura de _build_results"""
+    rng = np.random.default_rng(n_points)
+    ppm = np.linspace(-60.0, -240.0, n_points)
+    intensity = rng.normal(0, 1e3, n_points)
+    for center in rng.uniform(-230, -70, N_PEAKS):
+        intensity += 1e6 / (1 + ((ppm - center) / 0.05) ** 2)
+
+    peaks = [
+        {
+            'ppm': np.float64(center), 'intensity': np.float64(rng.uniform(1e5, 1e6)),
+            'width_ppm': np.float64(rng.uniform(0.01, 0.2)), 'snr': np.float64(rng.uniform(5, 500)),
+            'region': 'pifas' if center > -140 else 'fluor', 'index': np.int64(i)
+        }
+        for i, center in enumerate(rng.uniform(-230, -70, N_PEAKS))
+    ]
+    quality_metrics = {
+        'snr': np.float64(152.3), 'noise_level': np.float64(1021.7),
+        'baseline_flatness': np.float64(0.93), 'is_good_quality': np.bool_(True)
+    }
+    region = {'total_area': np.float64(8.2e7), 'percentage': np.float64(41.2),
+              'n_points': np.int64(n_points // 3)}
+    return {
+        'spectrum': {'ppm': ppm, 'intensity': intensity},
+        'file_name': 'muestra_rio.zip', 'filename': 'muestra_rio.zip',
+        'concentration': 1.0, 'sample_concentration': 1.0,
+        'peaks': peaks, 'peaks_count': len(peaks),
+        'quality_metrics': quality_metrics, 'signal_to_noise': np.float64(152.3),
+        'fluor_total': dict(region), 'fluor_percentage': np.float64(41.2),
+        'pifas': dict(region), 'pifas_percentage': np.float64(12.7),
+        'pifas_concentration': 0.127, 'quality_score': np.float64(8.4),
+        'pfas_detection': {
+            'total_detected': 2,
+            'detected_pfas': [
+                {'name': 'PFOA', 'cas': '335-67-1', 'confidence': 91.2,
+                 'matched_peaks': [np.float64(-81.1), np.float64(-118.6)]},
+                {'name': 'PFOS', 'cas': '1763-23-1', 'confidence': 74.5,
+                 'matched_peaks': [np.float64(-80.9)]}
+            ]
+        }
+    }
+
+
+def legacy_response(results: dict) -> bytes:
+    """Camino anterior: .tolist() en el analizador + json estándar (jsonify)"""
+    listed = dict(results, spectrum={k: v.tolist() for k, v in results['spectrum'].items()})
+    return json.dumps(listed, cls=NumpyJSONEncoder, sort_keys=True).encode('utf-8')
+
+
+def legacy_file(results: dict) -> bytes:
+    """Camino anterior del JSON en ANALYSIS_DIR: json.dump(indent=2)"""
+    listed = dict(results, spectrum={k: v.tolist() for k, v in results['spectrum'].items()})
+    return json.dumps(listed, cls=NumpyJSONEncoder, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def with_backend(use_orjson: bool):
+    def serialize(results: dict) -> bytes:
+        previous = json_utils.ORJSON_AVAILABLE
+        json_utils.ORJSON_AVAILABLE = use_orjson
+        try:
+            return json_utils.dumps_bytes(results)
+        finally:
+            json_utils.ORJSON_AVAILABLE = previous
+    return serialize
+
+
+def measure(serialize, results: dict, repeats: int):
+    """(ms medios, bytes)"""
+    body = serialize(results)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        serialize(results)
+    return (time.perf_counter() - started) / repeats * 1000, len(body), body
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    paths = [
+        ('anterior (respuesta)', legacy_response),
+        ('anterior (archivo)', legacy_file),
+        ('json_utils + json', with_backend(False)),
+    ]
+    if json_utils.orjson is not None:
+        paths.append(('json_utils + orjson', with_backend(True)))
+
+    print("=" * 72)
+    print("⏱️  BENCHMARK: serialización JSON de resultados")
+    print(f"   orjson {'disponible' if json_utils.orjson is not None else 'NO disponible'}")
+    print("=" * 72)
+    print(f"{'puntos':>8} {'camino':>22} {'tiempo (ms)':>12} {'MB':>8} {'×':>6}")
+
+    for n_points in SIZES:
+        results = make_results(n_points)
+        baseline_ms = None
+        reference = None
+        for name, serialize in paths:
+            elapsed, size, body = measure(serialize, results, repeats)
+            decoded = json.loads(body)
+            if reference is None:
+                reference = decoded
+            elif decoded != reference:
+                print(f"⚠️  {name}: el JSON decodificado difiere del camino anterior")
+            baseline_ms = baseline_ms or elapsed
+            print(f"{n_points:>8} {name:>22} {elapsed:>12.1f} {size / 1e6:>8.2f} "
+                  f"{baseline_ms / elapsed:>6.1f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
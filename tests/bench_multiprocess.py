@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escalado multi-proceso (backend/serve.py)
+======================================================
+Arranca el servidor real con 1..N procesos worker (waitress, fork) sobre
+una BD temporal y, para cada configuración, lanza durante unos segundos
+peticiones concurrentes de:
+
+- POST /api/analyze con un FID Bruker sintético (CPU-bound: lectura,
+  procesado, picos y detección de PFAS)
+- GET /api/health (ligera: mide el coste fijo del stack HTTP)
+
+Muestra peticiones/s, latencia p50/p95 y la aceleración frente a 1
+proceso. Comprueba además que el rate limit de /api/validate_pin
+(5/minuto) se comparte entre procesos (limiter en SQLite): el 6.º login
+debe recibir 429 aunque cada intento caiga en un worker distinto.
+
+Con un solo núcleo la aceleración es ~1×; el techo es min(N, núcleos).
+
+Ejecutar: python tests/bench_multiprocess.py [max_procesos] [segundos]
+"""
+
+import io
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+import requests
+
+# --- Configuración de Rutas ---
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+sys.path.insert(0, str(CURRENT_DIR))
+
+from bench_fid_processing import make_bruker_fid
+
+N_COMPLEX = 32_768
+THREADS_PER_WORKER = 4
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def make_upload(tmp: Path) -> bytes:
+    """ZIP con un experimento Bruker (fid + acqus)"""
+    exp_dir = tmp / 'exp' / '1'
+    make_bruker_fid(exp_dir, N_COMPLEX)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        for f in exp_dir.iterdir():
+            z.write(f, f'exp/1/{f.name}')
+    return buf.getvalue()
+
+
+def start_server(workers: int, port: int, tmp: Path) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault('FLASK_SECRET_KEY', 'bench-secret')
+    env.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret-0123456789abcdef')
+    env.update({
+        'FLASK_ENV': 'production',
+        'DATABASE_PATH': str(tmp / f'measurements_{workers}.db'),
+        'RATELIMIT_STORAGE_URI': f"sqlite:///{tmp / f'ratelimit_{workers}.db'}",
+        'LOG_LEVEL': 'WARNING',
+        'LOG_CONSOLE_LEVEL': 'ERROR',
+    })
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--workers', str(workers),
+         '--threads', str(THREADS_PER_WORKER), '--host', '127.0.0.1', '--port', str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/api/health', timeout=1).ok:
+                return process
+        except requests.RequestException:
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError(f"El servidor con {workers} procesos no arrancó")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=20)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def login(base: str):
+    return requests.post(f'{base}/api/validate_pin', json={'company_id': 'FAES', 'pin': '1234'})
+
+
+def run_load(send, clients: int, seconds: float):
+    """(peticiones/s, p50 ms, p95 ms, errores)"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client(index):
+        session = requests.Session()
+        n = 0
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            ok = send(session, index, n)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+            n += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        return 0.0, 0.0, 0.0, errors[0]
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+    return len(latencies) / wall, p50, p95, errors[0]
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else min(4, os.cpu_count() or 1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    print("=" * 78)
+    print(f"⏱️  BENCHMARK: escalado multi-proceso ({os.cpu_count()} núcleos, {seconds:.0f}s por prueba)")
+    print("=" * 78)
+    print(f"{'procesos':>8} {'endpoint':>10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errores':>8} {'×':>6}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        upload = make_upload(tmp)
+        baseline = {}
+
+        workers = 1
+        while workers <= max_workers:
+            port = free_port()
+            base = f'http://127.0.0.1:{port}'
+            server = start_server(workers, port, tmp)
+            try:
+                token = login(base).json()['access_token']
+                headers = {'Authorization': f'Bearer {token}'}
+
+                def analyze(session, client, n):
+                    files = {'file': (f'bench_{workers}_{client}_{n}.zip', upload)}
+                    r = session.post(f'{base}/api/analyze', files=files,
+                                     data={'company_id': 'FAES'}, headers=headers)
+                    return r.ok
+
+                def health(session, client, n):
+                    return session.get(f'{base}/api/health').ok
+
+                for name, send, clients in (('analyze', analyze, workers * 2),
+                                            ('health', health, workers * THREADS_PER_WORKER)):
+                    rps, p50, p95, errors = run_load(send, clients, seconds)
+                    baseline.setdefault(name, rps)
+                    speedup = rps / baseline[name] if baseline[name] else 0
+                    print(f"{workers:>8} {name:>10} {rps:>9.1f} {p50:>9.1f} {p95:>9.1f} "
+                          f"{errors:>8} {speedup:>6.2f}")
+
+                # Rate limit compartido: ya hubo 1 login; 4 más pasan, el 6.º no
+                statuses = [login(base).status_code for _ in range(5)]
+                shared = statuses[:4].count(200) == 4 and statuses[4] == 429
+                print(f"{'':>8} {'limiter':>10} logins 2-6 → {statuses} "
+                      f"{'✅ compartido' if shared else '⚠️ NO compartido'}")
+            finally:
+                stop_server(server)
+            print()
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
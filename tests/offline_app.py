@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Aplicación Flask en modo offline para los tests
+================================================
+Importa backend/app.py sin servidor ni red, para usar app.test_client():
+
+- Claves JWT/Flask de prueba, rate limit en memoria
+- BD, auditoría y almacenes (análisis, subidas, blobs, caché de reportes y
+  de gráficos) en un directorio temporal, no en backend/storage
+- Sin sincronización con Google Apps Script
+- StubAnalyzer: analizador determinista y rápido que cuenta sus ejecuciones
+  (para comprobar si una petición analiza o reutiliza sin depender del
+  procesado numérico real)
+
+Uso:
+    from offline_app import load_app, auth_headers
+    client = load_app().app.test_client()
+"""
+
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# --- Configuración de Rutas ---
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+WORKER_DIR = ROOT_DIR / "worker"
+
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(WORKER_DIR))
+
+STORAGE_DIRS = (
+    'OUTPUT_DIR', 'ANALYSIS_DIR', 'CRAFT_EXPORTS_DIR', 'REPORT_CACHE_DIR',
+    'CHARTS_DIR', 'UPLOADS_DIR', 'CONTENT_STORE_DIR',
+)
+
+PINS = {'ADMIN': '0000', 'FAES': '1234', 'AUGAS_GALICIA': '5678'}
+
+_app_module = None
+# Un token por empresa: /api/validate_pin admite 5 peticiones por minuto
+_tokens = {}
+TMP_DIR = Path(tempfile.mkdtemp(prefix='craftrmn_tests_'))
+
+
+class StubAnalyzer:
+    """
+    Sustituto de SpectrumAnalyzer para los tests de rutas: el resultado
+    depende solo del contenido del archivo y de los parámetros.
+    """
+    runs = 0
+
+    class _Reader:
+        fid_mode = 'nmrglue'
+        phase_mode = 'heuristic'
+
+    def __init__(self, *args, **kwargs):
+        self.nmr_reader = self._Reader()
+        self.ppm_data = np.linspace(-200.0, -50.0, 64)
+        self.intensity_data = np.zeros(64)
+        self.file_metadata = {}
+
+    def analyze_file(self, file_path, fluor_range=None, pifas_range=None, concentration=1.0, **kwargs):
+        StubAnalyzer.runs += 1
+        data = Path(file_path).read_bytes()
+        self.intensity_data = np.full(64, float(len(data)))
+        return {
+            'file_name': Path(file_path).name,
+            'filename': Path(file_path).name,
+            'concentration': float(concentration),
+            'fluor_total': {'ppm_range': [fluor_range['min'], fluor_range['max']]},
+            'pifas': {'ppm_range': [pifas_range['min'], pifas_range['max']]},
+            'fluor_percentage': 100.0,
+            'pifas_percentage': float(len(data) % 100),
+            'quality_score': 8.0,
+            'pfas_detection': {'detected_pfas': [], 'total_detected': 0},
+            'spectrum': {'ppm': self.ppm_data.tolist(), 'intensity': self.intensity_data.tolist()},
+            'peaks': [],
+        }
+
+
+def load_app():
+    """Importa backend/app.py una sola vez con el entorno de pruebas"""
+    global _app_module
+    if _app_module is not None:
+        return _app_module
+
+    os.environ.setdefault('FLASK_SECRET_KEY', 'test-flask-secret-key-0123456789abcdef')
+    os.environ.setdefault('JWT_SECRET_KEY', 'test-jwt-secret-key-0123456789abcdef')
+    os.environ['RATELIMIT_STORAGE_URI'] = 'memory://'
+    os.environ['DATABASE_PATH'] = str(TMP_DIR / 'test.db')
+    os.environ['AUDIT_DB_FILE'] = str(TMP_DIR / 'audit.db')
+    os.environ['AUDIT_LOG_FILE'] = str(TMP_DIR / 'audit.log')
+
+    import config
+    for name in STORAGE_DIRS:
+        path = TMP_DIR / name.lower()
+        path.mkdir(parents=True, exist_ok=True)
+        setattr(config, name, path)
+
+    import app as app_module
+    from routes import analysis_routes
+    analysis_routes.push_to_google_cloud = lambda *args, **kwargs: None
+    app_module.SpectrumAnalyzer = StubAnalyzer
+
+    _app_module = app_module
+    return app_module
+
+
+def auth_headers(client, company_id: str) -> dict:
+    """Cabecera Authorization con un token de la empresa (se pide una vez)"""
+    if company_id not in _tokens:
+        response = client.post('/api/validate_pin', json={'company_id': company_id, 'pin': PINS[company_id]})
+        assert response.status_code == 200, response.get_json()
+        _tokens[company_id] = response.get_json()['access_token']
+    return {'Authorization': f"Bearer {_tokens[company_id]}"}
+
+
+def upload(client, headers, company_id, filename, data: bytes, parameters: str = None):
+    """POST /api/analyze con un archivo en memoria"""
+    form = {'company_id': company_id, 'file': (io.BytesIO(data), filename)}
+    if parameters is not None:
+        form['parameters'] = parameters
+    return client.post('/api/analyze', headers=headers, data=form, content_type='multipart/form-data')
+
+
+def csv_bytes(seed: int = 0) -> bytes:
+    """CSV ppm,intensity pequeño (el contenido cambia con seed)"""
+    ppm = np.linspace(-200.0, -50.0, 200)
+    intensity = np.exp(-((ppm + 120.0) / 0.5) ** 2) * 100.0 + seed
+    return ('ppm,intensity\n' + '\n'.join(f'{a:.4f},{b:.4f}' for a, b in zip(ppm, intensity))).encode()
+
+
+def run_suite(title: str, tests) -> int:
+    """Ejecuta las funciones test_* fuera de pytest y muestra PASS/FAIL"""
+    print("=" * 70)
+    print(f"🧪 TEST: {title}")
+    print("=" * 70)
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ PASS | {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ FAIL | {test.__name__}: {type(e).__name__} {e}")
+    print(f"\n📊 {len(tests) - failed}/{len(tests)} tests pasaron")
+    return 1 if failed else 0
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Test de Subidas por Partes (Offline)
+====================================
+Verifica que:
+1. Una parte cortada a medias conserva lo recibido y se reanuda desde ahí.
+2. Una parte que no empieza en 'received' se rechaza con el offset correcto
+   (OffsetMismatch / 409).
+3. El SHA-256 es el mismo si el hash incremental se pierde (otro worker,
+   reinicio) y hay que recalcularlo desde disco.
+4. Un sha256 del cliente que no coincide descarta la subida; el correcto
+   la entrega a su destino.
+5. Una firma de archivo que no corresponde a la extensión descarta la sesión.
+6. El flujo HTTP completo (init → PUT partes → complete) analiza el archivo.
+
+Ejecutar: python tests/test_chunked_upload.py  (o pytest tests/test_chunked_upload.py)
+"""
+
+import hashlib
+import io
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from offline_app import auth_headers, csv_bytes, load_app, run_suite
+
+app_module = load_app()
+client = app_module.app.test_client()
+
+from utils.chunked_upload import ChunkedUploadStore, OffsetMismatch
+
+DATA = csv_bytes(seed=49)
+SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+def _store() -> ChunkedUploadStore:
+    return ChunkedUploadStore(Path(tempfile.mkdtemp(prefix='uploads_')), max_chunk_bytes=1024 * 1024, ttl_seconds=3600)
+
+
+def _place_into(directory: Path):
+    def place(data_path, meta):
+        target = directory / meta['filename']
+        data_path.replace(target)
+        return target
+    return place
+
+
+def test_interrupted_chunk_resumes():
+    store = _store()
+    upload_id = store.create('muestra.csv', len(DATA), 'FAES')['upload_id']
+
+    # El cuerpo se corta: se anuncian 1000 bytes y llegan 300
+    meta = store.write_chunk(upload_id, 0, 1000, io.BytesIO(DATA[:300]))
+    assert meta['received'] == 300
+    assert store.get(upload_id)['received'] == 300
+
+    meta = store.write_chunk(upload_id, 300, len(DATA) - 300, io.BytesIO(DATA[300:]))
+    assert meta['received'] == len(DATA)
+    assert meta['sha256'] == SHA256
+
+
+def test_wrong_offset_is_rejected():
+    store = _store()
+    upload_id = store.create('muestra.csv', len(DATA), 'FAES')['upload_id']
+    store.write_chunk(upload_id, 0, 500, io.BytesIO(DATA[:500]))
+    try:
+        store.write_chunk(upload_id, 400, 100, io.BytesIO(DATA[400:500]))
+    except OffsetMismatch as e:
+        assert e.received == 500
+    else:
+        raise AssertionError("se aceptó una parte solapada")
+    assert store.get(upload_id)['received'] == 500
+
+
+def test_rehash_after_losing_hasher():
+    store = _store()
+    upload_id = store.create('muestra.csv', len(DATA), 'FAES')['upload_id']
+    store.write_chunk(upload_id, 0, 700, io.BytesIO(DATA[:700]))
+    # Otra instancia (otro worker) o un reinicio: sin hash en memoria
+    store._hashers.clear()
+    meta = store.write_chunk(upload_id, 700, len(DATA) - 700, io.BytesIO(DATA[700:]))
+    assert meta['sha256'] == SHA256
+
+
+def test_sha256_mismatch_discards_upload():
+    store = _store()
+    upload_id = store.create('muestra.csv', len(DATA), 'FAES')['upload_id']
+    store.write_chunk(upload_id, 0, len(DATA), io.BytesIO(DATA))
+    try:
+        store.finish(upload_id, _place_into(store.upload_dir), expected_sha256='0' * 64)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("se aceptó un sha256 distinto")
+    assert not store.data_path(upload_id).exists()
+    try:
+        store.get(upload_id)
+    except LookupError:
+        pass
+    else:
+        raise AssertionError("la sesión sigue abierta tras el error de hash")
+
+
+def test_finish_places_file():
+    store = _store()
+    target_dir = Path(tempfile.mkdtemp(prefix='placed_'))
+    upload_id = store.create('muestra.csv', len(DATA), 'FAES')['upload_id']
+    store.write_chunk(upload_id, 0, len(DATA), io.BytesIO(DATA))
+    meta, path = store.finish(upload_id, _place_into(target_dir), expected_sha256=SHA256.upper())
+    assert path.read_bytes() == DATA
+    assert meta['sha256'] == SHA256
+    assert not store.data_path(upload_id).exists()
+
+
+def test_bad_signature_discards_session():
+    store = _store()
+    data = b'no es un zip' * 500
+    upload_id = store.create('rack.zip', len(data), 'FAES')['upload_id']
+    try:
+        store.write_chunk(upload_id, 0, len(data), io.BytesIO(data))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("se aceptó un .zip sin firma PK")
+    assert not store.data_path(upload_id).exists()
+
+
+def test_http_resume_and_complete():
+    headers = auth_headers(client, 'FAES')
+    response = client.post('/api/uploads', headers=headers,
+                           json={'filename': 'partes.csv', 'size': len(DATA), 'company_id': 'FAES'})
+    assert response.status_code == 201, response.get_json()
+    upload_id = response.get_json()['upload_id']
+    url = f'/api/uploads/{upload_id}'
+
+    def put(start, end):
+        return client.put(url, data=DATA[start:end + 1], headers={
+            **headers,
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': f'bytes {start}-{end}/{len(DATA)}',
+        })
+
+    assert put(0, 999).status_code == 200
+    response = put(500, 1499)
+    assert response.status_code == 409
+    assert response.get_json()['received'] == 1000
+
+    received = client.get(url, headers=headers).get_json()['received']
+    assert put(received, len(DATA) - 1).get_json()['complete'] is True
+
+    response = client.post(f'{url}/complete', headers=headers, json={'sha256': SHA256})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['measurement_id']
+    assert client.get(url, headers=headers).status_code == 404
+
+
+def test_http_sha256_mismatch():
+    headers = auth_headers(client, 'FAES')
+    upload_id = client.post('/api/uploads', headers=headers, json={
+        'filename': 'corrupto.csv', 'size': len(DATA), 'company_id': 'FAES'
+    }).get_json()['upload_id']
+    url = f'/api/uploads/{upload_id}'
+    client.put(url, data=DATA, headers={
+        **headers,
+        'Content-Type': 'application/octet-stream',
+        'Content-Range': f'bytes 0-{len(DATA) - 1}/{len(DATA)}',
+    })
+
+    response = client.post(f'{url}/complete', headers=headers, json={'sha256': 'f' * 64})
+    assert response.status_code == 400
+    assert client.get(url, headers=headers).status_code == 404
+
+
+TESTS = [
+    test_interrupted_chunk_resumes,
+    test_wrong_offset_is_rejected,
+    test_rehash_after_losing_hasher,
+    test_sha256_mismatch_discards_upload,
+    test_finish_places_file,
+    test_bad_signature_discards_session,
+    test_http_resume_and_complete,
+    test_http_sha256_mismatch,
+]
+
+
+if __name__ == "__main__":
+    sys.exit(run_suite("subidas por partes (reanudación y SHA-256)", TESTS))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test de Paridad de los Modos FID (Offline)
+==========================================
+Verifica que NMR_FID_MODE=nmrglue y NMR_FID_MODE=mmap dan el mismo espectro
+para el mismo FID Bruker:
+1. Misma escala de ppm.
+2. Mismo ensanchamiento de línea (DEFAULT_LB_HZ): picos con la misma anchura.
+3. Misma forma de espectro (correlación ~1, diferencia relativa pequeña).
+
+fid_mode forma parte de la clave de reutilización de subidas, así que un
+cambio de modo no debe cambiar los resultados.
+
+Ejecutar: python tests/test_fid_parity.py  (o pytest tests/test_fid_parity.py)
+"""
+
+import logging
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+# --- Configuración de Rutas ---
+CURRENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = CURRENT_DIR.parent
+sys.path.insert(0, str(ROOT_DIR / "worker"))
+sys.path.insert(0, str(CURRENT_DIR))
+
+from bench_fid_processing import make_bruker_fid
+from nmr_reader import NMRDataReader, NMRGLUE_AVAILABLE
+
+N_COMPLEX = 16384
+
+
+def _fwhm_points(spectrum: np.ndarray) -> int:
+    """Puntos por encima de la mitad del pico más alto"""
+    return int(np.sum(spectrum > spectrum.max() / 2))
+
+
+def _read_both_modes():
+    logging.disable(logging.CRITICAL)
+    warnings.filterwarnings('ignore', module='nmrglue')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / '1'
+        make_bruker_fid(path, N_COMPLEX)
+        return {
+            mode: NMRDataReader(fid_mode=mode).read_data(path)
+            for mode in ('nmrglue', 'mmap')
+        }
+
+
+def test_fid_modes_match():
+    if not NMRGLUE_AVAILABLE:
+        print("⏭️  nmrglue no instalado: no hay modo con el que comparar")
+        return
+    spectra = _read_both_modes()
+    ppm_ng, y_ng, _ = spectra['nmrglue']
+    ppm_mm, y_mm, _ = spectra['mmap']
+
+    assert len(y_ng) == len(y_mm)
+    np.testing.assert_allclose(ppm_ng, ppm_mm, rtol=0, atol=1e-9)
+    assert np.argmax(y_ng) == np.argmax(y_mm)
+    assert _fwhm_points(y_ng) == _fwhm_points(y_mm)
+    assert np.corrcoef(y_ng, y_mm)[0, 1] > 0.9999
+    assert np.max(np.abs(y_ng - y_mm)) / np.max(np.abs(y_ng)) < 1e-3
+
+
+def main():
+    print("=" * 70)
+    print("🧪 TEST: paridad de modos FID (nmrglue vs mmap)")
+    print("=" * 70)
+    try:
+        test_fid_modes_match()
+    except AssertionError as e:
+        print(f"❌ FAIL | Los modos dan espectros distintos {e}")
+        return 1
+    print("✅ PASS | Mismo espectro y mismo ensanchamiento en ambos modos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test de GET Condicional y Cache-Control (Offline)
+=================================================
+Verifica que:
+1. /api/measurements/<id> y /spectrum devuelven ETag y 304 con If-None-Match.
+2. El 304 solo se da tras comprobar el acceso: otra empresa con el ETag
+   correcto recibe 403, no 304.
+3. Solo assets/molecules/ es inmutable; logos y demás estáticos se revalidan.
+4. Sin index.html / app.html en el frontend, / y /app.html responden 404 JSON
+   (no 500).
+
+Ejecutar: python tests/test_http_cache.py  (o pytest tests/test_http_cache.py)
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from offline_app import ROOT_DIR, auth_headers, csv_bytes, load_app, run_suite, upload
+
+app_module = load_app()
+client = app_module.app.test_client()
+
+_measurement = {}
+
+
+def _faes_measurement():
+    """Medición de FAES compartida por los tests (se crea una vez)"""
+    if not _measurement:
+        headers = auth_headers(client, 'FAES')
+        response = upload(client, headers, 'FAES', 'etag.csv', csv_bytes(seed=44))
+        assert response.status_code == 200, response.get_json()
+        _measurement['id'] = response.get_json()['measurement_id']
+        _measurement['headers'] = headers
+    return _measurement['id'], _measurement['headers']
+
+
+def test_measurement_not_modified():
+    measurement_id, headers = _faes_measurement()
+    url = f'/api/measurements/{measurement_id}?company=FAES'
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers.get('ETag')
+    assert etag
+
+    response = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert not response.data
+
+
+def test_not_modified_requires_access():
+    measurement_id, headers = _faes_measurement()
+    etag = client.get(f'/api/measurements/{measurement_id}?company=FAES', headers=headers).headers['ETag']
+
+    other = {**auth_headers(client, 'AUGAS_GALICIA'), 'If-None-Match': etag}
+    response = client.get(f'/api/measurements/{measurement_id}?company=AUGAS_GALICIA', headers=other)
+    assert response.status_code == 403
+    response = client.get(f'/api/measurements/{measurement_id}?company=FAES', headers=other)
+    assert response.status_code == 403
+
+
+def test_spectrum_not_modified_requires_access():
+    measurement_id, headers = _faes_measurement()
+    url = f'/api/measurements/{measurement_id}/spectrum'
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert client.get(url, headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    other = {**auth_headers(client, 'AUGAS_GALICIA'), 'If-None-Match': etag}
+    assert client.get(url, headers=other).status_code == 403
+
+
+def test_static_cache_control():
+    molecule = next((ROOT_DIR / 'frontend' / 'assets' / 'molecules').glob('*.sdf'))
+    response = client.get(f'/assets/molecules/{molecule.name}')
+    assert response.status_code == 200
+    assert response.cache_control.immutable
+    response.close()
+
+    response = client.get('/assets/logos/faes_logo.png')
+    assert response.status_code == 200
+    assert not response.cache_control.immutable
+    assert response.cache_control.no_cache
+    response.close()
+
+
+def test_missing_pages_are_404():
+    flask_app = app_module.app
+    static_folder = flask_app.static_folder
+    flask_app.static_folder = tempfile.mkdtemp(prefix='frontend_')
+    try:
+        for url in ('/', '/app.html', '/index.html'):
+            response = client.get(url)
+            assert response.status_code == 404, (url, response.status_code)
+            assert response.get_json()['error']
+    finally:
+        flask_app.static_folder = static_folder
+
+
+TESTS = [
+    test_measurement_not_modified,
+    test_not_modified_requires_access,
+    test_spectrum_not_modified_requires_access,
+    test_static_cache_control,
+    test_missing_pages_are_404,
+]
+
+
+if __name__ == "__main__":
+    sys.exit(run_suite("ETag / 304 y Cache-Control", TESTS))
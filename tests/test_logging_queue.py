@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test del Logging Asíncrono (Offline)
+====================================
+Verifica que:
+1. queue_handler.prepare congela el mensaje al loggear: modificar después los
+   argumentos o el dict de un AuditEvent no cambia lo que se escribe.
+2. Un proceso hijo creado con fork (pools de análisis) no se bloquea al
+   loggear aunque la cola heredada esté llena y nadie la vacíe, con y sin
+   init_analysis_worker.
+3. AuditStoreHandler guarda un lote incompleto tras flush_seconds aunque no
+   lleguen más eventos (temporizador).
+
+Ejecutar: python tests/test_logging_queue.py  (o pytest tests/test_logging_queue.py)
+"""
+
+import logging
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from offline_app import load_app, run_suite
+
+load_app()
+
+import audit_logger
+from audit_store import AuditStoreHandler
+
+# Espera máxima por un hijo antes de darlo por bloqueado
+CHILD_TIMEOUT = 20
+
+
+def _record(msg, *args, name='craftrmn.test', level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 0, msg, args, None)
+
+
+def test_prepare_snapshots_args():
+    values = [1, 2]
+    prepared = audit_logger.queue_handler.prepare(_record("valores %s", values))
+    values.append(3)
+    assert prepared.getMessage() == "valores [1, 2]"
+    assert prepared.args is None
+
+
+def test_prepare_snapshots_audit_event():
+    event = {'event_type': 'TEST', 'details': {'n': 1}}
+    prepared = audit_logger.queue_handler.prepare(_record(audit_logger.AuditEvent(event), name='audit'))
+    event['details']['n'] = 2
+    assert '"n": 1' in prepared.getMessage()
+    assert isinstance(prepared.msg, str)
+
+
+def _fill_queue_and_log(use_initializer):
+    """Hijo: llena la cola heredada (nadie la vacía aquí) y loggea WARNING y auditoría"""
+    if use_initializer:
+        from utils.analysis_workers import init_analysis_worker
+        init_analysis_worker()
+    try:
+        while True:
+            audit_logger.log_queue.put_nowait(None)
+    except Exception:
+        pass
+    logging.getLogger('craftrmn.test').warning("hijo: cola llena")
+    audit_logger.audit_logger.log_event('TEST', {'child': True})
+
+
+def _run_forked_child(use_initializer):
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("⏭️  fork no disponible en esta plataforma")
+        return
+    process = multiprocessing.get_context('fork').Process(target=_fill_queue_and_log, args=(use_initializer,))
+    process.start()
+    process.join(CHILD_TIMEOUT)
+    if process.is_alive():
+        process.kill()
+        process.join()
+        raise AssertionError("el hijo se bloqueó al loggear con la cola llena")
+    assert process.exitcode == 0, process.exitcode
+
+
+def test_forked_child_does_not_block():
+    _run_forked_child(use_initializer=False)
+
+
+def test_forked_worker_initializer_does_not_block():
+    _run_forked_child(use_initializer=True)
+
+
+class _RecordingStore:
+    def __init__(self):
+        self.batches = []
+
+    def insert_many(self, events):
+        self.batches.append(list(events))
+
+
+def test_store_handler_flushes_on_timer():
+    store = _RecordingStore()
+    handler = AuditStoreHandler(store, batch_size=100, flush_seconds=0.2)
+    handler.handle(_record('{"event_type": "TEST", "details": {}}', name='audit'))
+    assert store.batches == []
+
+    deadline = time.monotonic() + 5
+    while not store.batches and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert len(store.batches) == 1 and store.batches[0][0]['event_type'] == 'TEST'
+    handler.close()
+
+
+TESTS = [
+    test_prepare_snapshots_args,
+    test_prepare_snapshots_audit_event,
+    test_forked_child_does_not_block,
+    test_forked_worker_initializer_does_not_block,
+    test_store_handler_flushes_on_timer,
+]
+
+
+if __name__ == "__main__":
+    sys.exit(run_suite("logging asíncrono (cola, fork, lotes de auditoría)", TESTS))
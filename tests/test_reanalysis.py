@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test del Re-análisis del Histórico (Offline)
+============================================
+Analiza mediciones con el SpectrumAnalyzer real (/api/analyze) y las
+re-analiza con ReanalysisManager (procesos worker, lotes, versiones):
+1. Con los mismos parámetros la nueva versión reproduce la original
+   (fluor_percentage, pifas_percentage y pifas_concentration): el espectro
+   guardado ya tiene el baseline corregido y cada medición conserva su
+   concentración.
+2. Un trabajo pausado se reanuda desde su último lote y termina con una
+   sola versión por medición.
+
+Ejecutar: python tests/test_reanalysis.py  (o pytest tests/test_reanalysis.py)
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from offline_app import auth_headers, run_suite, upload
+
+# Espera máxima por un trabajo (arranque del pool spawn + análisis)
+JOB_TIMEOUT = 120
+
+
+def _spectrum_csv(seed: int) -> bytes:
+    """Espectro 19F con línea base inclinada y varios picos (cambia con seed)"""
+    rng = np.random.default_rng(seed)
+    ppm = np.linspace(-200.0, -50.0, 3000)
+    intensity = 50.0 + 0.4 * (ppm + 200.0) + rng.normal(0, 0.5, ppm.size)
+    for center, height in ((-81.0, 900.0), (-118.5, 600.0), (-122.0, 450.0 + seed), (-126.3, 300.0)):
+        intensity += height * np.exp(-((ppm - center) / 0.08) ** 2)
+    return ('ppm,intensity\n' + '\n'.join(f'{a:.4f},{b:.4f}' for a, b in zip(ppm, intensity))).encode()
+
+
+_state = {}
+
+
+def _setup():
+    """App offline con el analizador real y tres mediciones de FAES"""
+    if _state:
+        return _state
+    from offline_app import load_app
+    app_module = load_app()
+    client = app_module.app.test_client()
+
+    import config as app_config
+    from analyzer import SpectrumAnalyzer
+    from config_manager import get_config_manager
+    from database import get_db
+    from reanalysis import ReanalysisManager
+
+    app_config.REANALYSIS_WORKERS = 1
+    app_config.REANALYSIS_CHUNK_SIZE = 1
+    app_config.REANALYSIS_YIELD_SECONDS = 0.05
+
+    stub = app_module.SpectrumAnalyzer
+    app_module.SpectrumAnalyzer = SpectrumAnalyzer
+    try:
+        headers = auth_headers(client, 'FAES')
+        originals = {}
+        for seed, concentration in ((1, 1.0), (2, 2.5), (3, 0.4)):
+            response = upload(client, headers, 'FAES', f'reanalisis_{seed}.csv', _spectrum_csv(seed),
+                              json.dumps({'concentration': concentration}))
+            assert response.status_code == 200, response.get_json()
+            result = response.get_json()
+            originals[result['measurement_id']] = result
+    finally:
+        app_module.SpectrumAnalyzer = stub
+
+    _state.update(db=get_db(), manager=ReanalysisManager(get_db()), originals=originals,
+                  params=get_config_manager().get_analysis_params())
+    return _state
+
+
+def _wait(manager):
+    manager._thread.join(JOB_TIMEOUT)
+    assert not manager.is_running(), "el re-análisis no terminó a tiempo"
+
+
+def _version_of(db, measurement_id, version):
+    rows = [row for row in db.get_analysis_versions(measurement_id) if row['version'] == version]
+    assert len(rows) == 1, rows
+    return rows[0]
+
+
+def test_unchanged_params_reproduce_v1():
+    state = _setup()
+    db, manager = state['db'], state['manager']
+    job = manager.start(state['params'], 'FAES', 'test')
+    _wait(manager)
+
+    job = db.get_reanalysis_job(job['id'])
+    assert job['status'] == 'completed', job
+    for measurement_id, original in state['originals'].items():
+        new = _version_of(db, measurement_id, job['version'])
+        assert new['error'] is None, new['error']
+        for key in ('fluor_percentage', 'pifas_percentage', 'pifas_concentration'):
+            assert np.isclose(new[key], original[key], rtol=1e-6, atol=1e-9), (
+                measurement_id, key, original[key], new[key])
+
+
+def test_pause_and_resume():
+    state = _setup()
+    db, manager = state['db'], state['manager']
+    job = manager.start(state['params'], 'FAES', 'test')
+    # Se pausa antes de que termine el primer lote (el pool aún arranca)
+    manager.pause(job['id'])
+    _wait(manager)
+
+    paused = db.get_reanalysis_job(job['id'])
+    assert paused['status'] == 'paused', paused
+    assert paused['processed'] < paused['total'], paused
+
+    manager.resume(job['id'])
+    _wait(manager)
+    done = db.get_reanalysis_job(job['id'])
+    assert done['status'] == 'completed', done
+    # total incluye las mediciones de FAES de otros tests del mismo proceso
+    assert done['processed'] == done['total'] >= len(state['originals']), done
+    assert done['last_id'] >= max(state['originals'])
+    for measurement_id in state['originals']:
+        _version_of(db, measurement_id, job['version'])
+
+
+TESTS = [
+    test_unchanged_params_reproduce_v1,
+    test_pause_and_resume,
+]
+
+
+if __name__ == "__main__":
+    sys.exit(run_suite("re-análisis del histórico (versiones, pausa y reanudación)", TESTS))
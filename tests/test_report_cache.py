@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test de la Caché de Reportes (Offline)
+======================================
+Verifica que:
+1. Sustituir una clave existente no cuenta su tamaño dos veces.
+2. La expulsión LRU deja la caché bajo el límite.
+3. Un reporte 'single' con measurement_id comprueba el acceso a la medición
+   antes de mirar la caché: otra empresa no recibe la entrada cacheada
+   (con el gráfico de una medición ajena).
+
+Ejecutar: python tests/test_report_cache.py  (o pytest tests/test_report_cache.py)
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from offline_app import auth_headers, csv_bytes, load_app, run_suite, upload
+
+app_module = load_app()
+client = app_module.app.test_client()
+
+from utils.metrics import metrics
+from utils.report_cache import ReportCache
+
+
+def test_put_same_key_counts_once():
+    cache = ReportCache(Path(tempfile.mkdtemp()), max_bytes=10_000)
+    key = cache.make_key({'report': 1})
+    cache.put(key, b'x' * 1000)
+    cache.put(key, b'y' * 400)
+    assert cache.stats()['size_bytes'] == 400
+    assert cache.get(key) == b'y' * 400
+
+
+def test_eviction_stays_under_limit():
+    cache_dir = Path(tempfile.mkdtemp())
+    cache = ReportCache(cache_dir, max_bytes=2500)
+    keys = [cache.make_key({'report': i}) for i in range(3)]
+    for offset, key in enumerate(keys):
+        cache.put(key, b'x' * 1000)
+        # LRU por mtime: asegurar un orden estable
+        os.utime(cache._path_for(key), (time.time() + offset, time.time() + offset))
+    assert cache.stats()['size_bytes'] <= 2500
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) is not None
+
+
+def test_export_checks_measurement_access_before_cache():
+    faes = auth_headers(client, 'FAES')
+    response = upload(client, faes, 'FAES', 'report_auth.csv', csv_bytes(seed=26))
+    assert response.status_code == 200, response.get_json()
+    measurement_id = response.get_json()['measurement_id']
+
+    body = {
+        'format': 'pdf', 'type': 'single', 'lang': 'es', 'company_data': {},
+        'results': {'file_name': 'report_auth.csv'}, 'measurement_id': measurement_id
+    }
+    assert client.post('/api/export', headers=faes, json=body).status_code == 200
+    hits = metrics.get('report_cache.hits')
+    assert client.post('/api/export', headers=faes, json=body).status_code == 200
+    assert metrics.get('report_cache.hits') == hits + 1
+
+    other = auth_headers(client, 'AUGAS_GALICIA')
+    response = client.post('/api/export', headers=other, json=body)
+    assert response.status_code == 200
+    assert metrics.get('report_cache.hits') == hits + 1, "otra empresa recibió el reporte cacheado"
+
+
+TESTS = [
+    test_put_same_key_counts_once,
+    test_eviction_stays_under_limit,
+    test_export_checks_measurement_access_before_cache,
+]
+
+
+if __name__ == "__main__":
+    sys.exit(run_suite("caché de reportes", TESTS))
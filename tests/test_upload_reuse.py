@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test de Reutilización de Subidas (Offline)
+==========================================
+Verifica la clave de reutilización de /api/analyze (SHA-256 del contenido +
+parámetros + formato + empresa):
+1. Los mismos bytes con los mismos parámetros devuelven la medición
+   anterior sin analizar de nuevo ni crear otra medición.
+2. La respuesta reutilizada lleva el nombre subido ahora y el original.
+3. Otros parámetros, otra empresa, otra extensión o una medición borrada
+   analizan de nuevo.
+4. ContentStore guarda una sola copia de los mismos bytes.
+
+Ejecutar: python tests/test_upload_reuse.py  (o pytest tests/test_upload_reuse.py)
+"""
+
+import io
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from offline_app import StubAnalyzer, auth_headers, csv_bytes, load_app, run_suite, upload
+
+app_module = load_app()
+client = app_module.app.test_client()
+
+from utils.content_store import get_content_store
+
+
+def _analyze(company_id, filename, data, parameters=None):
+    """(respuesta JSON, True si se ejecutó el analizador)"""
+    runs = StubAnalyzer.runs
+    response = upload(client, auth_headers(client, company_id), company_id, filename, data,
+                      json.dumps(parameters) if parameters is not None else None)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json(), StubAnalyzer.runs > runs
+
+
+def test_same_content_is_reused():
+    data = csv_bytes(seed=501)
+    first, analysed = _analyze('FAES', 'muestra.csv', data)
+    assert analysed and not first.get('reused')
+
+    second, analysed = _analyze('FAES', 'muestra.csv', data)
+    assert not analysed
+    assert second['reused'] is True
+    assert second['measurement_id'] == first['measurement_id']
+
+
+def test_reuse_shows_new_filename():
+    data = csv_bytes(seed=502)
+    first, _ = _analyze('FAES', 'original.csv', data)
+    second, analysed = _analyze('FAES', 'renombrado.csv', data)
+    assert not analysed
+    assert second['measurement_id'] == first['measurement_id']
+    assert second['file_name'] == 'renombrado.csv'
+    assert second['original_filename'] == 'original.csv'
+
+
+def test_different_parameters_reanalyse():
+    data = csv_bytes(seed=503)
+    first, _ = _analyze('FAES', 'muestra.csv', data, {'concentration': 1.0})
+    second, analysed = _analyze('FAES', 'muestra.csv', data, {'concentration': 2.0})
+    assert analysed
+    assert second['measurement_id'] != first['measurement_id']
+
+
+def test_other_company_reanalyses():
+    data = csv_bytes(seed=504)
+    first, _ = _analyze('FAES', 'muestra.csv', data)
+    second, analysed = _analyze('AUGAS_GALICIA', 'muestra.csv', data)
+    assert analysed
+    assert second['measurement_id'] != first['measurement_id']
+
+
+def test_other_extension_reanalyses():
+    data = csv_bytes(seed=505)
+    _analyze('FAES', 'muestra.csv', data)
+    _, analysed = _analyze('FAES', 'muestra.txt', data)
+    assert analysed
+
+
+def test_deleted_measurement_reanalyses():
+    data = csv_bytes(seed=506)
+    first, _ = _analyze('FAES', 'muestra.csv', data)
+    response = client.delete(f"/api/measurements/{first['measurement_id']}?company=FAES",
+                              headers=auth_headers(client, 'FAES'))
+    assert response.status_code == 200
+
+    second, analysed = _analyze('FAES', 'muestra.csv', data)
+    assert analysed
+    assert second['measurement_id'] != first['measurement_id']
+
+
+def test_content_store_deduplicates():
+    store = get_content_store()
+    data = csv_bytes(seed=507)
+    sha_a, path_a, created_a = store.put_stream(io.BytesIO(data), 'a.csv')
+    sha_b, path_b, created_b = store.put_stream(io.BytesIO(data), 'b.csv')
+    assert created_a and not created_b
+    assert sha_a == sha_b and path_a == path_b
+    assert not any(store.tmp_dir.iterdir())
+
+
+TESTS = [
+    test_same_content_is_reused,
+    test_reuse_shows_new_filename,
+    test_different_parameters_reanalyse,
+    test_other_company_reanalyses,
+    test_other_extension_reanalyses,
+    test_deleted_measurement_reanalyses,
+    test_content_store_deduplicates,
+]
+
+
+if __name__ == "__main__":
+    sys.exit(run_suite("reutilización de subidas (clave de contenido)", TESTS))
@@ -1,3 +1,4 @@
+import copy
 import csv
 import json
 import logging
@@ -8,6 +9,14 @@ from typing import Dict, List, Tuple
 from scipy.signal import find_peaks, peak_widths
 import sys
 from nmr_reader import NMRDataReader, is_nmrglue_available
+from pipeline import (
+    AnalysisPipeline,
+    PipelineAbort,
+    Stage,
+    StageCache,
+    fingerprint_arrays,
+    fingerprint_path
+)
 
 
 # Añadir ruta al backend para imports
@@ -22,15 +31,23 @@ from nmr_constants import (
     calculate_linewidth_tolerance
 )
 
+# Regla del trapecio: np.trapz se retiró en NumPy 2.4 (np.trapezoid desde 2.0)
+_trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+
+# Caché de etapas compartida por todos los analizadores del proceso: /analyze
+# crea un SpectrumAnalyzer por petición y aun así reutiliza lo ya calculado
+_shared_stage_cache = StageCache()
+
 
 class SpectrumAnalyzer:
     """
     Analizador mejorado v2.3 de espectros RMN para detección de PFAS
     """
     
-    def __init__(self, spectrometer_h1_freq_mhz: float = 500.0):
+    def __init__(self, spectrometer_h1_freq_mhz: float = 500.0, stage_cache: StageCache = None):
         """
         Inicializa el analizador.
+        stage_cache: caché de etapas propia (por defecto, la compartida del proceso)
         """
         self.nmr_reader = NMRDataReader()
         self.file_metadata = {}
@@ -40,6 +57,9 @@ class SpectrumAnalyzer:
         self.baseline_value = None
         self.analysis_results = {}
 
+        # Pipeline de etapas con caché (ver _build_pipeline / register_stage)
+        self.pipeline = self._build_pipeline(stage_cache or _shared_stage_cache)
+
         # Verificar disponibilidad de nmrglue
         if is_nmrglue_available():
             print("   ✅ nmrglue disponible - Soporte FID activado")
@@ -117,16 +137,132 @@ class SpectrumAnalyzer:
         print(f"   Rango PFAS/PIFAS:  {pifas_range['min']} a {pifas_range['max']} ppm")
         print(f"   Concentración:     {concentration} mM")
         
-        self._read_spectrum(file_path)
+        # La huella incluye la configuración del lector (modo FID y de fase)
+        source_key = fingerprint_path(file_path, {
+            'fid_mode': self.nmr_reader.fid_mode,
+            'phase_mode': self.nmr_reader.phase_mode
+        })
 
-        if len(self.ppm_data) < 2:
-            return {"error": "No hay datos suficientes en el archivo"}
-        
-        print(f"\n   ✅ Datos cargados: {len(self.ppm_data)} puntos")
-        print(f"   Rango ppm: {min(self.ppm_data):.2f} a {max(self.ppm_data):.2f}")
-        
-        if baseline_correction:
-            if baseline_method == 'polynomial':
+        return self._run_pipeline(
+            file_path, source_key, file_path.name, fluor_range, pifas_range,
+            concentration, baseline_correction, baseline_method
+        )
+
+    def analyze_spectrum_data(self, ppm, intensity, source_name: str,
+                              fluor_range: Dict = None,
+                              pifas_range: Dict = None,
+                              concentration: float = 1.0,
+                              baseline_correction: bool = True,
+                              baseline_method: str = 'polynomial',
+                              metadata: Dict = None) -> Dict:
+        """
+        Analiza un espectro ya cargado en memoria (ppm + intensidad).
+        Lo usan el re-análisis de mediciones históricas, que parte del
+        espectro guardado en la BD en lugar del archivo original, y el
+        ajuste interactivo de parámetros.
+        metadata: metadatos del lector (resolución, fase) si se conservan
+        """
+        if fluor_range is None:
+            fluor_range = {"min": -150, "max": -50}
+        if pifas_range is None:
+            pifas_range = {"min": -130, "max": -60}
+
+        source = {
+            'ppm': np.asarray(ppm, dtype=np.float64),
+            'intensity': np.asarray(intensity, dtype=np.float64),
+            'metadata': metadata or {}
+        }
+        source_key = fingerprint_arrays(source['ppm'], source['intensity'])
+
+        return self._run_pipeline(
+            source, source_key, source_name, fluor_range, pifas_range,
+            concentration, baseline_correction, baseline_method
+        )
+
+    # ==================== PIPELINE ====================
+
+    def _build_pipeline(self, cache: StageCache) -> AnalysisPipeline:
+        """
+        Etapas por defecto: read → baseline → quality → regions → peaks →
+        detect → score. Cada una declara de qué etapas y parámetros depende,
+        que es lo que decide qué se reutiliza de la caché. 'detect' depende
+        además de la huella de la base de datos de PFAS (pfas_db).
+        """
+        return AnalysisPipeline([
+            Stage('read', self._stage_read, inputs=['source']),
+            Stage('baseline', self._stage_baseline, inputs=['read'],
+                  params=['baseline_correction', 'baseline_method']),
+            Stage('quality', self._stage_quality, inputs=['read', 'baseline']),
+            Stage('regions', self._stage_regions, inputs=['read', 'baseline'],
+                  params=['fluor_range', 'pifas_range']),
+            Stage('peaks', self._stage_peaks, inputs=['read', 'baseline', 'quality'],
+                  params=['pifas_range']),
+            Stage('detect', self._stage_detect, inputs=['peaks'], params=['pfas_db']),
+            Stage('score', self._stage_score, inputs=['quality', 'peaks']),
+        ], cache=cache)
+
+    def register_stage(self, stage: Stage, after: str = None, before: str = None) -> Stage:
+        """Añade una etapa al pipeline (ver pipeline.AnalysisPipeline.register)"""
+        return self.pipeline.register(stage, after=after, before=before)
+
+    def _run_pipeline(self, source, source_key: str, source_name: str,
+                      fluor_range: Dict, pifas_range: Dict, concentration: float,
+                      baseline_correction: bool, baseline_method: str) -> Dict:
+        params = {
+            'fluor_range': fluor_range,
+            'pifas_range': pifas_range,
+            'concentration': float(concentration),
+            'baseline_correction': baseline_correction,
+            'baseline_method': baseline_method,
+            'pfas_db': self.pfas_detector.database_fingerprint()
+        }
+        try:
+            outputs = self.pipeline.run(source, source_key, params)
+        except PipelineAbort as e:
+            return {"error": str(e)}
+
+        if self.pipeline.last_run['reused']:
+            print(f"   ♻️ Reutilizado de caché: {', '.join(self.pipeline.last_run['reused'])}")
+
+        # Estado del analizador = último espectro analizado
+        self._use_spectrum(outputs['read'], outputs['baseline'])
+
+        results = self._build_results(outputs, params, source_name)
+        self._print_summary(results)
+        return results
+
+    def _use_spectrum(self, read: Dict, baseline: Dict = None):
+        """Carga en self.* los datos que usan los métodos _analyze_region, _detect_peaks..."""
+        self.file_metadata = read['metadata']
+        self.ppm_data = read['ppm']
+        self.intensity_data = read['intensity']
+        if baseline is not None:
+            self.intensity_corrected = baseline['intensity']
+            self.baseline_value = baseline['baseline_value']
+
+    def _stage_read(self, inputs: Dict, params: Dict) -> Dict:
+        source = inputs['source']
+        if isinstance(source, dict):
+            ppm, intensity, metadata = source['ppm'], source['intensity'], source.get('metadata', {})
+        else:
+            self._read_spectrum(source)
+            ppm, intensity, metadata = self.ppm_data, self.intensity_data, self.file_metadata
+
+        if len(ppm) < 2:
+            raise PipelineAbort("No hay datos suficientes en el archivo")
+
+        print(f"\n   ✅ Datos cargados: {len(ppm)} puntos")
+        print(f"   Rango ppm: {min(ppm):.2f} a {max(ppm):.2f}")
+        return {
+            'ppm': _read_only(ppm),
+            'intensity': _read_only(intensity),
+            'metadata': metadata
+        }
+
+    def _stage_baseline(self, inputs: Dict, params: Dict) -> Dict:
+        self._use_spectrum(inputs['read'])
+        if params['baseline_correction']:
+            if params['baseline_method'] == 'polynomial':
                 self._correct_baseline_polynomial()
                 print(f"   ✅ Baseline corregido (polynomial)")
             else:
@@ -135,25 +271,79 @@ class SpectrumAnalyzer:
         else:
             self.intensity_corrected = self.intensity_data.copy()
             self.baseline_value = 0.0
-        
-        # 1. Calcular métricas de calidad PRIMERO para obtener el noise_level
-        quality_metrics = self._calculate_quality_metrics()
-        
-        # 2. Analizar regiones
-        fluor_total_stats = self._analyze_region(
-            fluor_range['min'], fluor_range['max']
-        )
-        pifas_stats = self._analyze_region(
-            pifas_range['min'], pifas_range['max']
-        )
-        
-        # 3. Detectar picos PASANDO el noise_level global
-        peaks = self._detect_peaks_advanced(
-            pifas_range['min'], pifas_range['max'],
+        return {
+            'intensity': _read_only(self.intensity_corrected),
+            'baseline_value': self.baseline_value
+        }
+
+    def _stage_quality(self, inputs: Dict, params: Dict) -> Dict:
+        # Métricas de calidad PRIMERO: dan el noise_level para los picos
+        self._use_spectrum(inputs['read'], inputs['baseline'])
+        return self._calculate_quality_metrics()
+
+    def _stage_regions(self, inputs: Dict, params: Dict) -> Dict:
+        self._use_spectrum(inputs['read'], inputs['baseline'])
+        return {
+            'fluor_total': self._analyze_region(params['fluor_range']['min'], params['fluor_range']['max']),
+            'pifas': self._analyze_region(params['pifas_range']['min'], params['pifas_range']['max'])
+        }
+
+    def _stage_peaks(self, inputs: Dict, params: Dict) -> List[Dict]:
+        # Detectar picos PASANDO el noise_level global
+        self._use_spectrum(inputs['read'], inputs['baseline'])
+        quality_metrics = inputs['quality']
+        return self._detect_peaks_advanced(
+            params['pifas_range']['min'], params['pifas_range']['max'],
             global_noise_level=quality_metrics.get('noise_level', 1e-9),
             max_signal_intensity=quality_metrics.get('max_signal', 1.0)
         )
 
+    def _stage_detect(self, inputs: Dict, params: Dict) -> Dict:
+        peaks = inputs['peaks']
+        try:
+            print(f"\n   🔍 Iniciando detección de PFAS...")
+            
+            peak_ppms = [p['ppm'] for p in peaks]
+            peak_intensities = [p['intensity'] for p in peaks]
+            
+            print(f"   Picos a analizar: {len(peak_ppms)}")
+            if peak_ppms:
+                print(f"   Rango de picos: {min(peak_ppms):.2f} a {max(peak_ppms):.2f} ppm")
+            
+            pfas_detection = self.pfas_detector.detect_pfas(
+                chemical_shifts=peak_ppms,
+                intensities=peak_intensities,
+                confidence_threshold=0.60
+            )
+            
+            print(f"   ✅ Detección completada: {pfas_detection['total_detected']} PFAS detectados")
+            return pfas_detection
+            
+        except Exception as e:
+            print(f"   ⚠️ Error en detección de PFAS: {e}")
+            import traceback
+            traceback.print_exc()
+            # Con 'error' el pipeline no guarda la salida en la caché compartida
+            return {
+                "detected_pfas": [],
+                "total_detected": 0,
+                "error": str(e)
+            }
+
+    def _stage_score(self, inputs: Dict, params: Dict) -> Dict:
+        quality_score, quality_breakdown = self._calculate_quality_score_v2(inputs['quality'], inputs['peaks'])
+        return {'score': float(quality_score), 'breakdown': quality_breakdown}
+
+    def _build_results(self, outputs: Dict, params: Dict, source_name: str) -> Dict:
+        """Ensambla el JSON de resultados (copias: las salidas cacheadas no se tocan)"""
+        concentration = params['concentration']
+        metadata = outputs['read']['metadata']
+        quality_metrics = copy.deepcopy(outputs['quality'])
+        fluor_total_stats = copy.deepcopy(outputs['regions']['fluor_total'])
+        pifas_stats = copy.deepcopy(outputs['regions']['pifas'])
+        peaks = copy.deepcopy(outputs['peaks'])
+        baseline_value = outputs['baseline']['baseline_value']
+
         # --- Calcular concentraciones ---
         total_area = fluor_total_stats.get('total_area', 1)  # Evitar división por cero
         pifas_area = pifas_stats.get('total_area', 0)
@@ -163,17 +353,18 @@ class SpectrumAnalyzer:
         pfas_concentration = float(concentration * pifas_fraction)  # alias
 
         
-        # Resultados (VERSIÓN APLANADA Y CON .tolist() PARA JSON)
+        # Resultados (VERSIÓN APLANADA; el espectro va como array y lo
+        # serializa directamente el proveedor JSON, sin pasar por listas)
         results = {
             # --- Datos del Espectro (PARA EL GRÁFICO) ---
             "spectrum": {
-                "ppm": self.ppm_data.tolist(),  # <-- CONVERTIDO A LISTA
-                "intensity": self.intensity_corrected.tolist()  # <-- CONVERTIDO A LISTA
+                "ppm": _spectrum_array(outputs['read']['ppm']),
+                "intensity": _spectrum_array(outputs['baseline']['intensity'])
             },
             
             # --- Info Básica ---
-            "file_name": file_path.name,
-            "filename": file_path.name, # Alias
+            "file_name": source_name,
+            "filename": source_name, # Alias
             "concentration": float(concentration), # Convertido a float
             "sample_concentration": float(concentration), # Alias
 
@@ -202,51 +393,31 @@ class SpectrumAnalyzer:
             "total_integral": fluor_total_stats.get('total_area', 0), # Alias
 
             # --- Configuración ---
-            "baseline_corrected": baseline_correction,
-            "baseline_value": float(self.baseline_value) if self.baseline_value else 0.0,
+            "baseline_corrected": params['baseline_correction'],
+            "baseline_value": float(baseline_value) if baseline_value else 0.0,
             "spectrometer_config": {
                 "h1_frequency_mhz": self.spectrometer_h1_freq,
                 "f19_frequency_mhz": self.f19_frequency
             }
         }
 
+        # Resolución digital (solo si el espectro viene de un FID procesado aquí)
+        if metadata.get('resolution'):
+            results["spectrum_resolution"] = metadata['resolution']
+        if metadata.get('phase'):
+            results["phase_correction"] = metadata['phase']
+
         # Detección de PFAS
-        try:
-            print(f"\n   🔍 Iniciando detección de PFAS...")
-            
-            peak_ppms = [p['ppm'] for p in peaks]
-            peak_intensities = [p['intensity'] for p in peaks]
-            
-            print(f"   Picos a analizar: {len(peak_ppms)}")
-            if peak_ppms:
-                print(f"   Rango de picos: {min(peak_ppms):.2f} a {max(peak_ppms):.2f} ppm")
-            
-            pfas_detection = self.pfas_detector.detect_pfas(
-                chemical_shifts=peak_ppms,
-                intensities=peak_intensities,
-                confidence_threshold=0.60
-            )
-            
-            results["pfas_detection"] = pfas_detection
-            
-            print(f"   ✅ Detección completada: {pfas_detection['total_detected']} PFAS detectados")
-            
-        except Exception as e:
-            print(f"   ⚠️ Error en detección de PFAS: {e}")
-            import traceback
-            traceback.print_exc()
-            results["pfas_detection"] = {
-                "detected_pfas": [],
-                "total_detected": 0,
-                "error": str(e)
-            }
-            
-        quality_score, quality_breakdown = self._calculate_quality_score_v2(quality_metrics, peaks) 
-        results["quality_score"] = float(quality_score) # Convertir a float
-        results["quality_breakdown"] = quality_breakdown
+        results["pfas_detection"] = copy.deepcopy(outputs['detect'])
+
+        results["quality_score"] = outputs['score']['score']
+        results["quality_breakdown"] = dict(outputs['score']['breakdown'])
+
+        # Etapas registradas que publican su salida en los resultados
+        for stage in self.pipeline.stages:
+            if stage.result_key:
+                results[stage.result_key] = copy.deepcopy(outputs[stage.name])
 
-        self._print_summary(results)
-            
         return results    
             
     def _find_best_column(self, all_rows, num_cols):
@@ -370,14 +541,14 @@ class SpectrumAnalyzer:
             }
         
         if len(region_ppm) > 1:
-            total_area = float(np.trapz(region_intensity, region_ppm))
+            total_area = float(_trapezoid(region_intensity, region_ppm))
         else:
             total_area = 0.0
         
         max_intensity = float(np.max(region_intensity))
         n_points = int(len(region_intensity))
         
-        total_full_area = float(np.trapz(self.intensity_corrected, self.ppm_data))
+        total_full_area = float(_trapezoid(self.intensity_corrected, self.ppm_data))
         percentage = (total_area / total_full_area * 100) if total_full_area != 0 else 0.0
         
         return {
@@ -622,6 +793,18 @@ class SpectrumAnalyzer:
         print(f"\n{'='*70}\n")
 
 
+def _read_only(array) -> np.ndarray:
+    """Vista de solo lectura: las salidas de etapa se comparten vía caché"""
+    view = np.asarray(array).view()
+    view.flags.writeable = False
+    return view
+
+
+def _spectrum_array(array) -> np.ndarray:
+    """float64 nativo y contiguo (lo que se serializa sin copias), de solo lectura"""
+    return _read_only(np.ascontiguousarray(array, dtype=np.float64))
+
+
 def main():
     """Función principal para testing"""
     import sys
@@ -646,7 +829,8 @@ def main():
     # Guardar resultados
     output_file = file_path.with_suffix('.json')
     with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+        # El espectro va como array NumPy
+        json.dump(results, f, indent=2, ensure_ascii=False, default=lambda obj: obj.tolist())
     
     print(f"✅ Resultados guardados en: {output_file}")
 
@@ -0,0 +1,515 @@
+"""
+Procesamiento de FID Bruker con memoria acotada
+
+El camino clásico (nmrglue: read → zf → em → fft → real → ...) crea un
+array nuevo en cada paso, y el pico de memoria es varias veces el tamaño
+del FID. Aquí:
+
+- El fid/ser crudo se mapea en memoria (np.memmap) según BYTORDA/DTYPA
+  del acqus; solo se leen del disco las filas que se procesan.
+- Cada FID se copia una sola vez (convirtiendo de int32/float64) a un
+  buffer complejo ya dimensionado para el zero filling, y ventana, FFT
+  (scipy.fft con overwrite_x), inversión, baseline y normalización se
+  hacen in situ sobre ese buffer.
+- El fftshift se sustituye por modular el FID con (-1)^k antes de la FFT,
+  que no necesita copia.
+- FID reales (AQ_mod qf/qseq) usan la FFT de entrada real (rfft).
+- El zero filling va al siguiente tamaño 5-smooth (FFT rápida), la ventana
+  exponencial se cachea por (tamaño, lb, sw) y los buffers de trabajo se
+  reutilizan entre espectros de un mismo lote (FIDWorkspace).
+- Fase: heurística de inversión (por defecto) o corrección automática de
+  orden 0 y 1 por minimización de entropía (autophase, phase_mode='auto').
+"""
+import logging
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy import fft as sp_fft
+
+try:
+    import nmrglue as ng
+    NMRGLUE_AVAILABLE = True
+except ImportError:
+    NMRGLUE_AVAILABLE = False
+
+# DTYPA → tipo de dato del fid/ser (0 = int32, 2 = float64)
+DTYPA_TYPES = {0: 'i4', 2: 'f8'}
+
+# Cada FID de un ser empieza en un bloque de 1024 bytes
+BRUKER_BLOCK_BYTES = 1024
+
+# AQ_mod: 0 = qf, 1 = qsim, 2 = qseq, 3 = DQD (0 y 2 son datos reales)
+REAL_AQ_MODES = (0, 2)
+
+# Ensanchamiento de línea por defecto (Hz)
+DEFAULT_LB_HZ = 1.0
+
+# Fracción de puntos de cada extremo usada para la línea base lineal
+BASELINE_EDGE_FRACTION = 0.05
+
+# Tamaño de bloque para operaciones por tramos (evita temporales de N puntos)
+_BLOCK = 65536
+
+# Ventanas cacheadas (cada una ocupa 8 B/punto)
+WINDOW_CACHE_SIZE = 16
+
+# Modos de fase: 'heuristic' = parte real + inversión si dominan los negativos
+#                'auto'      = autophase (orden 0 y 1)
+PHASE_MODES = ('heuristic', 'auto')
+
+# Autophase: puntos máximos evaluados, semiancho (puntos) alrededor de cada
+# señal, peso de la penalización por intensidad negativa y rejilla
+AUTOPHASE_MAX_POINTS = 4096
+AUTOPHASE_PEAK_HALF_WIDTH = 24
+AUTOPHASE_NEGATIVE_PENALTY = 1e4
+AUTOPHASE_P0_STEP = 10.0
+AUTOPHASE_P1_SPAN = 180.0
+AUTOPHASE_P1_STEP = 20.0
+AUTOPHASE_REFINEMENTS = 4
+
+
+class BrukerRawData:
+    """
+    FID/ser Bruker mapeado en memoria.
+
+    `rows` es un np.memmap de forma (n_rows, row_points) con los valores
+    crudos intercalados (re, im, re, im...) tal y como están en disco.
+    """
+
+    def __init__(self, path: Path, params: Dict):
+        path = Path(path)
+        if path.is_file():
+            path = path.parent
+        self.path = path
+        self.params = params
+        acqus = params.get('acqus', {})
+
+        self.td = int(acqus.get('TD') or 0)
+        if self.td <= 0:
+            raise ValueError("acqus sin TD válido")
+
+        dtypa = int(acqus.get('DTYPA') or 0)
+        if dtypa not in DTYPA_TYPES:
+            raise ValueError(f"DTYPA no soportado: {dtypa}")
+        byte_order = '>' if int(acqus.get('BYTORDA') or 0) == 1 else '<'
+        self.dtype = np.dtype(byte_order + DTYPA_TYPES[dtypa])
+
+        self.aq_mod = int(acqus.get('AQ_mod') if acqus.get('AQ_mod') is not None else 3)
+        self.is_complex = self.aq_mod not in REAL_AQ_MODES
+
+        binary = path / 'ser' if (path / 'ser').exists() else path / 'fid'
+        if not binary.exists():
+            raise ValueError(f"No se encontró fid/ser en {path}")
+        self.binary = binary
+
+        file_size = binary.stat().st_size
+        itemsize = self.dtype.itemsize
+        padded = int(np.ceil(self.td * itemsize / BRUKER_BLOCK_BYTES)) * BRUKER_BLOCK_BYTES // itemsize
+        # TopSpin rellena cada FID hasta 1024 bytes; algunos exportadores no
+        if file_size % (padded * itemsize) == 0:
+            self.row_points = padded
+        elif file_size % (self.td * itemsize) == 0:
+            self.row_points = self.td
+        else:
+            raise ValueError(f"Tamaño de {binary.name} ({file_size} B) no cuadra con TD={self.td}")
+
+        self.n_rows = file_size // (self.row_points * itemsize)
+        if self.n_rows == 0:
+            raise ValueError(f"{binary.name} vacío")
+        self.rows = np.memmap(binary, dtype=self.dtype, mode='r',
+                              shape=(self.n_rows, self.row_points))
+
+    @property
+    def n_complex(self) -> int:
+        """Puntos del FID (complejos si is_complex, reales si no)"""
+        return self.td // 2 if self.is_complex else self.td
+
+    @property
+    def sw_hz(self) -> float:
+        return spectral_width_hz(self.params)
+
+    def row(self, index: int) -> np.ndarray:
+        """Valores crudos de una fila (vista del memmap, sin leer nada más)"""
+        return self.rows[index, :self.td]
+
+
+def open_bruker_raw(path: Path) -> BrukerRawData:
+    """Lee los acqus* (texto) y mapea el fid/ser binario"""
+    path = Path(path)
+    directory = path.parent if path.is_file() else path
+    if NMRGLUE_AVAILABLE:
+        params = ng.bruker.read_acqus_file(str(directory))
+    else:
+        params = {'acqus': read_acqus_scalars(directory / 'acqus')}
+    if 'acqus' not in params:
+        raise ValueError(f"No se encontró acqus en {directory}")
+    return BrukerRawData(directory, params)
+
+
+def read_acqus_scalars(acqus_path: Path) -> Dict:
+    """Lector mínimo de parámetros escalares JCAMP (##$KEY= valor) sin nmrglue"""
+    params = {}
+    with open(acqus_path, 'r', encoding='latin-1') as f:
+        for line in f:
+            if not line.startswith('##$') or '=' not in line:
+                continue
+            key, value = line[3:].split('=', 1)
+            value = value.strip()
+            if value.startswith('<') and value.endswith('>'):
+                params[key] = value[1:-1]
+                continue
+            try:
+                params[key] = int(value)
+            except ValueError:
+                try:
+                    params[key] = float(value)
+                except ValueError:
+                    params[key] = value
+    return params
+
+
+def spectral_width_hz(params: Dict) -> float:
+    """SW en Hz (SW_h, o SW en ppm × SFO1 si falta)"""
+    acqus = params['acqus']
+    if acqus.get('SW_h'):
+        return float(acqus['SW_h'])
+    return float(acqus['SW']) * float(acqus['SFO1'])
+
+
+def fast_fft_size(n_points: int) -> int:
+    """
+    Menor longitud par y 5-smooth (2^a·3^b·5^c) >= n_points. Par para que
+    la modulación (-1)^k siga equivaliendo al fftshift.
+    """
+    return 2 * sp_fft.next_fast_len((int(n_points) + 1) // 2, real=True)
+
+
+def zero_fill_size(n_points: int, fast: bool = True) -> int:
+    """Tamaño tras el zero filling: al menos 2× el FID, redondeado a FFT rápida"""
+    return fast_fft_size(n_points * 2) if fast else n_points * 2
+
+
+def exponential_window(n_points: int, lb_hz: float, sw_hz: float,
+                       modulated: bool = False) -> np.ndarray:
+    """
+    Ventana exponencial exp(-π·lb·t) con t = k / sw, cacheada por
+    (puntos, lb, sw). Con modulated=True incluye el factor (-1)^k que
+    sustituye al fftshift. El array devuelto es de solo lectura.
+    """
+    return _cached_window(int(n_points), float(lb_hz), float(sw_hz), bool(modulated))
+
+
+@lru_cache(maxsize=WINDOW_CACHE_SIZE)
+def _cached_window(n_points: int, lb_hz: float, sw_hz: float, modulated: bool) -> np.ndarray:
+    window = np.arange(n_points, dtype=np.float64)
+    window *= -np.pi * lb_hz / sw_hz
+    np.exp(window, out=window)
+    if modulated:
+        window[1::2] *= -1
+    window.flags.writeable = False
+    return window
+
+
+class FIDWorkspace:
+    """
+    Buffers de trabajo reutilizables entre FIDs del mismo tamaño (un lote,
+    las filas de un ser...). No es thread-safe: uno por lector/proceso.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[Tuple[int, str], np.ndarray] = {}
+
+    def buffer(self, size: int, dtype) -> np.ndarray:
+        """Buffer de `size` puntos puesto a cero (reutilizado si ya existe)"""
+        key = (size, np.dtype(dtype).str)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            # Solo se conserva un tamaño por tipo: un lote suele ser homogéneo
+            self._buffers = {k: v for k, v in self._buffers.items() if k[1] != key[1]}
+            buffer = np.zeros(size, dtype=dtype)
+            self._buffers[key] = buffer
+        else:
+            buffer.fill(0)
+        return buffer
+
+    def clear(self):
+        self._buffers.clear()
+
+
+def _subtract_linear_baseline(spectrum: np.ndarray):
+    """Ajusta una recta a los extremos del espectro y la resta in situ"""
+    n = spectrum.size
+    edge = max(2, int(n * BASELINE_EDGE_FRACTION))
+    if n < 2 * edge:
+        return
+    x = np.concatenate((np.arange(edge), np.arange(n - edge, n))).astype(np.float64)
+    y = np.concatenate((spectrum[:edge], spectrum[n - edge:]))
+    slope, intercept = np.polyfit(x, y, 1)
+    for start in range(0, n, _BLOCK):
+        stop = min(start + _BLOCK, n)
+        spectrum[start:stop] -= intercept + slope * np.arange(start, stop, dtype=np.float64)
+
+
+# ============================================================================
+# CORRECCIÓN DE FASE
+# ============================================================================
+
+def _select_signal_points(magnitude: np.ndarray) -> np.ndarray:
+    """
+    Índices donde evaluar la fase: las señales y sus colas dispersivas. El
+    módulo no depende de la fase, así que la selección vale para toda la
+    búsqueda. Como mucho AUTOPHASE_MAX_POINTS puntos.
+    """
+    n = magnitude.size
+    if n <= AUTOPHASE_MAX_POINTS:
+        return np.arange(n)
+
+    noise = np.median(magnitude)
+    mask = magnitude > noise * 5
+    width = 2 * AUTOPHASE_PEAK_HALF_WIDTH + 1
+    mask = np.convolve(mask.astype(np.float32), np.ones(width, dtype=np.float32), mode='same') > 0
+    indices = np.flatnonzero(mask)
+    if indices.size == 0 or indices.size > AUTOPHASE_MAX_POINTS:
+        # Demasiada señal (o ninguna): quedarse con los puntos más intensos
+        indices = np.sort(np.argpartition(magnitude, -AUTOPHASE_MAX_POINTS)[-AUTOPHASE_MAX_POINTS:])
+    return indices
+
+
+def _phase_cost(real_batch: np.ndarray, gaps: np.ndarray) -> np.ndarray:
+    """
+    Entropía de la derivada (Chen et al. 2002) + penalización por intensidad
+    negativa, para una matriz (combinaciones × puntos). Menor es mejor.
+    """
+    derivative = np.abs(np.diff(real_batch, axis=1))
+    derivative[:, gaps] = 0  # saltos entre regiones no contiguas
+    derivative /= derivative.sum(axis=1, keepdims=True) + 1e-300
+    entropy = -np.sum(derivative * np.log(derivative + 1e-300), axis=1)
+
+    negative = np.minimum(real_batch, 0)
+    penalty = np.sum(negative * negative, axis=1) / (np.sum(real_batch * real_batch, axis=1) + 1e-300)
+    return entropy + AUTOPHASE_NEGATIVE_PENALTY * penalty
+
+
+def _grid_search(selected: np.ndarray, x: np.ndarray, gaps: np.ndarray,
+                 p0_values: np.ndarray, p1_values: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Evalúa la rejilla p0 × p1. Para cada p1 se rota una vez (vector complejo)
+    y todos los p0 salen de Re(S·e^{iφ0}) = cos φ0·A − sin φ0·B en bloque.
+    """
+    cos_p0 = np.cos(np.deg2rad(p0_values))[:, None]
+    sin_p0 = np.sin(np.deg2rad(p0_values))[:, None]
+    best = (np.inf, 0.0, 0.0)
+    for p1 in p1_values:
+        rotated = selected * np.exp(1j * np.deg2rad(p1) * x)
+        costs = _phase_cost(cos_p0 * rotated.real - sin_p0 * rotated.imag, gaps)
+        index = int(np.argmin(costs))
+        if costs[index] < best[0]:
+            best = (float(costs[index]), float(p0_values[index]), float(p1))
+    return best
+
+
+def autophase(spectrum: np.ndarray, p1_center: float = 0.0) -> Tuple[float, float]:
+    """
+    Corrección automática de fase de orden 0 y 1 por minimización de
+    entropía, con búsqueda en rejilla de gruesa a fina.
+
+    Args:
+        spectrum: Espectro complejo (orden de frecuencias de la FFT desplazada)
+        p1_center: Centro de la búsqueda de p1 (p.ej. 360·GRPDLY del filtro digital)
+
+    Returns:
+        (p0, p1) en grados, con el convenio de apply_phase / ng.proc_base.ps
+    """
+    n = spectrum.size
+    indices = _select_signal_points(np.abs(spectrum))
+    selected = spectrum[indices]
+    x = indices / n
+    gaps = np.flatnonzero(np.diff(indices) > 1)
+
+    p0_step, p1_step = AUTOPHASE_P0_STEP, AUTOPHASE_P1_STEP
+    p0_values = np.arange(-180.0, 180.0, p0_step)
+    p1_values = np.arange(p1_center - AUTOPHASE_P1_SPAN, p1_center + AUTOPHASE_P1_SPAN + p1_step / 2, p1_step)
+    _, p0, p1 = _grid_search(selected, x, gaps, p0_values, p1_values)
+
+    for _ in range(AUTOPHASE_REFINEMENTS):
+        p0_values = p0 + np.arange(-3, 4) * (p0_step / 2)
+        p1_values = p1 + np.arange(-3, 4) * (p1_step / 2)
+        p0_step, p1_step = p0_step / 2, p1_step / 2
+        _, p0, p1 = _grid_search(selected, x, gaps, p0_values, p1_values)
+
+    p0 = (p0 + 180.0) % 360.0 - 180.0
+    return p0, p1
+
+
+def apply_phase(spectrum: np.ndarray, p0: float, p1: float) -> np.ndarray:
+    """Aplica la fase p0 + p1·k/N (grados) in situ, por bloques"""
+    n = spectrum.size
+    p0_rad, p1_rad = np.deg2rad(p0), np.deg2rad(p1)
+    for start in range(0, n, _BLOCK):
+        stop = min(start + _BLOCK, n)
+        spectrum[start:stop] *= np.exp(1j * (p0_rad + p1_rad * np.arange(start, stop) / n))
+    return spectrum
+
+
+def group_delay_p1(params: Dict) -> float:
+    """p1 (grados) que compensa el retardo del filtro digital Bruker (GRPDLY)"""
+    try:
+        grpdly = float(params['acqus'].get('GRPDLY') or 0)
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+    return 360.0 * grpdly if grpdly > 0 else 0.0
+
+
+def phase_spectrum(spectrum: np.ndarray, phase_mode: str = 'heuristic',
+                   p1_center: float = 0.0) -> Dict:
+    """
+    Corrige la fase de un espectro complejo in situ según phase_mode.
+
+    Returns:
+        Dict con 'mode' y, en modo 'auto', 'p0'/'p1' (grados) y 'seconds'
+    """
+    if phase_mode not in PHASE_MODES:
+        raise ValueError(f"Modo de fase desconocido: {phase_mode} (opciones: {', '.join(PHASE_MODES)})")
+    if phase_mode != 'auto':
+        return {'mode': phase_mode}
+
+    started = time.perf_counter()
+    p0, p1 = autophase(spectrum, p1_center)
+    apply_phase(spectrum, p0, p1)
+    elapsed = time.perf_counter() - started
+    logging.info(f"  💡 Autophase: p0={p0:.1f}°, p1={p1:.1f}° ({elapsed * 1000:.0f} ms)")
+    return {'mode': 'auto', 'p0': round(p0, 2), 'p1': round(p1, 2), 'seconds': round(elapsed, 4)}
+
+
+def _finish_spectrum(spectrum: np.ndarray, flip_sign: bool = True) -> np.ndarray:
+    """Inversión de fase (heurística), baseline lineal y normalización a 1M, in situ"""
+    min_val = spectrum.min()
+    max_val = spectrum.max()
+    if flip_sign and min_val < 0 and abs(min_val) > abs(max_val) * 2:
+        logging.warning(f"  ⚠️  Espectro con fase invertida detectado (Min: {min_val:.2e}, Max: {max_val:.2e}). Invirtiendo...")
+        np.negative(spectrum, out=spectrum)
+
+    _subtract_linear_baseline(spectrum)
+
+    max_intensity = spectrum.max()
+    if max_intensity > 0:
+        spectrum *= 1_000_000 / max_intensity
+    else:
+        logging.warning(" ⚠️ Espectro nulo post-corrección; no se puede normalizar.")
+    return spectrum
+
+
+def process_fid_inplace(raw: np.ndarray, is_complex: bool, sw_hz: float,
+                        lb_hz: float = DEFAULT_LB_HZ,
+                        size: Optional[int] = None,
+                        workspace: Optional[FIDWorkspace] = None,
+                        phase_mode: str = 'heuristic',
+                        p1_center: float = 0.0) -> Tuple[np.ndarray, Dict]:
+    """
+    Procesa un FID crudo (valores intercalados re/im o reales) con un único
+    buffer de trabajo.
+
+    Args:
+        raw: Valores crudos (p.ej. BrukerRawData.row(i)); no se modifica
+        is_complex: True si raw es re/im intercalado
+        sw_hz: Anchura espectral (Hz) para la ventana exponencial
+        lb_hz: Ensanchamiento de línea (Hz)
+        size: Puntos tras el zero filling (por defecto zero_fill_size(n))
+        workspace: Buffers reutilizables entre llamadas (opcional)
+        phase_mode: 'heuristic' o 'auto' (ver phase_spectrum)
+        p1_center: Centro de la búsqueda de p1 en modo 'auto'
+
+    Returns:
+        (espectro real float64 de mayor a menor frecuencia como el camino
+        nmrglue, info de fase)
+    """
+    n = raw.size // 2 if is_complex else raw.size
+    size = size or zero_fill_size(n)
+    if size < n:
+        raise ValueError(f"Tamaño de FFT ({size}) menor que el FID ({n})")
+    workspace = workspace or FIDWorkspace()
+
+    if not is_complex:
+        # FID real (muestreado a 2·SW): rfft → size//2 + 1 puntos, la mitad
+        # de memoria que la FFT compleja
+        buffer = workspace.buffer(size, np.float64)
+        buffer[:n] = raw
+        buffer[:n] *= exponential_window(n, lb_hz, 2 * sw_hz)
+        spectrum_complex = sp_fft.rfft(buffer, overwrite_x=True)
+        phase = phase_spectrum(spectrum_complex, phase_mode, p1_center)
+        spectrum = np.empty(spectrum_complex.size, dtype=np.float64)
+        np.copyto(spectrum, spectrum_complex.real[::-1])
+        del spectrum_complex
+        return _finish_spectrum(spectrum, flip_sign=phase['mode'] != 'auto'), phase
+
+    buffer = workspace.buffer(size, np.complex128)
+    buffer.real[:n] = raw[0::2]
+    buffer.imag[:n] = raw[1::2]
+    # (-1)^k desplaza el espectro N/2 puntos: equivale a fftshift sin copia
+    buffer[:n] *= exponential_window(n, lb_hz, sw_hz, modulated=True)
+
+    spectrum_complex = sp_fft.fft(buffer, overwrite_x=True)
+    phase = phase_spectrum(spectrum_complex, phase_mode, p1_center)
+
+    spectrum = np.empty(size, dtype=np.float64)
+    np.copyto(spectrum, spectrum_complex.real)
+    del spectrum_complex
+    return _finish_spectrum(spectrum, flip_sign=phase['mode'] != 'auto'), phase
+
+
+def _ppm_step(sw_ppm: float, n_points: int, is_complex: bool) -> float:
+    # FFT compleja: N bins de SW/N; rfft: N/2+1 bins que cubren SW entero
+    return sw_ppm / n_points if is_complex else sw_ppm / max(n_points - 1, 1)
+
+
+def ppm_axis(params: Dict, n_points: int, is_complex: bool = True) -> np.ndarray:
+    """
+    Escala ppm (de mayor a menor) centrada en O1, un valor por bin de la FFT
+    (paso SW/N, el mismo que reporta resolution_info).
+    """
+    acqus = params['acqus']
+    sfo1 = float(acqus['SFO1'])
+    sw_ppm = float(acqus['SW'])
+    ref_ppm = float(acqus['O1']) / sfo1
+    step = _ppm_step(sw_ppm, n_points, is_complex)
+    return ref_ppm + sw_ppm / 2 - np.arange(n_points, dtype=np.float64) * step
+
+
+def resolution_info(params: Dict, n_points: int, n_fid: Optional[int] = None,
+                    is_complex: bool = True, lb_hz: Optional[float] = None) -> Dict:
+    """Tamaño de FFT y resolución digital (Hz y ppm por punto) de un espectro"""
+    sw_hz = spectral_width_hz(params)
+    sw_ppm = float(params['acqus']['SW'])
+    step_ppm = _ppm_step(sw_ppm, n_points, is_complex)
+    info = {
+        'fft_size': int(n_points if is_complex else (n_points - 1) * 2),
+        'sw_hz': round(sw_hz, 4),
+        'hz_per_point': round(step_ppm * sw_hz / sw_ppm, 6),
+        'ppm_per_point': round(step_ppm, 8)
+    }
+    if n_fid is not None:
+        info['fid_points'] = int(n_fid)
+    if lb_hz is not None:
+        info['lb_hz'] = lb_hz
+    return info
+
+
+def process_bruker_row(raw_data: BrukerRawData, row: int = 0,
+                       lb_hz: float = DEFAULT_LB_HZ,
+                       workspace: Optional[FIDWorkspace] = None,
+                       phase_mode: str = 'heuristic') -> Tuple[np.ndarray, np.ndarray, Dict]:
+    """Procesa una fila del fid/ser mapeado → (ppm, espectro, {'resolution', 'phase'})"""
+    spectrum, phase = process_fid_inplace(
+        raw_data.row(row), raw_data.is_complex, raw_data.sw_hz,
+        lb_hz=lb_hz, workspace=workspace, phase_mode=phase_mode,
+        p1_center=group_delay_p1(raw_data.params)
+    )
+    info = {
+        'resolution': resolution_info(raw_data.params, spectrum.size, raw_data.n_complex,
+                                      raw_data.is_complex, lb_hz),
+        'phase': phase
+    }
+    return ppm_axis(raw_data.params, spectrum.size, raw_data.is_complex), spectrum, info
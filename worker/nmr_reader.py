@@ -16,8 +16,9 @@ PERO AÑADE la normalización a 1M al final para la UI.
 
 import numpy as np
 import csv
+import os
 from pathlib import Path
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import logging
 
 # Intentar importar nmrglue
@@ -30,15 +31,39 @@ except ImportError:
     logging.warning("⚠️  nmrglue no encontrado - Solo soporte CSV")
     logging.warning("   Instalar con: pip install nmrglue")
 
+import fid_processing
+
+# Modo de lectura de FID Bruker:
+#   'nmrglue' → ng.bruker.read + procesado paso a paso (por defecto)
+#   'mmap'    → fid/ser mapeado en memoria y procesado in situ (fid_processing)
+FID_MODES = ('nmrglue', 'mmap')
+DEFAULT_FID_MODE = os.getenv('NMR_FID_MODE', 'nmrglue').lower()
+
+# Corrección de fase de los FID (ambos modos):
+#   'heuristic' → parte real + inversión si dominan los negativos (por defecto)
+#   'auto'      → autophase de orden 0 y 1 (fid_processing.autophase)
+DEFAULT_PHASE_MODE = os.getenv('NMR_PHASE_MODE', 'heuristic').lower()
+
 
 class NMRDataReader:
     """
     Lector universal de datos NMR
     """
     
-    def __init__(self):
+    def __init__(self, fid_mode: Optional[str] = None, phase_mode: Optional[str] = None):
         self.data_format = None
         self.metadata = {}
+        self.fid_mode = (fid_mode or DEFAULT_FID_MODE).lower()
+        if self.fid_mode not in FID_MODES:
+            raise ValueError(f"Modo FID desconocido: {self.fid_mode} (opciones: {', '.join(FID_MODES)})")
+        self.phase_mode = (phase_mode or DEFAULT_PHASE_MODE).lower()
+        if self.phase_mode not in fid_processing.PHASE_MODES:
+            raise ValueError(f"Modo de fase desconocido: {self.phase_mode} "
+                             f"(opciones: {', '.join(fid_processing.PHASE_MODES)})")
+        # Fase aplicada al último FID procesado por el camino nmrglue
+        self._last_phase = {'mode': self.phase_mode}
+        # Buffers de FFT reutilizados entre todos los FID que lee este lector
+        self.fid_workspace = fid_processing.FIDWorkspace()
     
     def detect_format(self, path: Path) -> str:
         if not path.exists():
@@ -140,12 +165,21 @@ class NMRDataReader:
                 self._create_default_acqus(acqus_path)
             path = parent_dir
         
+        if self.fid_mode == 'mmap':
+            return self._read_bruker_mmap(path)
+        
         try:
             # 💡 SOLUCIÓN V19: Forzar que lea el FID crudo, ignorando el 1r procesado
                 logging.info("  ✅ Leyendo FID crudo (ignorando 1r)...")
                 dic, data = ng.bruker.read(str(path))
                 logging.info("  ✅ FID crudo leído - procesando...")
                 is_processed = False
+                n_rows = 1
+                if data.ndim > 1:
+                    # ser pseudo-2D: aquí solo la primera fila (read_bruker_rows lee todas)
+                    n_rows = data.shape[0]
+                    logging.warning(f"  ⚠️  ser con {n_rows} filas: se analiza la primera")
+                    data = data[0]
                 data = self._process_fid_bruker(data, dic) # V19
         
         except Exception as e:
@@ -155,6 +189,9 @@ class NMRDataReader:
         metadata = self._extract_bruker_metadata(dic)
         metadata['format'] = 'bruker'
         metadata['processed'] = is_processed
+        metadata['ser_rows'] = n_rows
+        metadata['resolution'] = self._bruker_resolution(dic, len(data))
+        metadata['phase'] = self._last_phase
         
         if np.iscomplexobj(data):
             logging.warning("  ⚠️  Se esperaba espectro real pero se encontró complejo. Tomando magnitud.")
@@ -162,21 +199,126 @@ class NMRDataReader:
         
         return ppm_scale, data, metadata
     
+    def _read_bruker_mmap(self, path: Path) -> Tuple[np.ndarray, np.ndarray, Dict]:
+        """Lectura mapeada en memoria + procesado in situ (ver fid_processing)"""
+        logging.info("  ✅ Leyendo FID crudo mapeado en memoria...")
+        try:
+            raw_data = fid_processing.open_bruker_raw(path)
+            if raw_data.n_rows > 1:
+                logging.warning(f"  ⚠️  ser con {raw_data.n_rows} filas: se analiza la primera")
+            ppm_scale, data, info = fid_processing.process_bruker_row(
+                raw_data, 0, workspace=self.fid_workspace, phase_mode=self.phase_mode
+            )
+        except Exception as e:
+            raise ValueError(f"Error leyendo datos Bruker: {e}")
+        
+        metadata = self._extract_bruker_metadata(raw_data.params)
+        metadata['format'] = 'bruker'
+        metadata['processed'] = False
+        metadata['ser_rows'] = raw_data.n_rows
+        metadata['resolution'] = info['resolution']
+        metadata['phase'] = info['phase']
+        return ppm_scale, data, metadata
+    
+    def count_bruker_rows(self, path: Path) -> int:
+        """
+        Número de FIDs de un experimento Bruker (1 para fid, N para un ser
+        pseudo-2D). Solo lee la cabecera (lectura perezosa de nmrglue).
+        """
+        if self.fid_mode == 'mmap':
+            try:
+                return fid_processing.open_bruker_raw(path).n_rows
+            except Exception as e:
+                logging.warning(f"  ⚠️  No se pudieron contar filas de {path}: {e}")
+                return 1
+        if not NMRGLUE_AVAILABLE:
+            return 1
+        try:
+            _, data = ng.bruker.read_lowmem(str(path), read_pulseprogram=False)
+            return data.shape[0] if len(data.shape) > 1 else 1
+        except Exception as e:
+            logging.warning(f"  ⚠️  No se pudieron contar filas de {path}: {e}")
+            return 1
+    
+    def read_bruker_rows(self, path: Path, start: int = 0,
+                         stop: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray, Dict]]:
+        """
+        Lee y procesa las filas [start, stop) de un experimento Bruker.
+        Para un ser pseudo-2D cada fila es un FID independiente; solo se
+        cargan en memoria las filas pedidas.
+        """
+        path = Path(path)
+        if self.fid_mode == 'mmap':
+            return self._read_bruker_rows_mmap(path, start, stop)
+        if not NMRGLUE_AVAILABLE:
+            raise ValueError("nmrglue no disponible")
+        try:
+            # El pulseprogram puede alterar la forma deducida del ser; no se necesita
+            dic, data = ng.bruker.read_lowmem(str(path), read_pulseprogram=False)
+            if len(data.shape) == 1:
+                dic, fid = ng.bruker.read(str(path))
+                fids = [fid]
+            else:
+                stop = data.shape[0] if stop is None else min(stop, data.shape[0])
+                # nmrglue reduce a 1D los cortes de una sola fila
+                fids = list(np.atleast_2d(np.asarray(data[start:stop])))
+        except Exception as e:
+            raise ValueError(f"Error leyendo datos Bruker: {e}")
+
+        base_metadata = self._extract_bruker_metadata(dic)
+        rows = []
+        for offset, fid in enumerate(fids):
+            spectrum = self._process_fid_bruker(np.asarray(fid), dic)
+            if np.iscomplexobj(spectrum):
+                spectrum = np.abs(spectrum)
+            metadata = dict(base_metadata, format='bruker', processed=False, row=start + offset,
+                            resolution=self._bruker_resolution(dic, len(spectrum)),
+                            phase=self._last_phase)
+            rows.append((self._create_ppm_scale_bruker(dic, len(spectrum)), spectrum, metadata))
+        return rows
+    
+    def _read_bruker_rows_mmap(self, path: Path, start: int,
+                               stop: Optional[int]) -> List[Tuple[np.ndarray, np.ndarray, Dict]]:
+        try:
+            raw_data = fid_processing.open_bruker_raw(path)
+        except Exception as e:
+            raise ValueError(f"Error leyendo datos Bruker: {e}")
+        stop = raw_data.n_rows if stop is None else min(stop, raw_data.n_rows)
+        base_metadata = self._extract_bruker_metadata(raw_data.params)
+        rows = []
+        for row in range(start, stop):
+            ppm_scale, spectrum, info = fid_processing.process_bruker_row(
+                raw_data, row, workspace=self.fid_workspace, phase_mode=self.phase_mode
+            )
+            metadata = dict(base_metadata, format='bruker', processed=False, row=row,
+                            resolution=info['resolution'], phase=info['phase'])
+            rows.append((ppm_scale, spectrum, metadata))
+        return rows
+    
     def _process_fid_bruker(self, fid: np.ndarray, dic: dict) -> np.ndarray:
         """
         Procesa FID de Bruker (FFT, phase correction, etc.)
         ✅ VERSIÓN 19: (V16) Inversión simple + Baseline + (V17) Normalización
         """
         
-        # Zero filling
-        fid = ng.proc_base.zf_size(fid, fid.size * 2)
+        # Zero filling (al menos 2×, redondeado a un tamaño de FFT rápido)
+        fid = ng.proc_base.zf_size(fid, fid_processing.zero_fill_size(fid.size))
         
-        # Aplicar ventana exponencial
-        fid = ng.proc_base.em(fid, lb=1.0)  # 1 Hz line broadening
+        # Ventana exponencial de DEFAULT_LB_HZ (1 Hz), igual que el modo mmap.
+        # em() recibe lb en puntos (lb_hz / sw); un FID real se muestrea a 2·SW
+        sw_hz = fid_processing.spectral_width_hz(dic)
+        if not np.iscomplexobj(fid):
+            sw_hz *= 2
+        fid = ng.proc_base.em(fid, lb=fid_processing.DEFAULT_LB_HZ / sw_hz)
         
         # Fourier Transform
         spectrum_complex = ng.proc_base.fft(fid)
 
+        # Autophase (orden 0 y 1) si está activado; p1 parte del retardo del filtro digital
+        self._last_phase = fid_processing.phase_spectrum(
+            spectrum_complex, self.phase_mode, fid_processing.group_delay_p1(dic)
+        )
+
         # 💡 V16: NO USAR NP.ABS. Tomar la parte real.
         spectrum_real = np.real(spectrum_complex)
 
@@ -184,7 +326,7 @@ class NMRDataReader:
         max_val = np.max(spectrum_real)
 
         # 💡 V16: Comprobar si el espectro está "al revés" (picos negativos)
-        if min_val < 0 and abs(min_val) > abs(max_val) * 2:
+        if self.phase_mode != 'auto' and min_val < 0 and abs(min_val) > abs(max_val) * 2:
             logging.warning(f"  ⚠️  Espectro con fase invertida detectado (Min: {min_val:.2e}, Max: {max_val:.2e}). Invirtiendo...")
             spectrum_final = -spectrum_real # Invertir
         else:
@@ -211,17 +353,19 @@ class NMRDataReader:
     
     def _create_ppm_scale_bruker(self, dic: dict, n_points: int) -> np.ndarray:
         try:
-            sfo1 = float(dic['acqus']['SFO1'])
-            sw_ppm = float(dic['acqus']['SW'])
-            o1 = float(dic['acqus']['O1'])
-            ref_ppm = o1 / sfo1
-            ppm_max = ref_ppm + sw_ppm / 2
-            ppm_min = ref_ppm - sw_ppm / 2
-            return np.linspace(ppm_max, ppm_min, n_points)
+            # Misma escala (un valor por bin, paso SW/N) que el modo mmap
+            return fid_processing.ppm_axis(dic, n_points)
         except Exception as e:
             logging.warning(f"  ⚠️  No se pudo crear escala PPM precisa: {e}")
             return np.linspace(0, -200, n_points)
     
+    def _bruker_resolution(self, dic: dict, n_points: int) -> Dict:
+        try:
+            return fid_processing.resolution_info(dic, n_points)
+        except Exception as e:
+            logging.warning(f"  ⚠️  No se pudo calcular la resolución: {e}")
+            return {'fft_size': n_points}
+    
     def _extract_bruker_metadata(self, dic: dict) -> Dict:
         metadata = {}
         try:
@@ -242,7 +386,7 @@ class NMRDataReader:
         try:
             parent_dir = path.parent if path.is_file() else path
             dic, data = ng.varian.read(str(parent_dir))
-            data = self._process_fid_generic(data) # 💡 V19: Usar genérico
+            data = self._process_fid_generic(data, self._varian_sw_hz(dic)) # 💡 V19: Usar genérico
             ppm_scale = self._create_ppm_scale_varian(dic, len(data))
             metadata = {
                 'format': 'varian',
@@ -253,6 +397,14 @@ class NMRDataReader:
         except Exception as e:
             raise ValueError(f"Error leyendo datos Varian: {e}")
     
+    @staticmethod
+    def _varian_sw_hz(dic: dict) -> Optional[float]:
+        """Anchura espectral en Hz del procpar (None si falta)"""
+        try:
+            return float(dic['procpar']['sw']['values'][0])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+    
     def _create_ppm_scale_varian(self, dic: dict, n_points: int) -> np.ndarray:
         try:
             procpar = dic['procpar']
@@ -293,20 +445,28 @@ class NMRDataReader:
         except Exception as e:
             raise ValueError(f"Error leyendo datos NMRPipe: {e}")
     
-    def _process_fid_generic(self, fid: np.ndarray) -> np.ndarray:
+    def _process_fid_generic(self, fid: np.ndarray, sw_hz: Optional[float] = None) -> np.ndarray:
         """
         Procesamiento genérico de FID
         ✅ VERSIÓN 19: (V16) Inversión simple + Baseline + (V17) Normalización
+        sw_hz: anchura espectral; sin ella no se aplica ventana (no se puede
+        pasar DEFAULT_LB_HZ a puntos)
         """
         
-        # Zero filling
-        fid = ng.proc_base.zf_size(fid, fid.size * 2)
+        # Zero filling (al menos 2×, redondeado a un tamaño de FFT rápido)
+        fid = ng.proc_base.zf_size(fid, fid_processing.zero_fill_size(fid.size))
         
-        # Ventana
-        fid = ng.proc_base.em(fid, lb=1.0)
+        # Ventana exponencial de DEFAULT_LB_HZ, como en _process_fid_bruker
+        if sw_hz:
+            if not np.iscomplexobj(fid):
+                sw_hz *= 2
+            fid = ng.proc_base.em(fid, lb=fid_processing.DEFAULT_LB_HZ / sw_hz)
+        else:
+            logging.debug("  Sin anchura espectral: FID sin ventana exponencial")
         
         # FFT
         spectrum_complex = ng.proc_base.fft(fid)
+        self._last_phase = fid_processing.phase_spectrum(spectrum_complex, self.phase_mode)
         
         # 💡 V16: Invertir si es necesario, luego corregir baseline
         spectrum_real = np.real(spectrum_complex)
@@ -314,7 +474,7 @@ class NMRDataReader:
         min_val = np.min(spectrum_real)
         max_val = np.max(spectrum_real)
 
-        if min_val < 0 and abs(min_val) > abs(max_val) * 2:
+        if self.phase_mode != 'auto' and min_val < 0 and abs(min_val) > abs(max_val) * 2:
             logging.warning(f"  ⚠️  Espectro genérico con fase invertida detectado. Invirtiendo...")
             spectrum_final = -spectrum_real # Invertir
         else:
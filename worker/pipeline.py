@@ -0,0 +1,259 @@
+"""
+Pipeline de análisis por etapas con caché de resultados intermedios
+
+Cada etapa declara:
+- las etapas de las que depende (`inputs`)
+- los parámetros de análisis que usa (`params`)
+
+La clave de caché de una etapa es un hash de su nombre/versión, de las
+claves de sus etapas de entrada y del valor de sus parámetros. Así, al
+cambiar solo `concentration` se reutilizan lectura, baseline y picos; al
+cambiar `pifas_range` se reutilizan lectura y baseline.
+
+Las etapas se registran en orden (register(..., after=/before=)), de modo
+que se pueden añadir pasos nuevos sin tocar SpectrumAnalyzer.analyze_file.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Entradas totales en la caché de etapas (la etapa 'read' guarda espectros
+# completos, así que conviene mantenerla acotada)
+DEFAULT_CACHE_SIZE = int(os.getenv('ANALYSIS_STAGE_CACHE_SIZE', 64))
+
+# Nombre reservado para la entrada inicial del pipeline (archivo o arrays)
+SOURCE = 'source'
+
+
+class PipelineAbort(Exception):
+    """Una etapa lo lanza para terminar el análisis con un error controlado"""
+
+
+class Stage:
+    """
+    Etapa del pipeline.
+
+    Args:
+        name: Nombre único (clave en los resultados intermedios)
+        func: func(inputs: Dict[str, Any], params: Dict) → salida
+        inputs: Etapas de las que depende ('source' = entrada inicial)
+        params: Parámetros de análisis que afectan a la salida
+        result_key: Si se indica, la salida se copia a results[result_key]
+        cacheable: False para etapas baratas o con efectos secundarios. Las
+            salidas dict con clave 'error' (fallo recuperable de la etapa) no
+            se guardan nunca: la siguiente ejecución lo vuelve a intentar
+        version: Cambiarla invalida la caché de la etapa (p.ej. al cambiar su código)
+    """
+
+    def __init__(self, name: str, func: Callable[[Dict[str, Any], Dict], Any],
+                 inputs: Iterable[str] = (), params: Iterable[str] = (),
+                 result_key: Optional[str] = None, cacheable: bool = True,
+                 version: str = '1'):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = tuple(params)
+        self.result_key = result_key
+        self.cacheable = cacheable
+        self.version = version
+
+    def cache_key(self, input_keys: Dict[str, str], params: Dict) -> str:
+        payload = {
+            'stage': self.name,
+            'version': self.version,
+            'inputs': [input_keys[name] for name in self.inputs],
+            'params': {key: params.get(key) for key in self.params}
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=_json_default).encode('utf-8')
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs}, params={self.params})"
+
+
+class StageCache:
+    """
+    Caché LRU en memoria de salidas de etapas. Es segura entre hilos: la
+    comparten todos los analizadores del proceso (ver analyzer.SpectrumAnalyzer).
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class AnalysisPipeline:
+    """Secuencia ordenada de etapas con caché compartida"""
+
+    def __init__(self, stages: Iterable[Stage] = (), cache: Optional[StageCache] = None):
+        self.stages: List[Stage] = []
+        self.cache = cache if cache is not None else StageCache()
+        # Etapas calculadas / reutilizadas en la última ejecución
+        self.last_run: Dict[str, List[str]] = {'computed': [], 'reused': []}
+        for stage in stages:
+            self.register(stage)
+
+    def stage_names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    def register(self, stage: Stage, after: Optional[str] = None,
+                 before: Optional[str] = None) -> Stage:
+        """
+        Añade una etapa (al final, o justo después/antes de otra). Sus
+        entradas deben ser etapas anteriores o 'source'.
+        """
+        names = self.stage_names()
+        if stage.name in names or stage.name == SOURCE:
+            raise ValueError(f"Etapa duplicada: {stage.name}")
+
+        if after is not None and before is not None:
+            raise ValueError("Indicar solo 'after' o 'before'")
+        if after is not None:
+            position = self._index(after) + 1
+        elif before is not None:
+            position = self._index(before)
+        else:
+            position = len(self.stages)
+
+        available = {SOURCE, *names[:position]}
+        missing = [name for name in stage.inputs if name not in available]
+        if missing:
+            raise ValueError(f"Etapa '{stage.name}': entradas no disponibles en esa posición: {missing}")
+
+        self.stages.insert(position, stage)
+        return stage
+
+    def unregister(self, name: str) -> Stage:
+        index = self._index(name)
+        dependants = [s.name for s in self.stages[index + 1:] if name in s.inputs]
+        if dependants:
+            raise ValueError(f"La etapa '{name}' la usan: {dependants}")
+        return self.stages.pop(index)
+
+    def _index(self, name: str) -> int:
+        for index, stage in enumerate(self.stages):
+            if stage.name == name:
+                return index
+        raise KeyError(f"Etapa no registrada: {name}")
+
+    def run(self, source: Any, source_key: str, params: Dict) -> Dict[str, Any]:
+        """
+        Ejecuta todas las etapas.
+
+        Args:
+            source: Entrada inicial (ruta, arrays...)
+            source_key: Huella de la entrada (ver fingerprint_path / fingerprint_arrays)
+            params: Parámetros de análisis
+
+        Returns:
+            Dict {nombre_etapa: salida} (incluye 'source'). Las salidas
+            cacheadas se comparten entre ejecuciones: no modificarlas.
+        """
+        outputs: Dict[str, Any] = {SOURCE: source}
+        keys: Dict[str, str] = {SOURCE: source_key}
+        computed, reused = [], []
+
+        for stage in self.stages:
+            key = stage.cache_key(keys, params)
+            keys[stage.name] = key
+
+            if stage.cacheable:
+                found, value = self.cache.get(key)
+                if found:
+                    outputs[stage.name] = value
+                    reused.append(stage.name)
+                    continue
+
+            value = stage.func({name: outputs[name] for name in stage.inputs}, params)
+            outputs[stage.name] = value
+            computed.append(stage.name)
+            if stage.cacheable and not _is_error(value):
+                self.cache.put(key, value)
+
+        self.last_run = {'computed': computed, 'reused': reused}
+        if reused:
+            logger.debug(f"♻️ Etapas reutilizadas de caché: {', '.join(reused)}")
+        return outputs
+
+
+# ============================================================================
+# HUELLAS DE ENTRADA
+# ============================================================================
+
+def fingerprint_path(path, extra: Optional[Dict] = None) -> str:
+    """
+    Huella de un archivo o directorio de experimento (ruta, tamaño y mtime
+    de cada archivo; no lee el contenido).
+    """
+    path = os.path.abspath(str(path))
+    entries = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            full = os.path.join(path, name)
+            if os.path.isfile(full):
+                stat = os.stat(full)
+                entries.append((name, stat.st_size, stat.st_mtime_ns))
+    else:
+        stat = os.stat(path)
+        entries.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+    payload = json.dumps({'path': path, 'files': entries, 'extra': extra or {}},
+                         sort_keys=True, default=_json_default)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def fingerprint_arrays(*arrays) -> str:
+    """Huella del contenido de arrays en memoria (espectros ya cargados)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        digest.update(str(array.shape).encode('ascii'))
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _json_default(obj):
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+def _is_error(value: Any) -> bool:
+    """Salida de una etapa que falló de forma recuperable (no se cachea)"""
+    return isinstance(value, dict) and bool(value.get('error'))